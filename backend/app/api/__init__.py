@@ -3,11 +3,20 @@ from flask_cors import CORS
 from flask_restful import Api
 import os
 from ..config import config
+from ..models import init_db
 
 # 创建Flask应用实例
 def create_app():
     app = Flask(__name__)
     
+    # 确保数据库表结构存在（包括旧数据库缺少的新增列）
+    init_db()
+    
+    # 按配置提前加载模型并预热，避免第一个识别/注册请求等待模型加载
+    if config.MODEL_WARMUP_ON_START:
+        from ..utils.face_utils import warmup
+        warmup()
+    
     # 配置跨域，允许前端http://127.0.0.1:3000访问
     CORS(app, origins=['http://127.0.0.1:3000'])
     
@@ -21,21 +30,29 @@ def create_app():
     api = Api(app, prefix='/api')
     
     # 导入并注册各个接口
-    from .register import CameraRegisterAPI, UploadRegisterAPI
-    from .recognize import CameraRecognizeAPI, UploadRecognizeAPI
+    from .register import BulkRegisterAPI, CameraRegisterAPI, UploadRegisterAPI
+    from .jobs import JobStatusAPI
+    from .recognize import BatchRecognizeAPI, CameraRecognizeAPI, UploadRecognizeAPI
     from .delete import SingleDeleteAPI, BatchDeleteAPI
     from .statistic import StatisticAPI
     from .user import UserListAPI
+    from .search import SearchAPI
+    from .diagnostics import DiagnosticsAPI
     
     # 注册接口路由
     api.add_resource(CameraRegisterAPI, '/register/camera')
     api.add_resource(UploadRegisterAPI, '/register/upload')
+    api.add_resource(BulkRegisterAPI, '/register/bulk')
+    api.add_resource(JobStatusAPI, '/jobs/<string:job_id>')
     api.add_resource(CameraRecognizeAPI, '/recognize/camera')
     api.add_resource(UploadRecognizeAPI, '/recognize/upload')
+    api.add_resource(BatchRecognizeAPI, '/recognize/batch')
     api.add_resource(SingleDeleteAPI, '/delete/single')
     api.add_resource(BatchDeleteAPI, '/delete/batch')
     api.add_resource(StatisticAPI, '/statistic')
     api.add_resource(UserListAPI, '/user/list')
+    api.add_resource(SearchAPI, '/search')
+    api.add_resource(DiagnosticsAPI, '/diagnostics')
     
     return app
 
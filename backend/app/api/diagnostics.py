@@ -0,0 +1,27 @@
+from flask_restful import Resource
+import os
+from . import success_response, system_error_response
+
+from app.utils.thread_budget import thread_report
+
+
+class DiagnosticsAPI(Resource):
+    """
+    运行诊断接口
+    
+    查看处理该请求的工作进程的CPU线程预算和各推理框架实际生效的线程数
+    接口地址: GET /api/diagnostics
+    
+    返回数据:
+    - 成功: {"code": 0, "msg": "操作成功", "data": {"pid": 进程ID, "thread_budget": {"enabled": 是否启用, "budget": 预算, "applied": 已应用的框架, "current": 当前线程数, "os_threads": 进程线程数}}}
+    - 失败: {"code": 999, "msg": "系统异常，请重试", "data": {}}
+    """
+    def get(self):
+        try:
+            return success_response({
+                "pid": os.getpid(),
+                "thread_budget": thread_report()
+            })
+        except Exception as e:
+            print(f"❌ 获取诊断信息失败: {str(e)}")
+            return system_error_response()
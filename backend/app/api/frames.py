@@ -0,0 +1,137 @@
+"""请求解析 - 摄像头接口的图像帧和批量接口的图片文件列表
+
+摄像头接口同时支持JSON（base64图像）、原始图像请求体和multipart表单。
+
+前端用canvas.toDataURL生成base64字符串放在JSON中时，请求体比原始JPEG大约三分之一，
+服务端还要完整解析JSON并做一次base64解码。摄像头接口因此同时接受二进制帧：
+1. JSON: {"image": "data:image/jpeg;base64,...", 其他参数...}（原有格式）
+2. 原始图像请求体: Content-Type为image/jpeg、image/png、image/webp或application/octet-stream，
+   其他参数放在查询字符串中（如 POST /api/recognize/camera?face_box=...）
+3. multipart/form-data: 图像放在image字段（canvas.toBlob得到的Blob），其他参数为普通表单字段
+
+典型用法：
+    from .frames import read_camera_request
+
+    fields, image_bytes = read_camera_request(request)
+
+批量识别和批量注册接口接受多个图片文件或zip压缩包，由read_image_files展开为按需读取的图片列表。
+"""
+import base64
+import json
+import shutil
+import tempfile
+import zipfile
+
+from app.utils.batch_recognition import is_image_filename, iter_zip_images
+
+
+# 按原始图像请求体处理的Content-Type
+BINARY_FRAME_TYPES = ("image/jpeg", "image/png", "image/webp", "application/octet-stream")
+
+
+def read_camera_request(req):
+    """
+    读取摄像头接口的请求参数和图像字节
+
+    Args:
+        req (flask.Request): 当前请求
+
+    Returns:
+        tuple: (参数字典, 图像字节)，未提供图像时图像字节为None
+
+    Raises:
+        ValueError: 当请求数据无效或base64解码失败时抛出
+    """
+    if req.mimetype in BINARY_FRAME_TYPES:
+        # 直接读取请求体，不缓存到request.data
+        return req.args.to_dict(), req.get_data(cache=False) or None
+
+    if req.mimetype == "multipart/form-data":
+        file = req.files.get("image")
+        return req.form.to_dict(), (file.read() or None) if file else None
+
+    data = req.get_json(silent=True)
+    if not data or not isinstance(data, dict):
+        raise ValueError("无效的请求数据")
+    fields = {key: value for key, value in data.items() if key != "image"}
+    image = data.get("image")
+    if not image:
+        return fields, None
+    if not isinstance(image, str):
+        raise ValueError("图像数据必须是base64字符串")
+    # 移除base64头部信息
+    if "base64," in image:
+        image = image.split("base64,", 1)[1]
+    return fields, base64.b64decode(image)
+
+
+def parse_json_field(value):
+    """
+    解析表单或查询字符串中以JSON字符串提交的参数（如face_box），JSON请求中的对象原样返回
+
+    Args:
+        value: 参数值
+
+    Returns:
+        解析后的值，空字符串返回None
+
+    Raises:
+        ValueError: 当JSON字符串无效时抛出
+    """
+    if isinstance(value, str):
+        return json.loads(value) if value.strip() else None
+    return value
+
+
+# 按zip压缩包处理的请求体Content-Type
+ZIP_MIMETYPES = ("application/zip", "application/x-zip-compressed")
+
+
+def read_image_files(req, archives):
+    """
+    读取批量接口（批量识别、批量注册）请求中的图片列表
+    
+    支持multipart中的files/file字段（可多个，.zip文件按压缩包展开）、archive字段（zip压缩包），
+    以及Content-Type为application/zip的原始请求体。
+    
+    Args:
+        req (flask.Request): 当前请求
+        archives (list): 打开的压缩包会追加到该列表，由调用方在响应结束后关闭
+        
+    Returns:
+        list: (文件名, 读取函数) 元组列表，不支持的文件类型的读取函数抛出ValueError
+        
+    Raises:
+        ValueError: 当压缩包无效时抛出
+    """
+    def open_archive(fileobj):
+        try:
+            archive = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile:
+            raise ValueError("无效的zip压缩包")
+        archives.append(archive)
+        return iter_zip_images(archive)
+    
+    if req.mimetype in ZIP_MIMETYPES:
+        # 请求体先写入临时文件（较小时在内存中），zip需要随机读取
+        spool = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+        shutil.copyfileobj(req.stream, spool)
+        spool.seek(0)
+        return open_archive(spool)
+    
+    items = []
+    for field in ("files", "file", "archive"):
+        for file in req.files.getlist(field):
+            filename = file.filename or ""
+            if field == "archive" or filename.lower().endswith(".zip"):
+                items.extend(open_archive(file.stream))
+            elif is_image_filename(filename):
+                items.append((filename, file.read))
+            else:
+                items.append((filename, _unsupported_file))
+    return items
+
+
+def _unsupported_file():
+    """不支持的文件类型的读取函数"""
+    raise ValueError("不支持的文件类型，请上传图片文件")
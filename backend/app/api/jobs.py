@@ -0,0 +1,40 @@
+from flask_restful import Resource
+from flask import request
+from . import success_response, error_response, system_error_response
+
+from app.utils.bulk_registration import ITEM_STATUSES, bulk_registration_runner
+
+
+class JobStatusAPI(Resource):
+    """
+    批量注册任务查询接口
+
+    查询POST /api/register/bulk创建的任务的进度、每张照片的结果和被阻断的重复人脸
+    接口地址: GET /api/jobs/<job_id>
+
+    查询参数:
+    - status: 只返回该状态的条目（pending、registered、blocked、failed），默认全部
+    - page: 条目页码，默认为1
+    - page_size: 每页条目数，默认为100，最大1000
+
+    返回数据:
+    - 成功: {"code": 0, "msg": "操作成功", "data": {"job": {任务进度}, "items": [条目结果], "duplicates": [被阻断的条目]}}
+    - 失败: {"code": 30, "msg": "任务不存在", "data": {}}
+    """
+    def get(self, job_id):
+        try:
+            status = request.args.get('status', '', type=str) or None
+            page = max(1, request.args.get('page', 1, type=int))
+            page_size = min(max(1, request.args.get('page_size', 100, type=int)), 1000)
+            if status and status not in ITEM_STATUSES:
+                return error_response(2, f"status参数无效，可选值: {', '.join(ITEM_STATUSES)}")
+
+            result = bulk_registration_runner.get_job(
+                job_id, status=status, offset=(page - 1) * page_size, limit=page_size
+            )
+            if result is None:
+                return error_response(30, "任务不存在")
+            return success_response(result)
+        except Exception as e:
+            print(f"❌ 查询批量注册任务失败: {str(e)}")
+            return system_error_response()
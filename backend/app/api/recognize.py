@@ -1,8 +1,9 @@
 """人脸识别接口模块
 
 提供两种人脸识别方式：
-1. 摄像头识别 - 通过POST /api/recognize/camera接收base64编码的图像
+1. 摄像头识别 - 通过POST /api/recognize/camera接收base64编码的图像或二进制图像帧
 2. 照片上传识别 - 通过POST /api/recognize/upload接收文件上传
+3. 批量识别 - 通过POST /api/recognize/batch接收多个文件或zip压缩包，以NDJSON逐张流式返回结果
 
 核心功能：
 - 接收人脸图像并进行有效性验证
@@ -11,21 +12,57 @@
 
 依赖：
 - Flask-RESTful用于API实现
-- PIL用于图像处理
+- OpenCV用于图像解码（decode_image，不支持的格式回退到PIL）
 - 后端recognize_face模块处理核心识别逻辑
 """
-import base64
-import io
-from PIL import Image
-from flask import request
+import json
+import time
+
+from flask import Response, request, stream_with_context
 from flask_restful import Resource
 from werkzeug.utils import secure_filename
 
 # 导入统一响应格式函数
 from . import success_response, system_error_response
+from .frames import read_camera_request, read_image_files
 
 # 导入核心业务逻辑
+from app.config import config
+from app.utils.batch_recognition import recognize_batch
 from app.utils.data_process import recognize_face
+from app.utils.face_utils import decode_image, decode_upload, scale_box
+
+
+def recognition_response_data(result):
+    """
+    把recognize_face的识别结果转换为识别接口返回的data字段
+    
+    Args:
+        result (dict): recognize_face格式的识别结果
+        
+    Returns:
+        dict: 接口返回数据（total_count、matched_count、matched_names、face_boxes等）
+    """
+    # 转换匹配详情为所需格式
+    matched_names = []
+    for detail in result.get("match_details", []):
+        if detail.get("matched_user"):
+            matched_names.append({
+                "name": detail["matched_user"],
+                "user_id": "N/A",  # 从数据库获取user_id需要额外查询
+                "similarity": detail.get("similarity", 0.0),
+                "confidence": 0.95  # 这里简化处理，实际应该从检测结果获取
+            })
+    
+    return {
+        "total_count": result.get("total_count", 0),
+        "matched_count": result.get("matched_count", 0),
+        "unmatched_count_db": result.get("unmatched_count_db", 0),
+        "matched_names": matched_names,
+        "unmatched_names_db": result.get("unmatched_names_db", []),
+        "face_boxes": result.get("face_boxes", []),
+        "face_confidences": [0.95] * result.get("total_count", 0)  # 简化处理
+    }
 
 
 class CameraRecognizeAPI(Resource):
@@ -34,8 +71,10 @@ class CameraRecognizeAPI(Resource):
     通过摄像头采集的方式进行人脸识别
     接口地址: POST /api/recognize/camera
     
-    请求参数(JSON):
-    - image: base64编码的图像数据(必填)
+    请求格式（三选一）:
+    - JSON: {"image": base64编码的图像数据(必填)}
+    - 原始图像请求体: Content-Type为image/jpeg、image/png、image/webp或application/octet-stream
+    - multipart/form-data: image字段为图像文件
     
     返回数据:
     - 成功: {"code": 0, "msg": "识别成功", "data": {...}}
@@ -57,60 +96,34 @@ class CameraRecognizeAPI(Resource):
             # 导入统一响应格式函数
             from . import error_response
             
-            # 获取请求数据
-            data = request.get_json()
-            if not data:
-                return error_response(2, "请求数据无效")
+            # 读取请求参数和图像字节（JSON base64、原始图像请求体或multipart）
+            try:
+                _, image_bytes = read_camera_request(request)
+            except ValueError as e:
+                return error_response(2, f"请求数据无效: {str(e)}")
             
             # 验证必要参数
-            image_data = data.get("image")
-            if not image_data:
+            if not image_bytes:
                 return error_response(2, "图像数据不能为空")
             
-            # 解码base64图像
+            # 解码图像
             try:
-                # 去除可能的base64前缀
-                if image_data.startswith('data:image/'):
-                    # 提取base64部分
-                    image_data = image_data.split(',')[1]
-                
-                # 解码base64
-                image_bytes = base64.b64decode(image_data)
-                # 转换为PIL Image对象
-                image = Image.open(io.BytesIO(image_bytes))
+                # 直接解码为RGB数组
+                image = decode_image(image_bytes)
                 
             except Exception as e:
                 return error_response(2, f"图像解码失败: {str(e)}")
             
             # 调用核心识别逻辑
             try:
-                result = recognize_face(image)
+                result = recognize_face(image, detection_profile=config.ENDPOINT_DETECTION_PROFILES["recognize_camera"])
                 
                 # 检查是否有匹配结果
                 if result.get("total_count", 0) == 0:
                     return error_response(11, "未检测到人脸")
                 
-                # 转换匹配详情为所需格式
-                matched_names = []
-                for detail in result.get("match_details", []):
-                    if detail.get("matched_user"):
-                        matched_names.append({
-                            "name": detail["matched_user"],
-                            "user_id": "N/A",  # 从数据库获取user_id需要额外查询
-                            "similarity": detail.get("similarity", 0.0),
-                            "confidence": 0.95  # 这里简化处理，实际应该从检测结果获取
-                        })
-                
-                # 构建响应数据
-                response_data = {
-                    "total_count": result.get("total_count", 0),
-                    "matched_count": result.get("matched_count", 0),
-                    "unmatched_count_db": result.get("unmatched_count_db", 0),
-                    "matched_names": matched_names,
-                    "unmatched_names_db": result.get("unmatched_names_db", []),
-                    "face_boxes": result.get("face_boxes", []),
-                    "face_confidences": [0.95] * result.get("total_count", 0)  # 简化处理
-                }
+                # 转换为接口返回格式
+                response_data = recognition_response_data(result)
                 
                 # 添加annotated_image（可选，需要额外实现）
                 # 这里简化处理，实际应该生成标注图像
@@ -140,7 +153,9 @@ class UploadRecognizeAPI(Resource):
     接口地址: POST /api/recognize/upload
     
     请求参数(Form-Data):
-    - file: 图像文件(必填，支持jpg、jpeg、png、gif格式)
+    - file: 图像文件(必填，支持jpg、jpeg、png、gif格式，像素数不超过config.MAX_UPLOAD_PIXELS)
+    
+    超大的JPEG按缩小的分辨率解码（见decode_upload），返回的人脸框坐标始终对应原图。
     
     返回数据:
     - 成功: {"code": 0, "msg": "识别成功", "data": {...}}
@@ -183,16 +198,17 @@ class UploadRecognizeAPI(Resource):
             
             # 读取并处理图像
             try:
-                # 转换为PIL Image对象
-                image = Image.open(file.stream)
-                # 确保图像在内存中（某些情况下可能需要）
-                image.load()
+                # 先检查文件头中的分辨率，过大的JPEG直接按缩小的分辨率解码
+                image, scale = decode_upload(file.read())
             except Exception as e:
                 return error_response(2, f"图像解析失败: {str(e)}")
             
             # 调用核心识别逻辑（与摄像头接口相同）
             try:
-                result = recognize_face(image)
+                result = recognize_face(image, detection_profile=config.ENDPOINT_DETECTION_PROFILES["recognize_upload"])
+                if scale != 1.0:
+                    # 人脸框映射回原图坐标
+                    result["face_boxes"] = [scale_box(box, 1 / scale) for box in result.get("face_boxes", [])]
                 
                 # 检查是否有匹配结果
                 if result.get("total_count", 0) == 0:
@@ -202,27 +218,8 @@ class UploadRecognizeAPI(Resource):
                         "data": {}
                     })
                 
-                # 转换匹配详情为所需格式
-                matched_names = []
-                for detail in result.get("match_details", []):
-                    if detail.get("matched_user"):
-                        matched_names.append({
-                            "name": detail["matched_user"],
-                            "user_id": "N/A",  # 从数据库获取user_id需要额外查询
-                            "similarity": detail.get("similarity", 0.0),
-                            "confidence": 0.95  # 简化处理
-                        })
-                
-                # 构建响应数据
-                response_data = {
-                    "total_count": result.get("total_count", 0),
-                    "matched_count": result.get("matched_count", 0),
-                    "unmatched_count_db": result.get("unmatched_count_db", 0),
-                    "matched_names": matched_names,
-                    "unmatched_names_db": result.get("unmatched_names_db", []),
-                    "face_boxes": result.get("face_boxes", []),
-                    "face_confidences": [0.95] * result.get("total_count", 0)  # 简化处理
-                }
+                # 转换为接口返回格式
+                response_data = recognition_response_data(result)
                 
                 return success_response(response_data)
                 
@@ -242,6 +239,98 @@ class UploadRecognizeAPI(Resource):
             return system_error_response()
 
 
+def _batch_line(item):
+    """把recognize_batch产出的单张图片结果转换为NDJSON中的一行"""
+    line = {"type": "result", "index": item["index"], "filename": item["filename"]}
+    if item["result"] is not None:
+        line.update(code=0, msg="识别成功", data=recognition_response_data(item["result"]))
+    elif item["error_stage"] == "decode":
+        line.update(code=2, msg=item["error"], data={})
+    elif "未检测到人脸" in item["error"]:
+        line.update(code=11, msg="人脸数量为0", data={})
+    else:
+        line.update(code=10, msg="人脸识别失败: " + item["error"], data={})
+    return line
+
+
+class BatchRecognizeAPI(Resource):
+    """批量识别人脸接口
+    
+    一次请求识别多张图片，解码和人脸检测由线程池并行执行，所有图片的人脸合并成共享的FaceNet批次提取特征
+    （见app.utils.batch_recognition），每张图片识别完成后立即以NDJSON（每行一个JSON对象）流式返回，
+    客户端不必等待整批完成。
+    接口地址: POST /api/recognize/batch
+    
+    请求格式（二选一）:
+    - multipart/form-data: files字段（可重复）为图片文件，.zip文件或archive字段按压缩包展开
+    - application/zip: 请求体为zip压缩包
+    
+    返回数据（Content-Type: application/x-ndjson，按完成顺序，不是上传顺序）:
+    - 每张图片一行: {"type": "result", "index": 序号, "filename": 文件名, "code": 0, "msg": "识别成功", "data": {...}}
+      data与照片上传识别接口相同；失败时code为2（图像解析失败）、11（人脸数量为0）或10（识别失败）
+    - 最后一行: {"type": "summary", "code": 0, "msg": "批量识别完成", "data": {"total", "succeeded", "failed", "face_count", "elapsed_ms"}}
+    - 请求本身无效（没有图片、图片数超过上限、压缩包无效）时返回普通JSON错误响应
+    """
+    def post(self):
+        """处理批量识别请求
+        
+        Returns:
+            Response: NDJSON流式响应，请求无效时为JSON错误响应
+        """
+        from . import error_response
+        
+        archives = []
+        try:
+            items = read_image_files(request, archives)
+        except ValueError as e:
+            return error_response(2, str(e))
+        
+        if not items or len(items) > config.BATCH_RECOGNIZE_MAX_IMAGES:
+            for archive in archives:
+                archive.close()
+            if not items:
+                return error_response(2, "未提供图像文件")
+            return error_response(2, f"图片数量 {len(items)} 超过单次上限 {config.BATCH_RECOGNIZE_MAX_IMAGES}")
+        
+        def generate():
+            start = time.perf_counter()
+            succeeded = failed = face_count = 0
+            try:
+                for item in recognize_batch(items):
+                    line = _batch_line(item)
+                    if line["code"] == 0:
+                        succeeded += 1
+                        face_count += line["data"]["total_count"]
+                    else:
+                        failed += 1
+                    yield json.dumps(line, ensure_ascii=False) + "\n"
+                
+                yield json.dumps({
+                    "type": "summary",
+                    "code": 0,
+                    "msg": "批量识别完成",
+                    "data": {
+                        "total": len(items),
+                        "succeeded": succeeded,
+                        "failed": failed,
+                        "face_count": face_count,
+                        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+                    }
+                }, ensure_ascii=False) + "\n"
+            except Exception as e:
+                # 响应头已经发出，只能在流中返回错误
+                print(f"批量识别接口错误: {str(e)}")
+                yield json.dumps({"type": "error", "code": 999, "msg": "系统异常，请重试", "data": {}}, ensure_ascii=False) + "\n"
+            finally:
+                for archive in archives:
+                    archive.close()
+        
+        response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+        # 禁止Nginx等反向代理缓冲，逐行发送给客户端
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+
 def register_routes(api):
     """注册路由函数
     
@@ -253,9 +342,11 @@ def register_routes(api):
     注册的路由：
     - POST /api/recognize/camera: 摄像头识别人脸接口
     - POST /api/recognize/upload: 上传图像识别人脸接口
+    - POST /api/recognize/batch: 批量识别人脸接口
     """
     api.add_resource(CameraRecognizeAPI, '/api/recognize/camera')
     api.add_resource(UploadRecognizeAPI, '/api/recognize/upload')
+    api.add_resource(BatchRecognizeAPI, '/api/recognize/batch')
 
 
 # 如果直接运行该模块，可以进行简单测试
@@ -268,6 +359,7 @@ if __name__ == '__main__':
     register_routes(api)
     
     print("人脸识别接口模块已初始化，可以通过以下接口访问：")
-    print("1. POST /api/recognize/camera - 摄像头识别人脸（base64图像）")
+    print("1. POST /api/recognize/camera - 摄像头识别人脸（base64图像或二进制图像帧）")
     print("2. POST /api/recognize/upload - 上传图像识别人脸（文件上传）")
+    print("3. POST /api/recognize/batch - 批量识别人脸（多文件或zip压缩包，NDJSON流式返回）")
     print("注意：直接运行此模块仅用于测试接口结构，实际功能需要完整的后端环境。")
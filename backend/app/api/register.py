@@ -1,8 +1,9 @@
 """人脸注册接口模块
 
-提供两种人脸录入方式：
-1. 摄像头采集 - 通过POST /api/register/camera接收base64编码的图像
+提供三种人脸录入方式：
+1. 摄像头采集 - 通过POST /api/register/camera接收base64编码的图像或二进制图像帧
 2. 照片上传 - 通过POST /api/register/upload接收文件上传
+3. 批量注册 - 通过POST /api/register/bulk接收多个文件或zip压缩包，创建异步任务，进度通过GET /api/jobs/<job_id>查询
 
 核心功能：
 - 接收人脸图像并进行有效性验证
@@ -11,22 +12,26 @@
 
 依赖：
 - Flask-RESTful用于API实现
-- PIL用于图像处理
+- OpenCV用于图像解码（decode_image/decode_upload）
 - 后端register_face模块处理核心注册逻辑
 """
 from flask import request
 from flask_restful import Resource
-import base64
+import csv
 import io
 import json
+import os
 import re
-from PIL import Image
 
 # 导入统一响应格式
 from . import success_response, register_block_response, error_response, system_error_response, face_quality_response, face_uniqueness_response, user_id_uniqueness_response
+from .frames import parse_json_field, read_camera_request, read_image_files
 
 # 导入数据处理模块
+from app.config import config
+from app.utils.bulk_registration import bulk_registration_runner
 from app.utils.data_process import register_face
+from app.utils.face_utils import decode_upload, parse_face_box, scale_box
 
 class CameraRegisterAPI(Resource):
     """摄像头采集录入接口
@@ -34,11 +39,16 @@ class CameraRegisterAPI(Resource):
     通过摄像头采集的方式录入人脸信息
     接口地址: POST /api/register/camera
     
-    请求参数(JSON):
+    请求格式（三选一，参数相同）:
+    - JSON: 图像为base64编码字符串
+    - 原始图像请求体: Content-Type为image/jpeg、image/png、image/webp或application/octet-stream，其他参数放在查询字符串中
+    - multipart/form-data: image字段为图像文件，其他参数为表单字段，face_box为JSON字符串
+    
+    请求参数:
     - name: 用户名(必填)
-    - image: base64编码的图像数据(必填)
+    - image: 图像数据(必填)
     - user_id: 用户ID(可选，不提供则自动生成)
-    - face_box: 人脸区域坐标(可选)
+    - face_box: 人脸区域坐标(可选)，{x, y, width, height}或[x1, y1, x2, y2]，提供时只在人脸框附近检测人脸
     
     返回数据:
     - 成功: {"code": 0, "msg": "注册成功", "data": {...}}
@@ -52,21 +62,19 @@ class CameraRegisterAPI(Resource):
             JSON: 包含注册结果的响应数据
         """
         try:
-            # 获取请求数据
-            data = request.get_json()
-            
-            # 参数验证
-            if not data:
-                return error_response(2, "无效的请求数据")
+            # 读取请求参数和图像字节（JSON base64、原始图像请求体或multipart）
+            try:
+                data, image_data = read_camera_request(request)
+            except ValueError as e:
+                return error_response(2, f"无效的请求数据: {str(e)}")
             
             # 验证必填参数
             name = data.get('name')
-            image = data.get('image')
             
             if not name:
                 return error_response(1, "用户名为必填项")
             
-            if not image:
+            if not image_data:
                 return error_response(2, "图像数据为必填项")
             
             # 可选参数
@@ -81,37 +89,23 @@ class CameraRegisterAPI(Resource):
             if user_id and not re.match(r'^USR\d{12}$', user_id):
                 return error_response(4, "用户ID格式错误，正确格式：USR+年月日+4位序号")
             
-            # 解码base64图像
-            try:
-                # 移除base64头部信息
-                if 'base64,' in image:
-                    image = image.split('base64,')[1]
-                
-                # 解码base64数据
-                image_data = base64.b64decode(image)
-                
-                # 验证图像格式
-                img = Image.open(io.BytesIO(image_data))
-                
-                # 转换为RGB格式
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # 保存到字节流
-                img_byte_arr = io.BytesIO()
-                img.save(img_byte_arr, format='JPEG')
-                img_data = img_byte_arr.getvalue()
-                
-            except Exception as e:
-                return error_response(2, f"图像解码失败: {str(e)}")
+            # 解析人脸框（如果提供，表单和查询字符串中为JSON字符串）
+            if face_box:
+                try:
+                    face_box = parse_face_box(parse_json_field(face_box))
+                except ValueError:
+                    return error_response(2, "face_box参数格式错误")
             
             # 调用后端注册逻辑
             try:
                 # 将user_id作为identity_id传递，因为register_face函数使用identity_id参数
+                # 直接传入图片文件内容：register_face只解码一次，裁剪人脸后即释放整幅图像
                 result = register_face(
                     name=name,
-                    image=img,
-                    identity_id=user_id
+                    image=image_data,
+                    identity_id=user_id,
+                    face_box=face_box or None,
+                    detection_profile=config.ENDPOINT_DETECTION_PROFILES["register_camera"]
                 )
                 
                 # 处理注册结果
@@ -159,6 +153,8 @@ class CameraRegisterAPI(Resource):
                         msg=error_msg,
                         suggestion="请确保人脸清晰可见，面部完全暴露在画面中"
                     )
+                elif "图像解码失败" in error_msg:
+                    return error_response(2, error_msg)
                 elif "未检测到人脸" in error_msg:
                     # 记录完整错误信息到日志，但返回简化的错误消息给前端
                     print(f"摄像头注册接口错误: {error_msg}")
@@ -193,8 +189,11 @@ class UploadRegisterAPI(Resource):
     
     请求参数(Form-Data):
     - name: 用户名(必填)
-    - file: 图像文件(必填，支持JPG、PNG等常见格式)
+    - file: 图像文件(必填，支持JPG、PNG等常见格式，像素数不超过config.MAX_UPLOAD_PIXELS)
     - user_id: 用户ID(可选，不提供则自动生成)
+    - face_box: 人脸区域坐标(可选，JSON字符串)，原图坐标
+    
+    超大的JPEG按缩小的分辨率解码（见decode_upload），face_box相应换算到解码后的坐标。
     
     返回数据:
     - 成功: {"code": 0, "msg": "注册成功", "data": {...}}
@@ -230,22 +229,9 @@ class UploadRegisterAPI(Resource):
             if user_id and not re.match(r'^USR\d{12}$', user_id):
                 return error_response(4, "用户ID格式错误，正确格式：USR+年月日+4位序号")
             
-            # 读取文件内容
+            # 读取文件内容：先检查文件头中的分辨率，直接解码为RGB数组（过大的JPEG按缩小的分辨率解码）
             try:
-                img_data = file.read()
-                
-                # 验证图像格式
-                img = Image.open(io.BytesIO(img_data))
-                
-                # 转换为RGB格式
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # 保存到字节流
-                img_byte_arr = io.BytesIO()
-                img.save(img_byte_arr, format='JPEG')
-                img_data = img_byte_arr.getvalue()
-                
+                img, scale = decode_upload(file.read())
             except Exception as e:
                 return error_response(2, f"文件解析失败: {str(e)}")
             
@@ -255,6 +241,10 @@ class UploadRegisterAPI(Resource):
             if face_box_str:
                 try:
                     face_box = json.loads(face_box_str)
+                    if face_box:
+                        face_box = parse_face_box(face_box)
+                        if scale != 1.0:
+                            face_box = tuple(int(round(coord)) for coord in scale_box(face_box, scale))
                 except:
                     return error_response(2, "face_box参数格式错误")
             
@@ -264,7 +254,9 @@ class UploadRegisterAPI(Resource):
                 result = register_face(
                     name=name,
                     image=img,
-                    identity_id=user_id
+                    identity_id=user_id,
+                    face_box=face_box or None,
+                    detection_profile=config.ENDPOINT_DETECTION_PROFILES["register_upload"]
                 )
                 
                 # 处理注册结果
@@ -337,6 +329,119 @@ class UploadRegisterAPI(Resource):
             return system_error_response()
 
 
+# zip压缩包中的清单文件名
+MANIFEST_FILENAME = "manifest.csv"
+
+
+def _read_manifest(req, archives):
+    """
+    读取批量注册的清单（CSV，列为filename、name和可选的user_id）
+    
+    清单来自multipart的manifest字段，或压缩包中的manifest.csv。
+    
+    Args:
+        req (flask.Request): 当前请求
+        archives (list): read_image_files打开的压缩包
+        
+    Returns:
+        dict: 文件名 -> (用户名, 身份ID或None)，没有清单时为空字典
+        
+    Raises:
+        ValueError: 当清单编码或表头无效时抛出
+    """
+    data = None
+    file = req.files.get('manifest')
+    if file:
+        data = file.read()
+    else:
+        for archive in archives:
+            for info in archive.infolist():
+                if os.path.basename(info.filename).lower() == MANIFEST_FILENAME and not info.filename.startswith("__MACOSX/"):
+                    data = archive.read(info)
+                    break
+    if data is None:
+        return {}
+    
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("清单文件必须是UTF-8编码的CSV")
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or not {"filename", "name"} <= set(reader.fieldnames):
+        raise ValueError("清单文件必须包含filename和name列")
+    
+    manifest = {}
+    for row in reader:
+        filename = (row.get("filename") or "").strip()
+        if filename:
+            manifest[filename] = ((row.get("name") or "").strip(), (row.get("user_id") or "").strip() or None)
+    return manifest
+
+
+class BulkRegisterAPI(Resource):
+    """批量注册接口
+    
+    一次上传多张照片，创建异步批量注册任务后立即返回任务ID（见app.utils.bulk_registration）。
+    任务按批执行"解码 → 人脸检测 → 批量特征提取 → 批量唯一性校验 → 单事务入库"，
+    任务状态保存在数据库中，服务重启后从未处理的照片继续。
+    接口地址: POST /api/register/bulk
+    
+    请求格式（二选一）:
+    - multipart/form-data: files字段（可重复）为照片，.zip文件或archive字段按压缩包展开；
+      manifest字段为可选的CSV清单（列：filename、name、user_id）
+    - application/zip: 请求体为zip压缩包，清单为压缩包中的manifest.csv
+    
+    清单中没有的照片以文件名（不含扩展名）作为用户名，身份ID自动生成。
+    
+    返回数据:
+    - 成功: {"code": 0, "msg": "操作成功", "data": {"job_id": 任务ID, "status": "queued", "total": 照片数, ...}}
+    - 失败: {"code": 2, "msg": 错误信息, "data": {}}（没有照片、照片数超过上限、压缩包或清单无效）
+    """
+    
+    def post(self):
+        """处理批量注册请求
+        
+        Returns:
+            JSON: 包含任务信息的响应数据
+        """
+        archives = []
+        try:
+            try:
+                files = read_image_files(request, archives)
+                manifest = _read_manifest(request, archives)
+            except ValueError as e:
+                return error_response(2, str(e))
+            
+            if not files:
+                return error_response(2, "未提供图像文件")
+            if len(files) > config.BULK_REGISTER_MAX_IMAGES:
+                return error_response(2, f"照片数量 {len(files)} 超过单个任务上限 {config.BULK_REGISTER_MAX_IMAGES}")
+            
+            sources = []
+            for filename, load in files:
+                basename = os.path.basename(filename)
+                name, user_id = manifest.get(filename) or manifest.get(basename) or (None, None)
+                sources.append({
+                    "filename": filename,
+                    "name": name or os.path.splitext(basename)[0],
+                    "user_id": user_id,
+                    "load": load
+                })
+            
+            # 照片写入任务暂存目录后即可关闭请求中的压缩包
+            job = bulk_registration_runner.create_job(sources)
+            bulk_registration_runner.submit(job["job_id"])
+            print(f"📥 已创建批量注册任务 {job['job_id']}，共 {job['total']} 张照片")
+            return success_response(job)
+            
+        except Exception as e:
+            print(f"批量注册接口错误: {str(e)}")
+            return system_error_response()
+        finally:
+            for archive in archives:
+                archive.close()
+
+
 def register_routes(api):
     """注册路由函数
     
@@ -348,9 +453,11 @@ def register_routes(api):
     注册的路由：
     - POST /register/camera: 摄像头采集录入接口
     - POST /register/upload: 照片上传录入接口
+    - POST /register/bulk: 批量注册接口
     """
     api.add_resource(CameraRegisterAPI, '/register/camera')
     api.add_resource(UploadRegisterAPI, '/register/upload')
+    api.add_resource(BulkRegisterAPI, '/register/bulk')
 
 
 # 测试代码（仅在直接运行模块时执行）
@@ -365,5 +472,6 @@ if __name__ == '__main__':
     print("人脸注册接口测试服务启动")
     print("访问 http://127.0.0.1:5000/register/camera (POST)")
     print("访问 http://127.0.0.1:5000/register/upload (POST)")
+    print("访问 http://127.0.0.1:5000/register/bulk (POST)")
     
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""人脸检索接口模块
+
+提供Top-k人脸检索：
+- 照片检索 - 通过POST /api/search接收文件上传，返回最相似的k个已注册用户
+
+与识别接口的区别：
+- 识别接口只返回超过识别阈值的最佳匹配
+- 检索接口不设阈值，按相似度返回前k个候选及分数，便于人工复核
+
+依赖：
+- Flask-RESTful用于API实现
+- OpenCV用于图像解码（decode_upload，超大的JPEG按缩小的分辨率解码）
+- 后端search_face模块处理核心检索逻辑
+"""
+from flask import request
+from flask_restful import Resource
+
+# 导入统一响应格式函数
+from . import success_response, error_response, system_error_response
+
+# 导入核心业务逻辑
+from app.config import config
+from app.utils.data_process import search_face
+from app.utils.face_utils import decode_upload, scale_box
+
+
+# k的默认值和上限
+DEFAULT_TOP_K = 5
+MAX_TOP_K = 100
+
+
+class SearchAPI(Resource):
+    """Top-k人脸检索接口
+
+    接口地址: POST /api/search
+
+    请求参数(Form-Data):
+    - file: 图像文件(必填，支持jpg、jpeg、png、gif格式，像素数不超过config.MAX_UPLOAD_PIXELS)
+    - k: 返回的候选数量(可选，默认5，最大100)
+
+    返回数据:
+    - 成功: {"code": 0, "msg": "操作成功", "data": {...}}
+    - 失败: {"code": [错误码], "msg": [错误信息], "data": {}}
+
+    成功响应data字段说明:
+    - k: 实际使用的候选数量
+    - total_count: 特征库中的有效用户数
+    - face_box: 被检索人脸的坐标
+    - results: 候选用户列表[{"user_id", "name", "similarity"}]，按相似度降序排列
+    """
+    def post(self):
+        """处理Top-k人脸检索请求
+
+        Returns:
+            JSON: 包含检索结果的响应数据
+        """
+        try:
+            # 检查是否有文件上传
+            if 'file' not in request.files:
+                return error_response(2, "未提供图像文件")
+
+            file = request.files['file']
+            if file.filename == '':
+                return error_response(2, "文件名为空")
+
+            allowed_extensions = {'png', 'jpg', 'jpeg', 'gif'}
+            if '.' not in file.filename or \
+               file.filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
+                return error_response(2, "不支持的文件类型，请上传图片文件")
+
+            # 解析k参数
+            k = request.form.get('k', DEFAULT_TOP_K)
+            try:
+                k = int(k)
+            except (TypeError, ValueError):
+                return error_response(2, "k必须是正整数")
+            if k <= 0:
+                return error_response(2, "k必须是正整数")
+            k = min(k, MAX_TOP_K)
+
+            # 读取图像
+            try:
+                image, scale = decode_upload(file.read())
+            except Exception as e:
+                return error_response(2, f"图像解析失败: {str(e)}")
+
+            # 调用核心检索逻辑
+            try:
+                result = search_face(image, k=k, detection_profile=config.ENDPOINT_DETECTION_PROFILES["search"])
+            except ValueError as e:
+                error_msg = str(e)
+                if "未检测到人脸" in error_msg:
+                    return error_response(11, "人脸数量为0")
+                elif "没有有效特征向量" in error_msg:
+                    return error_response(10, "无有效人脸")
+                else:
+                    return error_response(10, "人脸检索失败: " + error_msg)
+
+            return success_response({
+                "k": k,
+                "total_count": result["total_count"],
+                "face_box": scale_box(result["face_box"], 1 / scale),
+                "results": result["results"]
+            })
+
+        except Exception as e:
+            # 捕获其他未预期的异常
+            return system_error_response()
+
+
+def register_routes(api):
+    """注册路由函数
+
+    Args:
+        api: Flask-RESTful的Api实例
+
+    注册的路由：
+    - POST /api/search: Top-k人脸检索接口
+    """
+    api.add_resource(SearchAPI, '/api/search')
@@ -12,6 +12,7 @@ class Config:
     DATA_DIR = os.path.join(BASE_DIR, "data")  # 数据根目录
     FACE_IMAGE_DIR = os.path.join(DATA_DIR, "faces")  # 人脸图片存储目录
     DB_PATH = os.path.join(DATA_DIR, "face_db.db")  # SQLite数据库文件路径
+    FEATURE_STORE_PATH = os.path.join(DATA_DIR, "features.f32")  # 人脸特征矩阵文件（float32，每行512维）
     
     # 数据库配置
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{DB_PATH}"  # SQLite数据库URI
@@ -19,6 +20,76 @@ class Config:
     
     # 人脸识别配置
     RECOGNITION_THRESHOLD = 0.55  # 人脸识别阈值（相似度低于此值视为不匹配，0-1之间） - 优化后的值
+    UNIQUENESS_THRESHOLD = 0.50  # 注册唯一性校验阈值（比识别阈值更严格，"一人一脸一ID"）
+    RECOGNITION_ASSIGNMENT = "greedy"  # 多人脸联合分配："greedy"/"hungarian"保证一个用户只分配给一张人脸，None表示各人脸独立匹配
+    EMBEDDING_BATCH_SIZE = 32  # FaceNet特征提取单次推理的最大批次大小
+    FACE_DETECTOR_BACKEND = "mtcnn_tf"  # 人脸检测后端："mtcnn_tf"（TensorFlow）或"facenet_pytorch"（与FaceNet共用PyTorch，不需要TensorFlow）
+    EMBEDDER_BACKEND = "torch"  # 特征提取后端："torch"（eager模式）、"torchscript"、"onnx"、"int8_static"（需先运行python -m app.tools.export_embedder导出）或"int8_dynamic"
+    EMBEDDER_MODEL_DIR = os.path.join(DATA_DIR, "models")  # 导出的TorchScript/ONNX模型目录
+    EMBEDDER_PARITY_THRESHOLD = 0.999  # 导出模型与eager模型特征的最低余弦相似度，低于该值导出失败
+    QUANTIZED_EMBEDDER_PARITY_THRESHOLD = 0.98  # int8量化模型的最低余弦相似度（量化误差较大，单独设置）
+    MODEL_WARMUP_ON_START = False  # create_app时是否加载模型并预热（默认在首次识别/注册时才加载）
+    MAX_UPLOAD_PIXELS = 100_000_000  # 上传图片的像素预算（宽×高），读取文件头后超过该值直接拒绝，不解码
+    UPLOAD_DECODE_MIN_SIDE = 2560  # 上传的JPEG按1/2、1/4、1/8缩小解码，缩小后最长边不低于该值；0表示始终按原分辨率解码
+    DETECTION_DOWNSCALE = True  # 按检测档位的最小人脸和max_side缩小图像后再检测，坐标映射回原图裁剪人脸
+    
+    # 人脸检测档位：min_face_size为需要检出的最小人脸边长（原图像素），scale_factor为图像金字塔缩放因子，
+    # thresholds为P-Net/R-Net/O-Net三阶段阈值，max_faces为最多返回的人脸数（None表示不限），
+    # max_side为开启DETECTION_DOWNSCALE时检测图像长边的上限（None表示只按最小人脸缩放）：
+    # 长边超过该值的大图会进一步缩小，此时能检出的最小人脸相应变大（约为 检测器最小人脸 × 长边 / max_side）
+    DETECTION_PROFILES = {
+        "fast": {"min_face_size": 80, "scale_factor": 0.6, "thresholds": [0.7, 0.8, 0.85], "max_faces": 5, "max_side": None},
+        "balanced": {"min_face_size": 40, "scale_factor": 0.7, "thresholds": [0.6, 0.7, 0.75], "max_faces": 20, "max_side": 1920},
+        "accurate": {"min_face_size": 15, "scale_factor": 0.7, "thresholds": [0.6, 0.7, 0.75], "max_faces": None, "max_side": 2560},
+    }
+    DEFAULT_DETECTION_PROFILE = "balanced"  # 未指定档位时使用
+    DETECTION_ROI_MARGIN = 0.5  # 客户端提供人脸框时，框四周各扩展框边长的该比例，只在扩展后的区域内检测
+    DETECTION_ROI_FALLBACK = True  # 人脸框区域内未检测到人脸时回退到整幅图像检测
+    ENDPOINT_DETECTION_PROFILES = {  # 各接口使用的检测档位
+        "register_camera": "fast",  # 摄像头画面通常只有一张大脸，注册要求人脸不小于100px
+        "register_upload": "fast",
+        "recognize_camera": "fast",
+        "recognize_upload": "balanced",  # 上传的合影可能包含较小的人脸
+        "search": "balanced",
+        "recognize_batch": "balanced",
+        "register_bulk": "fast",
+    }
+    
+    # 批量识别配置（POST /api/recognize/batch）
+    BATCH_RECOGNIZE_MAX_IMAGES = 1000  # 单次请求最多的图片数（CPU上每张约0.1~0.3秒，gunicorn使用gthread工作进程，长时间的流式响应不受timeout限制）
+    BATCH_RECOGNIZE_WORKERS = 2  # 解码和人脸检测的线程数（特征提取在响应线程中按批次执行）
+    BATCH_RECOGNIZE_MAX_FILE_BYTES = 50 * 1024 * 1024  # zip压缩包中单个文件解压后的最大字节数
+    
+    # 批量注册任务配置（POST /api/register/bulk，GET /api/jobs/<job_id>）
+    BULK_REGISTER_JOB_DIR = os.path.join(DATA_DIR, "bulk_jobs")  # 任务照片暂存目录（每个任务一个子目录，任务结束后删除）
+    BULK_REGISTER_MAX_IMAGES = 10000  # 单个任务最多的照片数
+    BULK_REGISTER_CHUNK_SIZE = 64  # 每批处理的照片数：一批共享特征提取批次和唯一性比对，在一个事务中入库
+    BULK_REGISTER_WORKERS = 2  # 解码和人脸检测的线程数
+    BULK_REGISTER_POLL_SECONDS = 30  # 任务执行器空闲时检查待认领任务的间隔（秒）
+    BULK_REGISTER_STALE_SECONDS = 600  # 运行中的任务超过该时间没有心跳时，可被其他进程重新认领
+    
+    # CPU线程预算（PyTorch、TensorFlow、onnxruntime和OpenCV默认都按全部核数创建线程池，多进程部署时线程数远超核数）
+    THREAD_BUDGET_ENABLED = True  # 加载模型时按"可用核数 / 工作进程数"设置各框架的算子内线程数
+    THREAD_BUDGET_WORKERS = None  # 同一主机上的工作进程数，None表示读取环境变量WEB_CONCURRENCY，都未设置时为1（gunicorn.conf.py启动时写入实际进程数）
+    THREAD_BUDGET_CPUS = None  # 可分配的CPU核数，None表示按进程的CPU亲和性自动检测
+    THREAD_BUDGET_INTER_OP = 1  # 算子间并行线程数（模型中没有值得并行的分支）
+    
+    # 近似最近邻索引配置（特征库很大时替代暴力比对，候选集仍做精确重排）
+    ANN_INDEX_TYPE = None  # 索引类型：None表示关闭（始终暴力比对），"ivf"表示IVF倒排索引
+    ANN_MIN_GALLERY_SIZE = 50000  # 有效用户数达到该值才启用索引（没有已保存的索引文件时在后台线程中训练，训练完成前暴力比对）
+    ANN_NLIST = None  # IVF聚类簇数，None表示按4*sqrt(N)自动确定
+    ANN_NPROBE = 16  # 查询时扫描的簇数，越大召回越高、速度越慢
+    ANN_INDEX_PATH = os.path.join(DATA_DIR, "ann_index.npz")  # 索引文件路径
+    
+    # 特征量化配置（未启用索引时，粗筛使用内存中的低精度副本，候选行再用float32精确重排）
+    GALLERY_QUANTIZATION = None  # 量化类型：None表示关闭，"int8"
+    # 注意："int8"只节省内存（约为float32的1/4），不提速——NumPy没有int8矩阵乘法，每次查询都要把全部行
+    # 分块转换回float32，单次查询慢于float32暴力比对；需要提速时使用近似最近邻索引（ANN_INDEX_TYPE）
+    QUANTIZED_RERANK_K = 100  # 粗筛后送入float32精确重排的候选行数
+    
+    # 多工作进程特征库同步配置（gunicorn -w N 部署时各进程通过变更日志表同步注册/删除）
+    GALLERY_SYNC_ENABLED = True  # 使用特征库前先应用其他进程的变更
+    GALLERY_JOURNAL_MAX_ENTRIES = 10000  # 变更日志最多保留的记录数，落后更多的进程会全量重新加载
     
     # Flask配置
     DEBUG = True  # 开发模式下启用调试
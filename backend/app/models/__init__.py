@@ -1,7 +1,7 @@
 """数据模型模块 - 定义数据库表结构和ORM映射"""
 
 # 从models模块中导入所有数据模型和数据库工具函数
-from .models import User, get_db, init_db
+from .models import User, GalleryChange, RegistrationJob, RegistrationJobItem, get_db, init_db
 
 # 定义__all__，控制from models import *时的导入内容
-__all__ = ["User", "get_db", "init_db"]
\ No newline at end of file
+__all__ = ["User", "GalleryChange", "RegistrationJob", "RegistrationJobItem", "get_db", "init_db"]
\ No newline at end of file
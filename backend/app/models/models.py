@@ -2,7 +2,7 @@
 from datetime import datetime
 from sqlalchemy import Column, Integer, String, DateTime, Float
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 
 from ..config import config
@@ -35,6 +35,9 @@ class User(Base):
     # 人脸特征向量存储路径
     feature_path = Column(String(255), nullable=False, comment="人脸特征向量文件存储路径")
     
+    # 人脸特征向量在特征矩阵文件中的行号（旧版按用户单独保存.npy的记录为空）
+    feature_row = Column(Integer, nullable=True, comment="特征矩阵文件中的行号")
+    
     # 人脸图片存储路径
     image_path = Column(String(255), nullable=False, comment="人脸图片存储路径")
     
@@ -64,6 +67,80 @@ class RecognitionLog(Base):
         return f"<RecognitionLog(id={self.id}, user_id={self.user_id}, similarity={self.similarity})>"
 
 
+class GalleryChange(Base):
+    """人脸特征库变更日志模型 - 多工作进程之间同步特征库的增量记录
+    
+    自增主键即特征库版本号，各进程记录已应用的最大版本号，
+    识别前只需应用之后的变更。
+    """
+    
+    __tablename__ = "gallery_changes"
+    
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True, comment="变更版本号")
+    op = Column(String(10), nullable=False, comment="变更类型：add/remove/clear")
+    user_id = Column(Integer, nullable=True, comment="数据库用户ID")
+    identity_id = Column(String(50), nullable=True, comment="身份ID")
+    name = Column(String(100), nullable=True, comment="用户名")
+    feature_row = Column(Integer, nullable=True, comment="特征矩阵文件中的行号")
+    created_at = Column(DateTime, default=datetime.now, comment="变更时间")
+    
+    def __repr__(self):
+        """返回变更记录的字符串表示"""
+        return f"<GalleryChange(id={self.id}, op='{self.op}', identity_id='{self.identity_id}')>"
+
+
+class RegistrationJob(Base):
+    """批量注册任务模型 - 记录任务状态和进度
+    
+    任务由某个进程的任务执行器认领（owner），处理过程中定期刷新heartbeat_at；
+    执行进程退出或心跳超时后，任务可被其他进程重新认领并从未处理的条目继续。
+    """
+    
+    __tablename__ = "registration_jobs"
+    
+    id = Column(String(36), primary_key=True, comment="任务ID（UUID）")
+    status = Column(String(20), nullable=False, default="queued", index=True, comment="任务状态：queued/running/completed/failed")
+    total = Column(Integer, nullable=False, default=0, comment="照片总数")
+    processed = Column(Integer, nullable=False, default=0, comment="已处理的照片数")
+    registered = Column(Integer, nullable=False, default=0, comment="注册成功数")
+    blocked = Column(Integer, nullable=False, default=0, comment="因人脸已注册被阻断的数量")
+    failed = Column(Integer, nullable=False, default=0, comment="失败数")
+    message = Column(String(255), nullable=True, comment="任务失败原因")
+    owner = Column(String(100), nullable=True, comment="执行任务的进程（主机名:进程号）")
+    heartbeat_at = Column(DateTime, nullable=True, comment="执行进程最近一次心跳时间")
+    created_at = Column(DateTime, default=datetime.now, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment="更新时间")
+    finished_at = Column(DateTime, nullable=True, comment="完成时间")
+    
+    def __repr__(self):
+        """返回任务对象的字符串表示"""
+        return f"<RegistrationJob(id='{self.id}', status='{self.status}', processed={self.processed}/{self.total})>"
+
+
+class RegistrationJobItem(Base):
+    """批量注册条目模型 - 任务中每张照片的注册结果"""
+    
+    __tablename__ = "registration_job_items"
+    
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True, comment="条目ID")
+    job_id = Column(String(36), index=True, nullable=False, comment="任务ID")
+    position = Column(Integer, nullable=False, comment="照片在任务中的序号")
+    filename = Column(String(255), nullable=False, comment="上传的文件名")
+    name = Column(String(100), nullable=False, comment="用户名")
+    identity_id = Column(String(50), nullable=True, comment="指定或生成的身份ID")
+    source_path = Column(String(255), nullable=True, comment="暂存的照片路径")
+    status = Column(String(20), nullable=False, default="pending", index=True, comment="条目状态：pending/registered/blocked/failed")
+    message = Column(String(255), nullable=True, comment="结果说明")
+    user_id = Column(Integer, nullable=True, comment="注册成功的数据库用户ID")
+    matched_identity_id = Column(String(50), nullable=True, comment="阻断时已注册的相似用户身份ID")
+    matched_name = Column(String(100), nullable=True, comment="阻断时已注册的相似用户名")
+    similarity = Column(Float, nullable=True, comment="阻断时与相似用户的相似度")
+    
+    def __repr__(self):
+        """返回条目对象的字符串表示"""
+        return f"<RegistrationJobItem(job_id='{self.job_id}', position={self.position}, status='{self.status}')>"
+
+
 def get_db():
     """
     获取数据库会话的依赖函数
@@ -79,9 +156,30 @@ def get_db():
         db.close()
 
 
+def _add_missing_columns():
+    """
+    为已存在的表补充新增的可空列
+    
+    create_all只会创建缺失的表，不会修改已有表结构，
+    因此对旧数据库需要手动执行ALTER TABLE。
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    print(f"🛠️ 已为表 {table.name} 添加列 {column.name}")
+
+
 def init_db():
     """
     初始化数据库 - 创建所有表
     应用启动时调用，确保数据库表结构存在
     """
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
\ No newline at end of file
@@ -0,0 +1 @@
+# 命令行工具模块初始化文件
@@ -0,0 +1,176 @@
+"""量化特征提取后端评估命令 - 在已注册的人脸上比较量化模型与eager模型的特征偏移和匹配结果
+
+对数据库中每个用户的已注册人脸图片，分别用eager模型（torch后端）和待评估后端重新提取特征，报告：
+- 特征偏移：两组特征逐样本余弦相似度的最低值、1%分位数和平均值
+- 混合特征库翻转：待评估后端的查询特征与eager特征库比对（含自身），匹配结果与eager查询不同的样本数，
+  模拟只切换推理后端、不重建特征库时的线上情况
+- 留一翻转：排除自身后，全部使用待评估后端特征的匹配结果与全部使用eager特征的结果不同的样本数，
+  模拟重建特征库后不同用户之间的区分能力变化
+
+匹配规则与识别接口一致（match_face_features，含接近阈值时的+0.02加权）。
+
+用法（在backend目录下运行）：
+    python -m app.tools.eval_quantized_embedder --backend int8_static
+    python -m app.tools.eval_quantized_embedder --backend int8_dynamic --threshold 0.6 --limit 500
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+from app.config import config
+from app.utils.face_embedders import EMBEDDER_BACKENDS, TorchEmbedder, create_embedder, embedding_similarity
+from app.utils.face_utils import _preprocess_face_image, _to_model_input, match_face_features
+
+
+def embed_faces(embedder, face_arrays, batch_size=32):
+    """
+    分批提取人脸特征并L2归一化
+
+    Args:
+        embedder (FaceEmbedder): 特征提取器
+        face_arrays (list): 预处理后的160x160x3 uint8数组列表
+        batch_size (int): 批次大小
+
+    Returns:
+        numpy.array: (N, 512) float32归一化特征矩阵
+    """
+    features = [
+        embedder.embed(_to_model_input(face_arrays[start:start + batch_size]))
+        for start in range(0, len(face_arrays), batch_size)
+    ]
+    features = np.vstack(features).astype(np.float32)
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.where(norms > 0, norms, 1.0)
+
+
+def match_decisions(queries, gallery, threshold, exclude_self=False):
+    """
+    逐个查询特征与特征库比对，返回每个查询的最佳匹配行号
+
+    Args:
+        queries (numpy.array): (N, 512) 查询特征
+        gallery (numpy.array): (N, 512) 已归一化的特征库，第i行与第i个查询属于同一张人脸
+        threshold (float): 识别阈值
+        exclude_self (bool): 是否排除查询自身所在的行（留一比对）
+
+    Returns:
+        list: 每个查询的最佳匹配行号，未匹配为None
+    """
+    decisions = []
+    valid_mask = np.ones(len(gallery), dtype=bool)
+    for index, query in enumerate(queries):
+        if exclude_self:
+            valid_mask[index] = False
+        matches, _ = match_face_features(query, gallery, threshold, valid_mask if exclude_self else None)
+        decisions.append(matches[0][0] if matches else None)
+        valid_mask[index] = True
+    return decisions
+
+
+def decision_flips(reference, candidate, threshold):
+    """
+    计算待评估特征相对参考特征的偏移和匹配结果翻转
+
+    Args:
+        reference (numpy.array): (N, 512) eager模型的归一化特征
+        candidate (numpy.array): (N, 512) 待评估后端的归一化特征
+        threshold (float): 识别阈值
+
+    Returns:
+        dict: 评估指标
+            - count: 样本数
+            - drift_min / drift_p1 / drift_mean: 逐样本余弦相似度的最低值、1%分位数和平均值
+            - mixed_flips: 待评估查询 vs eager特征库（含自身）的匹配结果翻转样本行号
+            - loo_flips: 留一比对下全部待评估特征 vs 全部eager特征的匹配结果翻转样本行号
+    """
+    similarities = embedding_similarity(reference, candidate)
+    baseline = match_decisions(reference, reference, threshold)
+    mixed = match_decisions(candidate, reference, threshold)
+    loo_baseline = match_decisions(reference, reference, threshold, exclude_self=True)
+    loo_candidate = match_decisions(candidate, candidate, threshold, exclude_self=True)
+    return {
+        "count": len(reference),
+        "drift_min": float(similarities.min()),
+        "drift_p1": float(np.percentile(similarities, 1)),
+        "drift_mean": float(similarities.mean()),
+        "mixed_flips": [i for i, (a, b) in enumerate(zip(baseline, mixed)) if a != b],
+        "loo_flips": [i for i, (a, b) in enumerate(zip(loo_baseline, loo_candidate)) if a != b],
+    }
+
+
+def load_registered_faces(limit=None):
+    """
+    读取数据库中已注册用户的人脸图片
+
+    Args:
+        limit (int, optional): 最多读取的用户数
+
+    Returns:
+        tuple: (用户身份ID列表, 预处理后的160x160x3 uint8数组列表)
+    """
+    from app.models.models import SessionLocal, User
+
+    db = SessionLocal()
+    try:
+        query = db.query(User.identity_id, User.image_path).order_by(User.id)
+        if limit:
+            query = query.limit(limit)
+        rows = query.all()
+    finally:
+        db.close()
+
+    identities, arrays = [], []
+    for identity_id, image_path in rows:
+        if not image_path or not os.path.exists(image_path):
+            print(f"⚠️ 用户 {identity_id} 的人脸图片不存在: {image_path}")
+            continue
+        img_np = _preprocess_face_image(Image.open(image_path).convert("RGB"))
+        if img_np is None:
+            continue
+        identities.append(identity_id)
+        arrays.append(img_np)
+    return identities, arrays
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="评估量化特征提取后端对特征库匹配结果的影响")
+    parser.add_argument("--backend", required=True, choices=[name for name in EMBEDDER_BACKENDS if name != TorchEmbedder.NAME], help="待评估的后端")
+    parser.add_argument("--model", help="导出模型路径，默认config.EMBEDDER_MODEL_DIR下的标准文件名")
+    parser.add_argument("--threshold", type=float, default=config.RECOGNITION_THRESHOLD, help="识别阈值")
+    parser.add_argument("--limit", type=int, help="最多评估的用户数")
+    parser.add_argument("--batch-size", type=int, default=32, help="特征提取批次大小")
+    args = parser.parse_args(argv)
+
+    identities, arrays = load_registered_faces(args.limit)
+    if len(arrays) < 2:
+        print("❌ 已注册的人脸图片少于2张，无法评估")
+        return 1
+    print(f"📂 读取 {len(arrays)} 张已注册人脸图片")
+
+    print("🔧 正在提取eager模型特征...")
+    reference = embed_faces(TorchEmbedder(), arrays, args.batch_size)
+    print(f"🔧 正在提取{args.backend}后端特征...")
+    candidate = embed_faces(create_embedder(args.backend, args.model), arrays, args.batch_size)
+
+    result = decision_flips(reference, candidate, args.threshold)
+    print(
+        f"📊 特征偏移：余弦相似度 最低 {result['drift_min']:.6f} / "
+        f"1%分位 {result['drift_p1']:.6f} / 平均 {result['drift_mean']:.6f}"
+    )
+    print(f"📊 混合特征库翻转（{args.backend}查询 vs eager特征库）：{len(result['mixed_flips'])}/{result['count']}")
+    print(f"📊 留一翻转（全部{args.backend} vs 全部eager）：{len(result['loo_flips'])}/{result['count']}")
+    for index in sorted(set(result["mixed_flips"]) | set(result["loo_flips"])):
+        print(f"   ↪️ {identities[index]}")
+
+    if result["mixed_flips"] or result["loo_flips"]:
+        print(f"⚠️ 存在匹配结果翻转，启用{args.backend}后端后建议重建特征库并复核上述用户")
+    else:
+        print(f"✅ 阈值 {args.threshold} 下没有匹配结果翻转")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
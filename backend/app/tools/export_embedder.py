@@ -0,0 +1,207 @@
+"""FaceNet模型导出命令 - 把eager模式的InceptionResnetV1导出为TorchScript、ONNX或静态int8量化模型
+
+导出后自动用导出模型对应的推理后端（face_embedders）加载，并与eager模型逐样本比较特征的余弦相似度，
+最低相似度低于config.EMBEDDER_PARITY_THRESHOLD（int8量化模型为config.QUANTIZED_EMBEDDER_PARITY_THRESHOLD）
+时导出失败且不覆盖已有模型文件。
+校验样本为config.FACE_IMAGE_DIR中已注册的人脸图片（经过与extract_face_feature相同的预处理），
+不足时用随机输入补足。
+
+int8_static格式使用PyTorch FX静态量化：在已注册的人脸图片上校准各层激活值范围后，
+把卷积和全连接层转换为int8算子，再导出为冻结的TorchScript模型。校准至少需要一张已注册的人脸图片。
+
+用法（在backend目录下运行）：
+    python -m app.tools.export_embedder --format onnx
+    python -m app.tools.export_embedder --format torchscript --samples 128
+    python -m app.tools.export_embedder --format int8_static --calibration-samples 256
+
+导出完成后把config.EMBEDDER_BACKEND设置为对应的后端名称即可启用。
+"""
+import argparse
+import glob
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+from app.config import config
+from app.utils.face_embedders import (
+    EMBEDDER_BACKENDS, INPUT_SHAPE, MODEL_FILENAMES, QUANTIZED_BACKENDS, TorchEmbedder,
+    default_model_path, embedding_similarity, select_quantized_engine
+)
+from app.utils.face_utils import _preprocess_face_image, _to_model_input
+
+
+def export_torchscript(model, output_path):
+    """追踪eager模型并冻结为TorchScript模型"""
+    import torch
+
+    with torch.no_grad():
+        traced = torch.jit.trace(model, torch.zeros((1, *INPUT_SHAPE)))
+    torch.jit.freeze(traced).save(output_path)
+
+
+def export_onnx(model, output_path, opset=17):
+    """导出ONNX模型（批次维度可变）"""
+    import torch
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            torch.zeros((1, *INPUT_SHAPE)),
+            output_path,
+            input_names=["input"],
+            output_names=["embedding"],
+            dynamic_axes={"input": {0: "batch"}, "embedding": {0: "batch"}},
+            opset_version=opset,
+            do_constant_folding=True
+        )
+
+
+def export_int8_static(model, output_path, calibration, batch_size=32):
+    """
+    FX静态量化：在校准样本上统计激活值范围，转换为int8模型并导出为冻结的TorchScript模型
+
+    Args:
+        model (torch.nn.Module): eager模式的InceptionResnetV1
+        output_path (str): 输出路径
+        calibration (numpy.array): (N, 3, 160, 160) 校准样本
+        batch_size (int): 校准推理的批次大小
+    """
+    import copy
+
+    import torch
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = select_quantized_engine()
+    example = torch.zeros((1, *INPUT_SHAPE))
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(engine), (example,))
+    with torch.no_grad():
+        for start in range(0, len(calibration), batch_size):
+            prepared(torch.from_numpy(calibration[start:start + batch_size]))
+        quantized = convert_fx(prepared)
+        traced = torch.jit.trace(quantized, example)
+    torch.jit.freeze(traced).save(output_path)
+
+
+def load_face_samples(num_samples):
+    """
+    读取已注册的人脸图片并做与extract_face_feature相同的预处理
+
+    Args:
+        num_samples (int): 最多读取的图片数量
+
+    Returns:
+        list: 160x160x3 uint8数组列表
+    """
+    arrays = []
+    paths = sorted(glob.glob(os.path.join(config.FACE_IMAGE_DIR, "*")))
+    for path in paths:
+        if len(arrays) >= num_samples:
+            break
+        if not path.lower().endswith((".jpg", ".jpeg", ".png")):
+            continue
+        img_np = _preprocess_face_image(Image.open(path).convert("RGB"))
+        if img_np is not None:
+            arrays.append(img_np)
+    return arrays
+
+
+def load_parity_samples(num_samples, pad_random=True, seed=0):
+    """
+    生成一致性校验样本
+
+    Args:
+        num_samples (int): 样本数量
+        pad_random (bool): 人脸图片不足时是否用随机输入补足（量化模型的激活值范围按人脸图片校准，
+            随机输入超出校准范围，不用于量化模型的校验）
+        seed (int): 随机输入的随机种子
+
+    Returns:
+        tuple: ((N, 3, 160, 160) float32数组, 其中真实人脸样本数)
+    """
+    arrays = load_face_samples(num_samples)
+    num_faces = len(arrays)
+    rng = np.random.default_rng(seed)
+    while pad_random and len(arrays) < num_samples:
+        arrays.append(rng.integers(0, 256, size=(160, 160, 3), dtype=np.uint8))
+    return _to_model_input(arrays), num_faces
+
+
+def check_parity(reference_embedder, embedder, samples):
+    """
+    比较导出模型与eager模型的特征
+
+    第一个样本单独推理、其余样本作为一个批次推理，同时校验可变批次维度。
+
+    Returns:
+        numpy.array: 每个样本的余弦相似度
+    """
+    reference = reference_embedder.embed(samples)
+    if len(samples) == 1:
+        return embedding_similarity(reference, embedder.embed(samples))
+    candidate = np.vstack([embedder.embed(samples[:1]), embedder.embed(samples[1:])])
+    return embedding_similarity(reference, candidate)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出FaceNet特征提取模型并校验一致性")
+    parser.add_argument("--format", required=True, choices=sorted(MODEL_FILENAMES), help="导出格式")
+    parser.add_argument("--output", help="模型文件路径，默认config.EMBEDDER_MODEL_DIR下的标准文件名")
+    parser.add_argument("--samples", type=int, default=64, help="一致性校验样本数（至少2个）")
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset版本")
+    parser.add_argument("--calibration-samples", type=int, default=256, help="int8_static量化的校准图片数")
+    args = parser.parse_args(argv)
+
+    parity_threshold = (
+        config.QUANTIZED_EMBEDDER_PARITY_THRESHOLD if args.format in QUANTIZED_BACKENDS
+        else config.EMBEDDER_PARITY_THRESHOLD
+    )
+    if args.format == "int8_static":
+        calibration = load_face_samples(args.calibration_samples)
+        if not calibration:
+            print(f"❌ {config.FACE_IMAGE_DIR} 中没有可用于校准的人脸图片，请先注册用户")
+            return 1
+        print(f"📐 使用 {len(calibration)} 张已注册人脸图片校准量化参数")
+
+    output_path = args.output or default_model_path(args.format)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    # 先写入临时文件，通过校验后再替换正式文件
+    tmp_path = f"{output_path}.tmp"
+
+    print("🔧 正在加载eager模式FaceNet模型...")
+    reference = TorchEmbedder()
+
+    print(f"📦 正在导出{args.format}模型...")
+    if args.format == "onnx":
+        export_onnx(reference.model, tmp_path, args.opset)
+    elif args.format == "int8_static":
+        export_int8_static(reference.model, tmp_path, _to_model_input(calibration))
+    else:
+        export_torchscript(reference.model, tmp_path)
+
+    try:
+        samples, num_faces = load_parity_samples(max(2, args.samples), pad_random=args.format not in QUANTIZED_BACKENDS)
+        embedder = EMBEDDER_BACKENDS[args.format](tmp_path)
+        similarities = check_parity(reference, embedder, samples)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    print(
+        f"📊 一致性校验：{len(samples)} 个样本（真实人脸 {num_faces} 个），"
+        f"余弦相似度 最低 {similarities.min():.6f} / 平均 {similarities.mean():.6f}"
+    )
+    if similarities.min() <= parity_threshold:
+        os.remove(tmp_path)
+        print(f"❌ 一致性校验失败：最低相似度未超过 {parity_threshold}，未写入模型文件")
+        return 1
+
+    os.replace(tmp_path, output_path)
+    print(f"✅ 模型已导出到 {output_path}，设置 EMBEDDER_BACKEND = \"{args.format}\" 即可启用")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,499 @@
+"""人脸批量导入命令 - 从照片目录或CSV清单批量注册人脸
+
+替代逐张调用register_face的临时导入脚本（test_real_faces.py、interactive_test.py中的循环），
+按以下多进程流水线处理：
+1. 读取 + 解码 + 人脸检测 + 质量检查：进程池（--workers）并行处理，绕开GIL；
+   质量要求与register_face相同（detect_registration_face），工作进程只返回人脸裁剪和其JPEG编码
+2. 特征提取：人脸裁剪按--batch-size分批送入单独的特征提取进程，整批组成FaceNet批次；
+   特征提取期间主进程继续收集下一批的检测结果
+3. 唯一性校验：每批特征与特征库做一次矩阵比对（FaceGallery.match_many），
+   再与本次已通过校验的人脸、批内人脸做矩阵比对，阈值判定（含接近阈值时的加权）与注册接口一致
+4. 入库：全部通过校验的人脸在一个事务中插入，特征一次追加到特征存储，提交后一次性登记到特征库；
+   失败时回滚并删除已写入的人脸图片
+
+工作进程使用spawn方式启动（检测模型不一定fork安全），线程预算按"检测进程数 + 1"个进程分配
+（见thread_budget）。单张照片检测或一批人脸特征提取出错（包括工作进程异常退出）时，只把相关照片记为失败，
+其余照片照常导入。结束时打印各阶段处理的图片数、累计耗时和吞吐量（张/秒）。
+
+输入：
+- 目录：递归查找其中的图片，用户名取文件名（--name-from stem）或所在目录名（--name-from parent）
+- CSV：列为path（或filename）、name、user_id（可选），相对路径相对于CSV所在目录
+
+用法（在backend目录下运行）：
+    python -m app.tools.import_faces data/photos
+    python -m app.tools.import_faces data/photos --name-from parent --workers 8 --report import_report.csv
+    python -m app.tools.import_faces data/roster.csv --dry-run
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+import numpy as np
+
+from app.config import config
+from app.models.models import SessionLocal, User, init_db
+from app.utils.batch_recognition import is_image_filename
+from app.utils.bulk_registration import USER_ID_PATTERN, detect_registration_face
+from app.utils.data_process import generate_unique_identity_id
+from app.utils.face_gallery import FaceGallery, face_gallery
+from app.utils.face_utils import decode_upload, encode_jpeg, extract_face_feature, weight_similarities
+from app.utils.feature_store import feature_store
+
+
+# 吞吐量统计的各个阶段
+STAGES = ("decode", "detect", "embed", "dedupe", "insert")
+
+# 用户名来源
+NAME_SOURCES = ("stem", "parent")
+
+
+def read_sources(path, name_from="stem"):
+    """
+    读取待导入的照片列表
+
+    Args:
+        path (str): 照片目录或CSV清单路径
+        name_from (str): 目录输入时用户名的来源，"stem"为文件名（不含扩展名），"parent"为所在目录名
+
+    Returns:
+        list: {"path", "name", "user_id"} 字典列表，目录输入按路径排序
+
+    Raises:
+        ValueError: 路径不存在、CSV缺少必需的列或指定的身份ID格式不正确
+    """
+    if os.path.isdir(path):
+        sources = []
+        for root, _, filenames in os.walk(path):
+            for filename in filenames:
+                if not is_image_filename(filename):
+                    continue
+                file_path = os.path.join(root, filename)
+                name = os.path.splitext(filename)[0] if name_from == "stem" else os.path.basename(root)
+                sources.append({"path": file_path, "name": name, "user_id": None})
+        return sorted(sources, key=lambda source: source["path"])
+
+    if not os.path.isfile(path):
+        raise ValueError(f"路径不存在: {path}")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    sources = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        fields = set(reader.fieldnames or [])
+        path_field = "path" if "path" in fields else "filename"
+        if path_field not in fields or "name" not in fields:
+            raise ValueError("CSV清单需要包含path（或filename）和name列")
+        for line, row in enumerate(reader, start=2):
+            file_path = (row.get(path_field) or "").strip()
+            name = (row.get("name") or "").strip()
+            user_id = (row.get("user_id") or "").strip() or None
+            if not file_path or not name:
+                raise ValueError(f"CSV第{line}行缺少照片路径或用户名")
+            if user_id and not USER_ID_PATTERN.match(user_id):
+                raise ValueError(f"CSV第{line}行的身份ID格式不正确: {user_id}")
+            sources.append({"path": os.path.join(base_dir, file_path), "name": name, "user_id": user_id})
+    return sources
+
+
+def _init_worker(process_count, initializer=None):
+    """工作进程初始化：按同时运行的进程数分配线程预算，再执行调用方指定的初始化函数"""
+    config.THREAD_BUDGET_WORKERS = process_count
+    if initializer is not None:
+        initializer()
+
+
+def _detect_worker(path, detection_profile):
+    """
+    读取、解码一张照片并检测人脸（在检测进程中执行）
+
+    Returns:
+        dict: 成功时包含face（人脸裁剪）和jpeg（人脸裁剪的JPEG编码），失败时包含error；
+              均包含decode、detect两个阶段的耗时（秒），未执行的阶段为None
+    """
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            image, _ = decode_upload(f.read())
+    except Exception as e:
+        return {"error": f"图像解析失败: {str(e)}", "decode": time.perf_counter() - start, "detect": None}
+    decoded = time.perf_counter()
+
+    result = detect_registration_face(image, detection_profile)
+    result["decode"] = decoded - start
+    result["detect"] = time.perf_counter() - decoded
+    if "face" in result:
+        result["jpeg"] = encode_jpeg(result["face"], quality=95)
+    return result
+
+
+def _embed_worker(faces, batch_size):
+    """
+    提取一批人脸的特征（在特征提取进程中执行）
+
+    Returns:
+        tuple: ((N, 512) float32特征矩阵, 耗时秒数)
+    """
+    start = time.perf_counter()
+    features = np.asarray(extract_face_feature(faces, batch_size=batch_size), dtype=np.float32)
+    return features, time.perf_counter() - start
+
+
+class _InlineExecutor:
+    """在当前进程中同步执行任务的执行器（--workers 0，便于调试和测试）"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def _submit(executor, fn, *args):
+    """提交任务；执行器已不可用（如进程池中有工作进程异常退出）时返回带有该异常的future，不中断导入"""
+    try:
+        return executor.submit(fn, *args)
+    except Exception as e:
+        future = Future()
+        future.set_exception(e)
+        return future
+
+
+def dedupe_batch(features, accepted, threshold, gallery, snapshot):
+    """
+    一批人脸特征的唯一性校验：与特征库、本次已通过校验的人脸、批内人脸分别做矩阵比对
+
+    批内按顺序判定，与同一批中排在前面且已通过校验的人脸重复的同样阻断。
+
+    Args:
+        features (numpy.array): (K, 512) 已L2归一化的特征矩阵
+        accepted (numpy.array): (M, 512) 本次已通过校验的特征矩阵
+        threshold (float): 相似度阈值
+        gallery (FaceGallery): 特征库
+        snapshot (GallerySnapshot): 特征库快照
+
+    Returns:
+        list: 每个特征一项，通过校验为None，被阻断时为 (来源, 序号, 相似度)：
+              来源为"gallery"时序号是特征库行号，为"import"时是accepted中的行号，为"batch"时是批内序号
+    """
+    rows, similarities = gallery.match_many(features, threshold, snapshot=snapshot)
+
+    # 与本次已通过校验的人脸比对，分块计算避免生成过大的相似度矩阵
+    prior_rows = np.full(len(features), -1, dtype=np.int64)
+    prior_best = np.full(len(features), -np.inf, dtype=np.float32)
+    for start in range(0, len(accepted), FaceGallery.MATCH_BLOCK_ROWS):
+        weighted = weight_similarities(features @ accepted[start:start + FaceGallery.MATCH_BLOCK_ROWS].T, threshold)
+        block_best = weighted.argmax(axis=1)
+        block_similarities = weighted[np.arange(len(features)), block_best]
+        better = block_similarities > prior_best
+        prior_best[better] = block_similarities[better]
+        prior_rows[better] = start + block_best[better]
+
+    pairwise = weight_similarities(features @ features.T, threshold)
+    outcomes = []
+    kept = []
+    for i in range(len(features)):
+        if rows[i] >= 0:
+            outcomes.append(("gallery", int(rows[i]), float(similarities[i])))
+        elif prior_best[i] >= threshold:
+            outcomes.append(("import", int(prior_rows[i]), float(prior_best[i])))
+        else:
+            duplicate = next((j for j in kept if pairwise[i, j] >= threshold), None)
+            if duplicate is not None:
+                outcomes.append(("batch", duplicate, float(pairwise[i, duplicate])))
+            else:
+                kept.append(i)
+                outcomes.append(None)
+    return outcomes
+
+
+def insert_faces(sources, accepted, features, session_factory, gallery, store):
+    """
+    在一个事务中插入全部通过校验的人脸及其特征库变更日志，提交后一次性登记到特征库
+
+    指定的身份ID已被占用（或与本次导入中更早的照片相同）的照片记为失败。
+
+    Args:
+        sources (list): read_sources返回的照片列表
+        accepted (list): 通过校验的 (照片序号, 人脸JPEG) 列表
+        features (numpy.array): 与accepted对应的特征矩阵
+        session_factory (callable): 数据库会话工厂
+        gallery (FaceGallery): 特征库
+        store (FeatureStore): 特征存储
+
+    Returns:
+        dict: 照片序号 -> 结果字典（status为registered或failed）
+    """
+    outcomes = {}
+    db = session_factory()
+    written = []
+    try:
+        requested = [sources[index]["user_id"] for index, _ in accepted if sources[index]["user_id"]]
+        taken = set()
+        if requested:
+            taken = {
+                identity_id for (identity_id,) in
+                db.query(User.identity_id).filter(User.identity_id.in_(requested)).all()
+            }
+
+        users = []
+        os.makedirs(config.FACE_IMAGE_DIR, exist_ok=True)
+        for (index, jpeg), feature in zip(accepted, features):
+            source = sources[index]
+            identity_id = source["user_id"]
+            if identity_id and identity_id in taken:
+                outcomes[index] = {"status": "failed", "message": f"身份ID '{identity_id}' 已存在"}
+                continue
+            if not identity_id:
+                identity_id = generate_unique_identity_id(db)
+                while identity_id in taken:
+                    identity_id = generate_unique_identity_id(db)
+            taken.add(identity_id)
+
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            image_path = os.path.join(config.FACE_IMAGE_DIR, f"{source['name']}_{timestamp}_{str(uuid.uuid4())[:8]}.jpg")
+            with open(image_path, "wb") as f:
+                f.write(jpeg)
+            written.append(image_path)
+            users.append((index, feature, User(
+                name=source["name"], identity_id=identity_id, feature_path=store.path, image_path=image_path
+            )))
+
+        # 特征一次追加，失败或回滚时留下的行未被任何用户引用，视为无效行
+        rows = store.append_many([feature for _, feature, _ in users]) if users else []
+        for (_, _, user), row in zip(users, rows):
+            user.feature_row = row
+        db.add_all([user for _, _, user in users])
+        db.flush()
+        entries = []
+        for index, _, user in users:
+            outcomes[index] = {"status": "registered", "message": "注册成功", "identity_id": user.identity_id}
+            entries.append((user.id, user.identity_id, user.name, user.feature_row))
+        versions = gallery.journal_adds(db, entries)
+        db.commit()
+    except Exception:
+        db.rollback()
+        for path in written:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        raise
+    finally:
+        db.close()
+
+    gallery.add_many(entries, versions)
+    return outcomes
+
+
+def import_faces(sources, workers=None, batch_size=None, detection_profile=None, threshold=None, dry_run=False,
+                 session_factory=None, gallery=None, store=None, worker_initializer=None):
+    """
+    按流水线导入照片：检测进程池 -> 特征提取进程 -> 唯一性校验 -> 单事务入库
+
+    Args:
+        sources (list): read_sources返回的照片列表
+        workers (int, optional): 检测进程数，0表示在当前进程中执行全部阶段，默认为可用核数
+        batch_size (int, optional): 每次送入特征提取进程的人脸数，默认为config.EMBEDDING_BATCH_SIZE
+        detection_profile (str, optional): 人脸检测档位，默认与批量注册接口相同
+        threshold (float, optional): 唯一性校验阈值，默认为config.UNIQUENESS_THRESHOLD
+        dry_run (bool): 只检测和校验，不写入数据库
+        session_factory (callable, optional): 数据库会话工厂，默认SessionLocal
+        gallery (FaceGallery, optional): 特征库，默认全局face_gallery
+        store (FeatureStore, optional): 特征存储，默认全局feature_store
+        worker_initializer (callable, optional): 在每个工作进程中执行的初始化函数（须为可pickle的模块级函数），
+            例如加载自定义的检测或特征提取后端；workers为0时不执行
+
+    Returns:
+        tuple: (results, stats)
+            - results: 与sources对应的结果字典列表，status为registered、blocked、failed
+              （dry_run时通过校验的照片为accepted）
+            - stats: 阶段名 -> {"images": 处理的图片数, "seconds": 累计耗时}，另含"wall"总耗时
+    """
+    if workers is None:
+        workers = max(1, os.cpu_count() or 1)
+    batch_size = max(1, int(batch_size or config.EMBEDDING_BATCH_SIZE))
+    detection_profile = detection_profile or config.ENDPOINT_DETECTION_PROFILES["register_bulk"]
+    threshold = config.UNIQUENESS_THRESHOLD if threshold is None else threshold
+    session_factory = session_factory if session_factory is not None else SessionLocal
+    gallery = gallery if gallery is not None else face_gallery
+    store = store if store is not None else feature_store
+
+    stats = {stage: {"images": 0, "seconds": 0.0} for stage in STAGES}
+    results = [None] * len(sources)
+    accepted = []  # (照片序号, 人脸JPEG)
+    accepted_features = np.empty((len(sources), FaceGallery.FEATURE_DIM), dtype=np.float32)
+    snapshot = gallery.snapshot()
+    started = time.perf_counter()
+
+    def finish_batch(batch, future):
+        try:
+            features, seconds = future.result()
+        except Exception as e:
+            for index, _ in batch:
+                results[index] = {"status": "failed", "message": f"人脸特征提取失败: {str(e)}"}
+            print(f"❌ 一批 {len(batch)} 张人脸特征提取失败: {str(e)}")
+            return
+        stats["embed"]["images"] += len(batch)
+        stats["embed"]["seconds"] += seconds
+
+        start = time.perf_counter()
+        outcomes = dedupe_batch(features, accepted_features[:len(accepted)], threshold, gallery, snapshot)
+        for (index, jpeg), feature, outcome in zip(batch, features, outcomes):
+            if outcome is None:
+                accepted_features[len(accepted)] = feature
+                accepted.append((index, jpeg))
+                continue
+            origin, row, similarity = outcome
+            if origin == "gallery":
+                matched = f"{snapshot.identity_ids[row]}（{snapshot.names[row]}）"
+            else:
+                original = accepted[row][0] if origin == "import" else batch[row][0]
+                matched = os.path.basename(sources[original]["path"])
+            results[index] = {
+                "status": "blocked", "message": f"该人脸已注册，与 {matched} 是同一人", "similarity": similarity
+            }
+        stats["dedupe"]["images"] += len(batch)
+        stats["dedupe"]["seconds"] += time.perf_counter() - start
+        print(f"🔍 已校验 {stats['dedupe']['images']} 张人脸，通过 {len(accepted)} 张")
+
+    if workers > 0:
+        context = get_context("spawn")
+        initargs = (workers + 1, worker_initializer)
+        detect_pool = ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=initargs)
+        embed_pool = ProcessPoolExecutor(1, mp_context=context, initializer=_init_worker, initargs=initargs)
+    else:
+        detect_pool = embed_pool = _InlineExecutor()
+
+    with detect_pool, embed_pool:
+        # 同时在途的检测任务数有上限，避免检测结果（人脸裁剪）在内存中堆积
+        max_pending = max(1, workers) * 4
+        detecting = deque()
+        embedding = deque()  # (批次, future)
+        batch = []
+        next_index = 0
+        while next_index < len(sources) or detecting:
+            while next_index < len(sources) and len(detecting) < max_pending:
+                detecting.append((next_index, _submit(detect_pool, _detect_worker, sources[next_index]["path"], detection_profile)))
+                next_index += 1
+
+            index, future = detecting.popleft()
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"error": f"人脸检测失败: {str(e)}", "decode": None, "detect": None}
+            for stage in ("decode", "detect"):
+                if result[stage] is not None:
+                    stats[stage]["images"] += 1
+                    stats[stage]["seconds"] += result[stage]
+            if "error" in result:
+                results[index] = {"status": "failed", "message": result["error"]}
+            else:
+                batch.append((index, result["face"], result["jpeg"]))
+
+            if len(batch) >= batch_size or (batch and not detecting and next_index >= len(sources)):
+                future = _submit(embed_pool, _embed_worker, [face for _, face, _ in batch], batch_size)
+                embedding.append(([(i, jpeg) for i, _, jpeg in batch], future))
+                batch = []
+            # 特征提取进程中最多排队一批，其余批次完成后立即校验
+            while embedding and (len(embedding) > 1 or embedding[0][1].done()):
+                finish_batch(*embedding.popleft())
+
+        while embedding:
+            finish_batch(*embedding.popleft())
+
+    if dry_run:
+        for index, _ in accepted:
+            results[index] = {"status": "accepted", "message": "通过校验（未写入）"}
+    elif accepted:
+        start = time.perf_counter()
+        outcomes = insert_faces(sources, accepted, accepted_features[:len(accepted)], session_factory, gallery, store)
+        stats["insert"]["images"] = len(accepted)
+        stats["insert"]["seconds"] = time.perf_counter() - start
+        for index, outcome in outcomes.items():
+            results[index] = outcome
+
+    stats["wall"] = time.perf_counter() - started
+    return results, stats
+
+
+def print_summary(results, stats):
+    """打印各阶段吞吐量和导入结果统计"""
+    print("📊 各阶段吞吐量（累计耗时为各进程耗时之和）：")
+    print(f"   {'阶段':<8}{'图片数':>8}{'累计耗时(s)':>14}{'张/秒':>10}")
+    for stage in STAGES:
+        images, seconds = stats[stage]["images"], stats[stage]["seconds"]
+        rate = f"{images / seconds:.1f}" if seconds > 0 else "-"
+        print(f"   {stage:<8}{images:>8}{seconds:>14.2f}{rate:>10}")
+    wall = stats["wall"]
+    print(f"   总计 {len(results)} 张，墙钟耗时 {wall:.2f}s，{len(results) / wall if wall > 0 else 0:.1f} 张/秒")
+
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    print("📦 导入结果：" + "，".join(f"{status} {count}" for status, count in sorted(counts.items())))
+
+
+def write_report(path, sources, results):
+    """把每张照片的结果写入CSV报告"""
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(["path", "name", "status", "identity_id", "similarity", "message"])
+        for source, result in zip(sources, results):
+            similarity = result.get("similarity")
+            writer.writerow([
+                source["path"], source["name"], result["status"], result.get("identity_id") or source["user_id"] or "",
+                f"{similarity:.4f}" if similarity is not None else "", result["message"]
+            ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="从照片目录或CSV清单批量注册人脸")
+    parser.add_argument("source", help="照片目录，或包含path（或filename）、name、user_id列的CSV清单")
+    parser.add_argument("--name-from", choices=NAME_SOURCES, default="stem", help="目录输入时用户名取文件名或所在目录名")
+    parser.add_argument("--workers", type=int, default=None, help="检测进程数，默认为CPU核数，0表示在当前进程中执行")
+    parser.add_argument("--batch-size", type=int, default=config.EMBEDDING_BATCH_SIZE, help="特征提取批次大小")
+    parser.add_argument("--detection-profile", choices=list(config.DETECTION_PROFILES), help="人脸检测档位，默认与批量注册接口相同")
+    parser.add_argument("--threshold", type=float, default=config.UNIQUENESS_THRESHOLD, help="唯一性校验阈值")
+    parser.add_argument("--dry-run", action="store_true", help="只检测和校验，不写入数据库")
+    parser.add_argument("--report", help="把每张照片的结果写入该CSV文件")
+    args = parser.parse_args(argv)
+
+    try:
+        sources = read_sources(args.source, args.name_from)
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        return 1
+    if not sources:
+        print(f"❌ {args.source} 中没有可导入的图片")
+        return 1
+    print(f"📂 读取 {len(sources)} 张照片")
+
+    init_db()
+    results, stats = import_faces(
+        sources, workers=args.workers, batch_size=args.batch_size, detection_profile=args.detection_profile,
+        threshold=args.threshold, dry_run=args.dry_run
+    )
+    print_summary(results, stats)
+    if args.report:
+        write_report(args.report, sources, results)
+        print(f"📝 结果报告已写入 {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""近似最近邻索引模块 - 基于NumPy实现的IVF（倒排文件）索引
+
+特征库达到10^5~10^6规模时，即使矩阵化的暴力比对也会成为单张人脸的主要开销。
+IVF索引先用k-means把特征库划分为nlist个簇，查询时只扫描与查询向量最接近的
+nprobe个簇中的特征，得到候选集后再由调用方用精确的余弦相似度重排。
+
+索引只保存特征行号，不保存特征本身，特征矩阵仍由特征库（feature_store的内存映射）提供。
+
+典型用法：
+    from app.utils.ann_index import create_ann_index
+
+    index = create_ann_index("ivf", nprobe=16)
+    index.build(features, valid_mask=active)
+    candidates = index.search(query_feature)
+"""
+import os
+
+import numpy as np
+
+
+class IVFIndex:
+    """
+    IVF近似最近邻索引
+
+    使用球面k-means（质心归一化，按内积分配）训练粗聚类质心，
+    每个特征行归属于内积最大的质心。支持增量添加、墓碑删除和保存/加载。
+
+    Attributes:
+        nlist (int or None): 聚类簇数，为None时按特征数量自动确定
+        nprobe (int): 查询时扫描的簇数
+        n_iter (int): k-means迭代次数
+        max_train (int): 训练k-means时最多采样的特征数
+    """
+
+    INDEX_TYPE = "ivf"
+
+    def __init__(self, nlist=None, nprobe=16, n_iter=10, max_train=50000, seed=0):
+        """
+        初始化IVF索引
+
+        Args:
+            nlist (int, optional): 聚类簇数，默认按4*sqrt(N)自动确定
+            nprobe (int): 查询时扫描的簇数，默认16
+            n_iter (int): k-means迭代次数，默认10
+            max_train (int): 训练时最多采样的特征数，默认50000
+            seed (int): 随机种子
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.max_train = max_train
+        self.seed = seed
+        self.centroids = None
+        self._assign = np.empty(0, dtype=np.int32)  # 行号 -> 簇编号，-1表示未入索引
+        self._deleted = np.empty(0, dtype=bool)     # 墓碑标记
+        self._lists = []                            # 簇编号 -> 行号数组
+
+    @property
+    def is_trained(self):
+        """索引是否已训练"""
+        return self.centroids is not None
+
+    def __len__(self):
+        """返回索引中有效的特征行数"""
+        return int(np.count_nonzero((self._assign >= 0) & ~self._deleted))
+
+    @staticmethod
+    def _normalize(matrix):
+        """按行L2归一化"""
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1.0)
+
+    def _ensure_rows(self, size):
+        """扩展行号数组到至少size行"""
+        if size <= len(self._assign):
+            return
+        new_size = max(size, len(self._assign) * 2)
+        assign = np.full(new_size, -1, dtype=np.int32)
+        assign[:len(self._assign)] = self._assign
+        deleted = np.zeros(new_size, dtype=bool)
+        deleted[:len(self._deleted)] = self._deleted
+        self._assign, self._deleted = assign, deleted
+
+    def _nearest_centroids(self, features, chunk_size=8192):
+        """分块计算每个特征所属的簇（内积最大的质心）"""
+        labels = np.empty(len(features), dtype=np.int32)
+        for start in range(0, len(features), chunk_size):
+            chunk = np.asarray(features[start:start + chunk_size], dtype=np.float32)
+            labels[start:start + chunk_size] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return labels
+
+    def _train(self, train_features, nlist):
+        """球面k-means训练质心"""
+        rng = np.random.default_rng(self.seed)
+        train_features = self._normalize(np.asarray(train_features, dtype=np.float32))
+        init = rng.choice(len(train_features), size=nlist, replace=False)
+        centroids = train_features[init].copy()
+
+        for _ in range(self.n_iter):
+            labels = np.argmax(train_features @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, train_features)
+            counts = np.bincount(labels, minlength=nlist)
+            # 空簇重新随机初始化，避免质心失效
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                sums[empty] = train_features[rng.choice(len(train_features), size=len(empty))]
+            centroids = self._normalize(sums).astype(np.float32)
+
+        self.centroids = centroids
+
+    def build(self, features, valid_mask=None):
+        """
+        训练质心并把所有有效特征加入索引
+
+        Args:
+            features (numpy.array): (N, 512) 已归一化的特征矩阵
+            valid_mask (numpy.array, optional): (N,) 布尔数组，False的行不入索引
+        """
+        rows = np.arange(len(features)) if valid_mask is None else np.flatnonzero(valid_mask)
+        if len(rows) == 0:
+            raise ValueError("没有可用于构建索引的特征")
+
+        nlist = self.nlist or int(4 * np.sqrt(len(rows)))
+        nlist = max(1, min(nlist, len(rows)))
+
+        rng = np.random.default_rng(self.seed)
+        train_rows = rows if len(rows) <= self.max_train else np.sort(
+            rng.choice(rows, size=self.max_train, replace=False)
+        )
+        self._train(features[train_rows], nlist)
+
+        self._assign = np.empty(0, dtype=np.int32)
+        self._deleted = np.empty(0, dtype=bool)
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self.add(rows, features[rows])
+
+    def add(self, rows, features):
+        """
+        增量添加特征行（需先训练）
+
+        Args:
+            rows (sequence): 特征行号列表
+            features (numpy.array): 与rows对应的特征矩阵 (len(rows), 512)
+        """
+        if not self.is_trained:
+            raise RuntimeError("索引尚未训练，请先调用build()")
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        if len(rows) == 0:
+            return
+        labels = self._nearest_centroids(np.asarray(features).reshape(len(rows), -1))
+
+        self._ensure_rows(int(rows.max()) + 1)
+        # 已在索引中的行先从原簇移除（重复添加时以新特征为准）
+        for row in rows[self._assign[rows] >= 0]:
+            old_label = self._assign[row]
+            self._lists[old_label] = self._lists[old_label][self._lists[old_label] != row]
+        self._assign[rows] = labels
+        self._deleted[rows] = False
+
+        order = np.argsort(labels, kind="stable")
+        sorted_labels = labels[order]
+        boundaries = np.flatnonzero(np.diff(sorted_labels)) + 1
+        for group in np.split(order, boundaries):
+            label = labels[group[0]]
+            # 替换而不是原地修改，保证并发查询看到的列表始终完整
+            self._lists[label] = np.concatenate([self._lists[label], rows[group]])
+
+    def indexed_mask(self, size):
+        """
+        返回前size行中当前处于索引内（且未删除）的行
+
+        Args:
+            size (int): 行数
+
+        Returns:
+            numpy.array: (size,) 布尔数组
+        """
+        mask = np.zeros(size, dtype=bool)
+        n = min(size, len(self._assign))
+        mask[:n] = (self._assign[:n] >= 0) & ~self._deleted[:n]
+        return mask
+
+    def remove(self, rows):
+        """
+        删除特征行（标记墓碑，查询时过滤）
+
+        Args:
+            rows (sequence): 特征行号列表
+        """
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        rows = rows[rows < len(self._deleted)]
+        self._deleted[rows] = True
+
+    def search(self, query, nprobe=None):
+        """
+        查询候选特征行
+
+        Args:
+            query (numpy.array): 512维查询特征向量
+            nprobe (int, optional): 扫描的簇数，默认使用self.nprobe
+
+        Returns:
+            numpy.array: 候选特征行号（已过滤墓碑，未排序）
+        """
+        if not self.is_trained:
+            raise RuntimeError("索引尚未训练，请先调用build()")
+        nprobe = max(1, min(nprobe or self.nprobe, len(self.centroids)))
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+
+        centroid_scores = self.centroids @ query
+        if nprobe < len(self.centroids):
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(len(self.centroids))
+
+        lists = self._lists
+        candidates = np.concatenate([lists[label] for label in probe])
+        return candidates[~self._deleted[candidates]]
+
+    def save(self, path):
+        """
+        保存索引到文件（先写临时文件再替换，避免读到半个文件）
+
+        Args:
+            path (str): 保存路径（.npz）
+        """
+        if not self.is_trained:
+            raise RuntimeError("索引尚未训练，无法保存")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}.npz"
+        np.savez(
+            tmp_path,
+            index_type=np.array(self.INDEX_TYPE),
+            centroids=self.centroids,
+            assign=self._assign,
+            deleted=self._deleted,
+            nprobe=np.array(self.nprobe)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        从文件加载索引
+
+        Args:
+            path (str): 索引文件路径
+
+        Returns:
+            IVFIndex: 加载的索引
+        """
+        with np.load(path) as data:
+            index = cls(nprobe=int(data["nprobe"]))
+            index.centroids = data["centroids"].astype(np.float32)
+            index._assign = data["assign"].astype(np.int32)
+            index._deleted = data["deleted"].astype(bool)
+
+        index.nlist = len(index.centroids)
+        live = np.flatnonzero((index._assign >= 0) & ~index._deleted)
+        index._lists = [np.empty(0, dtype=np.int64) for _ in range(index.nlist)]
+        labels = index._assign[live]
+        for label in np.unique(labels):
+            index._lists[label] = live[labels == label]
+        return index
+
+
+# 支持的索引类型
+ANN_INDEX_TYPES = {
+    IVFIndex.INDEX_TYPE: IVFIndex,
+}
+
+
+def create_ann_index(index_type, **kwargs):
+    """
+    按类型创建近似最近邻索引
+
+    Args:
+        index_type (str): 索引类型，目前支持"ivf"
+        **kwargs: 传给索引构造函数的参数
+
+    Returns:
+        IVFIndex: 索引实例
+
+    Raises:
+        ValueError: 当索引类型不支持时抛出
+    """
+    if index_type not in ANN_INDEX_TYPES:
+        raise ValueError(f"不支持的近似最近邻索引类型: {index_type}")
+    return ANN_INDEX_TYPES[index_type](**kwargs)
+
+
+def load_ann_index(path):
+    """
+    从文件加载近似最近邻索引
+
+    Args:
+        path (str): 索引文件路径
+
+    Returns:
+        IVFIndex: 加载的索引
+    """
+    with np.load(path) as data:
+        index_type = str(data["index_type"])
+    if index_type not in ANN_INDEX_TYPES:
+        raise ValueError(f"不支持的近似最近邻索引类型: {index_type}")
+    return ANN_INDEX_TYPES[index_type].load(path)
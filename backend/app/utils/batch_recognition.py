@@ -0,0 +1,197 @@
+"""批量识别模块 - 多张图片并行解码和检测人脸，所有图片的人脸合并成共享的FaceNet批次提取特征
+
+逐张调用recognize_face时，每张图片的人脸单独组成一个批次（通常只有1~3张人脸），FaceNet的批处理能力用不上，
+解码、检测和特征提取也只能串行执行。批量识别分为两级流水线：
+1. 解码 + 人脸检测：线程池（config.BATCH_RECOGNIZE_WORKERS）并行处理，OpenCV解码和检测模型推理都会释放GIL；
+   同时在途的图片数有上限，压缩包中的图片按需读取，不会一次解码全部图片
+2. 特征提取 + 比对：在调用方线程中执行，把已完成检测的多张图片的人脸合并成一个批次送入FaceNet，
+   再按图片拆分特征，逐张图片用build_recognition_result组装与recognize_face相同格式的结果
+
+某张图片检测完成后，如果暂时没有其他图片完成检测，不等待凑满批次，立即提取特征并返回结果，
+因此结果按完成顺序逐张产出（带原始序号），调用方可以流式返回给客户端。
+
+典型用法：
+    from app.utils.batch_recognition import recognize_batch
+
+    for item in recognize_batch([("a.jpg", file_a.read), ("b.jpg", file_b.read)]):
+        print(item["index"], item["result"] or item["error"])
+"""
+import os
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ..config import config
+from .data_process import build_recognition_result
+from .face_gallery import face_gallery
+from .face_utils import decode_upload, detect_face, extract_face_feature, scale_box
+
+
+# 批量识别接受的图片扩展名
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp", "bmp"}
+
+
+def is_image_filename(filename):
+    """
+    根据扩展名判断是否为支持的图片文件
+
+    Args:
+        filename (str): 文件名
+
+    Returns:
+        bool: 扩展名是否在IMAGE_EXTENSIONS中
+    """
+    return "." in filename and filename.rsplit(".", 1)[1].lower() in IMAGE_EXTENSIONS
+
+
+def iter_zip_images(archive, max_file_bytes=None):
+    """
+    列出zip压缩包中的图片文件（跳过目录、隐藏文件和非图片文件）
+
+    Args:
+        archive (zipfile.ZipFile): 已打开的压缩包
+        max_file_bytes (int, optional): 单个文件解压后的最大字节数，默认config.BATCH_RECOGNIZE_MAX_FILE_BYTES
+
+    Returns:
+        list: (文件名, 读取函数) 元组列表，读取函数返回文件内容，文件过大时抛出ValueError
+    """
+    max_file_bytes = max_file_bytes or config.BATCH_RECOGNIZE_MAX_FILE_BYTES
+    items = []
+    for info in archive.infolist():
+        basename = os.path.basename(info.filename)
+        if info.is_dir() or not basename or basename.startswith(".") or info.filename.startswith("__MACOSX/"):
+            continue
+        if not is_image_filename(basename):
+            continue
+        items.append((info.filename, _zip_reader(archive, info, max_file_bytes)))
+    return items
+
+
+def _zip_reader(archive, info, max_file_bytes):
+    """返回读取压缩包中单个文件的函数（ZipFile的读取是线程安全的）"""
+    def read():
+        if info.file_size > max_file_bytes:
+            raise ValueError(f"文件过大: 解压后 {info.file_size} 字节，上限 {max_file_bytes} 字节")
+        return archive.read(info)
+    return read
+
+
+def _decode_and_detect(load, detection_profile):
+    """
+    读取、解码一张图片并检测人脸（在线程池中执行）
+
+    Returns:
+        dict: 成功时包含face_boxes、face_images（复制出的人脸裁剪，整幅图像随即释放）和scale；
+              失败时包含error和error_stage（"decode"或"detect"）
+    """
+    try:
+        image, scale = decode_upload(load())
+    except Exception as e:
+        return {"error": f"图像解析失败: {str(e)}", "error_stage": "decode"}
+
+    face_boxes, face_images, _ = detect_face(image, profile=detection_profile)
+    if not face_images:
+        return {"error": "未检测到人脸", "error_stage": "detect"}
+    return {
+        "face_boxes": face_boxes,
+        "face_images": [face.copy() for face in face_images],
+        "scale": scale,
+    }
+
+
+def _embed_and_match(pending, batch_size):
+    """
+    把多张图片的人脸合并成共享批次提取特征，再逐张图片组装识别结果
+
+    Args:
+        pending (list): (序号, 文件名, _decode_and_detect的成功结果) 列表
+        batch_size (int): FaceNet单次推理的最大批次大小
+
+    Yields:
+        dict: 每张图片的识别结果，格式见recognize_batch
+    """
+    try:
+        gallery = face_gallery.snapshot()
+        faces = [face for _, _, detection in pending for face in detection["face_images"]]
+        # 特征库为空时不需要提取特征
+        features = extract_face_feature(faces, batch_size=batch_size) if gallery.active.any() else []
+    except Exception as e:
+        for index, filename, _ in pending:
+            yield {"index": index, "filename": filename, "result": None, "error": f"特征提取失败: {str(e)}", "error_stage": "embed"}
+        return
+
+    offset = 0
+    for index, filename, detection in pending:
+        count = len(detection["face_images"])
+        result = build_recognition_result(detection["face_boxes"], features[offset:offset + count], gallery)
+        offset += count
+        if detection["scale"] != 1.0:
+            # 人脸框映射回原图坐标
+            result["face_boxes"] = [scale_box(box, 1 / detection["scale"]) for box in result["face_boxes"]]
+        yield {"index": index, "filename": filename, "result": result, "error": None, "error_stage": None}
+
+
+def recognize_batch(items, detection_profile=None, workers=None, batch_size=None):
+    """
+    批量识别图片中的人脸，按完成顺序逐张产出结果
+
+    Args:
+        items (iterable): (文件名, 读取函数) 元组，读取函数返回图片文件内容，在工作线程中按需调用
+        detection_profile (str, optional): 人脸检测档位，默认config.ENDPOINT_DETECTION_PROFILES["recognize_batch"]
+        workers (int, optional): 解码和检测的线程数，默认config.BATCH_RECOGNIZE_WORKERS
+        batch_size (int, optional): FaceNet单次推理的最大批次大小，默认config.EMBEDDING_BATCH_SIZE
+
+    Yields:
+        dict: 每张图片的识别结果
+            - index (int): 图片在items中的序号
+            - filename (str): 文件名
+            - result (dict or None): 与recognize_face格式相同的识别结果，face_boxes为原图坐标
+            - error (str or None): 错误信息
+            - error_stage (str or None): 出错的阶段，"decode"、"detect"或"embed"
+    """
+    detection_profile = detection_profile or config.ENDPOINT_DETECTION_PROFILES["recognize_batch"]
+    workers = max(1, int(workers or config.BATCH_RECOGNIZE_WORKERS))
+    batch_size = max(1, int(batch_size or config.EMBEDDING_BATCH_SIZE))
+    # 在途图片数上限：保证检测线程不空闲，同时限制已解码但未提取特征的图片占用的内存
+    max_in_flight = workers * 2
+
+    items = enumerate(items)
+    futures = {}
+    pending = []  # 已完成检测、等待提取特征的图片
+    pending_faces = 0
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-recognize")
+    try:
+        while True:
+            while len(futures) < max_in_flight:
+                item = next(items, None)
+                if item is None:
+                    break
+                index, (filename, load) = item
+                futures[executor.submit(_decode_and_detect, load, detection_profile)] = (index, filename)
+
+            if not futures and not pending:
+                break
+
+            done = set()
+            if futures:
+                # 有等待提取特征的人脸时只收集已经完成的检测，不阻塞等待
+                done, _ = wait(futures, timeout=0 if pending else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, filename = futures.pop(future)
+                try:
+                    detection = future.result()
+                except Exception as e:
+                    detection = {"error": f"人脸检测失败: {str(e)}", "error_stage": "detect"}
+                if "error" in detection:
+                    yield {"index": index, "filename": filename, "result": None, **detection}
+                else:
+                    pending.append((index, filename, detection))
+                    pending_faces += len(detection["face_images"])
+
+            # 凑满一个批次、暂时没有新完成的检测或全部检测已完成时提取特征
+            if pending and (pending_faces >= batch_size or not done or not futures):
+                yield from _embed_and_match(pending, batch_size)
+                pending, pending_faces = [], 0
+    finally:
+        # 调用方提前停止迭代（如客户端断开连接）时取消尚未开始的任务
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,640 @@
+"""批量注册模块 - 持久化在SQLite中的异步批量注册任务
+
+逐张调用register_face注册数千张照片时，每张照片单独提取特征（批次大小为1）、单独查询一次特征库、
+单独提交一次事务。批量注册任务把照片按config.BULK_REGISTER_CHUNK_SIZE分批，每批按流水线处理：
+1. 读取 + 解码 + 人脸检测 + 质量检查：线程池（config.BULK_REGISTER_WORKERS）并行处理，
+   当前批次提取特征和入库期间，下一批已经在检测
+2. 特征提取：整批人脸合并成FaceNet批次
+3. 唯一性校验：整批特征与特征库做一次矩阵比对（FaceGallery.match_many），
+   批内再两两比对，与同一批中已通过校验的照片重复的同样阻断
+4. 入库：人脸图片写入磁盘、特征追加到特征存储后，在一个事务中插入整批用户、更新各条目的结果和任务进度，
+   提交后一次性登记到内存特征库（变更日志同样在一个事务中写入）
+
+任务和条目保存在数据库中（RegistrationJob、RegistrationJobItem），照片暂存在config.BULK_REGISTER_JOB_DIR。
+每批的条目结果与用户记录在同一个事务中提交，进程中断时未提交的批次仍是pending状态，
+重启后任务执行器重新认领任务，从未处理的条目继续，已注册的照片不会重复注册。
+
+典型用法：
+    from app.utils.bulk_registration import bulk_registration_runner
+
+    job = bulk_registration_runner.create_job([
+        {"filename": "张三.jpg", "name": "张三", "user_id": None, "load": file.read},
+    ])
+    bulk_registration_runner.submit(job["job_id"])
+    status = bulk_registration_runner.get_job(job["job_id"])
+"""
+import os
+import re
+import shutil
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from ..config import config
+from ..models.models import RegistrationJob, RegistrationJobItem, SessionLocal, User
+from .data_process import MIN_CONFIDENCE_THRESHOLD, MIN_FACE_SIZE, generate_unique_identity_id
+from .face_gallery import face_gallery
+from .face_utils import decode_upload, detect_face, encode_jpeg, extract_face_feature, weight_similarities
+from .feature_store import feature_store
+
+
+# 任务状态和条目状态
+JOB_STATUSES = ("queued", "running", "completed", "failed")
+ITEM_STATUSES = ("pending", "registered", "blocked", "failed")
+
+# 指定身份ID的格式，与注册接口的校验相同：USR+年月日+序号
+USER_ID_PATTERN = re.compile(r"^USR\d{12}$")
+
+
+def _owner():
+    """当前进程的标识（主机名:进程号），gunicorn工作进程fork后进程号不同"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(owner):
+    """
+    判断任务的执行进程是否仍在运行
+
+    只能检查同一主机上的进程；其他主机上的进程视为存活，依靠心跳超时判断。
+    """
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def detect_registration_face(image, detection_profile):
+    """
+    检测人脸并检查注册质量要求
+
+    质量要求与register_face相同：只使用第一张人脸，置信度不低于MIN_CONFIDENCE_THRESHOLD，
+    边长不小于MIN_FACE_SIZE。
+
+    Args:
+        image (numpy.array): (H, W, 3) uint8 RGB数组
+        detection_profile (str): 人脸检测档位
+
+    Returns:
+        dict: 成功时包含face（复制出的人脸裁剪，不引用整幅图像），失败时包含error
+    """
+    _, face_images, confidences = detect_face(image, profile=detection_profile)
+    if not face_images:
+        return {"error": "未检测到人脸"}
+
+    confidence = confidences[0] if confidences else 0
+    if confidence < MIN_CONFIDENCE_THRESHOLD:
+        return {"error": f"人脸图像质量不满足要求，置信度 {confidence:.2f}，要求不低于 {MIN_CONFIDENCE_THRESHOLD}"}
+    face_height, face_width = face_images[0].shape[:2]
+    if face_width < MIN_FACE_SIZE or face_height < MIN_FACE_SIZE:
+        return {"error": f"人脸图像尺寸过小，{face_width}x{face_height}px，要求不小于 {MIN_FACE_SIZE}x{MIN_FACE_SIZE}px"}
+    return {"face": face_images[0].copy()}
+
+
+def _load_face(path, detection_profile):
+    """
+    读取、解码一张照片，检测人脸并检查注册质量要求（在线程池中执行）
+
+    Returns:
+        dict: 格式见detect_registration_face，解码失败时包含error
+    """
+    try:
+        with open(path, "rb") as f:
+            image, _ = decode_upload(f.read())
+    except Exception as e:
+        return {"error": f"图像解析失败: {str(e)}"}
+    return detect_registration_face(image, detection_profile)
+
+
+def job_to_dict(job):
+    """把任务记录转换为接口返回的字典"""
+    def fmt(value):
+        return value.strftime("%Y-%m-%d %H:%M:%S") if value else None
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "registered": job.registered,
+        "blocked": job.blocked,
+        "failed": job.failed,
+        "progress": round(job.processed / job.total, 4) if job.total else 1.0,
+        "message": job.message or "",
+        "created_at": fmt(job.created_at),
+        "updated_at": fmt(job.updated_at),
+        "finished_at": fmt(job.finished_at),
+    }
+
+
+def item_to_dict(item):
+    """把条目记录转换为接口返回的字典（阻断的条目附带已注册的相似用户）"""
+    data = {
+        "index": item.position,
+        "filename": item.filename,
+        "name": item.name,
+        "status": item.status,
+        "user_id": item.identity_id if item.status == "registered" else None,
+        "message": item.message or "",
+    }
+    if item.status == "blocked":
+        data["matched_user"] = {
+            "user_id": item.matched_identity_id,
+            "name": item.matched_name,
+            "similarity": item.similarity,
+        }
+    return data
+
+
+class BulkRegistrationRunner:
+    """
+    批量注册任务执行器 - 每个进程一个后台线程，从数据库认领并执行任务
+
+    认领通过带条件的UPDATE完成（只有状态和执行进程与读取时一致才更新），
+    多个gunicorn工作进程同时检查时只有一个能认领成功。
+    可认领的任务：排队中的任务；运行中但执行进程已退出（同一主机）或超过
+    config.BULK_REGISTER_STALE_SECONDS没有心跳的任务。每批入库时刷新心跳，并确认任务仍归本进程所有。
+    """
+
+    def __init__(self, session_factory=None, gallery=None, store=None):
+        """
+        初始化任务执行器（后台线程在start()或submit()时启动）
+
+        Args:
+            session_factory (callable, optional): 数据库会话工厂，默认SessionLocal
+            gallery (FaceGallery, optional): 人脸特征库，默认全局face_gallery
+            store (FeatureStore, optional): 特征存储，默认全局feature_store
+        """
+        self._session_factory = session_factory if session_factory is not None else SessionLocal
+        self._gallery = gallery if gallery is not None else face_gallery
+        self._store = store if store is not None else feature_store
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    @staticmethod
+    def job_dir(job_id):
+        """任务照片的暂存目录"""
+        return os.path.join(config.BULK_REGISTER_JOB_DIR, job_id)
+
+    def create_job(self, sources):
+        """
+        创建批量注册任务：照片写入暂存目录，任务和全部条目在一个事务中插入
+
+        Args:
+            sources (list): 照片列表，每项为字典
+                - filename (str): 文件名
+                - name (str): 用户名
+                - user_id (str or None): 指定的身份ID，None表示自动生成
+                - load (callable): 返回照片文件内容的函数，抛出异常时该条目直接记为失败
+
+        Returns:
+            dict: 任务信息，格式见job_to_dict
+        """
+        job_id = str(uuid.uuid4())
+        directory = self.job_dir(job_id)
+        os.makedirs(directory, exist_ok=True)
+
+        items = []
+        for position, source in enumerate(sources):
+            item = RegistrationJobItem(
+                job_id=job_id, position=position, filename=source["filename"][:255],
+                name=(source.get("name") or "").strip()[:100], identity_id=source.get("user_id") or None,
+                status="pending"
+            )
+            error = None
+            if not item.name:
+                error = "用户名不能为空"
+            if not error and item.identity_id and not USER_ID_PATTERN.match(item.identity_id):
+                error = "身份ID格式错误，正确格式：USR+年月日+4位序号"
+            if not error:
+                try:
+                    data = source["load"]()
+                    extension = os.path.splitext(source["filename"])[1].lower()[:10]
+                    item.source_path = os.path.join(directory, f"{position:06d}{extension}")
+                    with open(item.source_path, "wb") as f:
+                        f.write(data)
+                except Exception as e:
+                    error = f"读取文件失败: {str(e)}"
+            if error:
+                item.status, item.message, item.source_path = "failed", error, None
+            items.append(item)
+
+        failed = sum(1 for item in items if item.status == "failed")
+        job = RegistrationJob(
+            id=job_id, status="queued", total=len(items), processed=failed, failed=failed
+        )
+        db = self._session_factory()
+        try:
+            db.add(job)
+            db.add_all(items)
+            db.commit()
+            return job_to_dict(job)
+        except Exception:
+            db.rollback()
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        finally:
+            db.close()
+
+    def get_job(self, job_id, status=None, offset=0, limit=100):
+        """
+        查询任务进度和条目结果
+
+        Args:
+            job_id (str): 任务ID
+            status (str, optional): 只返回该状态的条目
+            offset (int): 条目分页偏移
+            limit (int): 条目分页大小
+
+        Returns:
+            dict or None: 任务不存在时返回None
+                - job: 任务信息，格式见job_to_dict
+                - items: 按序号排列的条目结果（分页）
+                - duplicates: 因人脸已注册被阻断的条目（最多limit条）
+        """
+        db = self._session_factory()
+        try:
+            job = db.query(RegistrationJob).filter(RegistrationJob.id == job_id).first()
+            if job is None:
+                return None
+            query = db.query(RegistrationJobItem).filter(RegistrationJobItem.job_id == job_id)
+            items = query
+            if status:
+                items = items.filter(RegistrationJobItem.status == status)
+            items = items.order_by(RegistrationJobItem.position).offset(offset).limit(limit).all()
+            duplicates = (
+                query.filter(RegistrationJobItem.status == "blocked")
+                .order_by(RegistrationJobItem.position).limit(limit).all()
+            )
+            return {
+                "job": job_to_dict(job),
+                "items": [item_to_dict(item) for item in items],
+                "duplicates": [item_to_dict(item) for item in duplicates],
+            }
+        finally:
+            db.close()
+
+    def start(self):
+        """启动本进程的后台线程（已启动时不重复启动；fork出的子进程中重新启动）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name="bulk-register", daemon=True)
+            self._thread.start()
+
+    def submit(self, job_id):
+        """
+        通知后台线程有新任务（任务已由create_job写入数据库）
+
+        Args:
+            job_id (str): 任务ID
+        """
+        self.start()
+        self._wake.set()
+
+    def _loop(self):
+        """后台线程：依次执行可认领的任务，空闲时等待新任务或定期检查"""
+        while True:
+            try:
+                while self.run_next():
+                    pass
+            except Exception as e:
+                print(f"❌ 批量注册任务执行器出错: {str(e)}")
+            self._wake.wait(config.BULK_REGISTER_POLL_SECONDS)
+            self._wake.clear()
+
+    def run_next(self):
+        """
+        认领并执行一个任务
+
+        Returns:
+            bool: 是否执行了任务
+        """
+        job_id = self._claim()
+        if job_id is None:
+            return False
+        self.run_job(job_id)
+        return True
+
+    def _claimable(self, job, now):
+        """判断任务是否可被本进程认领"""
+        if job.status == "queued":
+            return True
+        stale = job.heartbeat_at is None or now - job.heartbeat_at > timedelta(seconds=config.BULK_REGISTER_STALE_SECONDS)
+        return job.owner != _owner() and (stale or not _owner_alive(job.owner))
+
+    def _claim(self):
+        """
+        认领最早创建的可认领任务
+
+        Returns:
+            str or None: 认领到的任务ID
+        """
+        now = datetime.now()
+        db = self._session_factory()
+        try:
+            jobs = (
+                db.query(RegistrationJob)
+                .filter(RegistrationJob.status.in_(["queued", "running"]))
+                .order_by(RegistrationJob.created_at).all()
+            )
+            for job in jobs:
+                if not self._claimable(job, now):
+                    continue
+                claimed = db.query(RegistrationJob).filter(
+                    RegistrationJob.id == job.id,
+                    RegistrationJob.status == job.status,
+                    RegistrationJob.owner.is_(None) if job.owner is None else RegistrationJob.owner == job.owner
+                ).update({"status": "running", "owner": _owner(), "heartbeat_at": now}, synchronize_session=False)
+                db.commit()
+                if claimed:
+                    if job.status == "running":
+                        print(f"🔁 接管批量注册任务 {job.id}（原执行进程 {job.owner}）")
+                    return job.id
+            return None
+        finally:
+            db.close()
+
+    def _pending_items(self, job_id, after):
+        """读取序号大于after的下一批待处理条目（脱离会话的普通字典）"""
+        db = self._session_factory()
+        try:
+            items = (
+                db.query(RegistrationJobItem)
+                .filter(
+                    RegistrationJobItem.job_id == job_id,
+                    RegistrationJobItem.status == "pending",
+                    RegistrationJobItem.position > after
+                )
+                .order_by(RegistrationJobItem.position)
+                .limit(max(1, int(config.BULK_REGISTER_CHUNK_SIZE)))
+                .all()
+            )
+            return [
+                {
+                    "id": item.id, "position": item.position, "filename": item.filename,
+                    "name": item.name, "identity_id": item.identity_id, "source_path": item.source_path,
+                }
+                for item in items
+            ]
+        finally:
+            db.close()
+
+    def run_job(self, job_id):
+        """
+        执行已认领的任务，直到全部条目处理完毕、任务被其他进程接管或出错
+
+        读取 + 解码 + 检测在线程池中执行：提交当前批次的检测后先提交下一批的检测，
+        再等待当前批次完成并提取特征、入库，检测与特征提取、入库重叠执行。
+
+        Args:
+            job_id (str): 任务ID
+        """
+        detection_profile = config.ENDPOINT_DETECTION_PROFILES["register_bulk"]
+        workers = max(1, int(config.BULK_REGISTER_WORKERS))
+        print(f"📥 开始执行批量注册任务 {job_id}")
+
+        def submit_chunk(after):
+            items = self._pending_items(job_id, after)
+            return [(item, executor.submit(_load_face, item["source_path"], detection_profile)) for item in items]
+
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-register")
+        try:
+            chunk = submit_chunk(-1)
+            while chunk:
+                next_chunk = submit_chunk(chunk[-1][0]["position"])
+                if not self._process_chunk(job_id, chunk):
+                    print(f"⚠️ 批量注册任务 {job_id} 已被其他进程接管，停止执行")
+                    return
+                chunk = next_chunk
+            self._finish(job_id, "completed")
+        except Exception as e:
+            print(f"❌ 批量注册任务 {job_id} 执行失败: {str(e)}")
+            self._finish(job_id, "failed", message=str(e)[:255])
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _process_chunk(self, job_id, chunk):
+        """
+        等待一批照片检测完成，批量提取特征、校验唯一性，并在一个事务中入库
+
+        Args:
+            job_id (str): 任务ID
+            chunk (list): (条目字典, 检测任务future) 列表
+
+        Returns:
+            bool: 是否提交成功；任务已不归本进程所有时返回False（本批不写入）
+        """
+        outcomes = {}  # 条目ID -> 要更新的字段
+        faces = []
+        for item, future in chunk:
+            try:
+                detection = future.result()
+            except Exception as e:
+                detection = {"error": f"人脸检测失败: {str(e)}"}
+            if "error" in detection:
+                outcomes[item["id"]] = {"status": "failed", "message": detection["error"]}
+            else:
+                faces.append((item, detection["face"]))
+
+        features = []
+        if faces:
+            try:
+                features = extract_face_feature([face for _, face in faces])
+            except Exception as e:
+                for item, _ in faces:
+                    outcomes[item["id"]] = {"status": "failed", "message": f"特征提取失败: {str(e)}"}
+                faces = []
+
+        accepted = self._check_uniqueness(faces, features, outcomes)
+        return self._commit_chunk(job_id, chunk, accepted, outcomes)
+
+    def _check_uniqueness(self, faces, features, outcomes):
+        """
+        整批特征与特征库做一次矩阵比对，再在批内两两比对
+
+        Args:
+            faces (list): (条目字典, 人脸裁剪) 列表
+            features (list): 与faces对应的特征向量列表
+            outcomes (dict): 阻断的条目写入该字典
+
+        Returns:
+            list: 通过校验的 (条目字典, 人脸裁剪, 特征向量) 列表
+        """
+        if not faces:
+            return []
+        threshold = config.UNIQUENESS_THRESHOLD
+        matrix = np.asarray(features, dtype=np.float32)
+        snapshot = self._gallery.snapshot()
+        rows, similarities = self._gallery.match_many(matrix, threshold, snapshot=snapshot)
+        # 批内两两相似度（特征已L2归一化）
+        pairwise = weight_similarities(matrix @ matrix.T, threshold)
+
+        accepted = []
+        accepted_indices = []
+        for i, (item, face) in enumerate(faces):
+            if rows[i] >= 0:
+                outcomes[item["id"]] = {
+                    "status": "blocked",
+                    "message": "该人脸已注册，不可重复注册",
+                    "matched_identity_id": snapshot.identity_ids[rows[i]],
+                    "matched_name": snapshot.names[rows[i]],
+                    "similarity": float(similarities[i]),
+                }
+                continue
+            duplicate = next((j for j in accepted_indices if pairwise[i, j] >= threshold), None)
+            if duplicate is not None:
+                original = faces[duplicate][0]
+                outcomes[item["id"]] = {
+                    "status": "blocked",
+                    "message": f"与同一任务中的照片 '{original['filename']}' 是同一人",
+                    "duplicate_of": original,  # 身份ID在入库时才分配
+                    "matched_name": original["name"],
+                    "similarity": float(pairwise[i, duplicate]),
+                }
+                continue
+            accepted_indices.append(i)
+            accepted.append((item, face, features[i]))
+        return accepted
+
+    def _commit_chunk(self, job_id, chunk, accepted, outcomes):
+        """
+        写入人脸图片和特征，在一个事务中插入用户、特征库变更日志、更新条目结果和任务进度，提交后登记到特征库
+
+        指定的身份ID已被占用（或与同一批中的照片重复）的条目记为失败。
+        身份ID在事务中分配；自动生成的ID写回条目，批内重复检测据此引用同一人。
+
+        Returns:
+            bool: 是否提交成功；任务已不归本进程所有时回滚并返回False
+        """
+        db = self._session_factory()
+        written = []
+        try:
+            requested = [item["identity_id"] for item, _, _ in accepted if item["identity_id"]]
+            taken = set()
+            if requested:
+                taken = {
+                    identity_id for (identity_id,) in
+                    db.query(User.identity_id).filter(User.identity_id.in_(requested)).all()
+                }
+
+            users = []
+            for item, face, feature in accepted:
+                identity_id = item["identity_id"]
+                if identity_id and identity_id in taken:
+                    outcomes[item["id"]] = {"status": "failed", "message": f"身份ID '{identity_id}' 已存在"}
+                    continue
+                if not identity_id:
+                    identity_id = generate_unique_identity_id(db)
+                    while identity_id in taken:
+                        identity_id = generate_unique_identity_id(db)
+                taken.add(identity_id)
+                item["identity_id"] = identity_id
+
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                image_path = os.path.join(config.FACE_IMAGE_DIR, f"{item['name']}_{timestamp}_{str(uuid.uuid4())[:8]}.jpg")
+                os.makedirs(config.FACE_IMAGE_DIR, exist_ok=True)
+                with open(image_path, "wb") as f:
+                    f.write(encode_jpeg(face, quality=95))
+                written.append(image_path)
+                users.append((item, feature, User(
+                    name=item["name"], identity_id=identity_id, feature_path=self._store.path, image_path=image_path
+                )))
+
+            # 特征一次追加，失败或回滚时留下的行未被任何用户引用，视为无效行
+            rows = self._store.append_many([feature for _, feature, _ in users]) if users else []
+            for (item, _, user), row in zip(users, rows):
+                user.feature_row = row
+            db.add_all([user for _, _, user in users])
+            db.flush()
+            entries = []
+            for item, _, user in users:
+                outcomes[item["id"]] = {
+                    "status": "registered", "message": "注册成功", "user_id": user.id, "identity_id": user.identity_id
+                }
+                entries.append((user.id, user.identity_id, user.name, user.feature_row))
+            versions = self._gallery.journal_adds(db, entries)
+
+            for item, _ in chunk:
+                outcome = dict(outcomes[item["id"]])
+                duplicate_of = outcome.pop("duplicate_of", None)
+                if duplicate_of is not None:
+                    outcome["matched_identity_id"] = duplicate_of["identity_id"]
+                outcome["source_path"] = None
+                db.query(RegistrationJobItem).filter(RegistrationJobItem.id == item["id"]).update(
+                    outcome, synchronize_session=False
+                )
+
+            counts = {status: 0 for status in ITEM_STATUSES}
+            for outcome in outcomes.values():
+                counts[outcome["status"]] += 1
+            owned = db.query(RegistrationJob).filter(
+                RegistrationJob.id == job_id, RegistrationJob.owner == _owner()
+            ).update({
+                "processed": RegistrationJob.processed + len(chunk),
+                "registered": RegistrationJob.registered + counts["registered"],
+                "blocked": RegistrationJob.blocked + counts["blocked"],
+                "failed": RegistrationJob.failed + counts["failed"],
+                "heartbeat_at": datetime.now(),
+                "updated_at": datetime.now(),
+            }, synchronize_session=False)
+            if not owned:
+                db.rollback()
+                self._remove_files(written)
+                return False
+            db.commit()
+        except Exception:
+            db.rollback()
+            self._remove_files(written)
+            raise
+        finally:
+            db.close()
+
+        self._gallery.add_many(entries, versions)
+        self._remove_files([item["source_path"] for item, _ in chunk if item["source_path"]])
+        print(
+            f"📦 批量注册任务 {job_id}: 本批 {len(chunk)} 张，注册 {counts['registered']}，"
+            f"阻断 {counts['blocked']}，失败 {counts['failed']}"
+        )
+        return True
+
+    @staticmethod
+    def _remove_files(paths):
+        """删除文件，忽略不存在的文件"""
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _finish(self, job_id, status, message=None):
+        """把本进程执行的任务标记为完成或失败；完成时删除照片暂存目录"""
+        db = self._session_factory()
+        try:
+            db.query(RegistrationJob).filter(
+                RegistrationJob.id == job_id, RegistrationJob.owner == _owner()
+            ).update({
+                "status": status, "message": message, "finished_at": datetime.now(), "updated_at": datetime.now()
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        if status == "completed":
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+            print(f"✅ 批量注册任务 {job_id} 已完成")
+
+
+# 进程级任务执行器实例
+bulk_registration_runner = BulkRegistrationRunner()
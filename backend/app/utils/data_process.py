@@ -7,12 +7,15 @@
     from app.utils.data_process import register_face, recognize_face
     from PIL import Image
     
-    # 注册人脸
+    # 注册人脸（也可以传入decode_image解码得到的RGB数组）
     image = Image.open('user_photo.jpg')
     result = register_face("张三", image)
     
     # 识别人脸
     recognition_result = recognize_face(image)
+    
+    # 检索最相似的k个用户
+    search_result = search_face(image, k=5)
 """
 import os
 import sys
@@ -30,16 +33,27 @@ if __name__ == "__main__":
     sys.path.insert(0, backend_dir)
     from app.config import config
     from app.models.models import User, get_db, SessionLocal
-    from app.utils.face_utils import detect_face, extract_face_feature, save_face_feature, load_face_feature, compare_face_features
+    from app.utils.face_utils import decode_image, detect_face, extract_face_feature, encode_jpeg, save_face_feature, load_face_feature, compare_face_features
     from app.utils.user_id_generator import generate_new_user_id, validate_user_id_format, check_user_id_uniqueness
     from app.utils.user_data_manager import delete_user, delete_users
+    from app.utils.face_gallery import face_gallery
+    from app.utils.face_uniqueness_check import face_uniqueness_checker
+    from app.utils.feature_store import feature_store
 else:
     # 作为模块导入时使用相对导入
     from app.utils.user_data_manager import delete_user, delete_users
     from ..config import config
     from ..models.models import User, get_db, SessionLocal
-    from .face_utils import detect_face, extract_face_feature, save_face_feature, load_face_feature, compare_face_features
+    from .face_utils import decode_image, detect_face, extract_face_feature, encode_jpeg, save_face_feature, load_face_feature, compare_face_features
     from .user_id_generator import generate_new_user_id, validate_user_id_format, check_user_id_uniqueness
+    from .face_gallery import face_gallery
+    from .face_uniqueness_check import face_uniqueness_checker
+    from .feature_store import feature_store
+
+
+# 注册时的人脸质量要求（单张注册和批量注册共用）
+MIN_CONFIDENCE_THRESHOLD = 0.85  # 人脸检测置信度下限
+MIN_FACE_SIZE = 100  # 人脸裁剪的最小边长（像素）
 
 
 def generate_unique_identity_id(db):
@@ -66,7 +80,7 @@ def generate_unique_identity_id(db):
     return identity_id
 
 
-def register_face(name, image, identity_id=None):
+def register_face(name, image, identity_id=None, detection_profile=None, face_box=None):
     """
     人脸注册函数 - 注册新用户并保存人脸信息，并实施严格的人脸与身份ID绑定机制
     
@@ -77,12 +91,19 @@ def register_face(name, image, identity_id=None):
     4. 生成唯一文件名和路径
     5. 自动生成或验证唯一身份ID
     6. 保存用户信息到数据库
-    7. 保存人脸图片和特征向量到文件系统
+    7. 保存人脸图片，并把特征向量追加到特征矩阵文件
+    8. 同步更新内存特征库
+    
+    整幅图像只在人脸检测期间保留：选定的人脸裁剪复制出来后即释放整幅图像，
+    特征提取和入库时只持有人脸裁剪；保存时只编码这一张人脸裁剪。
+    传入图片文件内容时在函数内解码（调用方不持有解码后的整幅图像，裁剪后即可回收）。
     
     Args:
         name (str): 用户名
-        image (PIL.Image): 用户人脸图片
+        image (PIL.Image, numpy.array or bytes): 用户人脸图片，PIL图像、(H, W, 3) uint8 RGB数组或图片文件内容
         identity_id (str, optional): 身份ID，如不提供则自动生成唯一ID
+        detection_profile (str, optional): 人脸检测档位（config.DETECTION_PROFILES），默认config.DEFAULT_DETECTION_PROFILE
+        face_box (tuple, optional): 客户端给出的人脸框 (x1, y1, x2, y2)，提供时只在人脸框附近检测人脸
         
     Returns:
         dict: 注册结果信息
@@ -102,11 +123,19 @@ def register_face(name, image, identity_id=None):
     if identity_id is not None and not isinstance(identity_id, str):
         raise ValueError("[注册阻断] 身份ID必须是字符串类型。请不指定身份ID以自动生成，或输入有效的字符串格式身份ID。")
     
-    if not isinstance(image, Image.Image):
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        try:
+            image = decode_image(image)
+        except ValueError as e:
+            raise ValueError(f"[注册阻断] 图像解码失败: {str(e)}。请提供有效的图像文件。")
+    
+    if not isinstance(image, (Image.Image, np.ndarray)):
         raise ValueError("[注册阻断] 图片格式无效。请提供有效的图像文件。")
     
     # 人脸检测 - 实现严格的面部检测与验证
-    face_boxes, face_images, confidences = detect_face(image)
+    face_boxes, face_images, confidences = detect_face(image, profile=detection_profile, roi=face_box)
+    # 之后只通过检测结果中的裁剪视图引用整幅图像
+    del image
     
     # 检查是否检测到人脸
     if not face_images:
@@ -117,17 +146,17 @@ def register_face(name, image, identity_id=None):
         print(f"⚠️ 检测到{len(face_images)}张人脸，只使用第一张人脸进行注册")
     
     face_box = face_boxes[0]
-    face_image = face_images[0]
+    # 复制选定的人脸裁剪，释放整幅图像和其他人脸
+    face_image = face_images[0].copy()
+    del face_images
     confidence = confidences[0] if confidences else 0
     
     # 增强人脸质量验证 - 要求更高的置信度
-    MIN_CONFIDENCE_THRESHOLD = 0.85
     if confidence < MIN_CONFIDENCE_THRESHOLD:
         raise ValueError(f"[注册阻断] 人脸图像质量不满足要求。当前置信度为: {confidence:.2f}，要求最低置信度: {MIN_CONFIDENCE_THRESHOLD}。请重新拍摄，确保人脸清晰可见，光线充足，避免遮挡。")
     
     # 验证人脸图像尺寸 - 确保人脸足够大且清晰
-    face_width, face_height = face_image.size
-    MIN_FACE_SIZE = 100  # 最小人脸尺寸要求
+    face_height, face_width = face_image.shape[:2]
     if face_width < MIN_FACE_SIZE or face_height < MIN_FACE_SIZE:
         raise ValueError(f"[注册阻断] 人脸图像尺寸过小。检测到人脸尺寸: {face_width}x{face_height}px，要求最小尺寸: {MIN_FACE_SIZE}x{MIN_FACE_SIZE}px。请将人脸靠近摄像头，确保人脸占据画面的主要部分。")
     
@@ -161,40 +190,20 @@ def register_face(name, image, identity_id=None):
                 identity_id = generate_unique_identity_id(db)
         
         # 2. 人脸唯一性校验机制 - 核心的'一人一脸一ID'实现
-        # 验证当前人脸是否已存在于系统中
-        existing_users = db.query(User).all()
-        db_features = []
-        db_users = []
-        
-        for user in existing_users:
-            try:
-                existing_feature = load_face_feature(user.feature_path)
-                if existing_feature is not None:
-                    db_features.append(existing_feature)
-                    db_users.append(user)
-            except Exception as e:
-                print(f"⚠️ 加载用户 '{user.name}' 的特征向量失败: {str(e)}")
-                continue
+        # 与FaceUniquenessChecker共用同一次特征库查询（大特征库时经由近似最近邻索引）
+        similar_users, _ = face_uniqueness_checker.find_similar_users(
+            feature_vector,
+            threshold=config.UNIQUENESS_THRESHOLD,  # 比默认识别阈值0.55更严格
+            with_image_path=False
+        )
         
-        # 如果数据库中有特征向量，进行人脸唯一性校验
-        if db_features:
-            # 使用更高的阈值来确保唯一性（比识别阈值更严格）
-            UNIQUENESS_THRESHOLD = 0.50  # 比默认识别阈值0.55更严格
+        if similar_users:
+            # 找到匹配的用户，获取最相似的用户信息
+            matched_name = similar_users[0]["user_name"]
+            matched_identity_id = similar_users[0]["user_id"]
             
-            # 比较当前人脸特征与数据库中的所有特征
-            matches, max_similarity = compare_face_features(
-                feature_vector, 
-                db_features, 
-                threshold=UNIQUENESS_THRESHOLD
-            )
-            
-            if matches:
-                # 找到匹配的用户，获取最相似的用户信息
-                best_match_index = matches[0][0]
-                matched_user = db_users[best_match_index]
-                
-                # 阻断机制：发现人脸已注册，立即终止注册
-                raise ValueError(f"[注册阻断] 该人脸已注册，不可重复注册。根据'一人一脸一ID'原则，当前人脸已与身份ID '{matched_user.identity_id}' (用户: {matched_user.name}) 绑定。如需更新信息，请使用现有身份ID进行更新操作。")
+            # 阻断机制：发现人脸已注册，立即终止注册
+            raise ValueError(f"[注册阻断] 该人脸已注册，不可重复注册。根据'一人一脸一ID'原则，当前人脸已与身份ID '{matched_identity_id}' (用户: {matched_name}) 绑定。如需更新信息，请使用现有身份ID进行更新操作。")
         
         # 3. 生成文件路径和文件名
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -204,23 +213,20 @@ def register_face(name, image, identity_id=None):
         image_filename = f"{name}_{timestamp}_{unique_id}.jpg"
         image_path = os.path.join(config.FACE_IMAGE_DIR, image_filename)
         
-        # 保存特征向量
-        feature_filename = f"{name}_{timestamp}_{unique_id}.npy"
-        feature_path = os.path.join(config.DATA_DIR, "features", feature_filename)
-        
         # 确保目录存在
         os.makedirs(config.FACE_IMAGE_DIR, exist_ok=True)
-        os.makedirs(os.path.dirname(feature_path), exist_ok=True)
         
-        # 4. 保存数据
-        face_image.save(image_path, "JPEG", quality=95)
-        save_face_feature(feature_vector, feature_path)
+        # 4. 保存数据 - 特征向量追加到统一的特征矩阵文件
+        with open(image_path, "wb") as f:
+            f.write(encode_jpeg(face_image, quality=95))
+        feature_row = feature_store.append(feature_vector)
         
         # 5. 创建用户记录 - 完成'一人一脸一ID'绑定
         new_user = User(
             name=name,
             identity_id=identity_id,  # 严格绑定身份ID
-            feature_path=feature_path,
+            feature_path=feature_store.path,
+            feature_row=feature_row,
             image_path=image_path
         )
         
@@ -228,6 +234,9 @@ def register_face(name, image, identity_id=None):
         db.commit()
         db.refresh(new_user)
         
+        # 6. 同步更新内存特征库
+        face_gallery.add(new_user.id, identity_id, name, feature_row)
+        
         return {
             "success": True,
             "user_id": new_user.id,
@@ -245,20 +254,155 @@ def register_face(name, image, identity_id=None):
         db.close()
 
 
-def recognize_face(image):
+def build_recognition_result(face_boxes, feature_vectors, gallery):
+    """
+    根据检测到的人脸和特征向量组装识别结果（recognize_face和批量识别共用）
+    
+    Args:
+        face_boxes (list): 一张图片中的人脸坐标列表 [(x1, y1, x2, y2), ...]
+        feature_vectors (list): 与face_boxes顺序一致的归一化特征向量，缺少的视为特征提取失败；特征库为空时可为空列表
+        gallery (GallerySnapshot): 特征库快照（face_gallery.snapshot()）
+        
+    Returns:
+        dict: 识别结果，格式见recognize_face
+    """
+    if not gallery.active.any():
+        return {
+            "total_count": len(face_boxes),
+            "matched_count": 0,
+            "unmatched_count_db": 0,
+            "matched_names": [],
+            "unmatched_names_db": [],
+            "face_boxes": face_boxes,
+            "match_details": []
+        }
+    
+    user_names = list(gallery.names[gallery.active])
+    
+    features = [
+        feature_vectors[i] if i < len(feature_vectors) else None
+        for i in range(len(face_boxes))
+    ]
+    
+    # 多人脸联合分配：一次计算 人脸数×特征库 的相似度矩阵，保证同一用户不会被分配给两张人脸
+    assignment_method = config.RECOGNITION_ASSIGNMENT
+    if assignment_method:
+        assignments, max_similarities = face_gallery.assign(
+            features,
+            threshold=config.RECOGNITION_THRESHOLD,
+            method=assignment_method,
+            snapshot=gallery
+        )
+    
+    # 处理每张人脸
+    match_details = []
+    matched_names = set()
+    
+    for i, face_box in enumerate(face_boxes):
+        current_feature = features[i]
+        if current_feature is None:
+            match_details.append({
+                "face_index": i,
+                "matched_user": None,
+                "similarity": float(0.0),  # 确保是Python原生float
+                "face_box": face_box,
+                "error": "特征提取失败"
+            })
+            continue
+        
+        if assignment_method:
+            best_row, best_similarity = assignments[i]
+            max_similarity = max_similarities[i]
+            matches = [(best_row, best_similarity)] if best_row is not None else []
+        else:
+            # 与特征库中的所有特征进行矩阵化比对（大特征库时经由近似最近邻索引）
+            matches, max_similarity = face_gallery.match(
+                current_feature, 
+                threshold=config.RECOGNITION_THRESHOLD,
+                snapshot=gallery
+            )
+        
+        if matches:
+            # 找到匹配的用户
+            best_match_index = matches[0][0]  # 最匹配的特征库行索引
+            best_match_name = gallery.names[best_match_index]
+            best_similarity = matches[0][1]
+            
+            matched_names.add(best_match_name)
+            
+            match_details.append({
+                "face_index": i,
+                "matched_user": best_match_name,
+                "similarity": float(best_similarity),  # 确保转换为Python原生float
+                "face_box": face_box,
+                "error": None
+            })
+            
+            print(f"✅ 人脸 {i+1}: 匹配到用户 '{best_match_name}' (相似度: {best_similarity:.3f})")
+        else:
+            # 未找到匹配（联合分配时可能是候选用户已分配给相似度更高的人脸）
+            error = "候选用户已匹配给其他人脸" if max_similarity > 0 else "未找到匹配用户"
+            match_details.append({
+                "face_index": i,
+                "matched_user": None,
+                "similarity": float(max_similarity),  # 确保转换为Python原生float
+                "face_box": face_box,
+                "error": error
+            })
+            
+            print(f"❌ 人脸 {i+1}: {error} (最高相似度: {max_similarity:.3f})")
+    
+    # 统计结果
+    total_count = len(face_boxes)
+    matched_count = len(matched_names)
+    # 修正计算：数据库中存在但未出现在当前识别中的用户数
+    unmatched_count_db = len(user_names) - matched_count
+    
+    # 获取数据库中未出现的用户名
+    all_db_names = set(user_names)
+    matched_names_list = list(matched_names)
+    unmatched_names_db = list(all_db_names - matched_names)
+    
+    # 转换人脸框为Python原生类型（如果是NumPy数组）
+    if face_boxes:
+        # 确保face_boxes中的每个元素都是包含Python原生类型的元组
+        processed_face_boxes = []
+        for box in face_boxes:
+            # 处理不同情况的人脸框数据
+            if isinstance(box, (list, tuple, np.ndarray)):
+                processed_face_boxes.append(tuple(float(coord) for coord in box))
+            else:
+                processed_face_boxes.append(box)  # 如果是其他类型，保持不变
+        face_boxes = processed_face_boxes
+    else:
+        face_boxes = []
+    
+    return {
+        "total_count": total_count,
+        "matched_count": matched_count,
+        "unmatched_count_db": unmatched_count_db,
+        "matched_names": matched_names_list,
+        "unmatched_names_db": unmatched_names_db,
+        "face_boxes": face_boxes,
+        "match_details": match_details
+    }
+
+
+def recognize_face(image, detection_profile=None):
     """
     人脸识别函数 - 从图片中识别人脸并返回匹配结果
     
     处理流程：
     1. 验证输入参数
     2. 检测图片中的所有人脸
-    3. 提取每个人脸的特征向量
-    4. 加载数据库中所有用户的特征向量
-    5. 对比特征向量找出最匹配的用户
+    3. 批量提取所有人脸的特征向量
+    4. 从内存特征库获取所有用户的特征向量
+    5. 对比特征向量找出最匹配的用户（默认多人脸联合分配，一个用户最多匹配一张人脸）
     6. 统计并返回匹配结果
     
     Args:
-        image (PIL.Image): 待识别的图片
+        image (PIL.Image or numpy.array): 待识别的图片，PIL图像或(H, W, 3) uint8 RGB数组
+        detection_profile (str, optional): 人脸检测档位（config.DETECTION_PROFILES），默认config.DEFAULT_DETECTION_PROFILE
         
     Returns:
         dict: 识别结果
@@ -280,147 +424,86 @@ def recognize_face(image):
         Exception: 当数据库操作失败时抛出
     """
     # 参数验证
-    if not isinstance(image, Image.Image):
-        raise ValueError("图片必须是PIL.Image对象")
+    if not isinstance(image, (Image.Image, np.ndarray)):
+        raise ValueError("图片必须是PIL.Image对象或RGB numpy数组")
     
     # 人脸检测
-    face_boxes, face_images, _ = detect_face(image)
+    face_boxes, face_images, _ = detect_face(image, profile=detection_profile)
     
     # 检查是否检测到人脸
     if not face_images:
         raise ValueError("未检测到人脸")
     
-    # 创建数据库会话
-    db = SessionLocal()
     try:
-        # 获取所有用户
-        all_users = db.query(User).all()
-        
-        if not all_users:
-            return {
-                "total_count": len(face_images),
-                "matched_count": 0,
-                "unmatched_count_db": 0,
-                "matched_names": [],
-                "unmatched_names_db": [],
-                "face_boxes": face_boxes,
-                "match_details": []
-            }
-        
-        # 加载所有用户的特征向量
-        user_features = []
-        user_names = []
-        
-        for user in all_users:
-            try:
-                feature = load_face_feature(user.feature_path)
-                if feature is not None:
-                    user_features.append(feature)
-                    user_names.append(user.name)
-            except Exception as e:
-                print(f"⚠️ 加载用户 '{user.name}' 的特征向量失败: {str(e)}")
-                continue
+        # 从内存特征库获取所有用户特征（首次调用时才会读取数据库和特征文件）
+        gallery = face_gallery.snapshot()
         
-        if not user_features:
-            raise ValueError("数据库中没有有效的特征向量")
+        # 一次批量提取所有人脸的特征（特征库为空时不需要提取）
+        all_feature_vectors = extract_face_feature(face_images) if gallery.active.any() else []
         
-        # 处理每张人脸
-        match_details = []
-        matched_names = set()
-        
-        for i, (face_image, face_box) in enumerate(zip(face_images, face_boxes)):
-            # 提取当前人脸的特征
-            feature_vectors = extract_face_feature([face_image])
-            if not feature_vectors:
-                match_details.append({
-                    "face_index": i,
-                    "matched_user": None,
-                    "similarity": float(0.0),  # 确保是Python原生float
-                    "face_box": face_box,
-                    "error": "特征提取失败"
-                })
-                continue
-            
-            current_feature = feature_vectors[0]
-            
-            # 与数据库中的特征进行比对
-            matches, max_similarity = compare_face_features(
-                current_feature, 
-                user_features, 
-                threshold=config.RECOGNITION_THRESHOLD
-            )
-            
-            if matches:
-                # 找到匹配的用户
-                best_match_index = matches[0][0]  # 最匹配的索引
-                best_match_name = user_names[best_match_index]
-                best_similarity = matches[0][1]
-                
-                matched_names.add(best_match_name)
-                
-                match_details.append({
-                    "face_index": i,
-                    "matched_user": best_match_name,
-                    "similarity": float(best_similarity),  # 确保转换为Python原生float
-                    "face_box": face_box,
-                    "error": None
-                })
-                
-                print(f"✅ 人脸 {i+1}: 匹配到用户 '{best_match_name}' (相似度: {best_similarity:.3f})")
-            else:
-                # 未找到匹配
-                match_details.append({
-                    "face_index": i,
-                    "matched_user": None,
-                    "similarity": float(max_similarity),  # 确保转换为Python原生float
-                    "face_box": face_box,
-                    "error": "未找到匹配用户"
-                })
-                
-                print(f"❌ 人脸 {i+1}: 未找到匹配用户 (最高相似度: {max_similarity:.3f})")
-        
-        # 统计结果
-        total_count = len(face_images)
-        matched_count = len(matched_names)
-        # 修正计算：数据库中存在但未出现在当前识别中的用户数
-        unmatched_count_db = len(user_names) - matched_count
-        
-        # 获取数据库中未出现的用户名
-        all_db_names = set(user_names)
-        matched_names_list = list(matched_names)
-        unmatched_names_db = list(all_db_names - matched_names)
-        
-        # 转换人脸框为Python原生类型（如果是NumPy数组）
-        if face_boxes:
-            # 确保face_boxes中的每个元素都是包含Python原生类型的元组
-            processed_face_boxes = []
-            for box in face_boxes:
-                # 处理不同情况的人脸框数据
-                if isinstance(box, (list, tuple, np.ndarray)):
-                    processed_face_boxes.append(tuple(float(coord) for coord in box))
-                else:
-                    processed_face_boxes.append(box)  # 如果是其他类型，保持不变
-            face_boxes = processed_face_boxes
-        else:
-            face_boxes = []
-        
-        return {
-            "total_count": total_count,
-            "matched_count": matched_count,
-            "unmatched_count_db": unmatched_count_db,
-            "matched_names": matched_names_list,
-            "unmatched_names_db": unmatched_names_db,
-            "face_boxes": face_boxes,
-            "match_details": match_details
-        }
+        return build_recognition_result(face_boxes, all_feature_vectors, gallery)
         
     except ValueError:
         # 重新抛出参数验证错误
         raise
     except Exception as e:
         raise Exception(f"数据库操作失败: {str(e)}")
-    finally:
-        db.close()
+
+
+def search_face(image, k=5, detection_profile=None):
+    """
+    人脸检索函数 - 返回与图片中人脸最相似的k个已注册用户
+    
+    与recognize_face不同，检索不使用识别阈值，而是按相似度返回前k个候选，
+    适用于人工复核、疑似重复注册排查等场景。图片中有多张人脸时只检索第一张。
+    
+    Args:
+        image (PIL.Image or numpy.array): 待检索的图片，PIL图像或(H, W, 3) uint8 RGB数组
+        k (int): 返回的候选用户数量，默认为5
+        detection_profile (str, optional): 人脸检测档位（config.DETECTION_PROFILES），默认config.DEFAULT_DETECTION_PROFILE
+        
+    Returns:
+        dict: 检索结果
+            - face_box (tuple): 被检索人脸的坐标 (x1, y1, x2, y2)
+            - total_count (int): 特征库中的有效用户数
+            - results (list): 候选用户列表，按相似度降序排列
+                - user_id (str): 用户身份ID
+                - name (str): 用户名
+                - similarity (float): 余弦相似度
+                
+    Raises:
+        ValueError: 当输入参数无效、未检测到人脸或特征提取失败时抛出
+    """
+    if not isinstance(image, (Image.Image, np.ndarray)):
+        raise ValueError("图片必须是PIL.Image对象或RGB numpy数组")
+    if not isinstance(k, int) or k <= 0:
+        raise ValueError("k必须是正整数")
+    
+    face_boxes, face_images, _ = detect_face(image, profile=detection_profile)
+    if not face_images:
+        raise ValueError("未检测到人脸")
+    
+    feature_vectors = extract_face_feature([face_images[0]])
+    if not feature_vectors or feature_vectors[0] is None or not np.any(feature_vectors[0]):
+        raise ValueError("没有有效特征向量")
+    
+    gallery = face_gallery.snapshot()
+    hits = face_gallery.search(feature_vectors[0], k=k, snapshot=gallery)
+    
+    results = [
+        {
+            "user_id": gallery.identity_ids[row],
+            "name": gallery.names[row],
+            "similarity": round(similarity, 4)
+        }
+        for row, similarity in hits
+    ]
+    
+    return {
+        "face_box": tuple(float(coord) for coord in face_boxes[0]),
+        "total_count": int(np.count_nonzero(gallery.active)),
+        "results": results
+    }
 
 
 # 测试和示例代码
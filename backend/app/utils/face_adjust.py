@@ -49,8 +49,8 @@ class FaceAdjustment:
             # 保存原始图像
             self.image_data = image
             
-            # 使用优化后的人脸检测函数
-            face_boxes, _, confidences = detect_face(image, target_region)
+            # 使用优化后的人脸检测函数（提供目标区域时只在该区域附近检测）
+            face_boxes, _, confidences = detect_face(image, target_region, roi=target_region)
             
             # 转换PIL Image为OpenCV格式进行处理
             cv_image = np.array(image)
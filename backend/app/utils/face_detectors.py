@@ -0,0 +1,175 @@
+"""人脸检测后端模块 - detect_face使用的可替换检测器
+
+原实现使用mtcnn库（依赖TensorFlow）检测人脸、facenet_pytorch（依赖PyTorch）提取特征，
+每个工作进程同时加载两套深度学习运行时，常驻内存翻倍且两者的线程池相互争抢CPU。
+facenet_pytorch自带PyTorch实现的MTCNN，切换到该后端后整个进程只需要PyTorch。
+
+所有后端返回与mtcnn库相同格式的检测结果：
+    [{'box': [x, y, width, height], 'confidence': float}, ...]
+detect_face在此基础上完成裁剪、扩展和排序，因此切换后端不影响上层接口。
+
+检测参数（最小人脸、阈值、金字塔缩放因子）在创建检测器时指定，
+face_utils按config.DETECTION_PROFILES中的检测档位分别创建并缓存检测器。
+
+后端通过config.FACE_DETECTOR_BACKEND选择：
+- "mtcnn_tf": mtcnn库（TensorFlow），默认
+- "facenet_pytorch": facenet_pytorch.MTCNN（PyTorch），支持同尺寸图片批量检测
+
+典型用法：
+    from app.utils.face_detectors import create_detector
+
+    detector = create_detector("facenet_pytorch")
+    results = detector.detect(rgb_array)
+"""
+import numpy as np
+
+
+# 默认检测参数（两个后端保持一致）
+MIN_FACE_SIZE = 15  # 降低最小人脸大小以检测更远距离或更小的人脸
+STEP_THRESHOLDS = [0.6, 0.7, 0.75]  # P-Net/R-Net/O-Net三阶段阈值，提高准确性，减少误判
+SCALE_FACTOR = 0.7  # 图像金字塔缩放因子，以更好地处理不同大小的人脸
+
+
+class FaceDetector:
+    """
+    人脸检测器基类
+
+    Attributes:
+        NAME (str): 后端名称
+        FORK_SAFE (bool): 加载后能否安全地fork（决定gunicorn主进程能否预加载）
+        FRAMEWORK (str): 使用的推理框架（加载前按thread_budget设置该框架的线程数）
+    """
+
+    NAME = None
+    FORK_SAFE = False
+    FRAMEWORK = None
+
+    def detect(self, image):
+        """
+        检测单张图片中的人脸
+
+        Args:
+            image (numpy.array): (H, W, 3) uint8 RGB图像
+
+        Returns:
+            list: [{'box': [x, y, width, height], 'confidence': float}, ...]
+        """
+        raise NotImplementedError
+
+    def detect_batch(self, images):
+        """
+        批量检测多张图片中的人脸（默认逐张检测）
+
+        Args:
+            images (list): (H, W, 3) uint8 RGB图像列表
+
+        Returns:
+            list: 与输入一一对应的检测结果列表
+        """
+        return [self.detect(image) for image in images]
+
+    def warmup(self):
+        """对一张灰色图片执行一次检测，触发框架的延迟初始化"""
+        self.detect(np.full((160, 160, 3), 128, dtype=np.uint8))
+
+
+class TFMTCNNDetector(FaceDetector):
+    """基于mtcnn库（TensorFlow）的检测器"""
+
+    NAME = "mtcnn_tf"
+    FORK_SAFE = False  # TensorFlow运行时初始化后不支持fork
+    FRAMEWORK = "tensorflow"
+
+    def __init__(self, min_face_size=MIN_FACE_SIZE, thresholds=STEP_THRESHOLDS, scale_factor=SCALE_FACTOR):
+        from mtcnn import MTCNN
+
+        self._mtcnn = MTCNN(
+            min_face_size=min_face_size,
+            steps_threshold=list(thresholds),
+            scale_factor=scale_factor
+        )
+
+    def detect(self, image):
+        return [
+            {"box": list(result["box"]), "confidence": float(result.get("confidence", 0))}
+            for result in self._mtcnn.detect_faces(image)
+        ]
+
+
+class TorchMTCNNDetector(FaceDetector):
+    """基于facenet_pytorch.MTCNN（PyTorch）的检测器，与FaceNet共用同一个运行时"""
+
+    NAME = "facenet_pytorch"
+    FORK_SAFE = True
+    FRAMEWORK = "torch"
+
+    def __init__(self, min_face_size=MIN_FACE_SIZE, thresholds=STEP_THRESHOLDS, scale_factor=SCALE_FACTOR, device="cpu"):
+        from facenet_pytorch import MTCNN
+
+        self._mtcnn = MTCNN(
+            keep_all=True,
+            min_face_size=min_face_size,
+            thresholds=list(thresholds),
+            factor=scale_factor,
+            post_process=False,
+            device=device
+        )
+
+    @staticmethod
+    def _to_results(boxes, probs):
+        """把(x1, y1, x2, y2)浮点坐标转换为mtcnn库的[x, y, width, height]整数格式"""
+        if boxes is None:
+            return []
+        results = []
+        for box, prob in zip(boxes, probs):
+            x1, y1, x2, y2 = (int(round(float(v))) for v in box)
+            results.append({"box": [x1, y1, x2 - x1, y2 - y1], "confidence": float(prob)})
+        return results
+
+    def detect(self, image):
+        boxes, probs = self._mtcnn.detect(image)
+        return self._to_results(boxes, probs)
+
+    def detect_batch(self, images):
+        """同尺寸的图片一次送入网络批量检测，尺寸不同时逐张检测"""
+        if len(images) > 1 and len({image.shape for image in images}) == 1:
+            batch_boxes, batch_probs = self._mtcnn.detect(np.stack(images))
+            return [self._to_results(boxes, probs) for boxes, probs in zip(batch_boxes, batch_probs)]
+        return super().detect_batch(images)
+
+    def warmup(self):
+        """预热检测只使用单线程，避免gunicorn主进程在fork前创建线程池"""
+        import torch
+
+        num_threads = torch.get_num_threads()
+        torch.set_num_threads(1)
+        try:
+            super().warmup()
+        finally:
+            torch.set_num_threads(num_threads)
+
+
+# 支持的检测后端
+DETECTOR_BACKENDS = {
+    TFMTCNNDetector.NAME: TFMTCNNDetector,
+    TorchMTCNNDetector.NAME: TorchMTCNNDetector,
+}
+
+
+def create_detector(name, **params):
+    """
+    按名称创建人脸检测器
+
+    Args:
+        name (str): 后端名称，"mtcnn_tf"或"facenet_pytorch"
+        **params: 检测参数min_face_size、thresholds、scale_factor（未指定时使用模块默认值）
+
+    Returns:
+        FaceDetector: 检测器实例
+
+    Raises:
+        ValueError: 当后端名称不支持时抛出
+    """
+    if name not in DETECTOR_BACKENDS:
+        raise ValueError(f"不支持的人脸检测后端: {name}")
+    return DETECTOR_BACKENDS[name](**params)
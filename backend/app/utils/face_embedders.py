@@ -0,0 +1,270 @@
+"""人脸特征提取后端模块 - extract_face_feature使用的可替换FaceNet推理后端
+
+extract_face_feature负责人脸预处理和特征归一化，后端只负责把预处理后的批次张量映射为512维特征：
+    embed((B, 3, 160, 160) float32数组，取值[-1, 1]) -> (B, 512) float32数组（未归一化）
+
+后端通过config.EMBEDDER_BACKEND选择：
+- "torch": facenet_pytorch的InceptionResnetV1，PyTorch eager模式执行，默认
+- "torchscript": 导出并冻结的TorchScript模型（torch.jit.freeze），省去Python层的逐模块调度开销
+- "onnx": 导出的ONNX模型，使用onnxruntime的CPU执行器，推理进程不需要PyTorch
+- "int8_dynamic": 加载时对eager模型做动态int8量化（只量化全连接层，卷积层仍为float32，无需导出）
+- "int8_static": 用已注册人脸图片校准的静态int8量化模型（卷积层也量化，导出为TorchScript）
+
+torchscript、onnx和int8_static后端的模型文件由导出命令一次性生成，导出时自动与eager模型做一致性校验：
+    python -m app.tools.export_embedder --format onnx
+
+量化后端会带来特征偏移，启用前可用评估工具检查对现有特征库匹配结果的影响：
+    python -m app.tools.eval_quantized_embedder --backend int8_static
+
+典型用法：
+    from app.utils.face_embedders import create_embedder
+
+    embedder = create_embedder("onnx")
+    features = embedder.embed(batch)
+"""
+import os
+
+import numpy as np
+
+from ..config import config
+from .thread_budget import compute_thread_budget
+
+
+# FaceNet输入尺寸
+INPUT_SHAPE = (3, 160, 160)
+EMBEDDING_SIZE = 512
+
+
+class FaceEmbedder:
+    """
+    人脸特征提取器基类
+
+    Attributes:
+        NAME (str): 后端名称
+        FORK_SAFE (bool): 加载后能否安全地fork（决定gunicorn主进程能否预加载）
+        FRAMEWORK (str): 使用的推理框架（加载前按thread_budget设置该框架的线程数）
+    """
+
+    NAME = None
+    FORK_SAFE = False
+    FRAMEWORK = None
+
+    def embed(self, batch):
+        """
+        提取一个批次的人脸特征
+
+        Args:
+            batch (numpy.array): (B, 3, 160, 160) float32数组，取值范围[-1, 1]
+
+        Returns:
+            numpy.array: (B, 512) float32特征矩阵（未归一化）
+        """
+        raise NotImplementedError
+
+    def warmup(self):
+        """执行一次空推理，触发框架的延迟初始化"""
+        self.embed(np.zeros((1, *INPUT_SHAPE), dtype=np.float32))
+
+
+class TorchEmbedder(FaceEmbedder):
+    """facenet_pytorch的InceptionResnetV1（PyTorch eager模式）"""
+
+    NAME = "torch"
+    FORK_SAFE = True
+    FRAMEWORK = "torch"
+
+    def __init__(self, model=None):
+        if model is None:
+            from facenet_pytorch import InceptionResnetV1
+
+            # 加载预训练的InceptionResnetV1模型，设置为评估模式
+            model = InceptionResnetV1(pretrained='vggface2').eval()
+        self.model = model
+
+    def embed(self, batch):
+        import torch
+
+        with torch.no_grad():  # 关闭梯度计算，提高性能
+            return self.model(torch.from_numpy(np.ascontiguousarray(batch, dtype=np.float32))).cpu().numpy()
+
+    def warmup(self):
+        """预热推理只使用单线程，避免gunicorn主进程在fork前创建线程池"""
+        import torch
+
+        num_threads = torch.get_num_threads()
+        torch.set_num_threads(1)
+        try:
+            super().warmup()
+        finally:
+            torch.set_num_threads(num_threads)
+
+
+class TorchScriptEmbedder(TorchEmbedder):
+    """导出并冻结的TorchScript模型"""
+
+    NAME = "torchscript"
+    FORMAT = "torchscript"
+
+    def __init__(self, model_path=None):
+        model_path = model_path or default_model_path(self.FORMAT)
+        _check_model_file(model_path, self.FORMAT)
+
+        import torch
+
+        model = torch.jit.load(model_path, map_location="cpu").eval()
+        super().__init__(model)
+
+
+class DynamicInt8Embedder(TorchEmbedder):
+    """eager模型加载后做动态int8量化（torch.ao.quantization.quantize_dynamic）
+
+    动态量化只支持全连接层，InceptionResnetV1的计算量主要在卷积层，加速有限；
+    需要量化卷积层时使用int8_static后端。
+    """
+
+    NAME = "int8_dynamic"
+
+    def __init__(self, model=None):
+        import torch
+
+        select_quantized_engine()
+        super().__init__(model)
+        self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class StaticInt8Embedder(TorchScriptEmbedder):
+    """用已注册人脸图片校准并导出的静态int8量化模型（TorchScript）"""
+
+    NAME = "int8_static"
+    FORMAT = "int8_static"
+
+    def __init__(self, model_path=None):
+        # 量化算子的实现引擎需要在加载模型前确定，与导出时保持一致
+        select_quantized_engine()
+        super().__init__(model_path)
+
+
+class ONNXEmbedder(FaceEmbedder):
+    """导出的ONNX模型，使用onnxruntime CPU执行器"""
+
+    NAME = "onnx"
+    FORMAT = "onnx"
+    FORK_SAFE = False  # onnxruntime在创建会话时启动线程池，fork后的子进程中线程池不可用
+    FRAMEWORK = "onnxruntime"
+
+    def __init__(self, model_path=None):
+        model_path = model_path or default_model_path(self.FORMAT)
+        _check_model_file(model_path, self.FORMAT)
+
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if config.THREAD_BUDGET_ENABLED:
+            budget = compute_thread_budget()
+            options.intra_op_num_threads = budget["intra_op"]
+            options.inter_op_num_threads = budget["inter_op"]
+        self._session = onnxruntime.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_name = self._session.get_inputs()[0].name
+
+    def embed(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self._session.run(None, {self._input_name: batch})[0]
+
+
+# 支持的特征提取后端
+EMBEDDER_BACKENDS = {
+    TorchEmbedder.NAME: TorchEmbedder,
+    TorchScriptEmbedder.NAME: TorchScriptEmbedder,
+    ONNXEmbedder.NAME: ONNXEmbedder,
+    DynamicInt8Embedder.NAME: DynamicInt8Embedder,
+    StaticInt8Embedder.NAME: StaticInt8Embedder,
+}
+
+# 量化后端（一致性校验使用config.QUANTIZED_EMBEDDER_PARITY_THRESHOLD）
+QUANTIZED_BACKENDS = (DynamicInt8Embedder.NAME, StaticInt8Embedder.NAME)
+
+# 导出格式 -> 模型文件名
+MODEL_FILENAMES = {
+    TorchScriptEmbedder.FORMAT: "facenet_vggface2.torchscript.pt",
+    ONNXEmbedder.FORMAT: "facenet_vggface2.onnx",
+    StaticInt8Embedder.FORMAT: "facenet_vggface2.int8.torchscript.pt",
+}
+
+
+def select_quantized_engine():
+    """
+    选择并设置PyTorch量化算子引擎（x86使用fbgemm，ARM使用qnnpack）
+
+    Returns:
+        str: 引擎名称
+    """
+    import torch
+
+    engines = torch.backends.quantized.supported_engines
+    engine = "fbgemm" if "fbgemm" in engines else "qnnpack"
+    torch.backends.quantized.engine = engine
+    return engine
+
+
+def default_model_path(model_format):
+    """
+    导出模型的默认路径（config.EMBEDDER_MODEL_DIR下）
+
+    Args:
+        model_format (str): 导出格式，"torchscript"、"onnx"或"int8_static"
+
+    Returns:
+        str: 模型文件路径
+    """
+    return os.path.join(config.EMBEDDER_MODEL_DIR, MODEL_FILENAMES[model_format])
+
+
+def _check_model_file(model_path, model_format):
+    """导出模型不存在时给出导出命令提示"""
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(
+            f"找不到{model_format}模型文件: {model_path}，"
+            f"请先运行 python -m app.tools.export_embedder --format {model_format}"
+        )
+
+
+def create_embedder(name, model_path=None):
+    """
+    按名称创建人脸特征提取器
+
+    Args:
+        name (str): 后端名称，"torch"、"torchscript"、"onnx"、"int8_dynamic"或"int8_static"
+        model_path (str, optional): 导出模型路径（torchscript/onnx/int8_static），默认config.EMBEDDER_MODEL_DIR下的标准文件名
+
+    Returns:
+        FaceEmbedder: 特征提取器实例
+
+    Raises:
+        ValueError: 当后端名称不支持时抛出
+        FileNotFoundError: 当导出模型文件不存在时抛出
+    """
+    if name not in EMBEDDER_BACKENDS:
+        raise ValueError(f"不支持的特征提取后端: {name}")
+    if name in (TorchEmbedder.NAME, DynamicInt8Embedder.NAME):
+        return EMBEDDER_BACKENDS[name]()
+    return EMBEDDER_BACKENDS[name](model_path)
+
+
+def embedding_similarity(reference, candidate):
+    """
+    逐行计算两组特征的余弦相似度（用于导出模型与eager模型的一致性校验）
+
+    Args:
+        reference (numpy.array): (B, 512) 参考特征
+        candidate (numpy.array): (B, 512) 待校验特征
+
+    Returns:
+        numpy.array: (B,) 每个样本的余弦相似度
+    """
+    reference = np.asarray(reference, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    return np.sum(reference * candidate, axis=1) / np.where(norms > 0, norms, 1.0)
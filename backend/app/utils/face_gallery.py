@@ -0,0 +1,736 @@
+"""人脸特征库模块 - 进程内常驻的人脸特征矩阵
+
+识别和注册不再在每次请求时查询全部用户并逐个np.load特征文件，
+而是在首次使用时加载一次，之后在注册、删除时原地更新。
+
+特征矩阵直接使用特征存储文件（feature_store）的只读内存映射，
+第i行对应User.feature_row == i的用户；未被引用或已删除的行标记为无效。
+
+当config.ANN_INDEX_TYPE开启且特征库足够大时，比对先通过近似最近邻索引
+得到候选行，再对候选行做精确的余弦相似度重排。索引需要训练（k-means）时在后台线程中构建，
+构建期间继续暴力比对，完成后再原子地切换；多个工作进程通过文件锁只训练一次，其余进程加载保存的索引文件。
+
+当config.GALLERY_QUANTIZATION开启时（且未使用索引），粗筛在内存中的
+int8低精度副本上进行，再对前config.QUANTIZED_RERANK_K行用float32精确重排。
+
+多工作进程部署时，注册/删除会写入变更日志（gallery_sync），
+各进程在获取快照前只应用自己版本号之后的变更。
+
+典型用法：
+    from app.utils.face_gallery import face_gallery
+
+    matches, max_similarity = face_gallery.match(query_feature, threshold=0.55)
+"""
+import os
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+from ..config import config
+from ..models.models import SessionLocal, User
+from .ann_index import create_ann_index, load_ann_index
+from .face_utils import assign_face_features, match_face_features, top_k_face_features, weight_similarities
+from .feature_store import feature_store
+from .gallery_sync import gallery_journal
+from .quantization import QuantizedMatrix
+
+try:
+    import fcntl  # 仅POSIX系统可用，用于多进程只构建一次索引
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+# 特征库快照 - 只读视图，供识别/注册在一次请求内使用
+# features: (N, 512) float32，已L2归一化（特征存储文件的只读映射）
+# user_ids: (N,) int64，数据库User.id，无效行为-1
+# identity_ids / names: (N,) object数组
+# active: (N,) bool，False表示该行未被引用或已被删除（墓碑）
+GallerySnapshot = namedtuple(
+    "GallerySnapshot",
+    ["features", "user_ids", "identity_ids", "names", "active"]
+)
+
+
+class FaceGallery:
+    """
+    人脸特征库类 - 在内存中维护所有已注册用户的特征向量
+
+    特征矩阵来自特征存储文件的只读映射，本类只维护每一行对应的用户信息。
+    新增用户时重新映射已增长的文件，删除时只标记墓碑。
+    所有写操作持有锁，读操作通过snapshot()获取当前数据的视图。
+
+    Attributes:
+        FEATURE_DIM (int): 特征向量维度
+        INITIAL_CAPACITY (int): 用户信息数组的初始预留行数
+        MATCH_BLOCK_ROWS (int): 批量比对时每次参与矩阵乘法的特征库行数
+    """
+
+    FEATURE_DIM = 512
+    INITIAL_CAPACITY = 256
+    MATCH_BLOCK_ROWS = 16384
+
+    def __init__(self, store=None, journal=None):
+        """
+        初始化空的特征库（实际数据在首次使用时加载）
+
+        Args:
+            store (FeatureStore, optional): 特征存储，默认使用全局feature_store
+            journal (GalleryJournal, optional): 变更日志，默认使用全局gallery_journal
+        """
+        self._store = store if store is not None else feature_store
+        self._journal = journal if journal is not None else gallery_journal
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._index = None
+        self._index_thread = None
+        self._index_generation = 0  # 重新加载或清空时递增，之前开始的后台构建按新的数据重新训练
+        self._version = 0  # 已应用的变更日志版本号
+        self._reset_buffers(0)
+
+    def _reset_buffers(self, capacity):
+        """按给定容量重新分配用户信息数组"""
+        capacity = max(capacity, self.INITIAL_CAPACITY)
+        self._features = np.empty((0, self.FEATURE_DIM), dtype=np.float32)
+        self._user_ids = np.full(capacity, -1, dtype=np.int64)
+        self._identity_ids = np.empty(capacity, dtype=object)
+        self._names = np.empty(capacity, dtype=object)
+        self._active = np.zeros(capacity, dtype=bool)
+        self._quantized = None
+        self._count = 0
+        self._active_count = 0
+
+    def _grow(self, min_capacity):
+        """扩容用户信息数组（容量翻倍），保持已有行不变"""
+        capacity = len(self._user_ids)
+        if min_capacity <= capacity:
+            return
+        new_capacity = max(min_capacity, capacity * 2)
+
+        user_ids = np.full(new_capacity, -1, dtype=np.int64)
+        user_ids[:self._count] = self._user_ids[:self._count]
+        identity_ids = np.empty(new_capacity, dtype=object)
+        identity_ids[:self._count] = self._identity_ids[:self._count]
+        names = np.empty(new_capacity, dtype=object)
+        names[:self._count] = self._names[:self._count]
+        active = np.zeros(new_capacity, dtype=bool)
+        active[:self._count] = self._active[:self._count]
+
+        self._user_ids, self._identity_ids = user_ids, identity_ids
+        self._names, self._active = names, active
+
+    def _map_store(self):
+        """重新映射特征存储文件（文件增长后调用）"""
+        self._features = self._store.open_readonly()
+        self._grow(len(self._features))
+        self._count = len(self._features)
+        self._update_quantized()
+
+    def _update_quantized(self):
+        """按配置维护低精度粗筛矩阵，只量化新增的行"""
+        qtype = config.GALLERY_QUANTIZATION
+        if not qtype:
+            self._quantized = None
+            return
+        if self._quantized is None or self._quantized.qtype != qtype:
+            self._quantized = QuantizedMatrix(qtype)
+        done = len(self._quantized)
+        if done < self._count:
+            self._quantized.extend(self._features[done:self._count])
+
+    def _set_row(self, row, user_id, identity_id, name):
+        """登记某一行对应的用户信息"""
+        if not self._active[row]:
+            self._active_count += 1
+        self._user_ids[row] = user_id
+        self._identity_ids[row] = identity_id
+        self._names[row] = name
+        self._active[row] = True
+
+    def _migrate_legacy_users(self, db, users):
+        """
+        把旧版按用户单独保存的.npy特征导入特征存储
+
+        Args:
+            db: 数据库会话
+            users (list): feature_row为空的用户列表
+        """
+        migrated = 0
+        for user in users:
+            try:
+                feature = np.load(user.feature_path)
+            except Exception as e:
+                print(f"⚠️ 加载用户 '{user.name}' 的特征向量失败: {str(e)}")
+                continue
+            if feature.size != self.FEATURE_DIM:
+                print(f"⚠️ 用户 '{user.name}' 的特征向量维度异常: {feature.shape}")
+                continue
+            user.feature_row = self._store.append(feature)
+            migrated += 1
+        if migrated:
+            db.commit()
+            print(f"📦 已将 {migrated} 个旧版特征文件导入特征存储")
+
+    def load(self):
+        """
+        从数据库和特征存储全量加载特征库
+
+        旧版用户（feature_row为空）的特征文件会在这里一次性导入特征存储。
+        """
+        # 先读取版本号再查询用户，之后的变更在同步时重放（重放是幂等的）
+        version = self._latest_version()
+        db = SessionLocal()
+        try:
+            users = db.query(User).all()
+            legacy_users = [user for user in users if user.feature_row is None]
+            if legacy_users:
+                self._migrate_legacy_users(db, legacy_users)
+            entries = [
+                (user.feature_row, user.id, user.identity_id, user.name)
+                for user in users if user.feature_row is not None
+            ]
+        finally:
+            db.close()
+
+        with self._lock:
+            self._reset_buffers(len(self._store))
+            self._map_store()
+            for row, user_id, identity_id, name in entries:
+                if 0 <= row < self._count:
+                    self._set_row(row, user_id, identity_id, name)
+                else:
+                    print(f"⚠️ 用户 '{name}' 的特征行号无效: {row}")
+            self._setup_index()
+            self._version = version
+            self._loaded = True
+
+        print(f"📚 人脸特征库加载完成，共 {self._active_count} 个用户")
+
+    def _setup_index(self):
+        """
+        按配置准备近似最近邻索引（调用方持有锁）
+
+        已保存的索引文件直接加载并补齐保存之后新增/删除的行；
+        索引文件不存在或无法使用时在后台线程中构建，构建完成前继续暴力比对。
+        """
+        self._index = None
+        self._index_generation += 1
+        if not self._index_wanted():
+            return
+        index = self._load_saved_index()
+        if index is not None:
+            self._index = index
+        else:
+            self._schedule_index_build()
+
+    def _index_wanted(self):
+        """是否应启用索引：配置了索引类型且有效用户数达到config.ANN_MIN_GALLERY_SIZE"""
+        return bool(config.ANN_INDEX_TYPE) and self._active_count >= config.ANN_MIN_GALLERY_SIZE
+
+    def _load_saved_index(self):
+        """
+        加载已保存的索引文件并补齐保存之后的变化（调用方持有锁）
+
+        Returns:
+            ANNIndex or None: 索引文件不存在、类型不符或加载失败时为None
+        """
+        if not os.path.exists(config.ANN_INDEX_PATH):
+            return None
+        try:
+            index = load_ann_index(config.ANN_INDEX_PATH)
+        except Exception as e:
+            print(f"⚠️ 加载近似最近邻索引失败，将重新构建: {str(e)}")
+            return None
+        if index.INDEX_TYPE != config.ANN_INDEX_TYPE or index.centroids.shape[1] != self.FEATURE_DIM:
+            return None
+        self._catch_up_index(index)
+        return index
+
+    def _catch_up_index(self, index):
+        """把索引与当前的有效行对齐：移除已删除的行，加入尚未索引的行（调用方持有锁）"""
+        n = self._count
+        active = self._active[:n]
+        indexed = index.indexed_mask(n)
+        index.remove(np.flatnonzero(indexed & ~active))
+        new_rows = np.flatnonzero(active & ~indexed)
+        index.add(new_rows, self._features[new_rows])
+        index.nprobe = config.ANN_NPROBE
+
+    def _schedule_index_build(self):
+        """启动后台构建索引的线程（已有构建在进行时不重复启动，调用方持有锁）"""
+        if self._index_thread is not None and self._index_thread.is_alive():
+            return
+        self._index_thread = threading.Thread(target=self._build_index, name="ann-index-build", daemon=True)
+        self._index_thread.start()
+
+    @staticmethod
+    @contextmanager
+    def _index_file_lock():
+        """索引文件的进程间排他锁：同一时间只有一个工作进程训练索引"""
+        if fcntl is None:
+            yield
+            return
+        directory = os.path.dirname(config.ANN_INDEX_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(config.ANN_INDEX_PATH + ".lock", "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _build_index(self):
+        """
+        在后台线程中训练索引，完成后补齐构建期间的变化并切换
+
+        训练在特征库锁之外进行，期间识别和注册照常使用暴力比对；训练期间特征库被重新加载或清空时按新的数据重新训练。
+        持有文件锁期间若其他工作进程已保存了索引，直接加载该文件而不重复训练。
+        """
+        try:
+            with self._index_file_lock():
+                while True:
+                    with self._lock:
+                        if self._index is not None or not self._index_wanted():
+                            return
+                        index = self._load_saved_index()
+                        if index is not None:
+                            self._index = index
+                            return
+                        generation = self._index_generation
+                        n = self._count
+                        features = self._features[:n]
+                        active = self._active[:n].copy()
+
+                    index = create_ann_index(config.ANN_INDEX_TYPE, nlist=config.ANN_NLIST, nprobe=config.ANN_NPROBE)
+                    index.build(features, valid_mask=active)
+                    try:
+                        index.save(config.ANN_INDEX_PATH)
+                    except Exception as e:
+                        print(f"⚠️ 保存近似最近邻索引失败: {str(e)}")
+
+                    with self._lock:
+                        if generation != self._index_generation:
+                            continue
+                        self._catch_up_index(index)
+                        self._index = index
+                    break
+            print(f"🧭 近似最近邻索引构建完成，共 {len(index)} 行，{len(index.centroids)} 个簇")
+        except Exception as e:
+            print(f"⚠️ 构建近似最近邻索引失败，继续暴力比对: {str(e)}")
+
+    def wait_for_index(self, timeout=None):
+        """
+        等待正在进行的后台索引构建完成
+
+        Args:
+            timeout (float, optional): 最长等待秒数，默认一直等待
+
+        Returns:
+            bool: 当前是否已启用索引
+        """
+        thread = self._index_thread
+        if thread is not None:
+            thread.join(timeout)
+        return self._index is not None
+
+    def _latest_version(self):
+        """读取变更日志的最新版本号（同步关闭或日志不可用时返回0）"""
+        if not config.GALLERY_SYNC_ENABLED:
+            return 0
+        try:
+            return self._journal.latest_version()
+        except Exception as e:
+            print(f"⚠️ 读取特征库变更日志失败: {str(e)}")
+            return 0
+
+    def _publish(self, changes):
+        """
+        把本进程的变更写入变更日志，供其他工作进程同步
+
+        Args:
+            changes (list): 变更字典列表
+        """
+        if not config.GALLERY_SYNC_ENABLED or not changes:
+            return
+        try:
+            versions = self._journal.append_many(changes)
+        except Exception as e:
+            print(f"⚠️ 写入特征库变更日志失败: {str(e)}")
+            return
+        # 期间没有其他进程的变更时直接前移版本号，避免重放自己的变更
+        if versions and versions[0] == self._version + 1:
+            self._version = versions[-1]
+
+    def sync(self):
+        """
+        应用其他工作进程在本进程版本号之后的变更
+
+        只查询新增的变更记录并原地应用；日志记录已被清理或遇到清空操作时全量重新加载。
+        """
+        if not config.GALLERY_SYNC_ENABLED or not self._loaded:
+            return
+        with self._lock:
+            try:
+                changes, complete = self._journal.changes_since(self._version)
+            except Exception as e:
+                print(f"⚠️ 读取特征库变更日志失败: {str(e)}")
+                return
+            if not changes:
+                return
+            if not complete or any(change.op == "clear" for change in changes):
+                self.load()
+                return
+            for change in changes:
+                if change.op == "add":
+                    try:
+                        self._apply_add(change.user_id, change.identity_id, change.name, change.feature_row)
+                    except ValueError as e:
+                        print(f"⚠️ 同步用户 '{change.name}' 失败: {str(e)}")
+                elif change.op == "remove":
+                    self._apply_remove([change.identity_id])
+            self._version = changes[-1].id
+            print(f"🔄 已同步 {len(changes)} 条特征库变更，当前版本 {self._version}")
+
+    def ensure_loaded(self):
+        """如果尚未加载则执行全量加载"""
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self.load()
+
+    def reload(self):
+        """强制重新加载特征库"""
+        with self._lock:
+            self.load()
+
+    def snapshot(self):
+        """
+        获取当前特征库的只读快照
+
+        Returns:
+            GallerySnapshot: 特征矩阵及对应的用户信息数组
+        """
+        self.ensure_loaded()
+        self.sync()
+        with self._lock:
+            n = self._count
+            return GallerySnapshot(
+                features=self._features[:n],
+                user_ids=self._user_ids[:n].copy(),
+                identity_ids=self._identity_ids[:n].copy(),
+                names=self._names[:n].copy(),
+                active=self._active[:n].copy()
+            )
+
+    def add(self, user_id, identity_id, name, row):
+        """
+        登记一个新用户（其特征已写入特征存储）
+
+        Args:
+            user_id (int): 数据库用户ID
+            identity_id (str): 身份ID
+            name (str): 用户名
+            row (int): 特征存储中的行号
+        """
+        self.ensure_loaded()
+        with self._lock:
+            self._apply_add(user_id, identity_id, name, row)
+            self._publish([{
+                "op": "add", "user_id": user_id, "identity_id": identity_id, "name": name, "feature_row": row
+            }])
+
+    def add_many(self, entries, versions=None):
+        """
+        登记多个新用户（其特征已写入特征存储），变更日志在一个事务中写入
+
+        Args:
+            entries (list): (数据库用户ID, 身份ID, 用户名, 特征存储行号) 元组列表
+            versions (list, optional): 已随用户记录在同一事务中提交的变更日志版本号（journal_adds()的返回值），
+                提供时只更新本进程的特征库，不再写变更日志
+        """
+        if not entries:
+            return
+        self.ensure_loaded()
+        with self._lock:
+            for user_id, identity_id, name, row in entries:
+                self._apply_add(user_id, identity_id, name, row)
+            if versions is None:
+                self._publish(self._add_changes(entries))
+            elif versions and versions[0] == self._version + 1:
+                self._version = versions[-1]
+
+    def journal_adds(self, db, entries):
+        """
+        在调用方的数据库会话中写入新用户的变更日志（不提交）
+
+        与User记录在同一事务中提交：提交成功后即使本进程未能调用add_many()，
+        各工作进程（包括本进程）也会在下次同步时登记这些用户。
+
+        Args:
+            db (Session): 插入用户的数据库会话（已flush，用户ID已分配）
+            entries (list): (数据库用户ID, 身份ID, 用户名, 特征存储行号) 元组列表
+
+        Returns:
+            list: 变更日志版本号，提交后传给add_many(entries, versions)；同步关闭时为空列表
+        """
+        if not config.GALLERY_SYNC_ENABLED or not entries:
+            return []
+        return self._journal.add_to_session(db, self._add_changes(entries))
+
+    @staticmethod
+    def _add_changes(entries):
+        """把 (用户ID, 身份ID, 用户名, 行号) 元组转换为变更日志记录"""
+        return [
+            {"op": "add", "user_id": user_id, "identity_id": identity_id, "name": name, "feature_row": row}
+            for user_id, identity_id, name, row in entries
+        ]
+
+    def _apply_add(self, user_id, identity_id, name, row):
+        """在本进程的特征库中登记一行（不写变更日志）"""
+        if row is None or row >= self._count:
+            self._map_store()
+        if row is None or not 0 <= row < self._count:
+            raise ValueError(f"特征行号无效: {row}")
+        self._set_row(row, user_id, identity_id, name)
+        if self._index is not None:
+            self._index.add([row], self._features[row:row + 1])
+        elif self._index_wanted():
+            self._schedule_index_build()
+
+    def remove(self, identity_ids):
+        """
+        按身份ID删除用户特征（标记墓碑）
+
+        Args:
+            identity_ids (str or list): 单个身份ID或身份ID列表
+
+        Returns:
+            int: 实际删除的行数
+        """
+        if isinstance(identity_ids, str):
+            identity_ids = [identity_ids]
+        identity_ids = list(identity_ids)
+        with self._lock:
+            # 尚未加载时无需修改本进程数据，首次加载会直接读取数据库最新状态
+            removed = self._apply_remove(identity_ids) if self._loaded else 0
+            self._publish([{"op": "remove", "identity_id": identity_id} for identity_id in identity_ids])
+            return removed
+
+    def _apply_remove(self, identity_ids):
+        """在本进程的特征库中标记墓碑（不写变更日志）"""
+        n = self._count
+        hits = np.isin(self._identity_ids[:n], list(identity_ids)) & self._active[:n]
+        removed = int(hits.sum())
+        if removed:
+            self._active[:n][hits] = False
+            self._user_ids[:n][hits] = -1
+            self._active_count -= removed
+            if self._index is not None:
+                self._index.remove(np.flatnonzero(hits))
+        return removed
+
+    def clear(self):
+        """
+        清空特征库（删除全部用户后调用）
+
+        同时删除已保存的索引文件，之后重新加载或新启动的工作进程不会再加载旧数据上训练的索引。
+        与后台构建相同，先取得索引文件锁再取得特征库锁，正在进行的构建完成保存后才会删除。
+        """
+        with self._index_file_lock(), self._lock:
+            try:
+                os.remove(config.ANN_INDEX_PATH)
+            except OSError:
+                pass
+            self._reset_buffers(0)
+            self._map_store()
+            self._index = None
+            self._index_generation += 1
+            self._version = self._latest_version()
+            self._loaded = True
+            self._publish([{"op": "clear"}])
+
+    def _candidates(self, queries, snapshot, k=0):
+        """
+        为精确比对准备候选行
+
+        Args:
+            queries (list): 查询特征向量列表（None或全零向量会被跳过）
+            snapshot (GallerySnapshot): 使用的快照
+            k (int): 调用方至少需要的候选数（仅量化粗筛时使用）
+
+        Returns:
+            numpy.array or None: 升序的候选行号；None表示对全库精确比对
+        """
+        index = self._index
+        quantized = self._quantized
+        if index is None and quantized is None:
+            return None
+
+        queries = [feature for feature in queries if feature is not None and np.any(feature)]
+        if not queries:
+            return np.empty(0, dtype=np.int64)
+        if index is not None:
+            candidates = [index.search(feature) for feature in queries]
+        else:
+            rerank_k = max(k, config.QUANTIZED_RERANK_K)
+            candidates = [
+                quantized.top_candidates(feature, rerank_k, valid_mask=snapshot.active)
+                for feature in queries
+            ]
+        candidates = np.unique(np.concatenate(candidates))
+        return candidates[candidates < len(snapshot.features)]
+
+    def match(self, feature, threshold, snapshot=None):
+        """
+        在特征库中查找相似度达到阈值的用户
+
+        启用近似最近邻索引或量化粗筛时只对候选行做精确比对，
+        候选行的相似度与暴力比对完全一致，因此阈值判定保持不变。
+
+        Args:
+            feature (numpy.array): 512维查询特征向量
+            threshold (float): 相似度阈值
+            snapshot (GallerySnapshot, optional): 使用的快照，默认获取当前快照
+
+        Returns:
+            tuple: (匹配结果列表, 最高相似度)
+                - matches: [(特征库行索引, 相似度值), ...]，按相似度降序排列
+                - max_similarity: 最高相似度值
+        """
+        if snapshot is None:
+            snapshot = self.snapshot()
+        candidates = self._candidates([feature], snapshot)
+        if candidates is None:
+            return match_face_features(feature, snapshot.features, threshold=threshold, valid_mask=snapshot.active)
+
+        matches, max_similarity = match_face_features(
+            feature,
+            snapshot.features[candidates],
+            threshold=threshold,
+            valid_mask=snapshot.active[candidates]
+        )
+        return [(int(candidates[i]), similarity) for i, similarity in matches], max_similarity
+
+    def assign(self, features, threshold, method="greedy", snapshot=None):
+        """
+        为一帧中的多张人脸联合分配用户（一个用户最多分配给一张人脸）
+
+        启用近似最近邻索引或量化粗筛时，分配只在各人脸候选行的并集上进行。
+
+        Args:
+            features (list): 人脸特征向量列表（None表示该人脸特征提取失败）
+            threshold (float): 相似度阈值
+            method (str): 分配方法，"greedy"或"hungarian"
+            snapshot (GallerySnapshot, optional): 使用的快照，默认获取当前快照
+
+        Returns:
+            tuple: (分配结果列表, 最高相似度列表)，与assign_face_features相同，
+                行索引为特征库行号
+        """
+        if snapshot is None:
+            snapshot = self.snapshot()
+        candidates = self._candidates(features, snapshot, k=len(features))
+        if candidates is None:
+            return assign_face_features(
+                features, snapshot.features, threshold=threshold,
+                valid_mask=snapshot.active, method=method
+            )
+
+        assignments, max_similarities = assign_face_features(
+            features,
+            snapshot.features[candidates],
+            threshold=threshold,
+            valid_mask=snapshot.active[candidates],
+            method=method
+        )
+        assignments = [
+            (int(candidates[row]) if row is not None else None, similarity)
+            for row, similarity in assignments
+        ]
+        return assignments, max_similarities
+
+    def match_many(self, features, threshold, snapshot=None):
+        """
+        批量查找每个查询特征在特征库中最相似的用户
+
+        整批查询与特征库做矩阵乘法，按MATCH_BLOCK_ROWS行分块，大特征库时不会生成过大的相似度矩阵；
+        启用近似最近邻索引或量化粗筛时只在各查询候选行的并集上比对。
+        阈值判定（包括接近阈值时的加权）与match()一致。
+
+        Args:
+            features (numpy.array): (K, 512) 查询特征矩阵
+            threshold (float): 相似度阈值
+            snapshot (GallerySnapshot, optional): 使用的快照，默认获取当前快照
+
+        Returns:
+            tuple: (行号数组, 相似度数组)，形状均为(K,)
+                - rows: 达到阈值的最相似特征库行号，未达到阈值为-1
+                - similarities: 与最相似有效行的（加权后）相似度，特征库为空时为0.0
+        """
+        if snapshot is None:
+            snapshot = self.snapshot()
+        queries = np.asarray(features, dtype=np.float32).reshape(-1, self.FEATURE_DIM)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1.0)
+
+        rows = np.full(len(queries), -1, dtype=np.int64)
+        best = np.full(len(queries), -np.inf, dtype=np.float32)
+        candidates = self._candidates(list(queries), snapshot, k=1)
+        if candidates is None:
+            candidates = np.flatnonzero(snapshot.active)
+        else:
+            candidates = candidates[snapshot.active[candidates]]
+
+        for start in range(0, len(candidates), self.MATCH_BLOCK_ROWS):
+            block = candidates[start:start + self.MATCH_BLOCK_ROWS]
+            weighted = weight_similarities(queries @ snapshot.features[block].T, threshold)
+            block_best = weighted.argmax(axis=1)
+            block_similarities = weighted[np.arange(len(queries)), block_best]
+            better = block_similarities > best
+            best[better] = block_similarities[better]
+            rows[better] = block[block_best[better]]
+
+        best[np.isinf(best)] = 0.0
+        rows[best < threshold] = -1
+        return rows, best
+
+    def search(self, feature, k=5, snapshot=None):
+        """
+        检索与给定特征最相似的k个用户
+
+        启用近似最近邻索引或量化粗筛时只在候选行中选取前k个。
+
+        Args:
+            feature (numpy.array): 512维查询特征向量
+            k (int): 返回结果数量
+            snapshot (GallerySnapshot, optional): 使用的快照，默认获取当前快照
+
+        Returns:
+            list: [(特征库行索引, 相似度值), ...]，按相似度降序排列
+        """
+        if snapshot is None:
+            snapshot = self.snapshot()
+        candidates = self._candidates([feature], snapshot, k=k)
+        if candidates is None:
+            return top_k_face_features(feature, snapshot.features, k=k, valid_mask=snapshot.active)
+
+        results = top_k_face_features(
+            feature,
+            snapshot.features[candidates],
+            k=k,
+            valid_mask=snapshot.active[candidates]
+        )
+        return [(int(candidates[i]), similarity) for i, similarity in results]
+
+    def __len__(self):
+        """返回有效用户数"""
+        self.ensure_loaded()
+        self.sync()
+        return self._active_count
+
+
+# 进程级特征库实例
+face_gallery = FaceGallery()
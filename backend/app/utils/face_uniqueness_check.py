@@ -1,8 +1,12 @@
-"""人脸唯一性校验模块 - 提供人脸特征比对、唯一性校验和注册确认功能"""
-import sqlite3
-import numpy as np
+"""人脸唯一性校验模块 - 提供人脸特征比对、唯一性校验和注册确认功能
+
+相似用户查询直接使用进程内常驻的人脸特征库（face_gallery），
+注册流程（register_face）和本模块的校验接口共用同一次查询，结果一致。
+"""
 from app.config import Config
-from app.utils.face_utils import compare_face_features, extract_face_feature, detect_face
+from app.models.models import SessionLocal, User
+from app.utils.face_gallery import face_gallery
+from app.utils.face_utils import extract_face_feature, detect_face
 from PIL import Image
 import io
 import base64
@@ -14,16 +18,65 @@ class FaceUniquenessChecker:
     
     # 唯一性校验阈值设置
     # 建议值：比识别阈值稍低，以减少误判
-    UNIQUENESS_THRESHOLD = 0.5  # 人脸唯一性校验阈值
+    UNIQUENESS_THRESHOLD = Config.UNIQUENESS_THRESHOLD  # 人脸唯一性校验阈值
     
-    def __init__(self, db_path=None):
+    def __init__(self, gallery=None):
         """
         初始化人脸唯一性校验器
         
         Args:
-            db_path (str, optional): 数据库路径
+            gallery (FaceGallery, optional): 人脸特征库，默认使用全局face_gallery
+        """
+        self.gallery = gallery if gallery is not None else face_gallery
+    
+    def find_similar_users(self, feature, threshold=None, snapshot=None, with_image_path=True):
+        """
+        在特征库中查找与给定特征相似的已注册用户
+        
+        只做一次特征库查询（大特征库时经由近似最近邻索引），耗时与特征库规模基本无关。
+        
+        Args:
+            feature (numpy.array): 512维人脸特征向量
+            threshold (float, optional): 自定义唯一性阈值
+            snapshot (GallerySnapshot, optional): 使用的特征库快照
+            with_image_path (bool): 是否查询相似用户的人脸图片路径
+            
+        Returns:
+            tuple: (相似用户列表, 最高相似度)
+                - similar_users: [{'user_id': '', 'user_name': '', 'similarity': 0.0, 'image_path': ''}]，
+                  按相似度降序排列
+                - max_similarity: 最高相似度
         """
-        self.db_path = db_path if db_path else Config.DB_PATH
+        current_threshold = threshold if threshold is not None else self.UNIQUENESS_THRESHOLD
+        if snapshot is None:
+            snapshot = self.gallery.snapshot()
+        
+        matches, max_similarity = self.gallery.match(feature, threshold=current_threshold, snapshot=snapshot)
+        similar_users = [
+            {
+                "user_id": snapshot.identity_ids[row],
+                "user_name": snapshot.names[row],
+                "similarity": float(similarity),
+                "image_path": ""
+            }
+            for row, similarity in matches
+        ]
+        
+        if similar_users and with_image_path:
+            # 只为命中的少数用户查询图片路径
+            db = SessionLocal()
+            try:
+                image_paths = dict(
+                    db.query(User.identity_id, User.image_path)
+                    .filter(User.identity_id.in_([user["user_id"] for user in similar_users]))
+                    .all()
+                )
+            finally:
+                db.close()
+            for user in similar_users:
+                user["image_path"] = image_paths.get(user["user_id"]) or ""
+        
+        return similar_users, float(max_similarity)
         
     def check_face_uniqueness(self, face_image, threshold=None):
         """
@@ -58,10 +111,10 @@ class FaceUniquenessChecker:
                     "max_similarity": 0.0
                 }
             
-            # 2. 从数据库加载所有已注册用户的特征
-            db_user_data = self._load_all_user_features()
+            # 2. 获取特征库快照
+            snapshot = self.gallery.snapshot()
             
-            if not db_user_data:
+            if not snapshot.active.any():
                 # 数据库为空，表示这是第一个用户
                 return {
                     "is_unique": True,
@@ -70,34 +123,14 @@ class FaceUniquenessChecker:
                     "max_similarity": 0.0
                 }
             
-            # 3. 提取特征向量列表
-            db_features = [np.array(data['feature_vector']) for data in db_user_data]
-            
-            # 4. 进行特征比对
-            matches, max_similarity = compare_face_features(
+            # 3. 查询相似用户（一次特征库查询）
+            similar_users, max_similarity = self.find_similar_users(
                 face_features[0],  # 当前只有一个人脸的特征
-                db_features,
-                threshold=current_threshold
+                threshold=current_threshold,
+                snapshot=snapshot
             )
             
-            # 5. 分析比对结果
-            similar_users = []
-            
-            # 查找所有相似度超过阈值的用户
-            for index, similarity in matches:
-                if similarity >= current_threshold:
-                    user_info = db_user_data[index]
-                    similar_users.append({
-                        "user_id": user_info['user_id'],
-                        "user_name": user_info['user_name'],
-                        "similarity": float(similarity),
-                        "image_path": user_info.get('image_path', '')
-                    })
-            
-            # 按相似度降序排序
-            similar_users.sort(key=lambda x: x['similarity'], reverse=True)
-            
-            # 6. 生成结果
+            # 4. 生成结果
             if similar_users:
                 # 找到相似用户
                 top_similar_user = similar_users[0]
@@ -178,59 +211,6 @@ class FaceUniquenessChecker:
             print(f"特征提取失败: {str(e)}")
             return []
     
-    def _load_all_user_features(self):
-        """
-        从数据库加载所有用户的特征数据
-        
-        Returns:
-            list: 用户数据列表 [{'user_id': '', 'user_name': '', 'feature_vector': []}]
-        
-        Raises:
-            Exception: 当数据库操作失败时抛出
-        """
-        user_data = []
-        
-        try:
-            # 连接数据库
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row  # 使用字典形式返回结果
-            cursor = conn.cursor()
-            
-            # 查询所有用户数据
-            query = """
-                SELECT user_id, user_name, feature_vector, image_path 
-                FROM users 
-                WHERE feature_vector IS NOT NULL
-            """
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            
-            # 处理查询结果
-            for row in rows:
-                # 解析特征向量字符串为numpy数组
-                try:
-                    # 移除括号和空格，然后分割成数字字符串列表
-                    feature_str = row['feature_vector'].strip('[]')
-                    feature_vector = np.array([float(x) for x in feature_str.split(',')])
-                    
-                    user_data.append({
-                        'user_id': row['user_id'],
-                        'user_name': row['user_name'],
-                        'feature_vector': feature_vector,
-                        'image_path': row.get('image_path', '')
-                    })
-                except Exception as e:
-                    print(f"解析用户 {row['user_id']} 的特征向量失败: {str(e)}")
-                    continue
-            
-            # 关闭连接
-            conn.close()
-            
-        except Exception as e:
-            print(f"加载用户特征数据失败: {str(e)}")
-        
-        return user_data
-    
     def get_similarity_level(self, similarity):
         """
         根据相似度值返回相似度级别描述
@@ -363,6 +343,9 @@ class FaceUniquenessChecker:
             "action": "继续注册流程"
         }
 
+# 全局唯一性校验器实例
+face_uniqueness_checker = FaceUniquenessChecker()
+
 # 提供简化的函数接口供其他模块调用
 def check_face_is_unique(face_image, threshold=None):
     """
@@ -379,8 +362,7 @@ def check_face_is_unique(face_image, threshold=None):
             - similar_users: 相似用户列表
             - max_similarity: 最高相似度
     """
-    checker = FaceUniquenessChecker()
-    return checker.check_face_uniqueness(face_image, threshold)
+    return face_uniqueness_checker.check_face_uniqueness(face_image, threshold)
 
 def generate_confirmation_message(check_result):
     """
@@ -397,8 +379,7 @@ def generate_confirmation_message(check_result):
             - action_required: 是否需要用户操作
             - similar_users: 相似用户列表（如果有）
     """
-    checker = FaceUniquenessChecker()
-    return checker.generate_confirmation_prompt(check_result)
+    return face_uniqueness_checker.generate_confirmation_prompt(check_result)
 
 def validate_registration_permission(check_result, user_confirmation=False):
     """
@@ -414,8 +395,7 @@ def validate_registration_permission(check_result, user_confirmation=False):
             - reason: 允许或拒绝的原因
             - action: 建议的下一步操作
     """
-    checker = FaceUniquenessChecker()
-    return checker.verify_registration_permission(check_result, user_confirmation)
+    return face_uniqueness_checker.verify_registration_permission(check_result, user_confirmation)
 
 # 测试函数
 def test_face_uniqueness_check(face_image_path):
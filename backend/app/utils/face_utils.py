@@ -1,142 +1,472 @@
-"""人脸工具模块 - 实现人脸检测、特征提取、特征比对等核心功能"""
+"""人脸工具模块 - 实现人脸检测、特征提取、特征比对等核心功能
+
+人脸检测器（后端见face_detectors，由config.FACE_DETECTOR_BACKEND选择，每个检测档位一个实例）和
+FaceNet特征提取器（后端见face_embedders，由config.EMBEDDER_BACKEND选择）在首次使用时才加载，
+只做用户列表、统计、删除等操作的进程和脚本不会承担深度学习框架的启动开销。
+加载前按线程预算（见thread_budget）设置OpenCV和对应推理框架的线程数。
+服务启动时可调用warmup()提前加载模型并执行一次推理。
+
+图像处理全程使用numpy数组：上传的图片用decode_image解码一次得到RGB数组，检测在该数组（或其缩小副本）上进行，
+裁剪的人脸是原数组的切片视图，预处理后的人脸直接写入预分配的float32批次张量送入FaceNet。
+detect_face等函数仍接受PIL图像，入口处只转换一次。
+"""
+import io
+import threading
+import time
+
 import numpy as np
 from PIL import Image
-from mtcnn import MTCNN
-from facenet_pytorch import InceptionResnetV1
-import torch
 import cv2
 
+from ..config import config
+from .face_detectors import DETECTOR_BACKENDS, create_detector
+from .face_embedders import EMBEDDER_BACKENDS, INPUT_SHAPE, create_embedder
+from .thread_budget import apply_thread_budget
+
+
+# 模型实例（首次使用时加载）
+_detectors = {}  # 检测档位名称 -> 人脸检测器
+_embedder = None
+_model_lock = threading.Lock()
+
+# 缩放后最小人脸的目标边长（像素）：不低于R-Net的24px输入、接近O-Net的48px输入，缩放不影响后两阶段的精度
+DOWNSCALE_FACE_SIZE = 40
+
+
+def get_detection_profile(profile=None):
+    """
+    获取检测档位参数
+    
+    Args:
+        profile (str, optional): 档位名称（config.DETECTION_PROFILES的键），默认config.DEFAULT_DETECTION_PROFILE
+        
+    Returns:
+        tuple: (档位名称, 档位参数字典)
+        
+    Raises:
+        ValueError: 当档位名称不存在时抛出
+    """
+    profile = profile or config.DEFAULT_DETECTION_PROFILE
+    if profile not in config.DETECTION_PROFILES:
+        raise ValueError(f"不支持的人脸检测档位: {profile}")
+    return profile, config.DETECTION_PROFILES[profile]
+
+
+def get_detector(profile=None):
+    """
+    获取检测档位对应的人脸检测器（每个档位首次调用时按config.FACE_DETECTOR_BACKEND加载）
+    
+    开启config.DETECTION_DOWNSCALE时，图像会先缩小到最小人脸约为DOWNSCALE_FACE_SIZE像素（长边超过档位的max_side时进一步缩小），
+    检测器的最小人脸参数相应取min(档位最小人脸, DOWNSCALE_FACE_SIZE)。
+    
+    Args:
+        profile (str, optional): 档位名称，默认config.DEFAULT_DETECTION_PROFILE
+        
+    Returns:
+        FaceDetector: 人脸检测器
+    """
+    profile, params = get_detection_profile(profile)
+    detector = _detectors.get(profile)
+    if detector is None:
+        with _model_lock:
+            detector = _detectors.get(profile)
+            if detector is None:
+                min_face_size = params["min_face_size"]
+                if config.DETECTION_DOWNSCALE:
+                    min_face_size = min(min_face_size, DOWNSCALE_FACE_SIZE)
+                backend = DETECTOR_BACKENDS.get(config.FACE_DETECTOR_BACKEND)
+                apply_thread_budget("cv2", getattr(backend, "FRAMEWORK", None))
+                print(f"🔧 正在加载人脸检测器（{config.FACE_DETECTOR_BACKEND}，档位 {profile}）...")
+                detector = create_detector(
+                    config.FACE_DETECTOR_BACKEND,
+                    min_face_size=min_face_size,
+                    thresholds=params["thresholds"],
+                    scale_factor=params["scale_factor"]
+                )
+                _detectors[profile] = detector
+    return detector
+
+
+def get_embedder():
+    """
+    获取FaceNet特征提取器（首次调用时按config.EMBEDDER_BACKEND加载）
+    
+    Returns:
+        FaceEmbedder: 特征提取器
+    """
+    global _embedder
+    if _embedder is None:
+        with _model_lock:
+            if _embedder is None:
+                backend = EMBEDDER_BACKENDS.get(config.EMBEDDER_BACKEND)
+                apply_thread_budget("cv2", getattr(backend, "FRAMEWORK", None))
+                print(f"🔧 正在加载FaceNet特征提取模型（{config.EMBEDDER_BACKEND}）...")
+                _embedder = create_embedder(config.EMBEDDER_BACKEND)
+    return _embedder
+
+
+def warmup(detector=True, embedder=True):
+    """
+    预热模型 - 加载模型并各执行一次空推理
+    
+    首次推理会触发框架的延迟初始化（内存分配、算子选择等），
+    在服务启动时预热可以避免第一个请求明显变慢。
+    在gunicorn主进程fork之前调用时，工作进程以写时复制方式共享模型权重所在的内存页。
+    预热推理只使用单线程，避免fork前创建线程池。
+    
+    Args:
+        detector (bool): 是否预热人脸检测器（config.ENDPOINT_DETECTION_PROFILES用到的所有档位）
+        embedder (bool): 是否预热特征提取模型
+    
+    Returns:
+        float: 预热耗时（秒）
+    """
+    start = time.perf_counter()
+    
+    if detector:
+        profiles = {config.DEFAULT_DETECTION_PROFILE, *config.ENDPOINT_DETECTION_PROFILES.values()}
+        for profile in sorted(profiles):
+            get_detector(profile).warmup()
+    
+    if embedder:
+        get_embedder().warmup()
+    
+    elapsed = time.perf_counter() - start
+    print(f"🔥 模型预热完成，耗时 {elapsed:.2f} 秒")
+    return elapsed
+
 
-# 初始化MTCNN人脸检测器 - 优化参数以提高检测率并修复区域选择错误
-mtcnn = MTCNN(
-    min_face_size=15,  # 降低最小人脸大小以检测更远距离或更小的人脸
-    steps_threshold=[0.6, 0.7, 0.75],  # 调整阈值以提高准确性，减少误判
-    scale_factor=0.7  # 调整缩放因子以更好地处理不同大小的人脸，提高区域选择精度
-)
+def _detection_scale(min_face_size, long_side=None, max_side=None):
+    """
+    根据需要检出的最小人脸和图像分辨率计算检测前的缩放比例
+    
+    缩放后min_face_size大小的人脸约为DOWNSCALE_FACE_SIZE像素，与MTCNN用最小人脸参数确定图像金字塔
+    第一层的方式一致，但后续各层和R-Net/O-Net的裁剪都在缩小后的图像上完成，大图省去了逐层缩放原图的开销。
+    最小人脸不超过DOWNSCALE_FACE_SIZE的档位（balanced、accurate）按最小人脸不缩放，
+    此时由max_side限制长边，大图仍在缩小的副本上检测（能检出的最小人脸相应变大）。
+    
+    Args:
+        min_face_size (int): 需要检出的最小人脸边长（原图像素）
+        long_side (int, optional): 图像长边（像素）
+        max_side (int, optional): 缩放后长边的上限，None表示不限制
+        
+    Returns:
+        float: 缩放比例，1.0表示不缩放
+    """
+    if not config.DETECTION_DOWNSCALE:
+        return 1.0
+    scale = DOWNSCALE_FACE_SIZE / min_face_size
+    if max_side and long_side:
+        scale = min(scale, max_side / long_side)
+    return scale if scale < 1.0 else 1.0
 
 
-# 初始化FaceNet特征提取模型（预训练模型）
-# 加载预训练的InceptionResnetV1模型，设置为评估模式
-resnet = InceptionResnetV1(pretrained='vggface2').eval()
+def _detection_input(rgb_image, min_face_size, max_side=None):
+    """
+    生成送入检测器的图像数组（按_detection_scale缩小）
+    
+    Args:
+        rgb_image (numpy.array): (H, W, 3) uint8 RGB数组（可以是原图的切片视图）
+        min_face_size (int): 需要检出的最小人脸边长（原图像素）
+        max_side (int, optional): 缩放后长边的上限（检测档位的max_side）
+        
+    Returns:
+        tuple: (numpy.array, 缩放比例)，不缩放时只在输入不连续（切片视图）时复制
+    """
+    height, width = rgb_image.shape[:2]
+    scale = _detection_scale(min_face_size, max(width, height), max_side)
+    if scale < 1.0:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(rgb_image, size, interpolation=cv2.INTER_AREA), scale
+    return np.ascontiguousarray(rgb_image), scale
 
 
-def detect_face(image, target_region=None):
+def _rescale_results(results, scale, offset=(0, 0)):
+    """
+    把缩小（及裁剪）后图像上的检测框映射回原图坐标
+    
+    Args:
+        results (list): 检测器输出 [{'box': [x, y, width, height], 'confidence': float}, ...]
+        scale (float): 检测图像相对原图（或裁剪区域）的缩放比例
+        offset (tuple): 裁剪区域左上角在原图中的坐标 (x, y)
+        
+    Returns:
+        list: 原图坐标下的检测结果
+    """
+    if scale == 1.0 and offset == (0, 0):
+        return results
+    offset_x, offset_y = offset
+    mapped = []
+    for result in results:
+        x, y, width, height = (v / scale for v in result['box'])
+        box = [int(round(x)) + offset_x, int(round(y)) + offset_y, int(round(width)), int(round(height))]
+        mapped.append(dict(result, box=box))
+    return mapped
+
+
+def decode_image(data):
+    """
+    把图片文件内容解码为RGB数组
+    
+    使用cv2.imdecode直接解码为numpy数组，OpenCV不支持的格式（如GIF）回退到PIL。
+    与原先的PIL解码保持一致：丢弃透明通道，不按EXIF方向信息旋转图像。
+    
+    Args:
+        data (bytes): 图片文件内容
+        
+    Returns:
+        numpy.array: (H, W, 3) uint8 RGB数组
+        
+    Raises:
+        ValueError: 当数据无法解码为图像时抛出
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    image = cv2.imdecode(buffer, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION) if buffer.size else None
+    if image is not None:
+        # 原地转换通道顺序，不额外分配整幅图像
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+    try:
+        with Image.open(io.BytesIO(data)) as pil_image:
+            return np.asarray(pil_image.convert('RGB'))
+    except Exception as e:
+        raise ValueError(f"无法解码图像: {str(e)}")
+
+
+# JPEG缩小解码倍数 -> cv2.imdecode标志（libjpeg在DCT阶段直接输出缩小的图像）
+_REDUCED_DECODE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def _decode_reduction(width, height, min_side):
+    """
+    选择JPEG缩小解码倍数：缩小后最长边不低于min_side的最大倍数
+    
+    Args:
+        width (int): 原图宽度
+        height (int): 原图高度
+        min_side (int): 缩小后最长边的下限，0表示不缩小
+        
+    Returns:
+        int: 1、2、4或8
+    """
+    if not min_side:
+        return 1
+    for factor in (8, 4, 2):
+        if max(width, height) / factor >= min_side:
+            return factor
+    return 1
+
+
+def decode_upload(data, max_pixels=None, min_side=None):
+    """
+    解码上传的图片 - 先读取文件头检查像素预算，过大的JPEG直接按缩小的分辨率解码
+    
+    文件头由PIL读取（只解析头部，不解码像素）。像素数超过预算的图片直接拒绝；
+    JPEG的最长边超过min_side的2倍以上时，用cv2.IMREAD_REDUCED_COLOR_*按1/2、1/4或1/8解码，
+    解码耗时和峰值内存随之下降。其他格式按原分辨率解码。
+    
+    检测和裁剪在缩小后的图像上进行，返回给客户端的坐标需要除以返回的缩放比例映射回原图。
+    
+    Args:
+        data (bytes): 图片文件内容
+        max_pixels (int, optional): 像素预算，默认config.MAX_UPLOAD_PIXELS，0表示不限
+        min_side (int, optional): 缩小解码后最长边的下限，默认config.UPLOAD_DECODE_MIN_SIDE
+        
+    Returns:
+        tuple: ((H, W, 3) uint8 RGB数组, 缩放比例)，缩放比例为解码尺寸 / 原图尺寸，1.0表示原分辨率
+        
+    Raises:
+        ValueError: 当数据无法解码或像素数超过预算时抛出
+    """
+    max_pixels = config.MAX_UPLOAD_PIXELS if max_pixels is None else max_pixels
+    min_side = config.UPLOAD_DECODE_MIN_SIDE if min_side is None else min_side
+    try:
+        with Image.open(io.BytesIO(data)) as header:
+            width, height = header.size
+            image_format = header.format
+    except Exception as e:
+        raise ValueError(f"无法解码图像: {str(e)}")
+    
+    if max_pixels and width * height > max_pixels:
+        raise ValueError(f"图像分辨率过大（{width}x{height}），像素数不能超过{max_pixels}")
+    
+    factor = _decode_reduction(width, height, min_side) if image_format == "JPEG" else 1
+    if factor > 1:
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        image = cv2.imdecode(buffer, _REDUCED_DECODE_FLAGS[factor] | cv2.IMREAD_IGNORE_ORIENTATION)
+        if image is not None:
+            print(f"📉 {width}x{height} 的JPEG按1/{factor}解码为 {image.shape[1]}x{image.shape[0]}")
+            return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image), image.shape[1] / width
+    return decode_image(data), 1.0
+
+
+def scale_box(box, scale):
+    """
+    按比例缩放坐标 (x1, y1, x2, y2)（用于在原图坐标和缩小解码的图像坐标之间转换）
+    
+    Args:
+        box (tuple): 坐标 (x1, y1, x2, y2)
+        scale (float): 缩放比例
+        
+    Returns:
+        tuple: 缩放后的浮点坐标
+    """
+    return tuple(float(coord) * scale for coord in box)
+
+
+def to_rgb_array(image):
+    """
+    把输入图像统一为RGB数组
+    
+    Args:
+        image (PIL.Image or numpy.array): PIL图像，或(H, W, 3) uint8 RGB数组（原样返回，不复制）
+        
+    Returns:
+        numpy.array: (H, W, 3) uint8 RGB数组
+        
+    Raises:
+        TypeError: 当输入类型或数组形状无效时抛出
+    """
+    if isinstance(image, np.ndarray):
+        if image.ndim != 3 or image.shape[2] != 3 or image.dtype != np.uint8:
+            raise TypeError("图像数组必须是(H, W, 3)的uint8 RGB数组")
+        return image
+    if isinstance(image, Image.Image):
+        return np.asarray(image if image.mode == 'RGB' else image.convert('RGB'))
+    raise TypeError("输入必须是PIL.Image对象或RGB numpy数组")
+
+
+def encode_jpeg(rgb_image, quality=95):
+    """
+    把RGB数组编码为JPEG
+    
+    Args:
+        rgb_image (numpy.array): (H, W, 3) uint8 RGB数组
+        quality (int): JPEG质量
+        
+    Returns:
+        bytes: JPEG文件内容
+        
+    Raises:
+        ValueError: 当编码失败时抛出
+    """
+    ok, encoded = cv2.imencode(
+        ".jpg", cv2.cvtColor(rgb_image, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    )
+    if not ok:
+        raise ValueError("JPEG编码失败")
+    return encoded.tobytes()
+
+
+def parse_face_box(face_box):
+    """
+    解析客户端提交的人脸框
+    
+    支持前端FaceDetector/ImageAnnotator使用的{x, y, width, height}对象、
+    接口文档中的{x1, y1, x2, y2}对象，以及后端接口返回的[x1, y1, x2, y2]坐标列表。
+    
+    Args:
+        face_box (dict or list): 人脸框
+        
+    Returns:
+        tuple: 整数坐标 (x1, y1, x2, y2)
+        
+    Raises:
+        ValueError: 当人脸框格式无效或面积为0时抛出
+    """
+    try:
+        if isinstance(face_box, dict) and 'x1' in face_box:
+            x1, y1, x2, y2 = (float(face_box[key]) for key in ('x1', 'y1', 'x2', 'y2'))
+        elif isinstance(face_box, dict):
+            x1, y1 = float(face_box['x']), float(face_box['y'])
+            x2, y2 = x1 + float(face_box['width']), y1 + float(face_box['height'])
+        elif isinstance(face_box, (list, tuple)) and len(face_box) == 4:
+            x1, y1, x2, y2 = (float(v) for v in face_box)
+        else:
+            raise ValueError
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"人脸框格式无效: {face_box}")
+    if not (np.isfinite([x1, y1, x2, y2]).all() and x2 > x1 and y2 > y1):
+        raise ValueError(f"人脸框格式无效: {face_box}")
+    return int(round(x1)), int(round(y1)), int(round(x2)), int(round(y2))
+
+
+def _roi_region(roi, width, height):
+    """
+    计算人脸框扩展config.DETECTION_ROI_MARGIN后与图像相交的检测区域
+    
+    Args:
+        roi (tuple): 人脸框 (x1, y1, x2, y2)
+        width (int): 图像宽度
+        height (int): 图像高度
+        
+    Returns:
+        tuple or None: 检测区域 (x1, y1, x2, y2)，与图像不相交时返回None
+    """
+    x1, y1, x2, y2 = roi
+    margin_x = int((x2 - x1) * config.DETECTION_ROI_MARGIN)
+    margin_y = int((y2 - y1) * config.DETECTION_ROI_MARGIN)
+    region = (max(0, x1 - margin_x), max(0, y1 - margin_y), min(width, x2 + margin_x), min(height, y2 + margin_y))
+    if region[2] <= region[0] or region[3] <= region[1]:
+        return None
+    return region
+
+
+def detect_face(image, target_region=None, profile=None, roi=None):
     """
     人脸检测函数 - 使用MTCNN从图像中检测人脸，并优化人脸区域选择
     
+    检测参数由检测档位（config.DETECTION_PROFILES）决定。图像先按档位的最小人脸和长边上限（max_side）缩小后检测，
+    检测框映射回原图后从原图裁剪人脸，裁剪结果的分辨率不受缩放影响。
+    
+    提供roi（客户端给出的人脸框）时，只在人脸框扩展config.DETECTION_ROI_MARGIN后的区域内检测，
+    该区域内未检测到人脸且config.DETECTION_ROI_FALLBACK开启时再检测整幅图像。
+    
     Args:
-        image (PIL.Image): 输入的PIL图像对象
-        target_region (tuple, optional): 目标人脸区域坐标 (x1, y1, x2, y2)，用于优先选择指定区域内的人脸
+        image (PIL.Image or numpy.array): 输入图像，PIL图像或(H, W, 3) uint8 RGB数组
+        target_region (tuple, optional): 目标人脸区域坐标 (x1, y1, x2, y2)，用于优先选择指定区域内的人脸，默认为roi
+        profile (str, optional): 检测档位名称，默认config.DEFAULT_DETECTION_PROFILE
+        roi (tuple, optional): 限定检测范围的人脸框 (x1, y1, x2, y2)
         
     Returns:
         tuple: (人脸坐标列表, 裁剪后的人脸图像列表, 人脸置信度列表)
             - face_boxes: 人脸边界框坐标列表，格式为[(x1, y1, x2, y2), ...]，按置信度和区域优先级排序
-            - face_images: 裁剪后的人脸图像列表[PIL.Image, ...]
+            - face_images: 裁剪后的人脸图像列表[numpy.array, ...]，(h, w, 3) RGB数组，是输入图像的切片视图
             - confidences: 人脸检测置信度列表[float, ...]
             
     Raises:
         Exception: 当图像格式不支持或处理失败时抛出异常
     """
     try:
-        # 确保输入是PIL图像
-        if not isinstance(image, Image.Image):
-            raise TypeError("输入必须是PIL.Image对象")
-        
-        # 转换图像为RGB格式
-        rgb_image = image.convert('RGB')
-        
-        # 使用MTCNN检测人脸
-        # 返回人脸边界框、置信度和关键点
-        results = mtcnn.detect_faces(np.array(rgb_image))
-        
-        # 如果没有检测到人脸，返回空列表
-        if not results:
-            return [], [], []
-        
-        face_data = []  # 存储人脸数据(坐标、图像、置信度)
-        
-        # 处理每个检测到的人脸
-        for result in results:
-            # 获取边界框坐标（x1, y1, width, height）
-            x1, y1, width, height = result['box']
-            # 计算右下角坐标
-            x2 = x1 + width
-            y2 = y1 + height
-            
-            # 确保坐标在图像范围内（防止越界）
-            x1, y1 = max(0, x1), max(0, y1)
-            x2 = min(image.width, x2)
-            y2 = min(image.height, y2)
-            
-            # 计算人脸区域中心
-            center_x = (x1 + x2) / 2
-            center_y = (y1 + y2) / 2
-            
-            # 扩展边界框，确保包含完整人脸
-            # 扩展比例
-            expand_ratio = 0.1
-            expand_w = int(width * expand_ratio)
-            expand_h = int(height * expand_ratio)
-            
-            # 扩展边界框
-            x1_expanded = max(0, x1 - expand_w)
-            y1_expanded = max(0, y1 - expand_h)
-            x2_expanded = min(image.width, x2 + expand_w)
-            y2_expanded = min(image.height, y2 + expand_h)
-            
-            # 裁剪扩展后的人脸区域
-            face_img = rgb_image.crop((x1_expanded, y1_expanded, x2_expanded, y2_expanded))
-            
-            # 获取置信度
-            confidence = result.get('confidence', 0)
-            
-            # 计算与人脸区域的重叠度或距离（用于优先选择目标区域内的人脸）
-            region_score = 0
-            if target_region:
-                t_x1, t_y1, t_x2, t_y2 = target_region
-                # 计算重叠区域面积
-                overlap_x1 = max(x1, t_x1)
-                overlap_y1 = max(y1, t_y1)
-                overlap_x2 = min(x2, t_x2)
-                overlap_y2 = min(y2, t_y2)
-                
-                if overlap_x1 < overlap_x2 and overlap_y1 < overlap_y2:
-                    overlap_area = (overlap_x2 - overlap_x1) * (overlap_y2 - overlap_y1)
-                    face_area = (x2 - x1) * (y2 - y1)
-                    target_area = (t_x2 - t_x1) * (t_y2 - t_y1)
-                    # 计算IOU（交并比）
-                    union_area = face_area + target_area - overlap_area
-                    if union_area > 0:
-                        region_score = overlap_area / union_area
-                else:
-                    # 计算中心点距离
-                    t_center_x = (t_x1 + t_x2) / 2
-                    t_center_y = (t_y1 + t_y2) / 2
-                    distance = np.sqrt((center_x - t_center_x)**2 + (center_y - t_center_y)**2)
-                    # 距离越近，得分越高
-                    max_distance = np.sqrt(image.width**2 + image.height**2)
-                    region_score = 1 - (distance / max_distance)
-            
-            # 综合评分：置信度(0.7权重) + 区域匹配度(0.3权重)
-            score = confidence * 0.7 + region_score * 0.3
-            
-            # 存储人脸数据
-            face_data.append({
-                'box': (x1, y1, x2, y2),
-                'image': face_img,
-                'confidence': confidence,
-                'score': score
-            })
+        profile, params = get_detection_profile(profile)
         
-        # 按综合评分降序排序，优先选择评分高的人脸
-        face_data.sort(key=lambda x: x['score'], reverse=True)
+        # 统一为RGB数组（PIL图像只转换这一次）
+        rgb_image = to_rgb_array(image)
+        height, width = rgb_image.shape[:2]
         
-        # 提取排序后的结果
-        face_boxes = [item['box'] for item in face_data]
-        face_images = [item['image'] for item in face_data]
-        confidences = [item['confidence'] for item in face_data]
+        detector = get_detector(profile)
+        results = []
         
-        return face_boxes, face_images, confidences
+        # 快速路径：只在客户端人脸框附近检测
+        region = _roi_region(roi, width, height) if roi else None
+        if region:
+            x1, y1, x2, y2 = region
+            detect_input, scale = _detection_input(rgb_image[y1:y2, x1:x2], params["min_face_size"], params.get("max_side"))
+            results = _rescale_results(detector.detect(detect_input), scale, region[:2])
+            if not results and config.DETECTION_ROI_FALLBACK:
+                print("⚠️ 人脸框区域内未检测到人脸，改为检测整幅图像")
+                region = None
+        
+        if not region:
+            # 使用人脸检测器检测人脸（大图在缩小的副本上检测），返回人脸边界框和置信度
+            detect_input, scale = _detection_input(rgb_image, params["min_face_size"], params.get("max_side"))
+            results = _rescale_results(detector.detect(detect_input), scale)
+        del detect_input
+        
+        return _collect_faces(rgb_image, results, target_region or roi, params["max_faces"])
         
     except Exception as e:
         # 记录错误信息
@@ -144,12 +474,225 @@ def detect_face(image, target_region=None):
         raise Exception(f"人脸检测失败: {str(e)}")
 
 
-def extract_face_feature(face_images):
+def detect_face_batch(images, target_region=None, profile=None):
     """
-    人脸特征提取函数 - 使用FaceNet提取人脸特征向量
+    批量人脸检测函数 - 对多张图片执行一次批量检测
+    
+    检测器支持批量时（facenet_pytorch后端且图片尺寸相同）一次送入网络，否则逐张检测。
     
     Args:
-        face_images (list): 裁剪后的人脸图像列表 [PIL.Image, ...]
+        images (list): PIL图像或(H, W, 3) uint8 RGB数组列表
+        target_region (tuple, optional): 目标人脸区域坐标 (x1, y1, x2, y2)
+        profile (str, optional): 检测档位名称，默认config.DEFAULT_DETECTION_PROFILE
+        
+    Returns:
+        list: 与输入一一对应的(人脸坐标列表, 裁剪后的人脸图像列表, 人脸置信度列表)
+        
+    Raises:
+        Exception: 当图像格式不支持或处理失败时抛出异常
+    """
+    try:
+        profile, params = get_detection_profile(profile)
+        rgb_images = [to_rgb_array(image) for image in images]
+        inputs = [_detection_input(rgb, params["min_face_size"], params.get("max_side")) for rgb in rgb_images]
+        batch_results = get_detector(profile).detect_batch([detect_input for detect_input, _ in inputs])
+        return [
+            _collect_faces(rgb_image, _rescale_results(results, scale), target_region, params["max_faces"])
+            for rgb_image, results, (_, scale) in zip(rgb_images, batch_results, inputs)
+        ]
+    except Exception as e:
+        print(f"人脸检测出错: {str(e)}")
+        raise Exception(f"人脸检测失败: {str(e)}")
+
+
+def _collect_faces(rgb_image, results, target_region=None, max_faces=None):
+    """
+    根据检测结果裁剪人脸并按置信度和区域优先级排序
+    
+    裁剪结果是rgb_image的切片视图，不复制像素。
+    
+    Args:
+        rgb_image (numpy.array): (H, W, 3) uint8 RGB数组
+        results (list): 检测器输出 [{'box': [x, y, width, height], 'confidence': float}, ...]
+        target_region (tuple, optional): 目标人脸区域坐标 (x1, y1, x2, y2)
+        max_faces (int, optional): 最多返回的人脸数，None表示不限
+        
+    Returns:
+        tuple: (人脸坐标列表, 裁剪后的人脸图像列表, 人脸置信度列表)
+    """
+    # 如果没有检测到人脸，返回空列表
+    if not results:
+        return [], [], []
+    
+    image_height, image_width = rgb_image.shape[:2]
+    face_data = []  # 存储人脸数据(坐标、图像、置信度)
+    
+    # 处理每个检测到的人脸
+    for result in results:
+        # 获取边界框坐标（x1, y1, width, height）
+        x1, y1, width, height = result['box']
+        # 计算右下角坐标
+        x2 = x1 + width
+        y2 = y1 + height
+        
+        # 确保坐标在图像范围内（防止越界）
+        x1, y1 = max(0, x1), max(0, y1)
+        x2 = min(image_width, x2)
+        y2 = min(image_height, y2)
+        
+        # 计算人脸区域中心
+        center_x = (x1 + x2) / 2
+        center_y = (y1 + y2) / 2
+        
+        # 扩展边界框，确保包含完整人脸
+        # 扩展比例
+        expand_ratio = 0.1
+        expand_w = int(width * expand_ratio)
+        expand_h = int(height * expand_ratio)
+        
+        # 扩展边界框
+        x1_expanded = max(0, x1 - expand_w)
+        y1_expanded = max(0, y1 - expand_h)
+        x2_expanded = min(image_width, x2 + expand_w)
+        y2_expanded = min(image_height, y2 + expand_h)
+        
+        # 裁剪扩展后的人脸区域（切片视图）
+        face_img = rgb_image[y1_expanded:y2_expanded, x1_expanded:x2_expanded]
+        
+        # 获取置信度
+        confidence = result.get('confidence', 0)
+        
+        # 计算与人脸区域的重叠度或距离（用于优先选择目标区域内的人脸）
+        region_score = 0
+        if target_region:
+            t_x1, t_y1, t_x2, t_y2 = target_region
+            # 计算重叠区域面积
+            overlap_x1 = max(x1, t_x1)
+            overlap_y1 = max(y1, t_y1)
+            overlap_x2 = min(x2, t_x2)
+            overlap_y2 = min(y2, t_y2)
+            
+            if overlap_x1 < overlap_x2 and overlap_y1 < overlap_y2:
+                overlap_area = (overlap_x2 - overlap_x1) * (overlap_y2 - overlap_y1)
+                face_area = (x2 - x1) * (y2 - y1)
+                target_area = (t_x2 - t_x1) * (t_y2 - t_y1)
+                # 计算IOU（交并比）
+                union_area = face_area + target_area - overlap_area
+                if union_area > 0:
+                    region_score = overlap_area / union_area
+            else:
+                # 计算中心点距离
+                t_center_x = (t_x1 + t_x2) / 2
+                t_center_y = (t_y1 + t_y2) / 2
+                distance = np.sqrt((center_x - t_center_x)**2 + (center_y - t_center_y)**2)
+                # 距离越近，得分越高
+                max_distance = np.sqrt(image_width**2 + image_height**2)
+                region_score = 1 - (distance / max_distance)
+        
+        # 综合评分：置信度(0.7权重) + 区域匹配度(0.3权重)
+        score = confidence * 0.7 + region_score * 0.3
+        
+        # 存储人脸数据
+        face_data.append({
+            'box': (x1, y1, x2, y2),
+            'image': face_img,
+            'confidence': confidence,
+            'score': score
+        })
+    
+    # 按综合评分降序排序，优先选择评分高的人脸
+    face_data.sort(key=lambda x: x['score'], reverse=True)
+    if max_faces:
+        face_data = face_data[:max_faces]
+    
+    # 提取排序后的结果
+    face_boxes = [item['box'] for item in face_data]
+    face_images = [item['image'] for item in face_data]
+    confidences = [item['confidence'] for item in face_data]
+    
+    return face_boxes, face_images, confidences
+
+
+def _preprocess_face_image(face_img):
+    """
+    人脸图像预处理 - 调整尺寸、直方图均衡化和轻微去噪
+    
+    缩放后的160x160数组上原地完成色彩空间转换和去噪，不修改输入（输入可以是原图的切片视图）。
+    
+    Args:
+        face_img (numpy.array or PIL.Image): 裁剪后的人脸图像，(h, w, 3) uint8 RGB数组或PIL图像
+        
+    Returns:
+        numpy.array or None: 160x160x3的uint8数组，空图像返回None
+    """
+    # 1. 转换为numpy数组（数组输入不复制）
+    img_np = np.asarray(face_img)
+    
+    # 2. 图像尺寸检查和调整
+    if img_np.size == 0:
+        print("错误：空图像输入")
+        return None
+        
+    # 获取图像尺寸
+    h, w = img_np.shape[:2]
+    
+    # 检查最小尺寸要求（确保至少能被卷积核处理）
+    min_size = 10  # 最小尺寸要求
+    if h < min_size or w < min_size:
+        print(f"警告：人脸图像尺寸过小 ({w}x{h}px)，需要调整尺寸")
+    
+    # 确保图像尺寸为160x160，这是FaceNet的标准输入尺寸；尺寸已符合时复制一份，后续原地处理不影响输入
+    if h != 160 or w != 160:
+        img_np = cv2.resize(img_np, (160, 160), interpolation=cv2.INTER_CUBIC)
+    else:
+        img_np = img_np.copy()
+    
+    # 3. 应用直方图均衡化来增强对比度
+    # 只对Y通道（亮度）进行均衡化
+    if len(img_np.shape) == 3 and img_np.shape[2] == 3:
+        # 转换到YUV色彩空间
+        img_yuv = cv2.cvtColor(img_np, cv2.COLOR_RGB2YUV, dst=img_np)
+        # 均衡化Y通道
+        img_yuv[:,:,0] = cv2.equalizeHist(img_yuv[:,:,0])
+        # 转换回RGB
+        img_np = cv2.cvtColor(img_yuv, cv2.COLOR_YUV2RGB, dst=img_yuv)
+    
+    # 4. 高斯模糊去噪（轻微）
+    return cv2.GaussianBlur(img_np, (3, 3), 0, dst=img_np)
+
+
+def _to_model_input(face_arrays, out=None):
+    """
+    把预处理后的人脸数组转换为FaceNet输入批次
+    
+    Args:
+        face_arrays (list): _preprocess_face_image输出的160x160x3 uint8数组列表
+        out (numpy.array, optional): 预分配的(len(face_arrays), 3, 160, 160) float32数组，结果直接写入
+        
+    Returns:
+        numpy.array: (B, 3, 160, 160) float32数组，标准化到[-1, 1]
+    """
+    if out is None:
+        out = np.empty((len(face_arrays), *INPUT_SHAPE), dtype=np.float32)
+    for slot, img_np in zip(out, face_arrays):
+        # HWC -> CHW，赋值时完成uint8到float32的转换
+        slot[...] = img_np.transpose(2, 0, 1)
+    # (x / 255 - 0.5) * 2，原地计算
+    out *= 2.0 / 255.0
+    out -= 1.0
+    return out
+
+
+def extract_face_feature(face_images, batch_size=None):
+    """
+    人脸特征提取函数 - 使用FaceNet批量提取人脸特征向量
+    
+    人脸逐张预处理后写入一个预分配的批次张量（各批次复用），按batch_size分批送入FaceNet，
+    避免逐张推理的调用开销。返回结果与输入顺序一致。
+    
+    Args:
+        face_images (list): 裁剪后的人脸图像列表 [numpy.array或PIL.Image, ...]
+        batch_size (int, optional): 单次推理的最大批次大小，默认使用config.EMBEDDING_BATCH_SIZE
     
     Returns:
         list: 512维人脸特征向量列表 [numpy.array, ...]
@@ -159,67 +702,40 @@ def extract_face_feature(face_images):
     """
     try:
         # 检查输入
-        if not face_images or not all(isinstance(img, Image.Image) for img in face_images):
+        if not face_images or not all(isinstance(img, (np.ndarray, Image.Image)) for img in face_images):
             return []
         
-        feature_vectors = []  # 存储特征向量
+        batch_size = max(1, int(batch_size or config.EMBEDDING_BATCH_SIZE))
+        embedder = get_embedder()
         
-        # 处理每个人脸图像
-        for face_img in face_images:
-            # 图像预处理增强
-            # 1. 转换为numpy数组
-            img_np = np.array(face_img)
-            
-            # 2. 图像尺寸检查和调整
-            if img_np is None or img_np.size == 0:
-                print("错误：空图像输入")
-                feature_vectors.append(np.zeros(512))
+        # 批次张量只分配一次
+        buffer = np.empty((min(batch_size, len(face_images)), *INPUT_SHAPE), dtype=np.float32)
+        feature_vectors = [None] * len(face_images)
+        
+        for start in range(0, len(face_images), batch_size):
+            # 预处理当前批次的人脸，空图像使用零向量占位
+            batch_indices = []
+            batch_arrays = []
+            for i in range(start, min(start + batch_size, len(face_images))):
+                img_np = _preprocess_face_image(face_images[i])
+                if img_np is None:
+                    feature_vectors[i] = np.zeros(512, dtype=np.float32)
+                    continue
+                batch_indices.append(i)
+                batch_arrays.append(img_np)
+            if not batch_indices:
                 continue
-                
-            # 获取图像尺寸
-            h, w = img_np.shape[:2]
-            
-            # 检查最小尺寸要求（确保至少能被卷积核处理）
-            min_size = 10  # 最小尺寸要求
-            if h < min_size or w < min_size:
-                print(f"警告：人脸图像尺寸过小 ({w}x{h}px)，需要调整尺寸")
-                # 调整为标准尺寸 (160x160)，这是FaceNet的标准输入尺寸
-                img_np = cv2.resize(img_np, (160, 160), interpolation=cv2.INTER_CUBIC)
-            else:
-                # 确保图像尺寸为160x160，这是FaceNet的标准输入尺寸
-                if h != 160 or w != 160:
-                    img_np = cv2.resize(img_np, (160, 160), interpolation=cv2.INTER_CUBIC)
-            
-            # 3. 应用直方图均衡化来增强对比度
-            # 只对Y通道（亮度）进行均衡化
-            if len(img_np.shape) == 3 and img_np.shape[2] == 3:
-                # 转换到YUV色彩空间
-                img_yuv = cv2.cvtColor(img_np, cv2.COLOR_RGB2YUV)
-                # 均衡化Y通道
-                img_yuv[:,:,0] = cv2.equalizeHist(img_yuv[:,:,0])
-                # 转换回RGB
-                img_np = cv2.cvtColor(img_yuv, cv2.COLOR_YUV2RGB)
-            
-            # 4. 高斯模糊去噪（轻微）
-            img_np = cv2.GaussianBlur(img_np, (3, 3), 0)
-            
-            # 5. 转回PIL图像
-            enhanced_img = Image.fromarray(img_np)
-            
-            # 6. 转换为PyTorch张量并标准化
-            img_tensor = torch.tensor(np.array(enhanced_img)).float().permute(2, 0, 1)
-            img_tensor = (img_tensor / 255.0 - 0.5) * 2.0  # 标准化
-            img_tensor = img_tensor.unsqueeze(0)  # 添加批次维度
             
-            # 7. 提取特征向量
-            with torch.no_grad():  # 关闭梯度计算，提高性能
-                feature = resnet(img_tensor)
+            # 提取特征向量
+            batch = _to_model_input(batch_arrays, out=buffer[:len(batch_arrays)])
+            features_np = embedder.embed(batch)
             
-            # 8. 特征归一化，增强匹配稳定性
-            feature_np = feature.squeeze().cpu().numpy()
-            feature_np = feature_np / np.linalg.norm(feature_np) if np.linalg.norm(feature_np) > 0 else feature_np
+            # 特征归一化，增强匹配稳定性
+            norms = np.linalg.norm(features_np, axis=1, keepdims=True)
+            features_np = features_np / np.where(norms > 0, norms, 1.0)
             
-            feature_vectors.append(feature_np)
+            for i, feature_np in zip(batch_indices, features_np):
+                feature_vectors[i] = feature_np
         
         return feature_vectors
         
@@ -228,26 +744,286 @@ def extract_face_feature(face_images):
         raise Exception(f"人脸特征提取失败: {str(e)}")
 
 
-def compare_face_features(input_feature, db_features, threshold=0.55):
+def weight_similarities(similarities, threshold):
     """
-    人脸特征比对函数 - 计算余弦相似度进行特征比对
+    相似度优化：对于接近阈值（阈值下方0.05以内）的相似度给予一定加权（+0.02）
+    
+    Args:
+        similarities (numpy.array): 余弦相似度数组
+        threshold (float): 相似度阈值
+        
+    Returns:
+        numpy.array: 加权后的相似度数组
+    """
+    near_threshold = (similarities >= threshold - 0.05) & (similarities < threshold)
+    return np.where(near_threshold, similarities + 0.02, similarities)
+
+
+def match_face_features(input_feature, gallery_features, threshold=0.55, valid_mask=None):
+    """
+    矩阵化人脸特征比对函数 - 一次矩阵向量乘法计算与整个特征库的余弦相似度
+    
+    与compare_face_features语义一致（包括接近阈值时+0.02的加权规则），
+    但要求特征库的每一行已经L2归一化，因此无需逐个计算范数。
     
     Args:
         input_feature (numpy.array): 待比对的人脸特征向量 (512维)
-        db_features (list): 数据库中的人脸特征向量列表 [numpy.array, ...]
+        gallery_features (numpy.array): 已归一化的特征库矩阵 (N, 512)
         threshold (float): 相似度阈值，默认为0.55
+        valid_mask (numpy.array, optional): (N,) 布尔数组，False的行不参与比对
         
     Returns:
         tuple: (匹配结果列表, 最高相似度)
-            - matches: [(索引, 相似度值), ...]，按相似度降序排列
+            - matches: [(行索引, 相似度值), ...]，按相似度降序排列
             - max_similarity: 最高相似度值
         
     Raises:
         ValueError: 当输入特征格式不正确时抛出异常
     """
+    if not isinstance(input_feature, np.ndarray) or input_feature.shape != (512,):
+        raise ValueError("输入特征必须是512维numpy数组")
+    
+    if gallery_features is None or len(gallery_features) == 0:
+        return [], 0.0
+    
+    norm_input = np.linalg.norm(input_feature)
+    if norm_input == 0:
+        return [], 0.0
+    
+    # 一次矩阵向量乘法得到所有余弦相似度
+    query = (input_feature / norm_input).astype(gallery_features.dtype, copy=False)
+    similarities = gallery_features @ query
+    
+    weighted = weight_similarities(similarities, threshold)
+    
+    hits = weighted >= threshold
+    if valid_mask is not None:
+        hits &= valid_mask
+    hit_indices = np.flatnonzero(hits)
+    
+    # 按相似度降序排序（稳定排序，相同相似度保持原顺序）
+    order = np.argsort(-weighted[hit_indices], kind='stable')
+    hit_indices = hit_indices[order]
+    matches = [(int(i), float(weighted[i])) for i in hit_indices]
+    
+    # 计算最高相似度
+    max_similarity = matches[0][1] if matches else 0.0
+    
+    return matches, max_similarity
+
+
+# 支持的多人脸联合分配方法
+ASSIGNMENT_METHODS = ("greedy", "hungarian")
+
+
+def _linear_assignment(cost):
+    """
+    匈牙利算法（Kuhn-Munkres）求解最小代价分配
+    
+    行数不超过列数，每行分配到唯一的一列。内层对所有列的更新使用NumPy向量化，
+    复杂度为O(n^2 * m)，适用于一帧中的人脸数量级。
+    
+    Args:
+        cost (numpy.array): (n, m) 代价矩阵，n <= m
+        
+    Returns:
+        numpy.array: (n,) 每行分配到的列号
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)    # 列 -> 分配到的行（1起始，0表示未分配）
+    way = np.zeros(m + 1, dtype=np.int64)
+    
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            
+            used_cols = np.flatnonzero(used)
+            u[p[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[1:][free] -= delta
+            
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # 沿增广路径更新分配
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    
+    assignment = np.full(n, -1, dtype=np.int64)
+    cols = np.flatnonzero(p[1:])
+    assignment[p[cols + 1] - 1] = cols
+    return assignment
+
+
+def assign_face_features(input_features, gallery_features, threshold=0.55, valid_mask=None, method="greedy"):
+    """
+    多人脸联合分配函数 - 保证一帧中的多张人脸不会被分配到同一个用户
+    
+    一次矩阵乘法计算 人脸数×特征库 的完整相似度矩阵（与match_face_features相同的
+    近阈值加权），再求解一对一分配：
+    - greedy: 按相似度从高到低依次分配，人脸和用户都只能使用一次
+    - hungarian: 使分配的总相似度最大
+    
+    一对一分配中每张人脸最多只会用到自己相似度最高的F个用户（F为人脸数），
+    因此分配只在这些候选列上进行，代价与特征库规模无关。
+    
+    Args:
+        input_features (sequence): 人脸特征向量列表，每个为512维numpy数组，
+            无效特征（None或全零）不参与分配
+        gallery_features (numpy.array): 已归一化的特征库矩阵 (N, 512)
+        threshold (float): 相似度阈值，默认为0.55
+        valid_mask (numpy.array, optional): (N,) 布尔数组，False的行不参与比对
+        method (str): 分配方法，"greedy"或"hungarian"
+        
+    Returns:
+        tuple: (分配结果列表, 最高相似度列表)
+            - assignments: [(特征库行索引或None, 相似度值), ...]，与输入人脸一一对应
+            - max_similarities: 每张人脸超过阈值的最高相似度，无匹配时为0.0
+            
+    Raises:
+        ValueError: 当分配方法不支持或特征格式不正确时抛出异常
+    """
+    if method not in ASSIGNMENT_METHODS:
+        raise ValueError(f"不支持的分配方法: {method}")
+    
+    num_faces = len(input_features)
+    assignments = [(None, 0.0)] * num_faces
+    max_similarities = [0.0] * num_faces
+    if num_faces == 0 or gallery_features is None or len(gallery_features) == 0:
+        return assignments, max_similarities
+    
+    queries = np.zeros((num_faces, 512), dtype=gallery_features.dtype)
+    for i, feature in enumerate(input_features):
+        if feature is None:
+            continue
+        if not isinstance(feature, np.ndarray) or feature.shape != (512,):
+            raise ValueError("输入特征必须是512维numpy数组")
+        norm = np.linalg.norm(feature)
+        if norm > 0:
+            queries[i] = feature / norm
+    
+    # 一次矩阵乘法得到完整的相似度矩阵 (F, N)
+    similarities = queries @ gallery_features.T
+    weighted = weight_similarities(similarities, threshold)
+    hits = weighted >= threshold
+    if valid_mask is not None:
+        hits &= valid_mask[None, :]
+    
+    masked = np.where(hits, weighted, -np.inf)
+    has_hit = hits.any(axis=1)
+    for i in np.flatnonzero(has_hit):
+        max_similarities[i] = float(masked[i].max())
+    if not has_hit.any():
+        return assignments, max_similarities
+    
+    # 每张人脸只保留相似度最高的F列作为候选
+    k = min(num_faces, masked.shape[1])
+    if k < masked.shape[1]:
+        top = np.argpartition(-masked, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(masked.shape[1]), (num_faces, k))
+    cols = np.unique(top[hits[np.arange(num_faces)[:, None], top]])
+    sub_weighted = weighted[:, cols]
+    sub_hits = hits[:, cols]
+    
+    if method == "greedy":
+        pairs = np.flatnonzero(sub_hits)
+        pairs = pairs[np.argsort(-sub_weighted.ravel()[pairs], kind='stable')]
+        used_faces, used_cols = set(), set()
+        for pair in pairs:
+            face, col = divmod(int(pair), len(cols))
+            if face in used_faces or col in used_cols:
+                continue
+            used_faces.add(face)
+            used_cols.add(col)
+            assignments[face] = (int(cols[col]), float(sub_weighted[face, col]))
+    else:
+        # 追加F个"不分配"虚拟列（代价0），低于阈值的组合代价设为极大值
+        cost = np.where(sub_hits, -sub_weighted, 1e6)
+        cost = np.hstack([cost, np.zeros((num_faces, num_faces))])
+        for face, col in enumerate(_linear_assignment(cost)):
+            if col < len(cols) and sub_hits[face, col]:
+                assignments[face] = (int(cols[col]), float(sub_weighted[face, col]))
+    
+    return assignments, max_similarities
+
+
+def top_k_face_features(input_feature, gallery_features, k=5, valid_mask=None):
+    """
+    Top-k人脸特征检索函数 - 返回与输入特征最相似的k行
+    
+    使用np.argpartition在O(N)时间内选出前k个候选，只对这k个结果排序，
+    避免对整个特征库做O(N log N)的全排序。返回原始余弦相似度（不做阈值加权）。
+    
+    Args:
+        input_feature (numpy.array): 待检索的人脸特征向量 (512维)
+        gallery_features (numpy.array): 已归一化的特征库矩阵 (N, 512)
+        k (int): 返回结果数量，默认为5
+        valid_mask (numpy.array, optional): (N,) 布尔数组，False的行不参与检索
+        
+    Returns:
+        list: [(行索引, 相似度值), ...]，按相似度降序排列，最多k个
+        
+    Raises:
+        ValueError: 当输入特征格式不正确或k不是正整数时抛出异常
+    """
+    if not isinstance(input_feature, np.ndarray) or input_feature.shape != (512,):
+        raise ValueError("输入特征必须是512维numpy数组")
+    if not isinstance(k, (int, np.integer)) or k <= 0:
+        raise ValueError("k必须是正整数")
+    
+    if gallery_features is None or len(gallery_features) == 0:
+        return []
+    
+    norm_input = np.linalg.norm(input_feature)
+    if norm_input == 0:
+        return []
+    
+    query = (input_feature / norm_input).astype(gallery_features.dtype, copy=False)
+    similarities = np.asarray(gallery_features @ query, dtype=np.float64)
+    
+    # 无效行置为-inf，保证不会进入前k
+    if valid_mask is not None:
+        similarities = np.where(valid_mask, similarities, -np.inf)
+        k = min(k, int(np.count_nonzero(valid_mask)))
+    k = min(k, len(similarities))
+    if k == 0:
+        return []
+    
+    # O(N)选出前k个，再对k个结果排序
+    if k < len(similarities):
+        top_indices = np.argpartition(-similarities, k - 1)[:k]
+    else:
+        top_indices = np.arange(len(similarities))
+    top_indices = top_indices[np.argsort(-similarities[top_indices], kind='stable')]
+    
+    return [(int(i), float(similarities[i])) for i in top_indices]
+
+
+def compare_face_features(input_feature, db_features, threshold=0.55):
     """
     人脸特征比对函数 - 计算余弦相似度进行特征比对
     
+    接受未归一化的特征向量列表，归一化后交给match_face_features进行矩阵化比对。
+    
     Args:
         input_feature (numpy.array): 待比对的人脸特征向量 (512维)
         db_features (list): 数据库中的人脸特征向量列表 [numpy.array, ...]
@@ -266,41 +1042,31 @@ def compare_face_features(input_feature, db_features, threshold=0.55):
         if not isinstance(input_feature, np.ndarray) or input_feature.shape != (512,):
             raise ValueError("输入特征必须是512维numpy数组")
         
-        if not db_features:
+        if db_features is None or len(db_features) == 0:
+            return [], 0.0
+        
+        # 跳过格式不正确的数据库特征，同时记录原始索引
+        valid_indices = [
+            i for i, db_feature in enumerate(db_features)
+            if isinstance(db_feature, np.ndarray) and db_feature.shape == (512,)
+        ]
+        if not valid_indices:
             return [], 0.0
         
-        matches = []  # 存储匹配结果
+        # 组装特征矩阵并按行归一化（零向量不参与比对）
+        matrix = np.stack([db_features[i] for i in valid_indices]).astype(np.float64)
+        norms = np.linalg.norm(matrix, axis=1)
+        matrix /= np.where(norms > 0, norms, 1.0)[:, None]
         
-        # 计算输入特征与每个数据库特征的余弦相似度
-        for i, db_feature in enumerate(db_features):
-            # 验证数据库特征
-            if not isinstance(db_feature, np.ndarray) or db_feature.shape != (512,):
-                continue
-            
-            # 计算余弦相似度
-            # cos_sim = (a·b) / (||a||×||b||)
-            dot_product = np.dot(input_feature, db_feature)
-            norm_input = np.linalg.norm(input_feature)
-            norm_db = np.linalg.norm(db_feature)
-            
-            # 避免除零错误
-            if norm_input > 0 and norm_db > 0:
-                similarity = dot_product / (norm_input * norm_db)
-                
-                # 相似度优化：对于接近阈值的匹配给予一定加权
-                if threshold - 0.05 <= similarity < threshold:
-                    # 对于接近阈值的情况，轻微提高相似度
-                    weighted_similarity = similarity + 0.02
-                    if weighted_similarity >= threshold:
-                        matches.append((i, weighted_similarity))
-                elif similarity >= threshold:
-                    matches.append((i, similarity))
-        
-        # 按相似度降序排序
-        matches.sort(key=lambda x: x[1], reverse=True)
-        
-        # 计算最高相似度
-        max_similarity = matches[0][1] if matches else 0.0
+        matches, max_similarity = match_face_features(
+            input_feature.astype(np.float64),
+            matrix,
+            threshold=threshold,
+            valid_mask=norms > 0
+        )
+        
+        # 映射回原始索引
+        matches = [(valid_indices[i], similarity) for i, similarity in matches]
         
         return matches, max_similarity
         
@@ -0,0 +1,141 @@
+"""特征存储模块 - 单文件、只追加的人脸特征矩阵
+
+所有用户的特征向量按行顺序写入同一个float32二进制文件（每行512维），
+用户表通过User.feature_row记录自己所在的行号。读取时使用np.memmap以只读
+方式映射整个文件，多个gunicorn工作进程映射同一文件时共享操作系统的页缓存，
+不会各自复制一份特征库。
+
+典型用法：
+    from app.utils.feature_store import feature_store
+
+    row = feature_store.append(feature_vector)
+    features = feature_store.open_readonly()  # (N, 512) 只读memmap
+"""
+import os
+
+import numpy as np
+
+try:
+    import fcntl  # 仅POSIX系统可用，用于多进程追加写入时加锁
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from ..config import config
+
+
+class FeatureStore:
+    """
+    只追加的特征矩阵文件
+
+    每行是L2归一化后的float32特征向量。删除用户时不修改文件，
+    未被任何用户引用的行视为无效行。
+
+    Attributes:
+        FEATURE_DIM (int): 特征向量维度
+        DTYPE: 存储数据类型
+    """
+
+    FEATURE_DIM = 512
+    DTYPE = np.float32
+
+    def __init__(self, path=None):
+        """
+        初始化特征存储
+
+        Args:
+            path (str, optional): 特征矩阵文件路径，默认使用config.FEATURE_STORE_PATH
+        """
+        self.path = path if path else config.FEATURE_STORE_PATH
+        self.row_bytes = self.FEATURE_DIM * np.dtype(self.DTYPE).itemsize
+
+    def __len__(self):
+        """返回文件中完整写入的行数"""
+        try:
+            return os.path.getsize(self.path) // self.row_bytes
+        except OSError:
+            return 0
+
+    def _normalize(self, features):
+        """把特征转换为L2归一化的float32矩阵"""
+        matrix = np.asarray(features, dtype=self.DTYPE).reshape(-1, self.FEATURE_DIM)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.ascontiguousarray(matrix / np.where(norms > 0, norms, 1.0), dtype=self.DTYPE)
+
+    def append_many(self, features):
+        """
+        追加多行特征向量
+
+        写入期间持有文件排他锁，保证多个进程同时注册时行号不冲突；
+        若文件末尾存在上次中断写入的半行数据，会先截断。
+
+        Args:
+            features (sequence or numpy.array): 特征向量列表或(N, 512)矩阵
+
+        Returns:
+            list: 每个特征对应的行号
+        """
+        matrix = self._normalize(features)
+        if len(matrix) == 0:
+            return []
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                size = os.fstat(f.fileno()).st_size
+                if size % self.row_bytes:
+                    size -= size % self.row_bytes
+                    f.truncate(size)
+                first_row = size // self.row_bytes
+                f.write(matrix.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+        return list(range(first_row, first_row + len(matrix)))
+
+    def append(self, feature):
+        """
+        追加单个特征向量
+
+        Args:
+            feature (numpy.array): 512维特征向量
+
+        Returns:
+            int: 写入的行号
+        """
+        return self.append_many([feature])[0]
+
+    def open_readonly(self):
+        """
+        以只读方式映射整个特征矩阵
+
+        Returns:
+            numpy.memmap or numpy.array: (N, 512) 特征矩阵，文件为空时返回空数组
+        """
+        rows = len(self)
+        if rows == 0:
+            return np.empty((0, self.FEATURE_DIM), dtype=self.DTYPE)
+        return np.memmap(self.path, dtype=self.DTYPE, mode="r", shape=(rows, self.FEATURE_DIM))
+
+    def read_row(self, row):
+        """
+        读取单行特征向量
+
+        Args:
+            row (int): 行号
+
+        Returns:
+            numpy.array or None: 512维特征向量，行号无效时返回None
+        """
+        features = self.open_readonly()
+        if row is None or not 0 <= row < len(features):
+            return None
+        return np.array(features[row])
+
+
+# 默认特征存储实例
+feature_store = FeatureStore()
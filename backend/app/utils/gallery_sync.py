@@ -0,0 +1,169 @@
+"""特征库同步模块 - 多工作进程之间的人脸特征库变更日志
+
+gunicorn以多个工作进程部署时，每个进程都持有自己的人脸特征库（face_gallery）。
+某个进程中的注册或删除会在数据库的gallery_changes表中追加一条变更记录，
+自增主键即全局版本号。其他进程在使用特征库前只查询比自己版本号新的记录
+并依次应用，不需要全量重新加载，也不会返回已删除或缺失新注册的用户。
+
+变更日志只保留最近config.GALLERY_JOURNAL_MAX_ENTRIES条，落后太多的进程
+（需要的记录已被清理）会改为全量重新加载。
+
+典型用法：
+    from app.utils.gallery_sync import gallery_journal
+
+    version = gallery_journal.append("add", user_id=1, identity_id="USR001", name="张三", feature_row=0)
+    changes, complete = gallery_journal.changes_since(last_applied_version)
+"""
+from ..config import config
+from ..models.models import GalleryChange, SessionLocal
+
+
+class GalleryJournal:
+    """
+    特征库变更日志
+
+    Attributes:
+        OPS (tuple): 支持的变更类型
+        PRUNE_INTERVAL (int): 每追加多少条记录检查一次日志清理
+    """
+
+    OPS = ("add", "remove", "clear")
+    PRUNE_INTERVAL = 1000
+
+    def __init__(self, session_factory=None, max_entries=None):
+        """
+        初始化变更日志
+
+        Args:
+            session_factory (callable, optional): 数据库会话工厂，默认使用SessionLocal
+            max_entries (int, optional): 最多保留的记录数，默认使用config.GALLERY_JOURNAL_MAX_ENTRIES
+        """
+        self._session_factory = session_factory if session_factory is not None else SessionLocal
+        self.max_entries = max_entries if max_entries is not None else config.GALLERY_JOURNAL_MAX_ENTRIES
+
+    def latest_version(self):
+        """
+        获取当前最新版本号
+
+        Returns:
+            int: 最新变更记录的ID，日志为空时返回0
+        """
+        db = self._session_factory()
+        try:
+            latest = db.query(GalleryChange.id).order_by(GalleryChange.id.desc()).first()
+            return latest[0] if latest else 0
+        finally:
+            db.close()
+
+    def append(self, op, user_id=None, identity_id=None, name=None, feature_row=None):
+        """
+        追加一条变更记录
+
+        Args:
+            op (str): 变更类型，"add"、"remove"或"clear"
+            user_id (int, optional): 数据库用户ID
+            identity_id (str, optional): 身份ID
+            name (str, optional): 用户名
+            feature_row (int, optional): 特征矩阵文件中的行号
+
+        Returns:
+            int: 新记录的版本号
+
+        Raises:
+            ValueError: 当变更类型不支持时抛出
+        """
+        return self.append_many([
+            {"op": op, "user_id": user_id, "identity_id": identity_id, "name": name, "feature_row": feature_row}
+        ])[-1]
+
+    def append_many(self, changes):
+        """
+        在一个事务中追加多条变更记录
+
+        Args:
+            changes (list): 变更字典列表，键与append()的参数相同
+
+        Returns:
+            list: 每条记录的版本号
+
+        Raises:
+            ValueError: 当变更类型不支持时抛出
+        """
+        if not changes:
+            return []
+        db = self._session_factory()
+        try:
+            versions = self.add_to_session(db, changes)
+            db.commit()
+            return versions
+        finally:
+            db.close()
+
+    def add_to_session(self, db, changes):
+        """
+        在调用方的数据库会话中写入变更记录（不提交）
+
+        变更记录与调用方的业务数据（如新插入的用户）在同一事务中提交或回滚，
+        不会出现用户已入库而变更日志缺失的情况。
+
+        Args:
+            db (Session): 调用方的数据库会话，须与变更日志使用同一个数据库
+            changes (list): 变更字典列表，键与append()的参数相同
+
+        Returns:
+            list: 每条记录的版本号（flush后分配，事务提交后生效）
+
+        Raises:
+            ValueError: 当变更类型不支持时抛出
+        """
+        for change in changes:
+            if change.get("op") not in self.OPS:
+                raise ValueError(f"不支持的特征库变更类型: {change.get('op')}")
+        if not changes:
+            return []
+
+        records = [GalleryChange(**change) for change in changes]
+        db.add_all(records)
+        db.flush()
+        versions = [record.id for record in records]
+        if versions[-1] // self.PRUNE_INTERVAL != (versions[0] - 1) // self.PRUNE_INTERVAL:
+            self._prune(db, versions[-1])
+        return versions
+
+    def _prune(self, db, latest_version):
+        """删除超出保留条数的旧记录（随调用方的事务提交）"""
+        cutoff = latest_version - self.max_entries
+        if cutoff <= 0:
+            return
+        db.query(GalleryChange).filter(GalleryChange.id <= cutoff).delete(synchronize_session=False)
+
+    def changes_since(self, version):
+        """
+        获取指定版本之后的全部变更
+
+        Args:
+            version (int): 已应用的版本号
+
+        Returns:
+            tuple: (变更列表, 是否完整)
+                - changes: [GalleryChange, ...]，按版本号升序排列
+                - complete: False表示所需的部分记录已被清理，调用方应全量重新加载
+        """
+        db = self._session_factory()
+        try:
+            changes = (
+                db.query(GalleryChange)
+                .filter(GalleryChange.id > version)
+                .order_by(GalleryChange.id)
+                .all()
+            )
+            # 版本号由SQLite按提交顺序连续分配，出现跳号说明中间的记录已被清理
+            complete = not changes or changes[0].id == version + 1
+            db.expunge_all()
+            return changes, complete
+        finally:
+            db.close()
+
+
+# 全局变更日志实例
+gallery_journal = GalleryJournal()
@@ -0,0 +1,162 @@
+"""特征量化模块 - 用于粗筛的低精度人脸特征矩阵
+
+每个用户的float32特征占2KB。粗筛阶段只需要近似的相似度排序，
+因此可以在内存中保存一份低精度副本用于全库扫描：
+- int8: 每行512字节加一个float32缩放系数（按行对称标量量化），相似度误差约1e-2
+
+NumPy没有低精度矩阵乘法，扫描时每个分块先转换到线程内复用的float32缓冲区再计算，
+因此量化副本主要用于节省内存，单次查询的扫描耗时不低于直接扫描float32特征。
+
+粗筛选出相似度最高的若干候选行后，再用特征存储中的float32特征精确重排，
+因此最终的相似度数值和阈值判定与未量化时保持一致。
+
+典型用法：
+    from app.utils.quantization import QuantizedMatrix
+
+    quantized = QuantizedMatrix("int8")
+    quantized.extend(features)
+    candidates = quantized.top_candidates(query_feature, k=100, valid_mask=active)
+"""
+import threading
+
+import numpy as np
+
+
+# 支持的量化类型
+QUANTIZATION_TYPES = ("int8",)
+
+
+class QuantizedMatrix:
+    """
+    低精度特征矩阵（只追加）
+
+    行号与特征存储的行号一一对应，新增用户时追加新行。
+
+    Attributes:
+        FEATURE_DIM (int): 特征向量维度
+        INITIAL_CAPACITY (int): 初始预留行数
+        CHUNK_SIZE (int): 计算相似度时每次转换为float32的行数
+    """
+
+    FEATURE_DIM = 512
+    INITIAL_CAPACITY = 256
+    CHUNK_SIZE = 1024
+
+    def __init__(self, qtype):
+        """
+        初始化空的量化矩阵
+
+        Args:
+            qtype (str): 量化类型，目前只支持"int8"
+
+        Raises:
+            ValueError: 当量化类型不支持时抛出
+        """
+        if qtype not in QUANTIZATION_TYPES:
+            raise ValueError(f"不支持的特征量化类型: {qtype}")
+        self.qtype = qtype
+        self._data = np.zeros((self.INITIAL_CAPACITY, self.FEATURE_DIM), dtype=np.int8)
+        self._scales = np.ones(self.INITIAL_CAPACITY, dtype=np.float32)
+        self._count = 0
+        self._buffers = threading.local()  # 每个线程复用的float32转换缓冲区
+
+    def __len__(self):
+        """返回已量化的行数"""
+        return self._count
+
+    @property
+    def nbytes(self):
+        """已量化数据实际占用的字节数（不含预留容量）"""
+        return self._count * (self._data.itemsize * self.FEATURE_DIM + self._scales.itemsize)
+
+    def _grow(self, min_capacity):
+        """扩容（容量翻倍）"""
+        capacity = len(self._data)
+        if min_capacity <= capacity:
+            return
+        new_capacity = max(min_capacity, capacity * 2)
+        data = np.zeros((new_capacity, self.FEATURE_DIM), dtype=self._data.dtype)
+        data[:self._count] = self._data[:self._count]
+        scales = np.ones(new_capacity, dtype=np.float32)
+        scales[:self._count] = self._scales[:self._count]
+        self._data, self._scales = data, scales
+
+    def extend(self, features):
+        """
+        追加特征行（分块转换，避免一次性复制整个float32矩阵）
+
+        Args:
+            features (numpy.array): (M, 512) 已归一化的特征矩阵（可以是memmap）
+        """
+        total = len(features)
+        self._grow(self._count + total)
+        for start in range(0, total, self.CHUNK_SIZE):
+            chunk = np.asarray(features[start:start + self.CHUNK_SIZE], dtype=np.float32)
+            rows = slice(self._count, self._count + len(chunk))
+            # 按行对称量化：x ≈ scale * q，q取值[-127, 127]
+            max_abs = np.abs(chunk).max(axis=1)
+            scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+            self._data[rows] = np.clip(np.rint(chunk / scales[:, None]), -127, 127).astype(np.int8)
+            self._scales[rows] = scales
+            self._count += len(chunk)
+
+    def scores(self, query):
+        """
+        计算查询向量与所有行的近似余弦相似度
+
+        Args:
+            query (numpy.array): 已归一化的512维查询向量
+
+        Returns:
+            numpy.array: (N,) float32近似相似度
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        # 先取局部引用，扫描期间其他线程追加新行不影响本次结果
+        count, data, row_scales = self._count, self._data, self._scales
+        scores = np.empty(count, dtype=np.float32)
+        buffer = self._chunk_buffer()
+        for start in range(0, count, self.CHUNK_SIZE):
+            end = min(start + self.CHUNK_SIZE, count)
+            chunk = buffer[:end - start]
+            np.copyto(chunk, data[start:end])
+            np.dot(chunk, query, out=scores[start:end])
+        scores *= row_scales[:count]
+        return scores
+
+    def _chunk_buffer(self):
+        """返回当前线程的float32转换缓冲区（首次使用时分配，之后每次查询复用）"""
+        buffer = getattr(self._buffers, "chunk", None)
+        if buffer is None:
+            buffer = np.empty((self.CHUNK_SIZE, self.FEATURE_DIM), dtype=np.float32)
+            self._buffers.chunk = buffer
+        return buffer
+
+    def top_candidates(self, query, k, valid_mask=None):
+        """
+        粗筛：返回近似相似度最高的k个有效行
+
+        Args:
+            query (numpy.array): 512维查询向量
+            k (int): 候选数量
+            valid_mask (numpy.array, optional): (N,) 布尔数组，False的行不参与粗筛
+
+        Returns:
+            numpy.array: 候选行号（升序）
+        """
+        norm = np.linalg.norm(query)
+        if self._count == 0 or norm == 0:
+            return np.empty(0, dtype=np.int64)
+        scores = self.scores(np.asarray(query) / norm)
+        if valid_mask is not None:
+            n = min(len(valid_mask), self._count)
+            scores = scores[:n]
+            scores[~valid_mask[:n]] = -np.inf
+            k = min(k, int(np.count_nonzero(valid_mask[:n])))
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        return np.sort(candidates).astype(np.int64)
@@ -63,7 +63,7 @@ class FaceUtilsTest(unittest.TestCase):
             if face_images:
                 for i, face_img in enumerate(face_images):
                     face_save_path = os.path.join(TEST_OUTPUT_DIR, f"detected_face_{i}.jpg")
-                    face_img.save(face_save_path)
+                    Image.fromarray(face_img).save(face_save_path)
                     print(f"保存裁剪后的人脸图像: {face_save_path}")
             
             # 断言检测结果至少有一个人脸
@@ -94,7 +94,7 @@ class FaceUtilsTest(unittest.TestCase):
             # 过滤掉太小的人脸图像
             valid_face_images = []
             for img in face_images:
-                h, w = img.size if hasattr(img, 'size') else img.shape[:2]
+                h, w = img.shape[:2]
                 if h >= 16 and w >= 16:  # 设置最小尺寸阈值
                     valid_face_images.append(img)
             
@@ -0,0 +1,221 @@
+"""CPU线程预算模块 - 统一设置PyTorch、TensorFlow、onnxruntime和OpenCV的线程数
+
+每个工作进程同时使用多个带线程池的库：TensorFlow（mtcnn_tf检测器）、PyTorch（FaceNet和facenet_pytorch检测器）、
+onnxruntime（onnx特征提取后端）以及OpenCV（人脸预处理中的resize/equalizeHist/GaussianBlur），
+它们默认都按机器的全部核数创建线程。gunicorn -w 4部署时，4个进程各自按全部核数并行，
+线程数远超核数，上下文切换和缓存争抢使吞吐量反而下降。
+
+线程预算按"可用核数 / 同一主机上的工作进程数"分配给每个进程（至少1个线程）：
+- 算子内并行线程数（intra_op）：PyTorch set_num_threads、TensorFlow intra_op、onnxruntime intra_op、cv2.setNumThreads
+- 算子间并行线程数（inter_op）：config.THREAD_BUDGET_INTER_OP
+
+预算在各框架加载模型时应用（face_utils.get_detector/get_embedder），每个框架只应用一次；
+TensorFlow和PyTorch的算子间线程数只能在运行时初始化前设置，来不及设置时记录在应用结果中。
+当前预算和实际生效的线程数可通过GET /api/diagnostics查看。
+
+典型用法：
+    from app.utils.thread_budget import apply_thread_budget
+
+    apply_thread_budget("cv2", "torch")
+"""
+import os
+import sys
+import threading
+
+from ..config import config
+
+
+# 支持设置线程数的框架
+FRAMEWORKS = ("cv2", "torch", "tensorflow", "onnxruntime")
+
+# 框架名称 -> 应用结果（首次应用后记录，不重复设置）
+_applied = {}
+_budget_lock = threading.Lock()
+
+
+def available_cpus():
+    """
+    当前进程可用的CPU核数（优先按CPU亲和性，容器中通过cpuset限制的核数也能正确反映）
+
+    Returns:
+        int: 可用核数
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def configured_workers():
+    """
+    同一主机上的工作进程数：config.THREAD_BUDGET_WORKERS，未设置时读取环境变量WEB_CONCURRENCY，都没有时为1
+
+    Returns:
+        int: 工作进程数
+    """
+    if config.THREAD_BUDGET_WORKERS:
+        return int(config.THREAD_BUDGET_WORKERS)
+    try:
+        return max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+    except ValueError:
+        return 1
+
+
+def compute_thread_budget(workers=None, cpus=None, inter_op=None):
+    """
+    计算每个工作进程的线程预算
+
+    Args:
+        workers (int, optional): 工作进程数，默认configured_workers()
+        cpus (int, optional): 可用核数，默认config.THREAD_BUDGET_CPUS或available_cpus()
+        inter_op (int, optional): 算子间并行线程数，默认config.THREAD_BUDGET_INTER_OP
+
+    Returns:
+        dict: {"cpus": 可用核数, "workers": 工作进程数, "intra_op": 算子内线程数, "inter_op": 算子间线程数}
+    """
+    workers = max(1, int(workers or configured_workers()))
+    cpus = max(1, int(cpus or config.THREAD_BUDGET_CPUS or available_cpus()))
+    inter_op = max(1, int(inter_op or config.THREAD_BUDGET_INTER_OP))
+    return {
+        "cpus": cpus,
+        "workers": workers,
+        "intra_op": max(1, cpus // workers),
+        "inter_op": inter_op,
+    }
+
+
+def _apply_cv2(budget):
+    import cv2
+
+    cv2.setNumThreads(budget["intra_op"])
+    return {"intra_op": cv2.getNumThreads()}
+
+
+def _apply_torch(budget):
+    import torch
+
+    result = {}
+    torch.set_num_threads(budget["intra_op"])
+    result["intra_op"] = torch.get_num_threads()
+    try:
+        torch.set_interop_threads(budget["inter_op"])
+    except RuntimeError as e:
+        # 已经执行过算子间并行的任务后不能再修改
+        result["inter_op_error"] = str(e)
+    result["inter_op"] = torch.get_num_interop_threads()
+    return result
+
+
+def _apply_tensorflow(budget):
+    import tensorflow as tf
+
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(budget["intra_op"])
+        tf.config.threading.set_inter_op_parallelism_threads(budget["inter_op"])
+    except RuntimeError as e:
+        # TensorFlow运行时初始化后不能再修改线程数
+        return {"error": str(e)}
+    return {
+        "intra_op": tf.config.threading.get_intra_op_parallelism_threads(),
+        "inter_op": tf.config.threading.get_inter_op_parallelism_threads(),
+    }
+
+
+def _apply_onnxruntime(budget):
+    # onnxruntime没有全局线程设置，ONNXEmbedder创建会话时按预算设置SessionOptions
+    return {"intra_op": budget["intra_op"], "inter_op": budget["inter_op"]}
+
+
+_APPLIERS = {
+    "cv2": _apply_cv2,
+    "torch": _apply_torch,
+    "tensorflow": _apply_tensorflow,
+    "onnxruntime": _apply_onnxruntime,
+}
+
+
+def apply_thread_budget(*frameworks):
+    """
+    按线程预算设置各框架的线程数（每个框架只在首次调用时设置）
+
+    PyTorch和TensorFlow尚未导入时，同时设置OMP_NUM_THREADS/MKL_NUM_THREADS环境变量（未设置过的情况下），
+    限制它们导入时创建的OpenMP/MKL线程池。config.THREAD_BUDGET_ENABLED为False时不做任何设置。
+
+    Args:
+        *frameworks (str): 框架名称，FRAMEWORKS中的值，None会被忽略
+
+    Returns:
+        dict: 框架名称 -> 应用结果（实际生效的线程数，或框架不可用/设置失败的原因）
+
+    Raises:
+        ValueError: 当框架名称不支持时抛出
+    """
+    if not config.THREAD_BUDGET_ENABLED:
+        return {}
+
+    budget = compute_thread_budget()
+    results = {}
+    with _budget_lock:
+        for framework in frameworks:
+            if framework is None:
+                continue
+            if framework not in _APPLIERS:
+                raise ValueError(f"不支持的线程预算框架: {framework}")
+            if framework not in _applied:
+                if framework in ("torch", "tensorflow") and framework not in sys.modules:
+                    os.environ.setdefault("OMP_NUM_THREADS", str(budget["intra_op"]))
+                    os.environ.setdefault("MKL_NUM_THREADS", str(budget["intra_op"]))
+                try:
+                    _applied[framework] = _APPLIERS[framework](budget)
+                except ImportError as e:
+                    _applied[framework] = {"error": f"未安装: {e}"}
+                print(f"🧵 {framework} 线程预算: {_applied[framework]}")
+            results[framework] = _applied[framework]
+    return results
+
+
+def thread_report():
+    """
+    当前进程的线程预算和实际线程数（不会为了报告而导入尚未加载的框架）
+
+    Returns:
+        dict: 诊断信息
+            - enabled: 是否启用线程预算
+            - budget: compute_thread_budget()的结果
+            - applied: 已应用预算的框架及应用结果
+            - current: 已加载框架当前的线程数
+            - os_threads: 进程的操作系统线程数（仅Linux）
+    """
+    current = {}
+    if "cv2" in sys.modules:
+        current["cv2"] = {"intra_op": sys.modules["cv2"].getNumThreads()}
+    if "torch" in sys.modules:
+        torch = sys.modules["torch"]
+        current["torch"] = {"intra_op": torch.get_num_threads(), "inter_op": torch.get_num_interop_threads()}
+    if "tensorflow" in sys.modules:
+        threading_config = sys.modules["tensorflow"].config.threading
+        current["tensorflow"] = {
+            "intra_op": threading_config.get_intra_op_parallelism_threads(),
+            "inter_op": threading_config.get_inter_op_parallelism_threads(),
+        }
+
+    with _budget_lock:
+        applied = dict(_applied)
+    return {
+        "enabled": config.THREAD_BUDGET_ENABLED,
+        "budget": compute_thread_budget(),
+        "applied": applied,
+        "current": current,
+        "os_threads": _os_thread_count(),
+    }
+
+
+def _os_thread_count():
+    """读取/proc/self/status中的线程数，非Linux系统返回None"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
@@ -12,6 +12,7 @@
 import sqlite3
 import os
 from app.config import Config
+from app.utils.face_gallery import face_gallery
 import shutil
 
 class UserDataManager:
@@ -224,6 +225,10 @@ class UserDataManager:
             
             print(f"[DEBUG] 删除数据库记录完成，影响行数: {deleted_rows}")
             
+            # 同步移除内存特征库中的对应特征
+            if deleted_rows:
+                face_gallery.remove(user_id)
+            
             # 2. 删除关联的图像文件
             deleted_files = []
             for file_path in files_to_delete:
@@ -434,6 +439,9 @@ class UserDataManager:
             conn.commit()
             conn.close()
             
+            # 同步清空内存特征库
+            face_gallery.clear()
+            
             # 删除关联的图像文件
             deleted_files = []
             for user in users:
@@ -0,0 +1,129 @@
+"""摄像头帧上传基准测试 - JSON+base64、原始JPEG请求体和multipart三种格式的传输字节数与服务端CPU耗时
+
+生成不同分辨率的摄像头帧JPEG（也可用--images指定真实照片目录），分别按三种格式构造请求，
+通过Flask测试客户端发送到一个只执行"read_camera_request读取图像字节 → decode_image解码"的路由，
+报告每种格式的请求体字节数，以及服务端在路由内读取+解码的平均CPU时间（time.process_time）和墙钟时间。
+不包含人脸检测和特征提取，它们与请求格式无关。
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_camera_upload.py
+    python benchmarks/bench_camera_upload.py --images data/test_images --repeat 50
+"""
+import argparse
+import base64
+import glob
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from flask import Flask, jsonify, request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.frames import read_camera_request
+from app.utils.face_utils import decode_image, encode_jpeg
+
+
+def synthetic_frames(sizes, quality):
+    """生成指定尺寸的摄像头帧JPEG（平滑渐变叠加噪声，压缩率接近真实画面）"""
+    rng = np.random.default_rng(0)
+    samples = []
+    for width, height in sizes:
+        gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+        noise = rng.normal(0, 12, size=(height, width, 3)).astype(np.float32)
+        rgb = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+        samples.append((f"{width}x{height}", encode_jpeg(rgb, quality=quality)))
+    return samples
+
+
+def load_frames(image_dir):
+    """读取目录中的JPEG文件内容"""
+    paths = sorted(
+        path for path in glob.glob(os.path.join(image_dir, "*"))
+        if path.lower().endswith((".jpg", ".jpeg"))
+    )
+    samples = []
+    for path in paths:
+        with open(path, "rb") as f:
+            samples.append((os.path.basename(path), f.read()))
+    return samples
+
+
+def create_bench_app():
+    """只做请求读取和图像解码的路由，在路由内统计CPU和墙钟时间"""
+    app = Flask(__name__)
+
+    @app.route("/frame", methods=["POST"])
+    def frame():
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        fields, image_bytes = read_camera_request(request)
+        image = decode_image(image_bytes)
+        return jsonify({
+            "cpu": time.process_time() - cpu_start,
+            "wall": time.perf_counter() - wall_start,
+            "shape": list(image.shape),
+            "fields": sorted(fields),
+        })
+
+    return app
+
+
+def build_requests(data):
+    """按三种格式构造请求参数，返回[(格式名称, 请求体字节数, test_client.post关键字参数的工厂函数)]"""
+    face_box = json.dumps([100, 80, 300, 320])
+    data_url = "data:image/jpeg;base64," + base64.b64encode(data).decode("ascii")
+    json_body = json.dumps({"name": "bench", "face_box": [100, 80, 300, 320], "image": data_url}).encode("utf-8")
+
+    app = Flask(__name__)
+    with app.test_request_context(
+        "/frame", method="POST", data={"name": "bench", "face_box": face_box, "image": (io.BytesIO(data), "frame.jpg", "image/jpeg")}
+    ) as context:
+        multipart_size = context.request.content_length
+
+    return [
+        ("JSON+base64", len(json_body), lambda: {"data": json_body, "content_type": "application/json"}),
+        ("原始JPEG", len(data), lambda: {
+            "query_string": {"name": "bench", "face_box": face_box}, "data": data, "content_type": "image/jpeg"
+        }),
+        ("multipart", multipart_size, lambda: {
+            "data": {"name": "bench", "face_box": face_box, "image": (io.BytesIO(data), "frame.jpg", "image/jpeg")}
+        }),
+    ]
+
+
+def measure(client, make_kwargs, repeat):
+    """返回(平均服务端CPU时间ms, 平均服务端墙钟时间ms)"""
+    client.post("/frame", **make_kwargs())  # 预热
+    cpu = wall = 0.0
+    for _ in range(repeat):
+        result = client.post("/frame", **make_kwargs()).get_json()
+        cpu += result["cpu"]
+        wall += result["wall"]
+    return cpu / repeat * 1000, wall / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="摄像头帧上传格式基准测试")
+    parser.add_argument("--images", help="JPEG图片目录，不指定时使用生成的摄像头帧")
+    parser.add_argument("--quality", type=int, default=95, help="生成帧的JPEG质量（前端识别页canvas.toBlob使用0.95）")
+    parser.add_argument("--repeat", type=int, default=30, help="每种格式的请求次数")
+    args = parser.parse_args()
+
+    samples = load_frames(args.images) if args.images else synthetic_frames([(640, 480), (1280, 720), (1920, 1080)], args.quality)
+    if not samples:
+        raise SystemExit(f"目录中没有JPEG图片: {args.images}")
+    print(f"📊 {len(samples)} 帧，每种格式 {args.repeat} 次请求，服务端时间为路由内读取请求+解码图像")
+
+    client = create_bench_app().test_client()
+    print(f"{'帧':<16}{'格式':<14}{'请求体(KB)':>12}{'相对JPEG':>10}{'CPU(ms)':>10}{'墙钟(ms)':>10}")
+    for name, data in samples:
+        for format_name, size, make_kwargs in build_requests(data):
+            cpu_ms, wall_ms = measure(client, make_kwargs, args.repeat)
+            print(f"{name:<16}{format_name:<14}{size / 1024:>12.1f}{size / len(data):>10.2f}{cpu_ms:>10.2f}{wall_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
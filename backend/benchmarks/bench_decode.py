@@ -0,0 +1,91 @@
+"""上传图片解码基准测试 - 原分辨率解码与decode_upload缩小解码的耗时和峰值内存
+
+生成不同分辨率的JPEG（也可用--images指定真实照片目录），分别用decode_image按原分辨率解码
+和decode_upload按config.UPLOAD_DECODE_MIN_SIDE缩小解码，报告平均解码耗时、解码后的尺寸
+以及解码过程中numpy数组的峰值内存（tracemalloc统计，OpenCV解码结果以numpy数组分配）。
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_decode.py
+    python benchmarks/bench_decode.py --images data/test_images --min-side 1920 --repeat 10
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import config
+from app.utils.face_utils import decode_image, decode_upload, encode_jpeg
+
+
+def synthetic_jpegs(sizes):
+    """生成指定尺寸的JPEG（平滑渐变叠加噪声，压缩率接近真实照片）"""
+    rng = np.random.default_rng(0)
+    samples = []
+    for width, height in sizes:
+        gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+        noise = rng.normal(0, 20, size=(height, width, 3)).astype(np.float32)
+        rgb = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+        samples.append((f"{width}x{height}", encode_jpeg(rgb, quality=90)))
+    return samples
+
+
+def load_jpegs(image_dir):
+    """读取目录中的JPEG文件内容"""
+    paths = sorted(
+        path for path in glob.glob(os.path.join(image_dir, "*"))
+        if path.lower().endswith((".jpg", ".jpeg"))
+    )
+    samples = []
+    for path in paths:
+        with open(path, "rb") as f:
+            samples.append((os.path.basename(path), f.read()))
+    return samples
+
+
+def measure(decode, data, repeat):
+    """返回(平均耗时ms, 峰值内存MB, 解码后的尺寸)"""
+    tracemalloc.start()
+    image = decode(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    shape = image.shape
+    del image
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        decode(data)
+    return (time.perf_counter() - start) / repeat * 1000, peak / 1024 / 1024, f"{shape[1]}x{shape[0]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上传图片解码基准测试")
+    parser.add_argument("--images", help="JPEG照片目录，不指定时使用生成的图片")
+    parser.add_argument("--min-side", type=int, default=config.UPLOAD_DECODE_MIN_SIDE, help="缩小解码后最长边的下限")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数")
+    args = parser.parse_args()
+
+    samples = load_jpegs(args.images) if args.images else synthetic_jpegs([(1920, 1080), (4032, 3024), (6000, 4000), (8160, 6120)])
+    if not samples:
+        raise SystemExit(f"目录中没有JPEG图片: {args.images}")
+    print(f"📊 {len(samples)} 张JPEG，缩小解码最长边下限 {args.min_side}，重复 {args.repeat} 次")
+
+    print(f"{'图片':<24}{'文件(MB)':>10}{'原分辨率(ms)':>14}{'峰值(MB)':>10}{'缩小解码(ms)':>14}{'峰值(MB)':>10}{'解码尺寸':>12}")
+    for name, data in samples:
+        full_ms, full_peak, _ = measure(decode_image, data, args.repeat)
+        reduced_ms, reduced_peak, shape = measure(
+            lambda payload: decode_upload(payload, min_side=args.min_side)[0], data, args.repeat
+        )
+        print(
+            f"{name:<24}{len(data) / 1024 / 1024:>10.2f}{full_ms:>14.1f}{full_peak:>10.1f}"
+            f"{reduced_ms:>14.1f}{reduced_peak:>10.1f}{shape:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""人脸检测后端基准测试 - 加载耗时、检测延迟和常驻内存
+
+每个后端在独立的子进程中运行，分别报告：
+- 加载耗时：导入框架并创建检测器
+- 单张延迟：逐张检测测试图片的平均耗时
+- 批量延迟：同尺寸图片一次批量检测时平均每张的耗时
+- 档位检测延迟：按检测档位（--profile）的参数和detect_face的缩放策略检测的平均耗时，及检出的人脸数
+- RSS：检测器加载并执行检测后进程的峰值常驻内存，以及同时加载FaceNet后的峰值
+  （模拟工作进程的实际内存占用：mtcnn_tf需要TensorFlow + PyTorch，facenet_pytorch只需要PyTorch）
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_detectors.py
+    python benchmarks/bench_detectors.py --backends facenet_pytorch --repeat 20
+    python benchmarks/bench_detectors.py --max-side 0 --profile fast  # 原始分辨率手机照片，注册场景
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.config import config
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB，Linux下ru_maxrss单位为KB）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_images(image_dir, max_side):
+    """读取测试图片并缩放到最长边不超过max_side（0表示保持原始分辨率）"""
+    paths = sorted(
+        path for path in glob.glob(os.path.join(image_dir, "*"))
+        if path.lower().endswith((".jpg", ".jpeg", ".png"))
+    )
+    images = []
+    for path in paths:
+        image = Image.open(path).convert("RGB")
+        if max_side:
+            image.thumbnail((max_side, max_side))
+        images.append(np.array(image))
+    return images
+
+
+def run_backend(backend, image_dir, max_side, repeat, profile):
+    """在当前进程中测试单个后端，返回结果字典"""
+    from app.utils.face_detectors import create_detector
+    from app.utils.face_utils import DOWNSCALE_FACE_SIZE, _detection_input
+
+    images = load_images(image_dir, max_side)
+    if not images:
+        raise SystemExit(f"测试图片目录为空: {image_dir}")
+
+    start = time.perf_counter()
+    detector = create_detector(backend)
+    load_time = time.perf_counter() - start
+
+    detector.detect(images[0])  # 预热
+    start = time.perf_counter()
+    faces = 0
+    for _ in range(repeat):
+        for image in images:
+            faces += len(detector.detect(image))
+    single_ms = (time.perf_counter() - start) / (repeat * len(images)) * 1000
+
+    # 档位检测：与face_utils.get_detector相同的参数，计时包含缩放本身
+    params = config.DETECTION_PROFILES[profile]
+    profile_detector = create_detector(
+        backend,
+        min_face_size=min(params["min_face_size"], DOWNSCALE_FACE_SIZE) if config.DETECTION_DOWNSCALE else params["min_face_size"],
+        thresholds=params["thresholds"],
+        scale_factor=params["scale_factor"]
+    )
+    profile_detector.detect(images[0])
+    start = time.perf_counter()
+    profile_faces = 0
+    for _ in range(repeat):
+        for image in images:
+            detect_input, _ = _detection_input(image, params["min_face_size"], params.get("max_side"))
+            profile_faces += len(profile_detector.detect(detect_input))
+    profile_ms = (time.perf_counter() - start) / (repeat * len(images)) * 1000
+
+    # 批量检测：把第一张图片复制成一批同尺寸图片
+    batch = [images[0]] * 8
+    detector.detect_batch(batch)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        detector.detect_batch(batch)
+    batch_ms = (time.perf_counter() - start) / (repeat * len(batch)) * 1000
+    detector_rss = peak_rss_mb()
+
+    from app.utils.face_utils import get_embedder
+    get_embedder()
+
+    return {
+        "backend": backend,
+        "load_s": load_time,
+        "single_ms": single_ms,
+        "batch_ms": batch_ms,
+        "faces_per_pass": faces // repeat,
+        "profile_ms": profile_ms,
+        "profile_faces_per_pass": profile_faces // repeat,
+        "detector_rss_mb": detector_rss,
+        "worker_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="人脸检测后端基准测试")
+    parser.add_argument("--backends", nargs="+", default=["mtcnn_tf", "facenet_pytorch"], help="要测试的后端")
+    parser.add_argument("--images", default=os.path.join(config.DATA_DIR, "test_images"), help="测试图片目录")
+    parser.add_argument("--max-side", type=int, default=1280, help="测试图片最长边，0表示原始分辨率")
+    parser.add_argument("--profile", default=config.DEFAULT_DETECTION_PROFILE, choices=sorted(config.DETECTION_PROFILES), help="检测档位")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_backend(args.worker, args.images, args.max_side, args.repeat, args.profile)))
+        return
+
+    print(f"📊 检测后端 {', '.join(args.backends)}，图片目录 {args.images}，最长边 {args.max_side}，档位 {args.profile}，重复 {args.repeat} 次")
+    rows = []
+    for backend in args.backends:
+        command = [
+            sys.executable, os.path.abspath(__file__), "--worker", backend,
+            "--images", args.images, "--max-side", str(args.max_side), "--repeat", str(args.repeat),
+            "--profile", args.profile
+        ]
+        result = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"⚠️ 后端 {backend} 测试失败: {result.stderr.strip().splitlines()[-1:]}")
+            continue
+        rows.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    print(f"{'后端':<18}{'加载(s)':>9}{'单张(ms)':>10}{'批量(ms/张)':>13}{'人脸数':>8}{'档位(ms)':>10}{'档位人脸数':>12}{'检测器RSS(MB)':>15}{'含FaceNet RSS(MB)':>19}")
+    for row in rows:
+        print(
+            f"{row['backend']:<18}{row['load_s']:>9.2f}{row['single_ms']:>10.1f}{row['batch_ms']:>13.1f}"
+            f"{row['faces_per_pass']:>8d}{row['profile_ms']:>10.1f}{row['profile_faces_per_pass']:>12d}"
+            f"{row['detector_rss_mb']:>15.0f}{row['worker_rss_mb']:>19.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
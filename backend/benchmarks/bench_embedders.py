@@ -0,0 +1,66 @@
+"""FaceNet特征提取后端基准测试 - 不同批次大小下每张人脸的推理耗时
+
+对比eager模式PyTorch、TorchScript、onnxruntime和int8量化后端（torchscript/onnx/int8_static需先运行
+python -m app.tools.export_embedder导出），报告批次大小1/8/32时每张人脸的平均推理耗时，
+以及各后端特征与eager模型特征的最低余弦相似度。
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_embedders.py
+    python benchmarks/bench_embedders.py --backends torch onnx --batch-sizes 1 8 32 --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.face_embedders import EMBEDDER_BACKENDS, INPUT_SHAPE, create_embedder, embedding_similarity
+
+
+def time_embedder(embedder, batch, repeat):
+    """返回每张人脸的平均推理耗时（毫秒）"""
+    embedder.embed(batch)  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        embedder.embed(batch)
+    return (time.perf_counter() - start) / (repeat * len(batch)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FaceNet特征提取后端基准测试")
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDER_BACKENDS), choices=list(EMBEDDER_BACKENDS), help="要测试的后端")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 32], help="批次大小")
+    parser.add_argument("--repeat", type=int, default=10, help="每个批次大小的重复次数")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    inputs = rng.uniform(-1, 1, size=(max(args.batch_sizes), *INPUT_SHAPE)).astype(np.float32)
+    print(f"📊 后端 {', '.join(args.backends)}，批次大小 {args.batch_sizes}，重复 {args.repeat} 次")
+
+    reference = None
+    rows = []
+    for backend in args.backends:
+        try:
+            embedder = create_embedder(backend)
+        except Exception as e:
+            print(f"⚠️ 后端 {backend} 加载失败: {e}")
+            continue
+        features = embedder.embed(inputs)
+        if reference is None and backend == "torch":
+            reference = features
+        parity = embedding_similarity(reference, features).min() if reference is not None else float("nan")
+        latencies = [time_embedder(embedder, inputs[:size], args.repeat) for size in args.batch_sizes]
+        rows.append((backend, latencies, parity))
+
+    header = "".join(f"{f'批次{size}(ms/张)':>16}" for size in args.batch_sizes)
+    print(f"{'后端':<14}{header}{'最低相似度':>14}")
+    for backend, latencies, parity in rows:
+        cells = "".join(f"{latency:>16.2f}" for latency in latencies)
+        print(f"{backend:<14}{cells}{parity:>14.6f}")
+
+
+if __name__ == "__main__":
+    main()
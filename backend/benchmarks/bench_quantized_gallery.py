@@ -0,0 +1,106 @@
+"""量化特征库基准测试 - 内存占用、扫描耗时和匹配结果变化
+
+用合成的聚类特征模拟特征库（每个用户一个特征，查询为已注册用户加噪声的新照片
+以及未注册的陌生人），对比：
+- 基线：compare_face_features（逐个float64特征向量，当前接口）
+- float32矩阵：match_face_features全库扫描
+- int8：量化粗筛 + float32精确重排
+
+报告每种表示的内存占用、单次查询耗时，以及与基线相比匹配决策（匹配到的用户或
+是否匹配）发生变化的查询数。
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_quantized_gallery.py --gallery-size 20000 --queries 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import config
+from app.utils.face_utils import compare_face_features, match_face_features
+from app.utils.quantization import QUANTIZATION_TYPES, QuantizedMatrix
+
+
+def make_dataset(gallery_size, num_queries, noise, seed=0):
+    """生成特征库和查询（一半为已注册用户，一半为陌生人）"""
+    rng = np.random.default_rng(seed)
+    gallery = rng.standard_normal((gallery_size, 512))
+    gallery /= np.linalg.norm(gallery, axis=1, keepdims=True)
+
+    known = rng.choice(gallery_size, size=num_queries // 2, replace=False)
+    queries = gallery[known] + rng.standard_normal((len(known), 512)) * noise
+    strangers = rng.standard_normal((num_queries - len(known), 512))
+    queries = np.vstack([queries, strangers])
+    return gallery.astype(np.float32), queries
+
+
+def decision(matches):
+    """取匹配决策：最佳匹配行号，未匹配时为None"""
+    return matches[0][0] if matches else None
+
+
+def run_baseline(gallery, queries, threshold):
+    """基线：compare_face_features，特征以float64数组列表传入"""
+    db_features = [row.astype(np.float64) for row in gallery]
+    start = time.perf_counter()
+    decisions = [decision(compare_face_features(q, db_features, threshold)[0]) for q in queries]
+    elapsed = time.perf_counter() - start
+    return decisions, elapsed, sum(f.nbytes for f in db_features)
+
+
+def run_float32(gallery, queries, threshold):
+    """float32矩阵全库扫描"""
+    start = time.perf_counter()
+    decisions = [decision(match_face_features(q, gallery, threshold)[0]) for q in queries]
+    return decisions, time.perf_counter() - start, gallery.nbytes
+
+
+def run_quantized(gallery, queries, threshold, qtype, rerank_k):
+    """量化粗筛 + float32精确重排"""
+    quantized = QuantizedMatrix(qtype)
+    quantized.extend(gallery)
+    start = time.perf_counter()
+    decisions = []
+    for q in queries:
+        candidates = quantized.top_candidates(q, rerank_k)
+        matches, _ = match_face_features(q, gallery[candidates], threshold)
+        decisions.append(int(candidates[matches[0][0]]) if matches else None)
+    return decisions, time.perf_counter() - start, quantized.nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="量化特征库基准测试")
+    parser.add_argument("--gallery-size", type=int, default=20000, help="特征库用户数")
+    parser.add_argument("--queries", type=int, default=200, help="查询数量")
+    parser.add_argument("--noise", type=float, default=0.04, help="同一用户新照片的特征噪声（每维标准差）")
+    parser.add_argument("--rerank-k", type=int, default=config.QUANTIZED_RERANK_K, help="精确重排的候选数")
+    parser.add_argument("--threshold", type=float, default=config.RECOGNITION_THRESHOLD, help="识别阈值")
+    args = parser.parse_args()
+
+    gallery, queries = make_dataset(args.gallery_size, args.queries, args.noise)
+    print(f"📊 特征库 {args.gallery_size} 人，查询 {len(queries)} 次，阈值 {args.threshold}，重排候选 {args.rerank_k}")
+
+    baseline, baseline_time, baseline_bytes = run_baseline(gallery, queries, args.threshold)
+    results = [("compare_face_features (float64)", baseline, baseline_time, baseline_bytes)]
+    results.append(("float32 矩阵", *run_float32(gallery, queries, args.threshold)))
+    for qtype in QUANTIZATION_TYPES:
+        results.append((f"{qtype} 粗筛 + float32 重排", *run_quantized(
+            gallery, queries, args.threshold, qtype, args.rerank_k
+        )))
+
+    print(f"{'表示':<34}{'内存(MB)':>10}{'每用户(B)':>12}{'单次查询(ms)':>14}{'决策变化':>10}")
+    for name, decisions, elapsed, nbytes in results:
+        changed = sum(a != b for a, b in zip(decisions, baseline))
+        print(
+            f"{name:<34}{nbytes / 2**20:>10.1f}{nbytes / args.gallery_size:>12.0f}"
+            f"{elapsed / len(queries) * 1000:>14.2f}{changed:>10d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""摄像头注册内存基准测试 - 旧的"base64解码 → PIL解码 → 重新编码JPEG → 再转换为数组"流程与当前单次解码流程的峰值内存对比
+
+旧流程（user-021之前的CameraRegisterAPI + register_face）：
+    JSON请求体 → base64解码 → PIL解码并转换RGB → 编码一份不使用的JPEG → register_face中再转换为numpy数组
+    → 检测人脸 → 人脸裁剪是整幅图像的视图，整幅图像、PIL图像和各份字节在特征提取期间都不释放 → 编码人脸裁剪
+当前流程：
+    二进制帧 → register_face中decode_image解码一次 → 检测人脸 → 复制人脸裁剪并释放整幅图像 → 特征提取 → 编码人脸裁剪
+
+帧在主进程中生成并写入临时文件，每个(帧尺寸, 流程)组合在独立的子进程中运行：先加载模型并用小图预热，
+读取帧文件后记录常驻内存峰值（VmHWM）作为基线，然后执行一次注册流程，报告进程常驻内存峰值的增量（包括PIL和OpenCV在C层分配的内存），
+以及tracemalloc统计的Python/numpy分配峰值。
+
+默认使用真实的人脸检测（detect_face）和特征提取（extract_face_feature）；没有模型的环境可用--no-models，
+此时用请求中的人脸框直接裁剪，并只执行特征提取前的预处理，两种流程的图像缓冲区对比不受影响。
+不写数据库和特征文件。
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_register_memory.py
+    python benchmarks/bench_register_memory.py --no-models --sizes 1280x720 1920x1080 4032x3024
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.config import config
+from app.utils.face_utils import (
+    _preprocess_face_image, _to_model_input, decode_image, detect_face, encode_jpeg, extract_face_feature, to_rgb_array
+)
+
+PROFILE = config.ENDPOINT_DETECTION_PROFILES["register_camera"]
+
+
+def synthetic_frame(width, height, quality=90):
+    """生成摄像头帧JPEG（平滑渐变叠加噪声）和画面中央的人脸框"""
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 12, size=(height, width, 3)).astype(np.float32)
+    rgb = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+    size = int(min(width, height) * 0.4)
+    x1, y1 = (width - size) // 2, (height - size) // 2
+    return encode_jpeg(rgb, quality=quality), (x1, y1, x1 + size, y1 + size)
+
+
+def make_stages(use_models, face_box):
+    """返回(检测函数, 特征提取函数)：真实模型，或按人脸框裁剪 + 只做预处理"""
+    if use_models:
+        def detect(image):
+            return detect_face(image, profile=PROFILE, roi=face_box)[1]
+        return detect, extract_face_feature
+
+    def detect(image):
+        x1, y1, x2, y2 = face_box
+        return [to_rgb_array(image)[y1:y2, x1:x2]]
+
+    def embed(faces):
+        return _to_model_input([_preprocess_face_image(face) for face in faces])
+
+    return detect, embed
+
+
+def legacy_pipeline(body, detect, embed):
+    """旧流程：所有中间结果都是局部变量，直到注册结束才释放"""
+    data = json.loads(body)
+    image = data["image"]
+    if "base64," in image:
+        image = image.split("base64,")[1]
+    image_data = base64.b64decode(image)
+    img = Image.open(io.BytesIO(image_data))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img_byte_arr = io.BytesIO()
+    img.save(img_byte_arr, format="JPEG")
+    img_data = img_byte_arr.getvalue()
+
+    face_images = detect(img)
+    face_image = face_images[0]
+    embed([face_image])
+    return len(encode_jpeg(face_image, quality=95)) + len(img_data)
+
+
+def current_pipeline(body, detect, embed):
+    """当前流程：与register_face相同，解码一次，复制人脸裁剪后释放整幅图像"""
+    image = decode_image(body)
+    face_images = detect(image)
+    del image
+    face_image = face_images[0].copy()
+    del face_images
+    embed([face_image])
+    return len(encode_jpeg(face_image, quality=95))
+
+
+def request_body(mode, frame, face_box):
+    """按流程构造请求体：旧流程为JSON+base64，当前流程为原始JPEG字节"""
+    if mode == "legacy":
+        data_url = "data:image/jpeg;base64," + base64.b64encode(frame).decode("ascii")
+        return json.dumps({"name": "bench", "face_box": list(face_box), "image": data_url}).encode("utf-8")
+    return frame
+
+
+def max_rss_mb():
+    """
+    进程常驻内存峰值（MB）
+
+    优先读取/proc/self/status中的VmHWM（exec后重新统计）；ru_maxrss在Linux下会继承父进程的峰值，
+    主进程生成大尺寸帧后子进程的基线会偏高，只在没有/proc的系统上使用。
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_worker(mode, frame_path, face_box, use_models):
+    """在当前进程中预热后执行一次注册流程，输出JSON结果"""
+    pipeline = legacy_pipeline if mode == "legacy" else current_pipeline
+
+    warmup_frame, warmup_box = synthetic_frame(320, 240)
+    detect, embed = make_stages(use_models, warmup_box)
+    pipeline(request_body(mode, warmup_frame, warmup_box), detect, embed)
+
+    with open(frame_path, "rb") as f:
+        frame = f.read()
+    body = request_body(mode, frame, face_box)
+    del frame
+    detect, embed = make_stages(use_models, face_box)
+
+    baseline = max_rss_mb()
+    tracemalloc.start()
+    start = time.perf_counter()
+    pipeline(body, detect, embed)
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(json.dumps({
+        "body_kb": len(body) / 1024,
+        "rss_mb": max_rss_mb() - baseline,
+        "traced_mb": traced_peak / 1024 / 1024,
+        "ms": elapsed * 1000,
+    }), flush=True)
+
+
+def run_mode(mode, frame_path, face_box, use_models):
+    """在独立子进程中运行一次，返回结果"""
+    command = [
+        sys.executable, os.path.abspath(__file__), "--worker", mode,
+        "--frame", frame_path, "--face-box", ",".join(str(v) for v in face_box)
+    ]
+    if not use_models:
+        command.append("--no-models")
+    output = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise SystemExit(f"子进程运行失败:\n{output.stderr}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def parse_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="摄像头注册峰值内存基准测试")
+    parser.add_argument("--sizes", nargs="+", type=parse_size, default=[(1280, 720), (1920, 1080), (4032, 3024)], help="帧尺寸，如1920x1080")
+    parser.add_argument("--no-models", action="store_true", help="不加载检测和特征提取模型，按人脸框裁剪并只做预处理")
+    parser.add_argument("--worker", choices=["legacy", "current"], help=argparse.SUPPRESS)
+    parser.add_argument("--frame", help=argparse.SUPPRESS)
+    parser.add_argument("--face-box", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    use_models = not args.no_models
+
+    if args.worker:
+        face_box = tuple(int(v) for v in args.face_box.split(","))
+        run_worker(args.worker, args.frame, face_box, use_models)
+        return
+
+    print(f"📊 模型 {'检测+特征提取' if use_models else '关闭（人脸框裁剪+预处理）'}，每个组合在独立子进程中运行一次注册流程")
+    print(f"{'帧':<12}{'流程':<10}{'请求体(KB)':>12}{'RSS峰值增量(MB)':>18}{'tracemalloc峰值(MB)':>22}{'耗时(ms)':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for width, height in args.sizes:
+            frame, face_box = synthetic_frame(width, height)
+            frame_path = os.path.join(directory, f"{width}x{height}.jpg")
+            with open(frame_path, "wb") as f:
+                f.write(frame)
+            for mode, name in (("legacy", "旧流程"), ("current", "当前流程")):
+                row = run_mode(mode, frame_path, face_box, use_models)
+                print(
+                    f"{f'{width}x{height}':<12}{name:<10}{row['body_kb']:>12.1f}{row['rss_mb']:>18.1f}"
+                    f"{row['traced_mb']:>22.1f}{row['ms']:>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""CPU线程预算基准测试 - 多个工作进程并发时，各框架默认线程数与按预算分配线程数的吞吐量对比
+
+模拟gunicorn -w N部署：同时启动N个工作进程（子进程），每个进程加载与服务相同的FaceNet特征提取器
+（可选同时加载人脸检测器），就绪后同时开始循环执行"检测（可选）→ 预处理人脸 → 批量提取特征"，
+持续固定时长。分别在关闭线程预算（各框架按全部核数创建线程）和开启线程预算两种模式下运行，报告：
+- 总吞吐量（人脸/秒，所有工作进程合计）
+- 单次循环延迟的P50/P95
+- 每个工作进程的操作系统线程数
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_thread_budget.py
+    python benchmarks/bench_thread_budget.py --workers 4 --duration 20 --detector
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.config import config
+
+FACES_PER_ITERATION = 8
+
+
+def run_worker(workers, budget, duration, detector):
+    """在当前进程中执行负载，stdout输出"ready"后等待stdin的开始信号，结束后输出JSON结果"""
+    config.THREAD_BUDGET_ENABLED = budget
+    config.THREAD_BUDGET_WORKERS = workers
+
+    from PIL import Image
+
+    from app.utils.face_utils import _preprocess_face_image, _to_model_input, get_detector, get_embedder
+    from app.utils.thread_budget import thread_report
+
+    rng = np.random.default_rng(os.getpid())
+    frame = rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+    faces = [Image.fromarray(rng.integers(0, 256, size=(200, 200, 3), dtype=np.uint8)) for _ in range(FACES_PER_ITERATION)]
+
+    embedder = get_embedder()
+    face_detector = get_detector("fast") if detector else None
+
+    def iteration():
+        if face_detector is not None:
+            face_detector.detect(frame)
+        embedder.embed(_to_model_input([_preprocess_face_image(face) for face in faces]))
+
+    iteration()  # 预热
+    print("ready", flush=True)
+    sys.stdin.readline()
+
+    latencies = []
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        iteration()
+        latencies.append(time.perf_counter() - start)
+
+    print(json.dumps({"latencies": latencies, "os_threads": thread_report()["os_threads"]}), flush=True)
+
+
+def run_mode(workers, budget, duration, detector):
+    """同时启动workers个工作进程，全部就绪后同时开始，返回汇总结果"""
+    env = dict(os.environ)
+    # 去掉外部设置的OpenMP/MKL线程数，两种模式都从框架默认值开始
+    env.pop("OMP_NUM_THREADS", None)
+    env.pop("MKL_NUM_THREADS", None)
+    command = [
+        sys.executable, os.path.abspath(__file__), "--worker",
+        "--workers", str(workers), "--duration", str(duration), "--budget", "on" if budget else "off"
+    ]
+    if detector:
+        command.append("--detector")
+    processes = [
+        subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        # 跳过模型加载时的日志，等待就绪信号
+        for line in process.stdout:
+            if line.strip() == "ready":
+                break
+        else:
+            raise SystemExit(f"工作进程启动失败，退出码 {process.wait()}")
+    for process in processes:
+        process.stdin.write("go\n")
+        process.stdin.flush()
+
+    latencies, os_threads = [], []
+    for process in processes:
+        result = json.loads(process.stdout.read().strip().splitlines()[-1])
+        process.wait()
+        latencies.extend(result["latencies"])
+        os_threads.append(result["os_threads"])
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "faces_per_s": len(latencies) * FACES_PER_ITERATION / duration,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "os_threads": os_threads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU线程预算基准测试")
+    parser.add_argument("--workers", type=int, default=4, help="并发工作进程数")
+    parser.add_argument("--duration", type=float, default=10, help="每种模式的测试时长（秒）")
+    parser.add_argument("--detector", action="store_true", help="每次循环同时执行一次人脸检测（config.FACE_DETECTOR_BACKEND）")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--budget", choices=["on", "off"], default="on", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.workers, args.budget == "on", args.duration, args.detector)
+        return
+
+    from app.utils.thread_budget import compute_thread_budget
+
+    budget = compute_thread_budget(workers=args.workers)
+    print(
+        f"📊 工作进程 {args.workers} 个，可用核数 {budget['cpus']}，每进程算子内线程 {budget['intra_op']}，"
+        f"特征提取 {config.EMBEDDER_BACKEND}，检测 {config.FACE_DETECTOR_BACKEND if args.detector else '关闭'}，"
+        f"每种模式 {args.duration} 秒"
+    )
+    rows = [
+        ("框架默认", run_mode(args.workers, False, args.duration, args.detector)),
+        ("线程预算", run_mode(args.workers, True, args.duration, args.detector)),
+    ]
+
+    print(f"{'模式':<10}{'吞吐量(人脸/s)':>16}{'P50(ms)':>10}{'P95(ms)':>10}{'进程线程数':>14}")
+    for name, row in rows:
+        threads = "/".join(str(count) for count in row["os_threads"])
+        print(f"{name:<10}{row['faces_per_s']:>16.1f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{threads:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Gunicorn配置文件
+
+用法（在backend目录下运行）：
+    gunicorn -c gunicorn.conf.py run:app
+
+preload_app让主进程先创建应用，并在fork工作进程之前加载、预热支持fork的模型
+（PyTorch的FaceNet特征提取器和facenet_pytorch人脸检测器；TensorFlow检测器和onnxruntime会话在各工作进程中加载），
+各工作进程以写时复制方式共享模型权重所在的内存页，不必各自加载一份。
+
+主进程启动时把工作进程数写入config.THREAD_BUDGET_WORKERS，各框架的线程数按"可用核数 / 工作进程数"分配
+（见app.utils.thread_budget），避免每个工作进程都按全部核数创建线程池。
+
+工作进程使用gthread类型：请求在工作线程中处理，工作进程的主循环持续向主进程发送心跳，
+批量识别（POST /api/recognize/batch）等持续数分钟的流式响应不会因超过timeout被终止；
+timeout仍保持默认的30秒，用于发现主循环卡死的工作进程。
+
+批量注册任务执行器的后台线程在各工作进程fork之后启动（线程不会随fork复制），
+启动时认领上次退出前未完成的任务（见app.utils.bulk_registration）。
+"""
+bind = "0.0.0.0:5000"
+workers = 4
+preload_app = True
+# gthread工作进程在处理请求期间照常发送心跳，timeout只限制心跳间隔，不限制单个请求的处理时长
+worker_class = "gthread"
+threads = 2  # 每个工作进程同时处理的请求数：长时间的批量识别不会阻塞该进程的其他请求
+timeout = 30
+
+
+def on_starting(server):
+    """主进程启动时（fork工作进程之前）设置线程预算并预热模型"""
+    from app.config import config
+    from app.utils.face_detectors import DETECTOR_BACKENDS
+    from app.utils.face_embedders import EMBEDDER_BACKENDS
+    from app.utils.face_utils import warmup
+
+    # 线程预算按实际的工作进程数分配（工作进程fork后继承该配置）
+    config.THREAD_BUDGET_WORKERS = server.cfg.workers
+
+    # TensorFlow运行时和onnxruntime会话不支持在初始化后fork，仍在各工作进程首次使用时加载
+    warmup(
+        detector=DETECTOR_BACKENDS[config.FACE_DETECTOR_BACKEND].FORK_SAFE,
+        embedder=EMBEDDER_BACKENDS[config.EMBEDDER_BACKEND].FORK_SAFE
+    )
+
+
+def post_fork(server, worker):
+    """工作进程fork后启动批量注册任务执行器，继续执行未完成的任务"""
+    from app.utils.bulk_registration import bulk_registration_runner
+
+    bulk_registration_runner.start()
@@ -22,6 +22,7 @@ sys.path.insert(0, backend_dir)
 from app.utils.data_process import register_face, recognize_face
 from app.utils.user_id_generator import generate_new_user_id, validate_user_id_format
 from app.models.models import init_db, SessionLocal, User
+from app.utils.face_gallery import face_gallery
 
 def print_menu():
     """打印菜单"""
@@ -405,9 +406,12 @@ def show_database_status():
                 # 检查文件是否存在
                 img_exists = os.path.exists(user.image_path)
                 feat_exists = os.path.exists(user.feature_path)
+                feat_label = os.path.basename(user.feature_path)
+                if user.feature_row is not None:
+                    feat_label = f"{feat_label} (第{user.feature_row}行)"
                 
                 print(f"      图片路径: {os.path.basename(user.image_path)} {'✅' if img_exists else '❌ 不存在'}")
-                print(f"      特征路径: {os.path.basename(user.feature_path)} {'✅' if feat_exists else '❌ 不存在'}")
+                print(f"      特征路径: {feat_label} {'✅' if feat_exists else '❌ 不存在'}")
                 print()
         else:
             print("💡 数据库为空，请先注册一些用户")
@@ -446,8 +450,8 @@ def clear_all_users():
                         os.remove(user.image_path)
                         print(f"   删除图片: {os.path.basename(user.image_path)}")
                     
-                    # 删除特征文件
-                    if os.path.exists(user.feature_path):
+                    # 删除旧版单独保存的特征文件（特征矩阵文件由所有用户共享，不能删除）
+                    if user.feature_row is None and os.path.exists(user.feature_path):
                         os.remove(user.feature_path)
                         print(f"   删除特征: {os.path.basename(user.feature_path)}")
                 except Exception as e:
@@ -457,6 +461,9 @@ def clear_all_users():
             db.query(User).delete()
             db.commit()
             
+            # 同步清空内存特征库
+            face_gallery.clear()
+            
             print(f"✅ 成功清空 {deleted_count} 个用户的数据")
             
         except Exception as e:
@@ -551,14 +558,16 @@ def delete_users():
                     os.remove(user.image_path)
                     print(f"   📷 删除图片: {os.path.basename(user.image_path)}")
                 
-                # 删除特征文件
-                if os.path.exists(user.feature_path):
+                # 删除旧版单独保存的特征文件（特征矩阵文件由所有用户共享，不能删除）
+                if user.feature_row is None and os.path.exists(user.feature_path):
                     os.remove(user.feature_path)
                     print(f"   🔬 删除特征: {os.path.basename(user.feature_path)}")
                 
                 # 删除数据库记录
+                identity_id = user.identity_id
                 db.delete(user)
                 db.commit()
+                face_gallery.remove(identity_id)
                 deleted_count += 1
                 print(f"   ✅ 成功删除用户: {user.name} (ID: {user.id})")
                 
@@ -1,9 +1,16 @@
+import os
+
 from app.api import create_app
 
 # 创建应用实例
 app = create_app()
 
 if __name__ == '__main__':
+    # 调试模式的重载器在子进程中运行应用，只在该进程中启动批量注册任务执行器（继续未完成的任务）
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from app.utils.bulk_registration import bulk_registration_runner
+        bulk_registration_runner.start()
+    
     # 从配置文件导入HOST和PORT
     try:
         from app.config import HOST, PORT
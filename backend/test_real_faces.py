@@ -98,7 +98,7 @@ def test_single_person_registration():
                 # 过滤掉太小的人脸图像
                 valid_faces = []
                 for img, box, conf in zip(face_images, face_boxes, confidences):
-                    h, w = img.size[1], img.size[0] if isinstance(img, Image.Image) else img.shape[:2]
+                    h, w = img.shape[:2]
                     if h >= 16 and w >= 16:
                         valid_faces.append((img, box, conf))
                         
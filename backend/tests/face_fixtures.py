@@ -0,0 +1,104 @@
+"""测试共用的人脸模型替身和临时特征库
+
+- CenterFaceDetector / ColorEmbedder：不依赖TensorFlow、PyTorch的检测器和特征提取器替身，
+  纯色照片的主色通道即身份（颜色相同即同一人）
+- GalleryTestCase：在临时目录中创建数据库、特征存储和特征库（已注册红色人脸的张三），
+  并替换注册检测档位的检测器、特征提取器和人脸图片目录
+- install_stub_models：在子进程中安装上述替身（用作进程池的初始化函数）
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import config
+from app.models.models import Base
+from app.utils import face_utils
+from app.utils.face_detectors import FaceDetector
+from app.utils.face_embedders import FaceEmbedder
+from app.utils.face_gallery import FaceGallery
+from app.utils.feature_store import FeatureStore
+from app.utils.gallery_sync import GalleryJournal
+
+
+class CenterFaceDetector(FaceDetector):
+    """在较亮的图像中心返回一张人脸，暗图像中不返回人脸"""
+
+    NAME = "center"
+
+    def detect(self, image):
+        if image.mean() < 20:
+            return []
+        return [{"box": [10, 10, 120, 120], "confidence": 0.99}]
+
+
+class ColorEmbedder(FaceEmbedder):
+    """人脸特征为主色通道（R/G/B）对应维度的单位向量：颜色相同即同一人，记录每次推理的批次大小"""
+
+    NAME = "color"
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def embed(self, batch):
+        self.batch_sizes.append(len(batch))
+        features = np.zeros((len(batch), 512), dtype=np.float32)
+        features[np.arange(len(batch)), batch.mean(axis=(2, 3)).argmax(axis=1)] = 1.0
+        return features
+
+
+COLORS = {"red": (220, 30, 30), "green": (30, 220, 30), "blue": (30, 30, 220), "dark": (5, 5, 5)}
+
+
+def photo(color, size=160):
+    """生成纯色JPEG照片"""
+    return face_utils.encode_jpeg(np.full((size, size, 3), COLORS[color], dtype=np.uint8))
+
+
+def install_stub_models():
+    """在当前进程中为所有检测档位安装CenterFaceDetector，并安装ColorEmbedder"""
+    for profile in config.DETECTION_PROFILES:
+        face_utils._detectors[profile] = CenterFaceDetector()
+    face_utils._embedder = ColorEmbedder()
+
+
+class GalleryTestCase(unittest.TestCase):
+    """临时数据库、特征存储和特征库，已注册用户张三的人脸为红色"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = FeatureStore(os.path.join(self.tmp_dir.name, "features.f32"))
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'face_db.db')}")
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        self.gallery = FaceGallery(self.store, GalleryJournal(self.Session))
+        self.gallery.clear()
+        feature = np.zeros(512, dtype=np.float32)
+        feature[0] = 1.0
+        self.gallery.add(1, "USR001", "张三", self.store.append(feature))
+
+        self.embedder = ColorEmbedder()
+        self.patches = []
+        self.start_patch(mock.patch.dict(
+            face_utils._detectors, {config.ENDPOINT_DETECTION_PROFILES["register_bulk"]: CenterFaceDetector()}
+        ))
+        self.start_patch(mock.patch.object(face_utils, "_embedder", self.embedder))
+        self.start_patch(mock.patch.object(config, "FACE_IMAGE_DIR", os.path.join(self.tmp_dir.name, "faces")))
+
+    def start_patch(self, patch):
+        """启动补丁，tearDown时按相反顺序停止"""
+        patch.start()
+        self.patches.append(patch)
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.tmp_dir.cleanup()
@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.ann_index import IVFIndex, create_ann_index, load_ann_index
+
+
+def clustered_features(n_clusters=20, per_cluster=50, seed=0):
+    """生成按簇分布的归一化特征，模拟同一人多张照片的特征分布"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, 512))
+    features = np.repeat(centers, per_cluster, axis=0) + rng.standard_normal((n_clusters * per_cluster, 512)) * 0.3
+    return (features / np.linalg.norm(features, axis=1, keepdims=True)).astype(np.float32)
+
+
+class IVFIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.features = clustered_features()
+        self.index = IVFIndex(nlist=20, nprobe=2)
+        self.index.build(self.features)
+
+    def test_search_contains_nearest_neighbour(self):
+        """测试候选集包含精确最近邻"""
+        for row in range(0, len(self.features), 97):
+            query = self.features[row]
+            candidates = self.index.search(query)
+            nearest = int(np.argmax(self.features @ query))
+            self.assertIn(nearest, candidates)
+            # 候选集应明显小于全库
+            self.assertLess(len(candidates), len(self.features) // 2)
+
+    def test_add_and_remove(self):
+        """测试增量添加和墓碑删除"""
+        new_row = len(self.features)
+        self.index.add([new_row], self.features[:1])
+        self.assertIn(new_row, self.index.search(self.features[0]))
+        self.index.remove([new_row, 0])
+        candidates = self.index.search(self.features[0])
+        self.assertNotIn(new_row, candidates)
+        self.assertNotIn(0, candidates)
+        self.assertEqual(len(self.index), len(self.features) - 1)
+
+    def test_valid_mask(self):
+        """测试构建时跳过无效行"""
+        mask = np.ones(len(self.features), dtype=bool)
+        mask[:10] = False
+        index = IVFIndex(nlist=20, nprobe=20)
+        index.build(self.features, valid_mask=mask)
+        self.assertEqual(len(index), len(self.features) - 10)
+        self.assertFalse(index.indexed_mask(len(self.features))[:10].any())
+
+    def test_save_and_load(self):
+        """测试保存和加载后查询结果一致"""
+        self.index.remove([5])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "ann_index.npz")
+            self.index.save(path)
+            loaded = load_ann_index(path)
+        query = self.features[123]
+        np.testing.assert_array_equal(
+            np.sort(self.index.search(query)), np.sort(loaded.search(query))
+        )
+        self.assertEqual(len(loaded), len(self.index))
+
+    def test_unknown_index_type(self):
+        """测试不支持的索引类型"""
+        with self.assertRaises(ValueError):
+            create_ann_index("hnsw")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
+import base64
+import io
 import unittest
 import json
 from app.api import create_app
+from app.api.frames import parse_json_field, read_camera_request
 
 
 class APITestCase(unittest.TestCase):
@@ -81,6 +84,55 @@ class APITestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         data = json.loads(response.data)
         self.assertIn('code', data)
+    
+    def test_diagnostics_api_reports_thread_budget(self):
+        """测试诊断API返回线程预算"""
+        response = self.client.get('/api/diagnostics')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['code'], 0)
+        self.assertGreaterEqual(data['data']['thread_budget']['budget']['intra_op'], 1)
+
+    def test_read_camera_request_formats(self):
+        """测试摄像头接口请求解析：JSON base64、原始图像请求体和multipart得到相同的图像字节"""
+        frame = b'\xff\xd8fake-jpeg-bytes\xff\xd9'
+        encoded = 'data:image/jpeg;base64,' + base64.b64encode(frame).decode()
+
+        with self.app.test_request_context('/api/register/camera', method='POST', json={'name': 'a', 'image': encoded}):
+            from flask import request
+            self.assertEqual(read_camera_request(request), ({'name': 'a'}, frame))
+        with self.app.test_request_context('/api/register/camera?name=a', method='POST', data=frame, content_type='image/jpeg'):
+            self.assertEqual(read_camera_request(request), ({'name': 'a'}, frame))
+        with self.app.test_request_context('/api/register/camera', method='POST', data={
+            'name': 'a', 'image': (io.BytesIO(frame), 'frame.jpg', 'image/jpeg')
+        }):
+            self.assertEqual(read_camera_request(request), ({'name': 'a'}, frame))
+        with self.app.test_request_context('/api/register/camera', method='POST', data='not json', content_type='text/plain'):
+            with self.assertRaises(ValueError):
+                read_camera_request(request)
+
+        self.assertEqual(parse_json_field('[1, 2, 3, 4]'), [1, 2, 3, 4])
+        self.assertEqual(parse_json_field({'x': 1}), {'x': 1})
+        self.assertIsNone(parse_json_field(' '))
+
+    def test_camera_apis_accept_binary_frames(self):
+        """测试摄像头接口接受原始图像请求体和multipart（无效图像返回code=2而不是请求格式错误）"""
+        response = self.client.post('/api/recognize/camera', data=b'not an image', content_type='image/jpeg')
+        data = json.loads(response.data)
+        self.assertEqual(data['code'], 2)
+        self.assertIn('图像解码失败', data['msg'])
+
+        response = self.client.post('/api/register/camera', data={
+            'name': '测试用户', 'face_box': '[1, 2', 'image': (io.BytesIO(b'not an image'), 'frame.jpg', 'image/jpeg')
+        })
+        data = json.loads(response.data)
+        self.assertEqual(data['code'], 2)
+        self.assertIn('face_box', data['msg'])
+
+        response = self.client.post('/api/register/camera?name=测试用户', data=b'not an image', content_type='image/jpeg')
+        data = json.loads(response.data)
+        self.assertEqual(data['code'], 2)
+        self.assertIn('图像解码失败', data['msg'])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+import io
+import json
+import os
+import runpy
+import sys
+import unittest
+import zipfile
+from unittest import mock
+
+import numpy as np
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import config
+from app.utils import batch_recognition, data_process, face_utils
+from face_fixtures import CenterFaceDetector, GalleryTestCase, photo
+
+
+class BatchRecognitionTestCase(GalleryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        feature = np.zeros(512, dtype=np.float32)
+        feature[1] = 1.0
+        self.gallery.add(2, "USR002", "李四", self.store.append(feature))
+
+        self.profile = config.ENDPOINT_DETECTION_PROFILES["recognize_batch"]
+        self.start_patch(mock.patch.dict(face_utils._detectors, {self.profile: CenterFaceDetector()}))
+        self.start_patch(mock.patch.object(batch_recognition, "face_gallery", self.gallery))
+        self.start_patch(mock.patch.object(data_process, "face_gallery", self.gallery))
+
+    def test_faces_from_several_images_share_one_batch(self):
+        """测试多张图片的人脸合并成一个FaceNet批次，再按图片拆分结果，人脸框映射回原图"""
+        pending = []
+        for index, (color, scale) in enumerate((("red", 1.0), ("green", 0.5), ("red", 1.0))):
+            detection = batch_recognition._decode_and_detect(lambda color=color: photo(color), self.profile)
+            detection["scale"] = scale
+            pending.append((index, f"{index}.jpg", detection))
+
+        items = list(batch_recognition._embed_and_match(pending, batch_size=32))
+        self.assertEqual(self.embedder.batch_sizes, [3])
+        self.assertEqual([item["index"] for item in items], [0, 1, 2])
+        self.assertEqual([item["result"]["matched_names"] for item in items], [["张三"], ["李四"], ["张三"]])
+        self.assertEqual(items[0]["result"]["face_boxes"][0], (10.0, 10.0, 130.0, 130.0))
+        self.assertEqual(items[1]["result"]["face_boxes"][0], (20.0, 20.0, 260.0, 260.0))
+
+    def test_recognize_batch_yields_every_image(self):
+        """测试每张图片都产出一个结果，解码失败和未检测到人脸的图片单独报告"""
+        items = [(f"{i}.jpg", lambda: photo("red")) for i in range(5)]
+        items.insert(2, ("dark.jpg", lambda: photo("dark")))
+        items.insert(4, ("broken.jpg", lambda: b"not an image"))
+
+        results = {item["index"]: item for item in batch_recognition.recognize_batch(items, workers=2, batch_size=4)}
+        self.assertEqual(sorted(results), list(range(7)))
+        self.assertEqual(results[2]["error"], "未检测到人脸")
+        self.assertEqual(results[4]["error_stage"], "decode")
+        self.assertEqual(results[6]["filename"], "4.jpg")
+        self.assertEqual(results[6]["result"]["matched_count"], 1)
+        self.assertEqual(sum(self.embedder.batch_sizes), 5)
+        self.assertLessEqual(max(self.embedder.batch_sizes), 4)
+
+    def test_batch_api_streams_ndjson(self):
+        """测试批量识别接口接受多文件和zip压缩包，逐行返回结果和汇总"""
+        from app.api import create_app
+
+        client = create_app().test_client()
+        response = client.post("/api/recognize/batch", data={
+            "files": [(io.BytesIO(photo("red")), "a.jpg"), (io.BytesIO(photo("dark")), "b.jpg"), (io.BytesIO(b"text"), "c.txt")]
+        })
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        by_name = {line["filename"]: line for line in lines if line["type"] == "result"}
+        self.assertEqual(by_name["a.jpg"]["code"], 0)
+        self.assertEqual(by_name["a.jpg"]["data"]["matched_names"][0]["name"], "张三")
+        self.assertEqual(by_name["b.jpg"]["code"], 11)
+        self.assertEqual(by_name["c.txt"]["code"], 2)
+        self.assertEqual(lines[-1]["type"], "summary")
+        self.assertEqual((lines[-1]["data"]["succeeded"], lines[-1]["data"]["failed"]), (1, 2))
+
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("photos/1.jpg", photo("red"))
+            zf.writestr("photos/2.png", photo("green"))
+            zf.writestr("__MACOSX/photos/._1.jpg", b"")
+            zf.writestr("README.txt", b"ignored")
+        response = client.post("/api/recognize/batch", data=archive.getvalue(), content_type="application/zip")
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(sorted(line["filename"] for line in lines[:-1]), ["photos/1.jpg", "photos/2.png"])
+        self.assertEqual(lines[-1]["data"]["face_count"], 2)
+
+        response = client.post("/api/recognize/batch", data=b"not a zip", content_type="application/zip")
+        self.assertEqual(response.get_json()["code"], 2)
+        response = client.post("/api/recognize/batch")
+        self.assertEqual(response.get_json()["code"], 2)
+
+
+class GunicornConfigTestCase(unittest.TestCase):
+
+    def test_workers_heartbeat_during_long_requests(self):
+        """测试gunicorn使用gthread工作进程：批量识别的长时间流式响应期间照常发送心跳，不会被timeout终止"""
+        settings = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py"))
+        self.assertEqual(settings["worker_class"], "gthread")
+        self.assertGreaterEqual(settings["threads"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import io
+import os
+import socket
+import sys
+import unittest
+import zipfile
+from unittest import mock
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import config
+from app.models.models import RegistrationJob, User
+from app.utils import bulk_registration
+from app.utils.bulk_registration import BulkRegistrationRunner
+from app.utils.face_gallery import FaceGallery
+from app.utils.gallery_sync import GalleryJournal
+from face_fixtures import GalleryTestCase, photo
+
+
+class BulkRegistrationTestCase(GalleryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.runner = BulkRegistrationRunner(session_factory=self.Session, gallery=self.gallery, store=self.store)
+        self.start_patch(mock.patch.object(config, "BULK_REGISTER_JOB_DIR", os.path.join(self.tmp_dir.name, "jobs")))
+        self.start_patch(mock.patch.object(config, "BULK_REGISTER_CHUNK_SIZE", 3))
+
+    def source(self, filename, color=None, name=None, user_id=None):
+        data = photo(color) if color else b"not an image"
+        return {"filename": filename, "name": name or filename.split(".")[0], "user_id": user_id, "load": lambda: data}
+
+    def test_job_registers_blocks_and_reports_failures(self):
+        """测试批量注册：批内重复和特征库中已有的人脸被阻断，无效照片单独报告，整批共享一个FaceNet批次"""
+        job = self.runner.create_job([
+            self.source("red.jpg", "red"),
+            self.source("green1.jpg", "green", name="李四"),
+            self.source("green2.jpg", "green"),
+            self.source("blue.jpg", "blue", name="王五", user_id="USR202510170001"),
+            self.source("dark.jpg", "dark"),
+            self.source("broken.jpg"),
+            self.source("blue_again.jpg", "blue"),
+        ])
+        self.assertEqual((job["status"], job["total"]), ("queued", 7))
+
+        self.assertTrue(self.runner.run_next())
+        self.assertFalse(self.runner.run_next())
+
+        result = self.runner.get_job(job["job_id"])
+        summary = result["job"]
+        self.assertEqual(summary["status"], "completed")
+        self.assertEqual(
+            (summary["processed"], summary["registered"], summary["blocked"], summary["failed"]), (7, 2, 3, 2)
+        )
+        items = {item["filename"]: item for item in result["items"]}
+        self.assertEqual(items["red.jpg"]["matched_user"]["user_id"], "USR001")
+        self.assertEqual(items["green2.jpg"]["matched_user"]["user_id"], items["green1.jpg"]["user_id"])
+        self.assertEqual(items["blue.jpg"]["user_id"], "USR202510170001")
+        self.assertEqual(items["blue_again.jpg"]["matched_user"]["name"], "王五")
+        self.assertEqual(items["dark.jpg"]["message"], "未检测到人脸")
+        self.assertIn("图像解析失败", items["broken.jpg"]["message"])
+        self.assertEqual(
+            sorted(item["filename"] for item in result["duplicates"]), ["blue_again.jpg", "green2.jpg", "red.jpg"]
+        )
+
+        # 每批的人脸合并成一个批次（第二批中只有blue.jpg检测到人脸）
+        self.assertEqual(self.embedder.batch_sizes, [3, 1, 1])
+        db = self.Session()
+        try:
+            self.assertEqual(sorted(name for (name,) in db.query(User.name).all()), ["李四", "王五"])
+        finally:
+            db.close()
+        self.assertEqual(len(self.gallery), 3)
+        self.assertFalse(os.path.exists(self.runner.job_dir(job["job_id"])))
+
+    def test_interrupted_job_resumes_without_duplicates(self):
+        """测试执行进程中断后，任务被重新认领并从未提交的批次继续，已注册的照片不会重复注册"""
+        job = self.runner.create_job([self.source(f"{i}.jpg", color) for i, color in enumerate(["red", "green", "blue"] * 2)])
+        commit_chunk = self.runner._commit_chunk
+        calls = []
+
+        def crash_on_second_chunk(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise SystemExit("进程被终止")
+            return commit_chunk(*args)
+
+        # 以一个已经退出的进程的身份执行（进程号超过pid_max）
+        dead_owner = f"{socket.gethostname()}:{2 ** 22 + 1}"
+        with mock.patch.object(bulk_registration, "_owner", return_value=dead_owner), \
+                mock.patch.object(self.runner, "_commit_chunk", side_effect=crash_on_second_chunk):
+            with self.assertRaises(SystemExit):
+                self.runner.run_next()
+
+        summary = self.runner.get_job(job["job_id"])["job"]
+        self.assertEqual((summary["status"], summary["processed"], summary["registered"]), ("running", 3, 2))
+
+        self.assertTrue(self.runner.run_next())
+        summary = self.runner.get_job(job["job_id"])["job"]
+        self.assertEqual(summary["status"], "completed")
+        self.assertEqual((summary["processed"], summary["registered"], summary["blocked"]), (6, 2, 4))
+        db = self.Session()
+        try:
+            self.assertEqual(db.query(User).count(), 2)
+            self.assertNotEqual(db.query(RegistrationJob).one().owner, dead_owner)
+        finally:
+            db.close()
+
+    def test_committed_users_reach_gallery_after_crash(self):
+        """测试用户提交后、登记到本进程特征库前进程中断：变更日志随用户一起提交，各进程同步后都能看到这些用户"""
+        other_worker = FaceGallery(self.store, GalleryJournal(self.Session))
+        other_count = len(other_worker)
+        job = self.runner.create_job([self.source(f"{i}.jpg", color) for i, color in enumerate(["red", "green", "blue"] * 2)])
+
+        dead_owner = f"{socket.gethostname()}:{2 ** 22 + 1}"
+        with mock.patch.object(bulk_registration, "_owner", return_value=dead_owner), \
+                mock.patch.object(self.gallery, "add_many", side_effect=SystemExit("进程被终止")):
+            with self.assertRaises(SystemExit):
+                self.runner.run_next()
+        self.assertEqual(self.gallery._active_count, 1)  # 本进程尚未登记（未同步）
+        self.assertEqual(len(other_worker), other_count + 2)
+
+        # 恢复执行的进程先同步变更日志，第二批中的人脸被第一批已提交的用户阻断
+        self.assertTrue(self.runner.run_next())
+        summary = self.runner.get_job(job["job_id"])["job"]
+        self.assertEqual((summary["registered"], summary["blocked"]), (2, 4))
+        self.assertEqual(len(self.gallery), 3)
+
+    def test_running_job_of_live_process_is_not_claimed(self):
+        """测试运行中且心跳未超时的任务不会被其他进程认领"""
+        job = self.runner.create_job([self.source("green.jpg", "green")])
+        with mock.patch.object(bulk_registration, "_owner", return_value=f"{socket.gethostname()}:1"):
+            self.assertEqual(self.runner._claim(), job["job_id"])
+        self.assertIsNone(self.runner._claim())
+
+    def test_bulk_api_creates_job_and_reports_progress(self):
+        """测试批量注册接口接受zip压缩包和清单，任务查询接口返回进度和条目结果"""
+        from app.api import create_app, jobs, register
+
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("photos/001.jpg", photo("green"))
+            zf.writestr("photos/002.jpg", photo("blue"))
+            zf.writestr("manifest.csv", "filename,name,user_id\n001.jpg,李四,\nphotos/002.jpg,王五,USR202510170002\n".encode("utf-8"))
+
+        client = create_app().test_client()
+        with mock.patch.object(register, "bulk_registration_runner", self.runner), \
+                mock.patch.object(jobs, "bulk_registration_runner", self.runner), \
+                mock.patch.object(self.runner, "submit", side_effect=lambda job_id: self.runner.run_next()):
+            response = client.post("/api/register/bulk", data={"archive": (io.BytesIO(archive.getvalue()), "photos.zip")})
+            data = response.get_json()
+            self.assertEqual(data["code"], 0)
+            job_id = data["data"]["job_id"]
+
+            data = client.get(f"/api/jobs/{job_id}?status=registered").get_json()
+            self.assertEqual(data["data"]["job"]["status"], "completed")
+            self.assertEqual(
+                [(item["name"], item["status"]) for item in data["data"]["items"]], [("李四", "registered"), ("王五", "registered")]
+            )
+            self.assertEqual(data["data"]["items"][1]["user_id"], "USR202510170002")
+
+            self.assertEqual(client.get("/api/jobs/unknown").get_json()["code"], 30)
+            self.assertEqual(client.get(f"/api/jobs/{job_id}?status=done").get_json()["code"], 2)
+            self.assertEqual(client.post("/api/register/bulk").get_json()["code"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,283 @@
+import os
+import sys
+import types
+import unittest
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import config
+from app.utils import face_utils
+from app.utils.face_detectors import FaceDetector, TorchMTCNNDetector, create_detector
+
+
+class FixedDetector(FaceDetector):
+    """返回固定检测结果的检测器，用于验证detect_face的后处理"""
+
+    NAME = "fixed"
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = 0
+        self.shapes = []
+
+    def detect(self, image):
+        self.calls += 1
+        self.shapes.append(image.shape)
+        return self.results
+
+
+class FaceDetectorTestCase(unittest.TestCase):
+
+    def test_torch_results_converted_to_mtcnn_format(self):
+        """测试facenet_pytorch的(x1, y1, x2, y2)输出转换为[x, y, width, height]"""
+        boxes = np.array([[10.4, 20.6, 110.2, 140.7]])
+        results = TorchMTCNNDetector._to_results(boxes, np.array([0.99]))
+        self.assertEqual(results, [{"box": [10, 21, 100, 120], "confidence": 0.99}])
+        self.assertEqual(TorchMTCNNDetector._to_results(None, [None]), [])
+
+    def test_torch_warmup_runs_single_threaded(self):
+        """测试PyTorch检测器预热时临时只用单线程，完成后恢复原线程数"""
+        torch = types.SimpleNamespace(num_threads=8)
+        torch.get_num_threads = lambda: torch.num_threads
+        torch.set_num_threads = lambda n: setattr(torch, "num_threads", n)
+        threads_during_detect = []
+
+        def detect(image):
+            threads_during_detect.append(torch.num_threads)
+            return None, None
+
+        detector = TorchMTCNNDetector.__new__(TorchMTCNNDetector)
+        detector._mtcnn = mock.Mock(detect=mock.Mock(side_effect=detect))
+        with mock.patch.dict(sys.modules, {"torch": torch}):
+            detector.warmup()
+        self.assertEqual(threads_during_detect, [1])
+        self.assertEqual(torch.num_threads, 8)
+
+    def test_warmup_uses_detector_warmup(self):
+        """测试face_utils.warmup()通过各档位检测器的warmup()预热"""
+        detectors = {profile: FixedDetector([]) for profile in config.DETECTION_PROFILES}
+        with mock.patch.dict(face_utils._detectors, detectors), \
+                mock.patch.object(FixedDetector, "warmup", autospec=True, side_effect=FaceDetector.warmup) as warmup:
+            face_utils.warmup(embedder=False)
+        profiles = {config.DEFAULT_DETECTION_PROFILE, *config.ENDPOINT_DETECTION_PROFILES.values()}
+        self.assertEqual(warmup.call_count, len(profiles))
+        for profile in profiles:
+            self.assertEqual(detectors[profile].shapes, [(160, 160, 3)])
+
+    def test_unknown_backend(self):
+        """测试不支持的检测后端"""
+        with self.assertRaises(ValueError):
+            create_detector("dlib")
+
+    def test_detect_face_uses_configured_detector(self):
+        """测试detect_face与detect_face_batch在检测器输出上完成裁剪和排序"""
+        detector = FixedDetector([
+            {"box": [10, 10, 40, 40], "confidence": 0.80},
+            {"box": [100, 100, 60, 60], "confidence": 0.99},
+        ])
+        image = Image.new("RGB", (200, 200), color="white")
+        with mock.patch.dict(face_utils._detectors, {"balanced": detector}):
+            boxes, faces, confidences = face_utils.detect_face(image, profile="balanced")
+            batch = face_utils.detect_face_batch([image, image], profile="balanced")
+        self.assertEqual(boxes, [(100, 100, 160, 160), (10, 10, 50, 50)])
+        self.assertEqual(confidences, [0.99, 0.80])
+        # 裁剪区域向外扩展10%，结果是原图数组的切片视图
+        self.assertEqual(faces[0].shape, (72, 72, 3))
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(batch[1][0], boxes)
+        self.assertEqual(detector.calls, 3)
+        # 档位最小人脸为40px，不缩放
+        self.assertEqual(detector.shapes[0], (200, 200, 3))
+
+    def test_image_detected_on_downscaled_copy(self):
+        """测试按档位最小人脸缩小图像检测，检测框映射回原图并从原图裁剪"""
+        # fast档位最小人脸80px：缩放比例 = 40 / 80 = 0.5
+        detector = FixedDetector([{"box": [300, 240, 60, 60], "confidence": 0.99}])
+        image = Image.new("RGB", (4000, 3000), color="white")
+        with mock.patch.dict(face_utils._detectors, {"fast": detector}):
+            boxes, faces, _ = face_utils.detect_face(image, profile="fast")
+        self.assertEqual(detector.shapes, [(1500, 2000, 3)])
+        self.assertEqual(boxes, [(600, 480, 720, 600)])
+        self.assertEqual(faces[0].shape, (144, 144, 3))
+
+    def test_profile_limits_face_count(self):
+        """测试档位的max_faces限制返回的人脸数"""
+        detector = FixedDetector([
+            {"box": [i * 100, 0, 90, 90], "confidence": 0.90 + i * 0.01} for i in range(7)
+        ])
+        # fast档位缩放比例0.5，检测框坐标对应缩小后的800x100图像
+        image = Image.new("RGB", (1600, 200), color="white")
+        with mock.patch.dict(face_utils._detectors, {"fast": detector}):
+            boxes, faces, confidences = face_utils.detect_face(image, profile="fast")
+        self.assertEqual(len(faces), face_utils.config.DETECTION_PROFILES["fast"]["max_faces"])
+        self.assertAlmostEqual(confidences[0], 0.96)
+
+    def test_detector_cached_per_profile(self):
+        """测试每个档位按自己的参数创建一个检测器并缓存"""
+        created = []
+
+        def fake_create_detector(name, **params):
+            created.append(params)
+            return FixedDetector([])
+
+        with mock.patch.dict(face_utils._detectors, clear=True), \
+                mock.patch.object(face_utils, "create_detector", fake_create_detector):
+            fast = face_utils.get_detector("fast")
+            self.assertIs(face_utils.get_detector("fast"), fast)
+            accurate = face_utils.get_detector("accurate")
+        self.assertIsNot(fast, accurate)
+        # 开启缩放时，检测器最小人脸取min(档位最小人脸, DOWNSCALE_FACE_SIZE)
+        self.assertEqual(created[0]["min_face_size"], 40)
+        self.assertEqual(created[0]["thresholds"], [0.7, 0.8, 0.85])
+        self.assertEqual(created[1]["min_face_size"], 15)
+        with self.assertRaises(ValueError):
+            face_utils.get_detector("tiny")
+
+    def test_detection_scale(self):
+        """测试缩放比例由档位最小人脸决定，长边超过max_side的大图进一步缩小"""
+        self.assertEqual(face_utils._detection_scale(15), 1.0)
+        self.assertEqual(face_utils._detection_scale(40), 1.0)
+        self.assertAlmostEqual(face_utils._detection_scale(100), 0.4)
+        # balanced档位（最小人脸40px）的12MP照片按长边上限缩小，小图不缩放
+        self.assertAlmostEqual(face_utils._detection_scale(40, 4000, 1920), 0.48)
+        self.assertEqual(face_utils._detection_scale(40, 1280, 1920), 1.0)
+        self.assertAlmostEqual(face_utils._detection_scale(100, 4000, 1920), 0.4)
+        with mock.patch.object(face_utils.config, "DETECTION_DOWNSCALE", False):
+            self.assertEqual(face_utils._detection_scale(100), 1.0)
+            self.assertEqual(face_utils._detection_scale(40, 4000, 1920), 1.0)
+
+    def test_large_image_detected_on_reduced_copy(self):
+        """测试balanced档位的大图在长边不超过max_side的副本上检测，检测框映射回原图坐标"""
+        detector = FixedDetector([{"box": [96, 96, 48, 48], "confidence": 0.99}])
+        image = np.zeros((3000, 4000, 3), dtype=np.uint8)
+        with mock.patch.dict(face_utils._detectors, {"balanced": detector}):
+            boxes, faces, _ = face_utils.detect_face(image, profile="balanced")
+        self.assertEqual(max(detector.shapes[0][:2]), 1920)
+        self.assertEqual(tuple(boxes[0]), (200, 200, 300, 300))
+        self.assertGreaterEqual(min(faces[0].shape[:2]), 100)  # 人脸从原图裁剪
+
+    def test_detect_face_on_rgb_array(self):
+        """测试直接传入RGB数组检测，裁剪的人脸共享原数组内存"""
+        detector = FixedDetector([{"box": [100, 100, 60, 60], "confidence": 0.99}])
+        rgb = np.zeros((200, 300, 3), dtype=np.uint8)
+        rgb[120:140, 120:140] = 255
+        with mock.patch.dict(face_utils._detectors, {"balanced": detector}):
+            boxes, faces, _ = face_utils.detect_face(rgb, profile="balanced")
+        self.assertEqual(boxes, [(100, 100, 160, 160)])
+        self.assertTrue(np.shares_memory(faces[0], rgb))
+        self.assertEqual(int(faces[0][26, 26, 0]), 255)
+        with self.assertRaises(Exception):
+            face_utils.detect_face(np.zeros((200, 300), dtype=np.uint8), profile="balanced")
+
+    def test_decode_image(self):
+        """测试图片字节解码为RGB数组，OpenCV不支持的格式回退到PIL"""
+        import io
+
+        for fmt in ("PNG", "GIF"):
+            buffer = io.BytesIO()
+            Image.new("RGB", (40, 30), color=(255, 0, 0)).save(buffer, format=fmt)
+            rgb = face_utils.decode_image(buffer.getvalue())
+            self.assertEqual(rgb.shape, (30, 40, 3))
+            self.assertEqual(tuple(int(v) for v in rgb[0, 0]), (255, 0, 0))
+        with self.assertRaises(ValueError):
+            face_utils.decode_image(b"not an image")
+        # JPEG编码后再解码，颜色通道顺序不变
+        decoded = face_utils.decode_image(face_utils.encode_jpeg(rgb, quality=95))
+        self.assertGreater(int(decoded[15, 20, 0]), 200)
+        self.assertLess(int(decoded[15, 20, 2]), 50)
+
+    def test_decode_upload_reduces_large_jpeg(self):
+        """测试上传的大尺寸JPEG按缩小的分辨率解码，超过像素预算的图片直接拒绝"""
+        import io
+
+        rgb = np.zeros((400, 6000, 3), dtype=np.uint8)
+        rgb[:, 3000:] = (0, 0, 255)
+        data = face_utils.encode_jpeg(rgb)
+        # 最长边6000：1/2解码后3000 >= 2560，1/4解码后1500 < 2560
+        image, scale = face_utils.decode_upload(data, min_side=2560)
+        self.assertEqual(image.shape, (200, 3000, 3))
+        self.assertAlmostEqual(scale, 0.5)
+        self.assertGreater(int(image[100, 2000, 2]), 200)
+        self.assertEqual(face_utils.scale_box((1000, 100, 1200, 300), scale), (500.0, 50.0, 600.0, 150.0))
+        # 不缩小或非JPEG格式按原分辨率解码
+        self.assertEqual(face_utils.decode_upload(data, min_side=0)[0].shape, (400, 6000, 3))
+        buffer = io.BytesIO()
+        Image.fromarray(rgb).save(buffer, format="PNG")
+        image, scale = face_utils.decode_upload(buffer.getvalue(), min_side=1000)
+        self.assertEqual((image.shape, scale), ((400, 6000, 3), 1.0))
+        with self.assertRaises(ValueError):
+            face_utils.decode_upload(data, max_pixels=6000 * 400 - 1)
+        with self.assertRaises(ValueError):
+            face_utils.decode_upload(b"not an image")
+
+    def test_register_face_decodes_once_and_releases_frame(self):
+        """测试注册时图片文件内容只解码一次，特征提取前整幅图像已释放，只保留人脸裁剪的副本"""
+        import weakref
+
+        from app.utils import data_process
+
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        frame[150:300, 250:400] = 200
+        data = face_utils.encode_jpeg(frame)
+        detector = FixedDetector([{"box": [250, 150, 150, 150], "confidence": 0.99}])
+        decoded = []
+
+        def recording_decode(payload):
+            image = face_utils.decode_image(payload)
+            decoded.append(weakref.ref(image))
+            return image
+
+        def checking_extract(faces):
+            self.assertIsNone(decoded[0]())
+            self.assertTrue(faces[0].flags.owndata)
+            raise RuntimeError("stop")
+
+        with mock.patch.dict(face_utils._detectors, {"balanced": detector}), \
+                mock.patch.object(data_process, "decode_image", side_effect=recording_decode), \
+                mock.patch.object(data_process, "extract_face_feature", side_effect=checking_extract):
+            with self.assertRaisesRegex(RuntimeError, "stop"):
+                data_process.register_face("测试用户", data, detection_profile="balanced")
+        self.assertEqual(len(decoded), 1)
+
+        with self.assertRaisesRegex(ValueError, "图像解码失败"):
+            data_process.register_face("测试用户", b"not an image")
+
+    def test_parse_face_box(self):
+        """测试解析前端和接口文档中的人脸框格式"""
+        self.assertEqual(face_utils.parse_face_box({"x": 10.4, "y": 20, "width": 100, "height": 120}), (10, 20, 110, 140))
+        self.assertEqual(face_utils.parse_face_box({"x1": 10, "y1": 20, "x2": 110, "y2": 140}), (10, 20, 110, 140))
+        self.assertEqual(face_utils.parse_face_box([10, 20, 110, 140]), (10, 20, 110, 140))
+        for invalid in ({"x": 10}, [10, 20, 110], [10, 20, 5, 140], "10,20,110,140", [0, 0, float("nan"), 10]):
+            with self.assertRaises(ValueError):
+                face_utils.parse_face_box(invalid)
+
+    def test_detect_face_inside_roi(self):
+        """测试提供人脸框时只在扩展后的区域内检测，检测框映射回原图"""
+        # 人脸框200x200，四周各扩展50% -> 检测区域 (300, 200, 700, 600)
+        detector = FixedDetector([{"box": [100, 100, 200, 200], "confidence": 0.99}])
+        image = Image.new("RGB", (1000, 800), color="white")
+        with mock.patch.dict(face_utils._detectors, {"balanced": detector}):
+            boxes, _, _ = face_utils.detect_face(image, profile="balanced", roi=(400, 300, 600, 500))
+        self.assertEqual(detector.shapes, [(400, 400, 3)])
+        self.assertEqual(boxes, [(400, 300, 600, 500)])
+
+    def test_roi_falls_back_to_full_image(self):
+        """测试人脸框区域内没有人脸时回退到整幅图像检测"""
+        detector = FixedDetector([])
+        image = Image.new("RGB", (1000, 800), color="white")
+        with mock.patch.dict(face_utils._detectors, {"balanced": detector}):
+            face_utils.detect_face(image, profile="balanced", roi=(400, 300, 600, 500))
+            self.assertEqual(detector.shapes, [(400, 400, 3), (800, 1000, 3)])
+            with mock.patch.object(face_utils.config, "DETECTION_ROI_FALLBACK", False):
+                boxes, _, _ = face_utils.detect_face(image, profile="balanced", roi=(400, 300, 600, 500))
+        self.assertEqual(boxes, [])
+        self.assertEqual(detector.calls, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
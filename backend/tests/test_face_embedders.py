@@ -0,0 +1,110 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import face_utils
+from app.utils.face_embedders import FaceEmbedder, create_embedder, embedding_similarity
+
+
+class RecordingEmbedder(FaceEmbedder):
+    """把输入批次的像素均值写入特征第一维的提取器，用于验证extract_face_feature的批处理"""
+
+    NAME = "recording"
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def embed(self, batch):
+        self.batch_sizes.append(len(batch))
+        features = np.ones((len(batch), 512), dtype=np.float32)
+        features[:, 0] = batch.reshape(len(batch), -1).mean(axis=1) * 100
+        return features
+
+
+class FaceEmbedderTestCase(unittest.TestCase):
+
+    def test_unknown_backend(self):
+        """测试不支持的特征提取后端"""
+        with self.assertRaises(ValueError):
+            create_embedder("tensorrt")
+
+    def test_missing_exported_model(self):
+        """测试导出模型不存在时提示导出命令"""
+        with tempfile.TemporaryDirectory() as directory:
+            for backend in ("onnx", "torchscript"):
+                with self.assertRaises(FileNotFoundError) as context:
+                    create_embedder(backend, os.path.join(directory, "missing.model"))
+                self.assertIn(f"app.tools.export_embedder --format {backend}", str(context.exception))
+
+    def test_embedding_similarity(self):
+        """测试逐行余弦相似度"""
+        reference = np.array([[1.0, 0.0], [0.0, 2.0], [1.0, 1.0]])
+        candidate = np.array([[2.0, 0.0], [1.0, 0.0], [0.0, 0.0]])
+        np.testing.assert_allclose(embedding_similarity(reference, candidate), [1.0, 0.0, 0.0])
+
+    def test_extract_face_feature_uses_embedder(self):
+        """测试extract_face_feature分批调用特征提取器、保持顺序并归一化"""
+        embedder = RecordingEmbedder()
+        faces = [Image.new("RGB", (120, 120), color=(v, v, v)) for v in (0, 255, 128)]
+        with mock.patch.object(face_utils, "_embedder", embedder):
+            features = face_utils.extract_face_feature(faces, batch_size=2)
+        self.assertEqual(embedder.batch_sizes, [2, 1])
+        self.assertEqual(len(features), 3)
+        for feature in features:
+            self.assertAlmostEqual(float(np.linalg.norm(feature)), 1.0, places=5)
+        # 输入标准化到[-1, 1]：黑色人脸的均值为-1，白色为1
+        self.assertLess(features[0][0], 0)
+        self.assertGreater(features[1][0], 0)
+        self.assertGreater(features[1][0], features[2][0])
+
+    def test_preprocess_does_not_modify_crop(self):
+        """测试预处理在副本上原地计算，不修改原图数组，批次张量写入预分配的数组"""
+        rng = np.random.default_rng(0)
+        frame = rng.integers(0, 256, size=(300, 300, 3), dtype=np.uint8)
+        original = frame.copy()
+        crops = [frame[10:170, 20:180], frame[50:250, 60:200]]
+        arrays = [face_utils._preprocess_face_image(crop) for crop in crops]
+        np.testing.assert_array_equal(frame, original)
+        self.assertEqual(arrays[1].shape, (160, 160, 3))
+
+        out = np.empty((2, 3, 160, 160), dtype=np.float32)
+        batch = face_utils._to_model_input(arrays, out=out)
+        self.assertIs(batch, out)
+        expected = (np.stack(arrays).astype(np.float32).transpose(0, 3, 1, 2) / 255.0 - 0.5) * 2.0
+        np.testing.assert_allclose(batch, expected, atol=1e-6)
+
+    def test_quantized_decision_flips(self):
+        """测试量化特征评估：特征偏移和匹配结果翻转"""
+        from app.tools.eval_quantized_embedder import decision_flips
+
+        reference = np.zeros((3, 512), dtype=np.float32)
+        reference[0, 0] = reference[1, 1] = 1.0
+        reference[2, [0, 3]] = [0.8, 0.6]  # 与第0行相似度0.8
+        candidate = reference.copy()
+        # 第1行偏移到与第0、2行都无关的方向：自身相似度0，混合比对时不再匹配自己
+        candidate[1] = 0.0
+        candidate[1, 2] = 1.0
+
+        result = decision_flips(reference, candidate, threshold=0.55)
+        self.assertEqual(result["count"], 3)
+        self.assertAlmostEqual(result["drift_min"], 0.0, places=6)
+        self.assertAlmostEqual(result["drift_mean"], 2 / 3, places=6)
+        self.assertEqual(result["mixed_flips"], [1])
+        self.assertEqual(result["loo_flips"], [])
+
+        # 第2行偏移后与第0行的相似度降到阈值以下，留一比对的匹配结果翻转
+        candidate[2, [0, 3]] = [0.4, 0.9165]
+        result = decision_flips(reference, candidate, threshold=0.55)
+        self.assertEqual(result["loo_flips"], [0, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,403 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import config
+from app.models.models import Base
+from app.utils.ann_index import IVFIndex
+from app.utils.face_gallery import FaceGallery
+from app.utils.face_utils import assign_face_features, match_face_features, top_k_face_features
+from app.utils.feature_store import FeatureStore
+from app.utils.gallery_sync import GalleryJournal
+
+
+def make_session_factory(directory):
+    """在临时目录中创建独立的SQLite数据库，返回会话工厂"""
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'face_db.db')}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def random_features(count, seed=0):
+    """生成随机的512维特征向量"""
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((count, 512))
+
+
+class FeatureStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = FeatureStore(os.path.join(self.tmp_dir.name, "features.f32"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_empty_store(self):
+        """测试空存储映射为空矩阵"""
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(self.store.open_readonly().shape, (0, 512))
+
+    def test_append_returns_sequential_rows(self):
+        """测试追加写入返回连续行号且数据已归一化"""
+        features = random_features(3)
+        self.assertEqual(self.store.append_many(features[:2]), [0, 1])
+        self.assertEqual(self.store.append(features[2]), 2)
+        mapped = self.store.open_readonly()
+        self.assertEqual(mapped.shape, (3, 512))
+        self.assertEqual(mapped.dtype, np.float32)
+        np.testing.assert_allclose(np.linalg.norm(mapped, axis=1), 1.0, rtol=1e-5)
+        expected = features[1] / np.linalg.norm(features[1])
+        np.testing.assert_allclose(self.store.read_row(1), expected, rtol=1e-5)
+
+    def test_mapping_is_read_only(self):
+        """测试映射的特征矩阵不可写"""
+        self.store.append(random_features(1)[0])
+        with self.assertRaises(ValueError):
+            self.store.open_readonly()[0, 0] = 1.0
+
+    def test_partial_row_is_truncated(self):
+        """测试中断写入留下的半行数据在下次追加时被截断"""
+        self.store.append(random_features(1)[0])
+        with open(self.store.path, "ab") as f:
+            f.write(b"\x00" * 100)
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store.append(random_features(1, seed=1)[0]), 1)
+        self.assertEqual(os.path.getsize(self.store.path), 2 * self.store.row_bytes)
+
+
+class FaceGalleryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = FeatureStore(os.path.join(self.tmp_dir.name, "features.f32"))
+        self.journal = GalleryJournal(make_session_factory(self.tmp_dir.name))
+        self.gallery = FaceGallery(self.store, self.journal)
+        # 从空特征库开始，不读取数据库
+        self.gallery.clear()
+        self.features = random_features(3)
+        rows = self.store.append_many(self.features)
+        for row, user_id, identity_id, name in zip(
+            rows, [1, 2, 3], ["USR001", "USR002", "USR003"], ["张三", "李四", "王五"]
+        ):
+            self.gallery.add(user_id, identity_id, name, row)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_snapshot_maps_store(self):
+        """测试快照中的特征矩阵对应特征存储的各行"""
+        snapshot = self.gallery.snapshot()
+        self.assertEqual(snapshot.features.shape, (3, 512))
+        self.assertEqual(list(snapshot.names), ["张三", "李四", "王五"])
+        self.assertTrue(snapshot.active.all())
+
+    def test_add_grows_gallery(self):
+        """测试新增用户后特征库在原地扩展"""
+        rows = self.store.append_many(random_features(300, seed=1))
+        for i, row in enumerate(rows):
+            self.gallery.add(100 + i, f"USR{100 + i}", f"user_{i}", row)
+        snapshot = self.gallery.snapshot()
+        self.assertEqual(len(self.gallery), 303)
+        self.assertEqual(snapshot.names[-1], "user_299")
+        self.assertEqual(snapshot.user_ids[-1], 399)
+
+    def test_unreferenced_rows_are_inactive(self):
+        """测试未被用户引用的行不参与比对"""
+        self.store.append(random_features(1, seed=2)[0])
+        row = self.store.append(random_features(1, seed=3)[0])
+        self.gallery.add(9, "USR009", "赵六", row)
+        snapshot = self.gallery.snapshot()
+        self.assertEqual(list(snapshot.active), [True, True, True, False, True])
+
+    def test_remove_marks_tombstone(self):
+        """测试删除用户后对应行不再有效"""
+        removed = self.gallery.remove("USR002")
+        self.assertEqual(removed, 1)
+        self.assertEqual(len(self.gallery), 2)
+        snapshot = self.gallery.snapshot()
+        self.assertEqual(list(snapshot.names[snapshot.active]), ["张三", "王五"])
+
+    def test_remove_unknown_identity(self):
+        """测试删除不存在的身份ID不影响特征库"""
+        self.assertEqual(self.gallery.remove(["USR999"]), 0)
+        self.assertEqual(len(self.gallery), 3)
+
+    def test_add_invalid_row(self):
+        """测试登记不存在的行号时抛出ValueError"""
+        with self.assertRaises(ValueError):
+            self.gallery.add(10, "USR010", "无效", 99)
+
+    def test_search_returns_top_k(self):
+        """测试检索返回最相似的k个有效用户"""
+        results = self.gallery.search(self.features[1], k=2)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0][0], 1)
+        self.gallery.remove("USR002")
+        self.assertNotIn(1, [row for row, _ in self.gallery.search(self.features[1], k=3)])
+
+    def test_match_many_consistent_with_match(self):
+        """测试批量比对与逐个比对的最佳匹配一致，分块比对不影响结果，删除的用户不参与"""
+        self.gallery.remove("USR003")
+        queries = np.vstack([self.features, random_features(1, seed=4)])
+        with mock.patch.object(FaceGallery, "MATCH_BLOCK_ROWS", 2):
+            rows, similarities = self.gallery.match_many(queries, threshold=0.5)
+        self.assertEqual(list(rows), [0, 1, -1, -1])
+        for query, similarity in zip(queries, similarities):
+            matches, max_similarity = self.gallery.match(query, threshold=-1.0)
+            self.assertAlmostEqual(float(similarity), matches[0][1], places=5)
+
+    def test_add_many(self):
+        """测试一次登记多个用户"""
+        rows = self.store.append_many(random_features(2, seed=5))
+        self.gallery.add_many([(4, "USR004", "赵六", rows[0]), (5, "USR005", "孙七", rows[1])])
+        self.assertEqual(len(self.gallery), 5)
+        self.assertEqual(list(self.gallery.snapshot().names[-2:]), ["赵六", "孙七"])
+
+    def test_clear(self):
+        """测试清空特征库"""
+        self.gallery.clear()
+        self.assertEqual(len(self.gallery), 0)
+        self.assertFalse(self.gallery.snapshot().active.any())
+
+
+class FaceGalleryIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.patcher = mock.patch.multiple(
+            config,
+            ANN_INDEX_TYPE="ivf",
+            ANN_MIN_GALLERY_SIZE=40,
+            ANN_NLIST=16,
+            ANN_NPROBE=4,
+            ANN_INDEX_PATH=os.path.join(self.tmp_dir.name, "ann_index.npz")
+        )
+        self.patcher.start()
+        self.store = FeatureStore(os.path.join(self.tmp_dir.name, "features.f32"))
+        rng = np.random.default_rng(0)
+        centers = rng.standard_normal((40, 512))
+        self.people = centers
+        rows = self.store.append_many(centers + rng.standard_normal((40, 512)) * 0.3)
+        self.gallery = FaceGallery(self.store, GalleryJournal(make_session_factory(self.tmp_dir.name)))
+        self.gallery.clear()
+        for row in rows:
+            self.gallery.add(row + 1, f"USR{row:03d}", f"user_{row}", row)
+        self.gallery.wait_for_index()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_index_built_and_saved(self):
+        """测试达到阈值后自动构建并保存索引"""
+        self.assertIsNotNone(self.gallery._index)
+        self.assertEqual(len(self.gallery._index.centroids), 16)
+        self.assertTrue(os.path.exists(config.ANN_INDEX_PATH))
+
+    def test_index_built_off_request_path(self):
+        """测试索引在后台线程中训练：训练期间注册和比对不被阻塞（暴力比对），构建期间新增的行在切换前补齐"""
+        self.gallery.clear()
+        rows = self.store.append_many(self.people + 0.01)
+        for row in rows[:-1]:
+            self.gallery.add(row + 1, f"USR{row:03d}", f"user_{row}", row)
+
+        training = threading.Event()
+        release = threading.Event()
+        build = IVFIndex.build
+
+        def slow_build(index, *args, **kwargs):
+            training.set()
+            release.wait(5)
+            return build(index, *args, **kwargs)
+
+        with mock.patch.object(IVFIndex, "build", slow_build):
+            # 达到阈值的这次注册只启动后台训练
+            self.gallery.add(rows[-1] + 1, f"USR{rows[-1]:03d}", f"user_{rows[-1]}", rows[-1])
+            self.assertTrue(training.wait(5))
+            self.assertIsNone(self.gallery._index)
+            matches, _ = self.gallery.match(self.people[3], threshold=0.55)
+            self.assertEqual(matches[0][0], rows[3])
+
+            # 训练期间新增的行
+            extra = self.store.append(self.people[0] * -1)
+            self.gallery.add(999, "USR999", "extra", extra)
+            release.set()
+            self.assertTrue(self.gallery.wait_for_index(5))
+
+        self.assertTrue(self.gallery._index.indexed_mask(extra + 1)[extra])
+        matches, _ = self.gallery.match(self.people[0] * -1, threshold=0.55)
+        self.assertEqual(matches[0][0], extra)
+
+    def test_saved_index_loaded_without_training(self):
+        """测试已保存的索引文件（如其他工作进程构建的）直接加载，不重新训练"""
+        with mock.patch.object(IVFIndex, "build", side_effect=AssertionError("不应重新训练")):
+            with self.gallery._lock:
+                self.gallery._setup_index()
+            self.assertIsNotNone(self.gallery._index)
+        self.assertEqual(len(self.gallery._index), 40)
+
+    def test_clear_removes_saved_index(self):
+        """测试清空特征库时删除已保存的索引文件，重新注册达到阈值后按新数据训练"""
+        self.gallery.clear()
+        self.assertFalse(os.path.exists(config.ANN_INDEX_PATH))
+
+        rows = self.store.append_many(-self.people)
+        with mock.patch.object(IVFIndex, "build", autospec=True, side_effect=IVFIndex.build) as build:
+            for row in rows:
+                self.gallery.add(row + 1, f"USR{row:03d}", f"user_{row}", row)
+            self.assertTrue(self.gallery.wait_for_index())
+        build.assert_called_once()
+        self.assertEqual(len(self.gallery._index), 40)
+        self.assertEqual(self.gallery.search(-self.people[3], k=1)[0][0], rows[3])
+
+    def test_match_consistent_with_brute_force(self):
+        """测试经由索引的匹配结果与暴力比对的最佳匹配一致"""
+        snapshot = self.gallery.snapshot()
+        rng = np.random.default_rng(1)
+        for person in range(0, 40, 5):
+            query = self.people[person] + rng.standard_normal(512) * 0.3
+            matches, max_similarity = self.gallery.match(query, threshold=0.55, snapshot=snapshot)
+            expected, expected_max = match_face_features(
+                query, snapshot.features, threshold=0.55, valid_mask=snapshot.active
+            )
+            self.assertEqual(matches[0][0], expected[0][0])
+            self.assertAlmostEqual(max_similarity, expected_max, places=5)
+
+    def test_search_consistent_with_brute_force(self):
+        """测试经由索引的top-k检索首位与暴力检索一致"""
+        snapshot = self.gallery.snapshot()
+        query = self.people[7]
+        results = self.gallery.search(query, k=3, snapshot=snapshot)
+        expected = top_k_face_features(query, snapshot.features, k=3, valid_mask=snapshot.active)
+        self.assertEqual(results[0][0], expected[0][0])
+        self.assertLessEqual(len(results), 3)
+
+    def test_assign_consistent_with_brute_force(self):
+        """测试经由索引的联合分配与暴力分配一致"""
+        snapshot = self.gallery.snapshot()
+        rng = np.random.default_rng(2)
+        queries = [self.people[p] + rng.standard_normal(512) * 0.3 for p in (1, 9, 9, 30)]
+        assignments, _ = self.gallery.assign(queries, threshold=0.55, snapshot=snapshot)
+        expected, _ = assign_face_features(
+            queries, snapshot.features, threshold=0.55, valid_mask=snapshot.active
+        )
+        self.assertEqual([row for row, _ in assignments], [row for row, _ in expected])
+
+    def test_removed_rows_not_matched(self):
+        """测试删除的用户不会经由索引被匹配"""
+        self.gallery.remove("USR000")
+        matches, _ = self.gallery.match(self.people[0], threshold=0.55)
+        self.assertNotIn(0, [row for row, _ in matches])
+
+
+
+class FaceGalleryQuantizationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.patcher = mock.patch.multiple(config, GALLERY_QUANTIZATION="int8", QUANTIZED_RERANK_K=8)
+        self.patcher.start()
+        self.store = FeatureStore(os.path.join(self.tmp_dir.name, "features.f32"))
+        self.gallery = FaceGallery(self.store, GalleryJournal(make_session_factory(self.tmp_dir.name)))
+        self.gallery.clear()
+        self.features = random_features(200)
+        for row in self.store.append_many(self.features):
+            self.gallery.add(row + 1, f"USR{row:03d}", f"user_{row}", row)
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_match_reranked_with_float32(self):
+        """测试量化粗筛后的匹配结果与float32暴力比对一致"""
+        snapshot = self.gallery.snapshot()
+        self.assertEqual(len(self.gallery._quantized), 200)
+        rng = np.random.default_rng(4)
+        for person in (0, 57, 199):
+            query = self.features[person] + rng.standard_normal(512) * 0.5
+            matches, max_similarity = self.gallery.match(query, threshold=0.55, snapshot=snapshot)
+            expected, expected_max = match_face_features(
+                query, snapshot.features, threshold=0.55, valid_mask=snapshot.active
+            )
+            self.assertEqual(matches[0][0], expected[0][0])
+            self.assertAlmostEqual(max_similarity, expected_max, places=5)
+
+    def test_search_and_remove(self):
+        """测试量化粗筛下的top-k检索不会返回已删除用户"""
+        self.gallery.remove("USR057")
+        rows = [row for row, _ in self.gallery.search(self.features[57], k=5)]
+        self.assertEqual(len(rows), 5)
+        self.assertNotIn(57, rows)
+
+
+class GallerySyncTestCase(unittest.TestCase):
+    """模拟两个工作进程共享特征存储和变更日志"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        session_factory = make_session_factory(self.tmp_dir.name)
+        self.patcher = mock.patch("app.utils.face_gallery.SessionLocal", session_factory)
+        self.patcher.start()
+        self.store = FeatureStore(os.path.join(self.tmp_dir.name, "features.f32"))
+        self.journal = GalleryJournal(session_factory, max_entries=5)
+        self.worker_a = FaceGallery(self.store, self.journal)
+        self.worker_b = FaceGallery(self.store, self.journal)
+        self.worker_a.ensure_loaded()
+        self.worker_b.ensure_loaded()
+        self.features = random_features(3)
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_add_visible_to_other_worker(self):
+        """测试一个进程注册的用户在另一个进程中可见"""
+        row = self.store.append(self.features[0])
+        self.worker_a.add(1, "USR001", "张三", row)
+        snapshot = self.worker_b.snapshot()
+        self.assertEqual(list(snapshot.names[snapshot.active]), ["张三"])
+        matches, _ = self.worker_b.match(self.features[0], threshold=0.55)
+        self.assertEqual(matches[0][0], row)
+
+    def test_remove_visible_to_other_worker(self):
+        """测试一个进程删除的用户在另一个进程中不再被匹配"""
+        rows = self.store.append_many(self.features[:2])
+        self.worker_a.add(1, "USR001", "张三", rows[0])
+        self.worker_a.add(2, "USR002", "李四", rows[1])
+        self.assertEqual(len(self.worker_b), 2)
+        self.worker_a.remove("USR001")
+        matches, _ = self.worker_b.match(self.features[0], threshold=0.55)
+        self.assertEqual(matches, [])
+        self.assertEqual(len(self.worker_b), 1)
+
+    def test_own_changes_not_replayed(self):
+        """测试本进程写入的变更直接前移版本号"""
+        row = self.store.append(self.features[0])
+        self.worker_a.add(1, "USR001", "张三", row)
+        self.assertEqual(self.worker_a._version, self.journal.latest_version())
+
+    def test_pruned_journal_triggers_reload(self):
+        """测试所需的变更记录已被清理时全量重新加载"""
+        self.journal.PRUNE_INTERVAL = 1
+        rows = self.store.append_many(self.features)
+        for i, row in enumerate(rows):
+            self.worker_a.remove(f"USR{i:03d}")
+            self.worker_a.remove(f"USR{i:03d}")
+        with mock.patch.object(self.worker_b, "load", wraps=self.worker_b.load) as load:
+            self.worker_b.snapshot()
+            load.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.face_utils import (
+    assign_face_features, compare_face_features, match_face_features, top_k_face_features
+)
+
+
+def normalize_rows(matrix):
+    """按行归一化"""
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+class FaceMatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.query = rng.standard_normal(512)
+        # 构造与查询向量相似度各不相同的特征库
+        noise = rng.standard_normal((20, 512))
+        weights = np.linspace(0.2, 3.0, 20)[:, None]
+        self.db_features = list(self.query + noise * weights)
+
+    def test_matches_sorted_descending(self):
+        """测试匹配结果按相似度降序排列且都不低于阈值"""
+        matches, max_similarity = match_face_features(
+            self.query, normalize_rows(np.stack(self.db_features)), threshold=0.5
+        )
+        similarities = [similarity for _, similarity in matches]
+        self.assertTrue(matches)
+        self.assertEqual(similarities, sorted(similarities, reverse=True))
+        self.assertTrue(all(similarity >= 0.5 for similarity in similarities))
+        self.assertAlmostEqual(max_similarity, similarities[0])
+
+    def test_near_threshold_weighting(self):
+        """测试接近阈值的相似度会加0.02后参与匹配"""
+        gallery = np.zeros((2, 512), dtype=np.float32)
+        query = np.zeros(512, dtype=np.float32)
+        query[0] = 1.0
+        # 第一行相似度0.54（加权后0.56），第二行相似度0.52（加权后0.54，仍低于阈值）
+        gallery[0, 0], gallery[0, 1] = 0.54, np.sqrt(1 - 0.54 ** 2)
+        gallery[1, 0], gallery[1, 1] = 0.52, np.sqrt(1 - 0.52 ** 2)
+        matches, max_similarity = match_face_features(query, gallery, threshold=0.55)
+        self.assertEqual([index for index, _ in matches], [0])
+        self.assertAlmostEqual(max_similarity, 0.56, places=5)
+
+    def test_valid_mask_excludes_rows(self):
+        """测试valid_mask为False的行不参与匹配"""
+        gallery = normalize_rows(np.stack(self.db_features))
+        mask = np.ones(len(gallery), dtype=bool)
+        full_matches, _ = match_face_features(self.query, gallery, threshold=0.5)
+        mask[full_matches[0][0]] = False
+        masked_matches, _ = match_face_features(self.query, gallery, threshold=0.5, valid_mask=mask)
+        self.assertNotIn(full_matches[0][0], [index for index, _ in masked_matches])
+
+    def test_compare_skips_invalid_features(self):
+        """测试compare_face_features跳过格式错误的特征并保留原始索引"""
+        db_features = [np.zeros(10), np.zeros(512)] + self.db_features
+        matches, _ = compare_face_features(self.query, db_features, threshold=0.5)
+        expected, _ = match_face_features(
+            self.query, normalize_rows(np.stack(self.db_features)), threshold=0.5
+        )
+        self.assertEqual([index for index, _ in matches], [index + 2 for index, _ in expected])
+
+    def test_invalid_input_feature(self):
+        """测试输入特征维度错误时抛出ValueError"""
+        with self.assertRaises(ValueError):
+            match_face_features(np.zeros(128), np.zeros((1, 512)))
+
+
+
+class TopKSearchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.query = rng.standard_normal(512)
+        self.gallery = normalize_rows(rng.standard_normal((200, 512)))
+
+    def test_top_k_matches_full_sort(self):
+        """测试top-k结果与全排序的前k个一致"""
+        results = top_k_face_features(self.query, self.gallery, k=10)
+        similarities = self.gallery @ (self.query / np.linalg.norm(self.query))
+        expected = np.argsort(-similarities)[:10]
+        self.assertEqual([row for row, _ in results], list(expected))
+        np.testing.assert_allclose([sim for _, sim in results], similarities[expected])
+
+    def test_valid_mask_and_small_gallery(self):
+        """测试无效行被跳过，且k大于有效行数时只返回有效行"""
+        mask = np.zeros(200, dtype=bool)
+        mask[[3, 50, 120]] = True
+        results = top_k_face_features(self.query, self.gallery, k=10, valid_mask=mask)
+        self.assertEqual(sorted(row for row, _ in results), [3, 50, 120])
+        self.assertEqual(top_k_face_features(self.query, np.empty((0, 512)), k=3), [])
+
+    def test_invalid_k(self):
+        """测试k不是正整数时抛出ValueError"""
+        with self.assertRaises(ValueError):
+            top_k_face_features(self.query, self.gallery, k=0)
+
+
+
+class FaceAssignmentTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # 用正交基精确构造相似度：
+        # 人脸A与用户X相似度0.70、与Y相似度0.65；人脸B只与X相似(0.60)
+        basis = np.eye(512)
+        self.gallery = basis[:2]
+        self.face_a = 0.70 * basis[0] + 0.65 * basis[1] + np.sqrt(1 - 0.70 ** 2 - 0.65 ** 2) * basis[2]
+        self.face_b = 0.60 * basis[0] + 0.80 * basis[3]
+
+    def test_greedy_assigns_each_user_once(self):
+        """测试贪心分配中同一用户不会分配给两张人脸"""
+        assignments, max_similarities = assign_face_features(
+            [self.face_a, self.face_b], self.gallery, threshold=0.55, method="greedy"
+        )
+        self.assertEqual(assignments[0][0], 0)
+        self.assertIsNone(assignments[1][0])
+        self.assertAlmostEqual(max_similarities[1], 0.60)
+
+    def test_hungarian_maximizes_total_similarity(self):
+        """测试匈牙利算法使总相似度最大"""
+        assignments, _ = assign_face_features(
+            [self.face_a, self.face_b], self.gallery, threshold=0.55, method="hungarian"
+        )
+        self.assertEqual([row for row, _ in assignments], [1, 0])
+        self.assertAlmostEqual(assignments[0][1], 0.65)
+
+    def test_single_face_matches_independent_match(self):
+        """测试单张人脸时联合分配与独立匹配的最佳结果一致"""
+        rng = np.random.default_rng(3)
+        gallery = normalize_rows(rng.standard_normal((100, 512)))
+        query = gallery[42] + rng.standard_normal(512) * 0.05
+        expected, _ = match_face_features(query, gallery, threshold=0.55)
+        for method in ("greedy", "hungarian"):
+            assignments, _ = assign_face_features([query, None], gallery, threshold=0.55, method=method)
+            self.assertEqual(assignments[0][0], expected[0][0])
+            self.assertIsNone(assignments[1][0])
+
+    def test_unknown_method(self):
+        """测试不支持的分配方法"""
+        with self.assertRaises(ValueError):
+            assign_face_features([self.face_a], self.gallery, method="auction")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Base
+from app.utils.face_gallery import FaceGallery
+from app.utils.face_uniqueness_check import FaceUniquenessChecker
+from app.utils.feature_store import FeatureStore
+from app.utils.gallery_sync import GalleryJournal
+
+
+class FaceUniquenessCheckerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = FeatureStore(os.path.join(self.tmp_dir.name, "features.f32"))
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'face_db.db')}")
+        Base.metadata.create_all(bind=engine)
+        self.gallery = FaceGallery(self.store, GalleryJournal(sessionmaker(bind=engine)))
+        self.gallery.clear()
+        rng = np.random.default_rng(0)
+        self.features = rng.standard_normal((3, 512))
+        rows = self.store.append_many(self.features)
+        for row, identity_id, name in zip(rows, ["USR001", "USR002", "USR003"], ["张三", "李四", "王五"]):
+            self.gallery.add(row + 1, identity_id, name, row)
+        self.checker = FaceUniquenessChecker(gallery=self.gallery)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_find_similar_users_from_gallery(self):
+        """测试相似用户直接从特征库查询"""
+        similar_users, max_similarity = self.checker.find_similar_users(
+            self.features[1], with_image_path=False
+        )
+        self.assertEqual([user["user_id"] for user in similar_users], ["USR002"])
+        self.assertEqual(similar_users[0]["user_name"], "李四")
+        self.assertAlmostEqual(max_similarity, 1.0, places=5)
+
+    def test_removed_user_is_unique(self):
+        """测试已删除用户的人脸不再被判定为重复"""
+        self.gallery.remove("USR002")
+        similar_users, _ = self.checker.find_similar_users(self.features[1], with_image_path=False)
+        self.assertEqual(similar_users, [])
+
+    def test_check_face_uniqueness(self):
+        """测试唯一性校验结果包含相似用户及图片路径"""
+        query = mock.MagicMock()
+        query.filter.return_value.all.return_value = [("USR003", "/data/faces/usr003.jpg")]
+        session = mock.MagicMock()
+        session.query.return_value = query
+        with mock.patch.object(self.checker, "_extract_features_from_image", return_value=[self.features[2]]), \
+                mock.patch("app.utils.face_uniqueness_check.SessionLocal", return_value=session):
+            result = self.checker.check_face_uniqueness(object())
+        self.assertFalse(result["is_unique"])
+        self.assertEqual(result["similar_users"][0]["user_id"], "USR003")
+        self.assertEqual(result["similar_users"][0]["image_path"], "/data/faces/usr003.jpg")
+        session.close.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import config
+from app.models.models import User
+from app.tools import import_faces
+from app.utils import face_utils
+from face_fixtures import CenterFaceDetector, GalleryTestCase, install_stub_models, photo
+
+
+class ImportFacesTestCase(GalleryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.photo_dir = os.path.join(self.tmp_dir.name, "photos")
+        os.makedirs(self.photo_dir)
+
+    def write_photo(self, filename, color=None):
+        path = os.path.join(self.photo_dir, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(photo(color) if color else b"not an image")
+        return path
+
+    def run_import(self, sources, **kwargs):
+        kwargs.setdefault("workers", 0)
+        return import_faces.import_faces(
+            sources, session_factory=self.Session, gallery=self.gallery, store=self.store, **kwargs
+        )
+
+    def registered_names(self):
+        db = self.Session()
+        try:
+            return sorted(name for (name,) in db.query(User.name).all())
+        finally:
+            db.close()
+
+    def test_read_sources_from_directory_and_csv(self):
+        """测试目录输入递归查找图片并按文件名或目录名命名，CSV输入解析相对路径并校验身份ID"""
+        self.write_photo("李四/1.jpg", "green")
+        self.write_photo("王五.png", "blue")
+        self.write_photo("notes.txt")
+
+        sources = import_faces.read_sources(self.photo_dir)
+        self.assertEqual([source["name"] for source in sources], ["1", "王五"])
+        sources = import_faces.read_sources(self.photo_dir, name_from="parent")
+        self.assertEqual([source["name"] for source in sources], ["李四", "photos"])
+
+        manifest = os.path.join(self.tmp_dir.name, "roster.csv")
+        with open(manifest, "w", encoding="utf-8") as f:
+            f.write("path,name,user_id\nphotos/王五.png,王五,USR202510170001\nphotos/李四/1.jpg,李四,\n")
+        sources = import_faces.read_sources(manifest)
+        self.assertEqual(sources[0]["path"], os.path.join(self.tmp_dir.name, "photos/王五.png"))
+        self.assertEqual([source["user_id"] for source in sources], ["USR202510170001", None])
+
+        with open(manifest, "w", encoding="utf-8") as f:
+            f.write("filename,name,user_id\n1.jpg,李四,USR1\n")
+        with self.assertRaises(ValueError):
+            import_faces.read_sources(manifest)
+
+    def test_import_dedupes_in_batches_and_inserts_once(self):
+        """测试导入：特征库中已有的人脸、跨批次和批内重复的人脸被阻断，通过校验的人脸在一个事务中入库"""
+        sources = [
+            {"path": self.write_photo(filename, color), "name": name, "user_id": user_id}
+            for filename, color, name, user_id in [
+                ("red.jpg", "red", "红", None),
+                ("green1.jpg", "green", "李四", None),
+                ("green2.jpg", "green", "李四二", None),
+                ("dark.jpg", "dark", "暗", None),
+                ("blue.jpg", "blue", "王五", "USR202510170001"),
+                ("broken.jpg", None, "坏", None),
+                ("green3.jpg", "green", "李四三", None),
+            ]
+        ]
+
+        results, stats = self.run_import(sources, batch_size=2)
+        statuses = [result["status"] for result in results]
+        self.assertEqual(statuses, ["blocked", "registered", "blocked", "failed", "registered", "failed", "blocked"])
+        self.assertIn("USR001", results[0]["message"])
+        self.assertIn("green1.jpg", results[2]["message"])  # 批内重复
+        self.assertIn("green1.jpg", results[6]["message"])  # 与之前批次通过的人脸重复
+        self.assertEqual(results[4]["identity_id"], "USR202510170001")
+
+        # 5张检测到人脸的照片按批次大小2送入特征提取
+        self.assertEqual(self.embedder.batch_sizes, [2, 2, 1])
+        self.assertEqual(stats["decode"]["images"], 7)
+        self.assertEqual(stats["detect"]["images"], 6)
+        self.assertEqual((stats["embed"]["images"], stats["dedupe"]["images"], stats["insert"]["images"]), (5, 5, 2))
+
+        self.assertEqual(self.registered_names(), ["李四", "王五"])
+        self.assertEqual(len(self.gallery), 3)
+        self.assertEqual(len(os.listdir(config.FACE_IMAGE_DIR)), 2)
+
+        # 再次导入时全部被特征库阻断
+        results, _ = self.run_import(sources[1:2])
+        self.assertEqual(results[0]["status"], "blocked")
+
+    def test_detection_error_fails_only_that_photo(self):
+        """测试某张照片检测时抛出异常只把该照片记为失败，其余照片照常入库"""
+        sources = [
+            {"path": self.write_photo("green.jpg", "green"), "name": "李四", "user_id": None},
+            {"path": self.write_photo("blue.jpg", "blue"), "name": "王五", "user_id": None},
+        ]
+
+        def detect(image):
+            if image[..., 2].mean() > 100:
+                raise RuntimeError("detector blew up")
+            return [{"box": [10, 10, 120, 120], "confidence": 0.99}]
+
+        with mock.patch.object(CenterFaceDetector, "detect", side_effect=detect):
+            results, _ = self.run_import(sources)
+        self.assertEqual([result["status"] for result in results], ["registered", "failed"])
+        self.assertIn("detector blew up", results[1]["message"])
+        self.assertEqual(self.registered_names(), ["李四"])
+
+    def test_committed_users_reach_gallery_after_crash(self):
+        """测试用户提交后、登记到特征库前进程中断：变更日志已随用户一起提交，特征库同步后即可看到这些用户"""
+        sources = [{"path": self.write_photo("green.jpg", "green"), "name": "李四", "user_id": None}]
+        with mock.patch.object(self.gallery, "add_many", side_effect=SystemExit("进程被终止")):
+            with self.assertRaises(SystemExit):
+                self.run_import(sources)
+        self.assertEqual(self.gallery._active_count, 1)
+        self.assertEqual(len(self.gallery), 2)
+
+        results, _ = self.run_import(sources)
+        self.assertEqual(results[0]["status"], "blocked")
+
+    def test_dry_run_and_taken_identity_ids(self):
+        """测试dry_run不写入数据库；指定的身份ID已被占用时该照片记为失败，其余照片正常入库"""
+        sources = [
+            {"path": self.write_photo("green.jpg", "green"), "name": "李四", "user_id": "USR202510170001"},
+            {"path": self.write_photo("blue.jpg", "blue"), "name": "王五", "user_id": "USR202510170001"},
+        ]
+        results, stats = self.run_import(sources, dry_run=True)
+        self.assertEqual([result["status"] for result in results], ["accepted", "accepted"])
+        self.assertEqual(stats["insert"]["images"], 0)
+        self.assertEqual(len(self.gallery), 1)
+
+        results, _ = self.run_import(sources)
+        self.assertEqual([result["status"] for result in results], ["registered", "failed"])
+        self.assertEqual(len(self.gallery), 2)
+
+    def test_process_pool_pipeline(self):
+        """测试多进程流水线：检测进程池和特征提取进程（spawn启动，通过初始化函数安装模型替身）"""
+        sources = [
+            {"path": self.write_photo(filename, color), "name": filename.split(".")[0], "user_id": None}
+            for filename, color in [("red.jpg", "red"), ("green1.jpg", "green"), ("dark.jpg", "dark"),
+                                    ("green2.jpg", "green"), ("blue.jpg", "blue")]
+        ]
+        results, stats = self.run_import(sources, workers=2, batch_size=2, worker_initializer=install_stub_models)
+        self.assertEqual(
+            [result["status"] for result in results], ["blocked", "registered", "failed", "blocked", "registered"]
+        )
+        self.assertEqual((stats["detect"]["images"], stats["embed"]["images"], stats["insert"]["images"]), (5, 4, 2))
+        self.assertEqual(self.registered_names(), ["blue", "green1"])
+        self.assertEqual(len(self.gallery), 3)
+
+    def test_main_prints_summary_and_report(self):
+        """测试命令行入口打印各阶段吞吐量并写出结果报告"""
+        self.write_photo("李四.jpg", "green")
+        report = os.path.join(self.tmp_dir.name, "report.csv")
+        with mock.patch.object(import_faces, "init_db"), \
+                mock.patch.object(import_faces, "SessionLocal", self.Session), \
+                mock.patch.object(import_faces, "face_gallery", self.gallery), \
+                mock.patch.object(import_faces, "feature_store", self.store), \
+                mock.patch("builtins.print") as printed:
+            self.assertEqual(import_faces.main([self.photo_dir, "--workers", "0", "--report", report]), 0)
+        output = "\n".join(str(call.args[0]) for call in printed.call_args_list if call.args)
+        for stage in import_faces.STAGES:
+            self.assertIn(stage, output)
+        self.assertIn("张/秒", output)
+        with open(report, encoding="utf-8-sig") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], "path,name,status,identity_id,similarity,message")
+        self.assertIn("李四,registered", lines[1])
+
+        self.assertEqual(import_faces.main([os.path.join(self.tmp_dir.name, "missing")]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LazyModelLoadingTestCase(unittest.TestCase):
+
+    def test_create_app_does_not_load_models(self):
+        """测试创建应用时不导入深度学习框架、不加载模型"""
+        code = (
+            "import sys\n"
+            "from app.utils import face_utils\n"
+            "import app.api.recognize, app.api.register\n"
+            "loaded = [m for m in ('mtcnn', 'tensorflow', 'torch', 'facenet_pytorch', 'onnxruntime') if m in sys.modules]\n"
+            "print(','.join(loaded) or 'none')\n"
+            "print(not face_utils._detectors and face_utils._embedder is None)\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split(), ["none", "True"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.quantization import QuantizedMatrix
+
+
+def normalized_features(count, seed=0):
+    """生成归一化的随机特征"""
+    rng = np.random.default_rng(seed)
+    features = rng.standard_normal((count, 512))
+    return (features / np.linalg.norm(features, axis=1, keepdims=True)).astype(np.float32)
+
+
+class QuantizedMatrixTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.features = normalized_features(1000)
+        self.query = self.features[10] + normalized_features(1, seed=1)[0] * 0.5
+        self.query /= np.linalg.norm(self.query)
+
+    def test_scores_close_to_float32(self):
+        """测试量化后的相似度与float32相似度误差足够小"""
+        exact = self.features @ self.query
+        quantized = QuantizedMatrix("int8")
+        quantized.extend(self.features)
+        np.testing.assert_allclose(quantized.scores(self.query), exact, atol=2e-2)
+
+    def test_chunk_buffer_reused(self):
+        """测试分块扫描复用同一个float32缓冲区，最后一个不满的分块结果正确"""
+        quantized = QuantizedMatrix("int8")
+        quantized.CHUNK_SIZE = 300
+        quantized.extend(self.features)
+        first = quantized.scores(self.query)
+        buffer = quantized._chunk_buffer()
+        self.assertEqual(buffer.shape, (300, 512))
+        np.testing.assert_allclose(quantized.scores(-self.query), -first, atol=1e-6)
+        self.assertIs(quantized._chunk_buffer(), buffer)
+
+    def test_memory_saving(self):
+        """测试量化矩阵的内存占用"""
+        int8 = QuantizedMatrix("int8")
+        int8.extend(self.features)
+        self.assertLess(int8.nbytes, self.features.nbytes // 3)
+
+    def test_top_candidates_contain_exact_best(self):
+        """测试粗筛候选包含精确最佳匹配且跳过无效行"""
+        quantized = QuantizedMatrix("int8")
+        # 分两次追加，验证扩容后行号保持不变
+        quantized.extend(self.features[:300])
+        quantized.extend(self.features[300:])
+        valid_mask = np.ones(len(self.features), dtype=bool)
+        valid_mask[10] = False
+        candidates = quantized.top_candidates(self.query, k=20, valid_mask=valid_mask)
+        self.assertEqual(len(candidates), 20)
+        self.assertNotIn(10, candidates)
+        exact = np.where(valid_mask, self.features @ self.query, -np.inf)
+        self.assertIn(int(np.argmax(exact)), candidates)
+
+    def test_unknown_type(self):
+        """测试不支持的量化类型"""
+        with self.assertRaises(ValueError):
+            QuantizedMatrix("int4")
+        with self.assertRaises(ValueError):
+            QuantizedMatrix("float16")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+import cv2
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import thread_budget
+
+
+class ThreadBudgetTestCase(unittest.TestCase):
+
+    def test_budget_divides_cpus_across_workers(self):
+        """测试按可用核数和工作进程数分配算子内线程数"""
+        budget = thread_budget.compute_thread_budget(workers=4, cpus=16)
+        self.assertEqual(budget, {"cpus": 16, "workers": 4, "intra_op": 4, "inter_op": 1})
+        self.assertEqual(thread_budget.compute_thread_budget(workers=3, cpus=8)["intra_op"], 2)
+        # 工作进程数多于核数时每个进程至少1个线程
+        self.assertEqual(thread_budget.compute_thread_budget(workers=8, cpus=4)["intra_op"], 1)
+
+    def test_workers_from_config_or_environment(self):
+        """测试工作进程数优先读取配置，其次读取WEB_CONCURRENCY"""
+        with mock.patch.object(thread_budget.config, "THREAD_BUDGET_WORKERS", None), \
+                mock.patch.dict(os.environ, {"WEB_CONCURRENCY": "6"}):
+            self.assertEqual(thread_budget.configured_workers(), 6)
+            with mock.patch.object(thread_budget.config, "THREAD_BUDGET_WORKERS", 2):
+                self.assertEqual(thread_budget.configured_workers(), 2)
+        with mock.patch.object(thread_budget.config, "THREAD_BUDGET_WORKERS", None), \
+                mock.patch.dict(os.environ, {"WEB_CONCURRENCY": "auto"}):
+            self.assertEqual(thread_budget.configured_workers(), 1)
+
+    def test_apply_to_cv2_once(self):
+        """测试按预算设置OpenCV线程数，且每个框架只设置一次"""
+        original = cv2.getNumThreads()
+        try:
+            with mock.patch.dict(thread_budget._applied, clear=True), \
+                    mock.patch.object(thread_budget.config, "THREAD_BUDGET_CPUS", 2), \
+                    mock.patch.object(thread_budget.config, "THREAD_BUDGET_WORKERS", 1):
+                results = thread_budget.apply_thread_budget("cv2", None)
+                self.assertEqual(results, {"cv2": {"intra_op": 2}})
+                self.assertEqual(cv2.getNumThreads(), 2)
+                cv2.setNumThreads(1)
+                thread_budget.apply_thread_budget("cv2")
+                self.assertEqual(cv2.getNumThreads(), 1)
+                self.assertEqual(thread_budget.thread_report()["applied"], {"cv2": {"intra_op": 2}})
+                with self.assertRaises(ValueError):
+                    thread_budget.apply_thread_budget("mxnet")
+        finally:
+            cv2.setNumThreads(original)
+
+    def test_disabled_budget_changes_nothing(self):
+        """测试关闭线程预算时不设置任何框架"""
+        with mock.patch.dict(thread_budget._applied, clear=True), \
+                mock.patch.object(thread_budget.config, "THREAD_BUDGET_ENABLED", False):
+            self.assertEqual(thread_budget.apply_thread_budget("cv2", "torch"), {})
+            self.assertEqual(thread_budget._applied, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
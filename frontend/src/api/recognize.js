@@ -2,11 +2,21 @@ import request from './request'
 
 /**
  * 摄像头拍照识别
- * @param {Object} data - 识别数据
- * @param {string} data.image - base64编码的图像
+ * @param {Blob|Object} data - 图像帧（canvas.toBlob得到的Blob，以原始图像请求体发送），
+ *   或识别数据对象 {image: base64编码的图像}（JSON发送）
  * @returns {Promise}
  */
 export const recognizeByCamera = (data) => {
+  if (data instanceof Blob) {
+    return request({
+      url: '/recognize/camera',
+      method: 'post',
+      data,
+      headers: {
+        'Content-Type': data.type || 'application/octet-stream'
+      }
+    })
+  }
   return request({
     url: '/recognize/camera',
     method: 'post',
@@ -2,14 +2,25 @@ import request from './request'
 
 /**
  * 摄像头采集录入
- * @param {Object} data - 录入数据
+ * @param {FormData|Object} data - 录入数据，FormData以multipart发送（image为图像帧Blob，face_box为JSON字符串），
+ *   对象以JSON发送（image为base64编码的图像）
  * @param {string} data.name - 用户名
- * @param {string} data.image - base64编码的图像
+ * @param {Blob|string} data.image - 图像帧
  * @param {string} [data.user_id] - 手动指定的用户ID（可选）
- * @param {Object} [data.face_box] - 人脸框坐标（可选）
+ * @param {Object|string} [data.face_box] - 人脸框坐标（可选）
  * @returns {Promise}
  */
 export const registerByCamera = (data) => {
+  if (data instanceof FormData) {
+    return request({
+      url: '/register/camera',
+      method: 'post',
+      data,
+      headers: {
+        'Content-Type': 'multipart/form-data'
+      }
+    })
+  }
   return request({
     url: '/register/camera',
     method: 'post',